@@ -1,230 +1,32 @@
-# API Routes สำหรับ Quick Actions
-@app.route('/api/customers')
-@login_required
-def api_customers_list():
-    try:
-        customers = Customer.query.order_by(Customer.name).all()
-        customer_list = []
-        for customer in customers:
-            customer_list.append({
-                'id': customer.id,
-                'name': customer.name,
-                'phone': customer.phone,
-                'email': customer.email or ''
-            })
-        return jsonify(customer_list)
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
-
-# Update create_service_job route เพื่อรองรับ Quick Add
-@app.route('/service-jobs', methods=['POST'])
-@login_required
-def create_service_job():
-    try:
-        # Get form data
-        customer_id = request.form.get('customer_id')
-        device_id = request.form.get('device_id')
-        problem_description = request.form.get('problem_description')
-        diagnosis = request.form.get('diagnosis')
-        priority = request.form.get('priority', 'medium')
-        assigned_technician_id = request.form.get('technician_id') or None
-        expected_completion_date = request.form.get('expected_completion_date')
-        estimated_cost = request.form.get('estimated_cost')
-        status = request.form.get('status', 'pending')
-        notes = request.form.get('notes')
-        
-        # สำหรับ Quick Add - สร้าง device ใหม่ถ้าไม่มี device_id
-        if not device_id and customer_id:
-            device_type = request.form.get('device_type', 'smartphone')
-            brand = request.form.get('brand', 'Unknown')
-            model = request.form.get('model', 'Unknown Model')
-            
-            # สร้าง device ใหม่
-            device = Device(
-                customer_id=customer_id,
-                device_type=device_type,
-                brand=brand,
-                model=model
-            )
-            db.session.add(device)
-            db.session.flush()  # Get device ID
-            device_id = device.id
-
-        # Create new service job
-        job = ServiceJob(
-            customer_id=customer_id,
-            device_id=device_id,
-            problem_description=problem_description,
-            diagnosis=diagnosis,
-            priority=priority,
-            assigned_technician_id=assigned_technician_id,
-            estimated_cost=float(estimated_cost) if estimated_cost else None,
-            status=ServiceJobStatus(status),
-            notes=notes
-        )
-        
-        if expected_completion_date:
-            job.expected_completion_date = datetime.strptime(expected_completion_date, '%Y-%m-%d').date()
-            job.estimated_completion_date = job.expected_completion_date
-        
-        db.session.add(job)
-        db.session.commit()
-        
-        return jsonify({'success': True, 'message': 'เพิ่มงานบริการใหม่เรียบร้อยแล้ว', 'job_id': job.id})
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'success': False, 'message': str(e)}), 400
-
-# API Routes
-@app.route('/api/customers/<int:customer_id>/devices')
-@login_required
-def api_customer_devices(customer_id):
-    try:
-        customer = Customer.query.get_or_404(customer_id)
-        devices = [{'id': d.id, 'name': f'{d.brand} {d.model} ({d.device_type})'} for d in customer.devices]
-        return jsonify({'success': True, 'devices': devices})
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
-
-@app.route('/api/products/<int:product_id>')
-@login_required
-def api_product_details(product_id):
-    try:
-        product = Product.query.get_or_404(product_id)
-        return jsonify({
-            'success': True,
-            'product': {
-                'id': product.id,
-                'name': product.name,
-                'price': product.price,
-                'stock_quantity': product.stock_quantity,
-                'sku': product.sku or ''
-            }
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
-
-@app.route('/api/sales/last')
-@login_required
-def api_last_sale():
-    try:
-        last_sale = Sale.query.order_by(Sale.id.desc()).first()
-        if last_sale:
-            return jsonify({
-                'success': True,
-                'sale': {
-                    'id': last_sale.id,
-                    'total_amount': last_sale.total_amount,
-                    'created_at': last_sale.created_at.isoformat()
-                }
-            })
-        return jsonify({'success': True, 'sale': None})
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
-
-@app.route('/api/sales/unpaid')
-@login_required
-def api_unpaid_sales():
-    try:
-        unpaid_sales = Sale.query.filter_by(payment_status='pending').count()
-        return jsonify({'success': True, 'count': unpaid_sales})
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
-
-@app.route('/api/service-jobs/completed')
-@login_required
-def api_completed_jobs():
-    try:
-        completed_jobs = ServiceJob.query.filter_by(status=ServiceJobStatus.COMPLETED).count()
-        return jsonify({'success': True, 'count': completed_jobs})
-    except Exception as e:message': str(e)}), 500
-
-@app.route('/api/customers/<int:customer_id>/devices')
-@login_required
-def api_customer_devices(customer_id):
-    try:
-        customer = Customer.query.get_or_404(customer_id)
-        devices = []
-        for device in customer.devices:
-            devices.append({
-                'id': device.id, 
-                'name': f'{device.brand} {device.model} ({device.device_type})',
-                'brand': device.brand,
-                'model': device.model,
-                'serial_number': device.serial_number or ''
-            })
-        return jsonify({'success': True, 'devices': devices})
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
-
-@app.route('/api/products/<int:product_id>')
-@login_required
-def api_product_details(product_id):
-    try:
-        product = Product.query.get_or_404(product_id)
-        return jsonify({
-            'success': True,
-            'product': {
-                'id': product.id,
-                'name': product.name,
-                'price': product.price,
-                'stock_quantity': product.stock_quantity,
-                'sku': product.sku or ''
-            }
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
-
-@app.route('/api/sales/last')
-@login_required
-def api_last_sale():
-    try:
-        last_sale = Sale.query.order_by(Sale.id.desc()).first()
-        if last_sale:
-            return jsonify({
-                'success': True,
-                'sale': {
-                    'id': last_sale.id,
-                    'total_amount': last_sale.total_amount,
-                    'created_at': last_sale.created_at.isoformat()
-                }
-            })
-        return jsonify({'success': True, 'sale': None})
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
-
-@app.route('/api/sales/unpaid')
-@login_required
-def api_unpaid_sales():
-    try:
-        unpaid_sales = Sale.query.filter_by(payment_status='pending').count()
-        return jsonify({'success': True, 'count': unpaid_sales})
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 500
-
-@app.route('/api/service-jobs/completed')
-@login_required
-def api_completed_jobs():
-    try:
-        completed_jobs = ServiceJob.query.filter_by(status=ServiceJobStatus.COMPLETED).count()
-        return jsonify({'success': True, 'count': completed_jobs})
-    except Exception as e:
-        return jsonify({'success': False, 'from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import joinedload, configure_mappers
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timedelta
 from enum import Enum
 import os
 import json
+from utils.stats import aggregate, count_where
+from utils.counters import track_sales, track_status
+from utils.rollups import DailySalesRollup
+from utils.exports import ExportColumn, CsvExport, export_params, format_datetime
+from utils.checkout import CheckoutService, CheckoutError
+from utils.sequences import SequenceAllocator
+from utils.engine import init_engine
+from utils.replica import ReadReplica
+from config import get_config_class
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'comphone-service-center-2024'
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///service_center.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
+# engine options / SQLite PRAGMA ตาม profile ของ config.py (FLASK_ENV)
+db = SQLAlchemy()
+init_engine(app, db, defaults=get_config_class())
+# หน้ารายงาน / export อ่านจาก replica (utils.replica)
+replica = ReadReplica(db)
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
@@ -414,6 +216,115 @@ class SystemSettings(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class StatCounter(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(100), unique=True, nullable=False, index=True)
+    value = db.Column(db.Float, default=0.0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DailySalesSummary(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sales_date = db.Column(db.Date, unique=True, nullable=False, index=True)
+    sales_count = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+    subtotal = db.Column(db.Float, default=0.0, nullable=False)
+    tax_amount = db.Column(db.Float, default=0.0, nullable=False)
+    discount_amount = db.Column(db.Float, default=0.0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DailyProductSales(db.Model):
+    __table_args__ = (db.UniqueConstraint('sales_date', 'product_id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    sales_date = db.Column(db.Date, nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+track_sales(Sale, StatCounter)
+track_status(ServiceJob, StatCounter, 'service_jobs')
+sales_rollup = DailySalesRollup(Sale, SaleItem, DailySalesSummary, DailyProductSales,
+                                tax_attr='tax', discount_attr='discount', counter_model=StatCounter)
+document_numbers = SequenceAllocator(StatCounter, lambda: db.session)
+checkout_service = CheckoutService(
+    Product, SaleItem,
+    item_row=lambda sale, line: {'unit_price': line.unit_price, 'total_price': line.total_price}
+)
+
+# Loader profiles ของ list view (เหมือน models.LOADER_PROFILES)
+# relationship หลายตัวมาจาก backref จึงต้อง configure mappers ก่อนอ้างถึง
+configure_mappers()
+LOADER_PROFILES = {
+    'job_list': (
+        joinedload(ServiceJob.customer),
+        joinedload(ServiceJob.device),
+        joinedload(ServiceJob.assigned_technician),
+    ),
+    'sale_list': (
+        joinedload(Sale.customer),
+        joinedload(Sale.salesperson),
+        joinedload(Sale.user),
+    ),
+    'invoice_list': (
+        joinedload(Invoice.customer),
+    ),
+}
+
+def load_profile(name):
+    return LOADER_PROFILES[name]
+
+# CSV exports - select เฉพาะคอลัมน์ + join ชื่อใน SQL แล้ว stream ทีละ batch
+# รองรับ ?columns=...&date_from=YYYY-MM-DD&date_to=YYYY-MM-DD (ดู utils/exports.py)
+PRODUCT_EXPORT = CsvExport(
+    'products', Product,
+    columns=[
+        ExportColumn('sku', 'SKU', Product.sku),
+        ExportColumn('name', 'ชื่อสินค้า', Product.name),
+        ExportColumn('category', 'หมวดหมู่', Product.category),
+        ExportColumn('brand', 'แบรนด์', Product.brand),
+        ExportColumn('price', 'ราคา', Product.price),
+        ExportColumn('cost', 'ต้นทุน', db.func.coalesce(Product.cost, 0)),
+        ExportColumn('stock', 'สต็อก', Product.stock_quantity),
+        ExportColumn('location', 'ที่เก็บ', Product.location),
+    ],
+    where=[Product.is_active == True],
+    order_by=Product.id,
+    timestamp=Product.created_at
+)
+
+INVOICE_EXPORT = CsvExport(
+    'invoices', Invoice,
+    columns=[
+        ExportColumn('invoice_number', 'เลขที่ใบเสร็จ', Invoice.invoice_number),
+        ExportColumn('customer', 'ลูกค้า', Customer.name),
+        ExportColumn('total_amount', 'จำนวนเงิน', Invoice.total_amount),
+        ExportColumn('payment_status', 'สถานะ', Invoice.payment_status),
+        ExportColumn('created_at', 'วันที่สร้าง', Invoice.created_at, format_datetime('%Y-%m-%d')),
+        ExportColumn('due_date', 'วันครบกำหนด', Invoice.due_date, format_datetime('%Y-%m-%d')),
+    ],
+    joins=[(Customer, Invoice.customer_id == Customer.id)],
+    order_by=Invoice.created_at.desc(),
+    timestamp=Invoice.created_at
+)
+
+SALES_EXPORT = CsvExport(
+    'sales_report', Sale,
+    columns=[
+        ExportColumn('created_at', 'วันที่', Sale.created_at, format_datetime('%Y-%m-%d %H:%M')),
+        ExportColumn('customer', 'ลูกค้า', db.func.coalesce(Customer.name, 'ลูกค้าทั่วไป')),
+        ExportColumn('salesperson', 'พนักงานขาย', User.username),
+        ExportColumn('total_amount', 'จำนวนเงิน', Sale.total_amount),
+        ExportColumn('payment_method', 'วิธีชำระ', Sale.payment_method),
+        ExportColumn('payment_status', 'สถานะ', Sale.payment_status),
+    ],
+    joins=[
+        (Customer, Sale.customer_id == Customer.id),
+        (User, Sale.salesperson_id == User.id),
+    ],
+    order_by=Sale.created_at.desc(),
+    timestamp=Sale.created_at
+)
+
 @login_manager.user_loader
 def load_user(user_id):
     return db.session.get(User, int(user_id))
@@ -554,33 +465,45 @@ def dashboard():
     try:
         print(f"🚀 Loading dashboard for user: {current_user.username}")
         
-        # Dashboard statistics with safe queries
-        total_customers = db.session.query(Customer).count()
-        total_jobs = db.session.query(ServiceJob).count()
-        completed_jobs = db.session.query(ServiceJob).filter(ServiceJob.status == ServiceJobStatus.COMPLETED).count()
-        pending_jobs = db.session.query(ServiceJob).filter(ServiceJob.status == ServiceJobStatus.PENDING).count()
-        in_progress_jobs = db.session.query(ServiceJob).filter(ServiceJob.status == ServiceJobStatus.IN_PROGRESS).count()
-        
-        # Calculate monthly revenue from sales
-        current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_revenue = db.session.query(db.func.sum(Sale.total_amount)).filter(
-            Sale.created_at >= current_month
-        ).scalar() or 0
+        # Dashboard statistics - หนึ่ง query ต่อ entity
+        now = datetime.now()
+        current_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        jobs = aggregate(
+            db.session, ServiceJob,
+            total=db.func.count(ServiceJob.id),
+            completed=count_where(ServiceJob.status == ServiceJobStatus.COMPLETED),
+            pending=count_where(ServiceJob.status == ServiceJobStatus.PENDING),
+            in_progress=count_where(ServiceJob.status == ServiceJobStatus.IN_PROGRESS)
+        )
+        sales = aggregate(
+            db.session, Sale,
+            total=db.func.count(Sale.id),
+            today=count_where(Sale.created_at >= today_start),
+            monthly_revenue=db.func.coalesce(db.func.sum(
+                db.case((Sale.created_at >= current_month, Sale.total_amount), else_=0)
+            ), 0)
+        )
+        products = aggregate(
+            db.session, Product,
+            total=db.func.count(Product.id),
+            low_stock=count_where(Product.stock_quantity <= Product.low_stock_alert)
+        )
+        total_customers = db.session.query(db.func.count(Customer.id)).scalar()
+        total_jobs = jobs['total']
+        completed_jobs = jobs['completed']
+        pending_jobs = jobs['pending']
+        in_progress_jobs = jobs['in_progress']
+        monthly_revenue = sales['monthly_revenue']
+        total_products = products['total']
+        low_stock_products = products['low_stock']
+        total_sales = sales['total']
+        today_sales = sales['today']
 
         # Recent jobs (last 5)
         recent_jobs = db.session.query(ServiceJob).order_by(ServiceJob.created_at.desc()).limit(5).all()
         
-        # Products stats
-        total_products = db.session.query(Product).count()
-        low_stock_products = db.session.query(Product).filter(
-            Product.stock_quantity <= Product.low_stock_alert
-        ).count()
-        
-        # Sales stats
-        total_sales = db.session.query(Sale).count()
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_sales = db.session.query(Sale).filter(Sale.created_at >= today_start).count()
-        
         # Prepare data for template
         template_data = {
             'user': current_user,
@@ -762,7 +685,7 @@ def service_jobs():
         page = request.args.get('page', 1, type=int)
         
         # Build query with proper joins
-        query = ServiceJob.query.join(Customer).join(Device)
+        query = ServiceJob.query.join(Customer).join(Device).options(*load_profile('job_list'))
         
         # Apply filters
         if search:
@@ -835,6 +758,23 @@ def create_service_job():
         status = request.form.get('status', 'pending')
         notes = request.form.get('notes')
         
+        # สำหรับ Quick Add - สร้าง device ใหม่ถ้าไม่มี device_id
+        if not device_id and customer_id:
+            device_type = request.form.get('device_type', 'smartphone')
+            brand = request.form.get('brand', 'Unknown')
+            model = request.form.get('model', 'Unknown Model')
+            
+            # สร้าง device ใหม่
+            device = Device(
+                customer_id=customer_id,
+                device_type=device_type,
+                brand=brand,
+                model=model
+            )
+            db.session.add(device)
+            db.session.flush()  # Get device ID
+            device_id = device.id
+
         # Create new service job
         job = ServiceJob(
             customer_id=customer_id,
@@ -855,7 +795,7 @@ def create_service_job():
         db.session.add(job)
         db.session.commit()
         
-        return jsonify({'success': True, 'message': 'เพิ่มงานบริการใหม่เรียบร้อยแล้ว'})
+        return jsonify({'success': True, 'message': 'เพิ่มงานบริการใหม่เรียบร้อยแล้ว', 'job_id': job.id})
         
     except Exception as e:
         db.session.rollback()
@@ -1144,43 +1084,10 @@ def bulk_delete_products():
 
 @app.route('/products/export')
 @login_required
+@replica.read_only
 def export_products():
     try:
-        products = Product.query.filter_by(is_active=True).all()
-        
-        # Simple CSV export
-        import csv
-        import io
-        
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow(['SKU', 'ชื่อสินค้า', 'หมวดหมู่', 'แบรนด์', 'ราคา', 'ต้นทุน', 'สต็อก', 'ที่เก็บ'])
-        
-        # Write data
-        for product in products:
-            writer.writerow([
-                product.sku or '',
-                product.name,
-                product.category or '',
-                product.brand or '',
-                product.price,
-                product.cost or 0,
-                product.stock_quantity,
-                product.location or ''
-            ])
-        
-        output.seek(0)
-        
-        from flask import Response
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename=products_{datetime.now().strftime("%Y%m%d")}.csv'
-            }
-        )
+        return PRODUCT_EXPORT.response(db.session, **export_params(request.args))
         
     except Exception as e:
         print(f"⚠️ Export products error: {e}")
@@ -1195,7 +1102,7 @@ def sales():
         date_from = request.args.get('date_from', '')
         date_to = request.args.get('date_to', '')
         
-        query = Sale.query.join(User, Sale.salesperson_id == User.id, isouter=True)
+        query = Sale.query.join(User, Sale.salesperson_id == User.id, isouter=True).options(*load_profile('sale_list'))
         
         if search:
             query = query.filter(
@@ -1251,29 +1158,9 @@ def create_sale():
         if not items:
             return jsonify({'success': False, 'message': 'ไม่มีสินค้าในการขาย'}), 400
         
-        # Calculate totals
-        subtotal = 0
-        sale_items = []
-        
-        for item in items:
-            product = Product.query.get(item['product_id'])
-            if not product:
-                return jsonify({'success': False, 'message': f'ไม่พบสินค้า ID: {item["product_id"]}'}), 400
-            
-            quantity = int(item['quantity'])
-            if product.stock_quantity < quantity:
-                return jsonify({'success': False, 'message': f'สินค้า "{product.name}" มีสต็อกไม่เพียงพอ'}), 400
-            
-            unit_price = float(item.get('unit_price', product.price))
-            total_price = unit_price * quantity
-            subtotal += total_price
-            
-            sale_items.append({
-                'product': product,
-                'quantity': quantity,
-                'unit_price': unit_price,
-                'total_price': total_price
-            })
+        # โหลดสินค้าทั้งตะกร้าใน query เดียว (utils.checkout)
+        lines = checkout_service.prepare(db.session, items, price_key='unit_price')
+        subtotal = sum(line.total_price for line in lines)
         
         tax = subtotal * 0.07  # 7% VAT
         total_amount = subtotal + tax - discount
@@ -1293,24 +1180,8 @@ def create_sale():
             notes=notes
         )
         
-        db.session.add(sale)
-        db.session.flush()  # Get sale ID
-        
-        # Create sale items and update stock
-        for item_data in sale_items:
-            sale_item = SaleItem(
-                sale_id=sale.id,
-                product_id=item_data['product'].id,
-                quantity=item_data['quantity'],
-                unit_price=item_data['unit_price'],
-                total_price=item_data['total_price']
-            )
-            db.session.add(sale_item)
-            
-            # Update product stock
-            item_data['product'].stock_quantity -= item_data['quantity']
-            item_data['product'].updated_at = datetime.utcnow()
-        
+        # ตัดสต็อกแบบมีเงื่อนไข แล้ว bulk insert รายการขาย
+        checkout_service.complete(db.session, sale, lines)
         db.session.commit()
         
         return jsonify({
@@ -1320,6 +1191,10 @@ def create_sale():
             'total_amount': total_amount
         })
         
+    except CheckoutError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e),
+                        'shortages': getattr(e, 'shortages', [])}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -1339,7 +1214,7 @@ def sale_receipt(sale_id):
 def sales_history():
     try:
         # Get recent sales for quick access
-        recent_sales = Sale.query.order_by(Sale.created_at.desc()).limit(10).all()
+        recent_sales = Sale.query.options(*load_profile('sale_list')).order_by(Sale.created_at.desc()).limit(10).all()
         return render_template('sales/history.html', recent_sales=recent_sales, user=current_user)
     except Exception as e:
         print(f"⚠️ Sales history error: {e}")
@@ -1355,7 +1230,7 @@ def invoices():
         date_from = request.args.get('date_from', '')
         date_to = request.args.get('date_to', '')
         
-        query = Invoice.query.join(Customer, isouter=True)
+        query = Invoice.query.join(Customer, isouter=True).options(*load_profile('invoice_list'))
         
         if search:
             query = query.filter(
@@ -1421,9 +1296,10 @@ def create_invoice():
         
         items = json.loads(items_data)
         
-        # Generate invoice number
-        last_invoice = Invoice.query.order_by(Invoice.id.desc()).first()
-        invoice_number = f"INV-{datetime.now().strftime('%Y%m')}-{(last_invoice.id + 1) if last_invoice else 1:04d}"
+        # Generate invoice number - ลำดับต่อเดือนแบบไม่มีช่องว่าง (utils.sequences)
+        invoice_number = document_numbers.next_number(
+            'INV-', period='%Y%m-', width=4, block_size=1, column=Invoice.invoice_number
+        )
         
         # Calculate totals
         subtotal = sum(float(item['total_price']) for item in items)
@@ -1568,41 +1444,10 @@ def bulk_delete_invoices():
 
 @app.route('/invoices/export')
 @login_required
+@replica.read_only
 def export_invoices():
     try:
-        invoices = Invoice.query.order_by(Invoice.created_at.desc()).all()
-        
-        # Simple CSV export
-        import csv
-        import io
-        
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow(['เลขที่ใบเสร็จ', 'ลูกค้า', 'จำนวนเงิน', 'สถานะ', 'วันที่สร้าง', 'วันครบกำหนด'])
-        
-        # Write data
-        for invoice in invoices:
-            writer.writerow([
-                invoice.invoice_number,
-                invoice.customer.name if invoice.customer else '',
-                invoice.total_amount,
-                invoice.payment_status,
-                invoice.created_at.strftime('%Y-%m-%d'),
-                invoice.due_date.strftime('%Y-%m-%d') if invoice.due_date else ''
-            ])
-        
-        output.seek(0)
-        
-        from flask import Response
-        return Response(
-            output.getvalue(),
-            mimetype='text/csv',
-            headers={
-                'Content-Disposition': f'attachment; filename=invoices_{datetime.now().strftime("%Y%m%d")}.csv'
-            }
-        )
+        return INVOICE_EXPORT.response(db.session, **export_params(request.args))
         
     except Exception as e:
         print(f"⚠️ Export invoices error: {e}")
@@ -1611,22 +1456,15 @@ def export_invoices():
 # Report Routes
 @app.route('/reports')
 @login_required
+@replica.read_only
 def reports():
     try:
         # Date range for reports
         end_date = datetime.now()
         start_date = end_date - timedelta(days=30)
         
-        # Sales reports
-        sales_data = db.session.query(
-            db.func.date(Sale.created_at).label('date'),
-            db.func.sum(Sale.total_amount).label('total'),
-            db.func.count(Sale.id).label('count')
-        ).filter(
-            Sale.created_at >= start_date
-        ).group_by(
-            db.func.date(Sale.created_at)
-        ).all()
+        # Sales reports (จาก daily_sales_summary)
+        sales_data = sales_rollup.by_day(db.session, start_date.date(), end_date.date())
         
         # Service jobs reports
         service_jobs_data = db.session.query(
@@ -1635,31 +1473,19 @@ def reports():
         ).group_by(ServiceJob.status).all()
         
         # Top products
-        top_products = db.session.query(
-            Product.name,
-            db.func.sum(SaleItem.quantity).label('total_sold'),
-            db.func.sum(SaleItem.total_price).label('total_revenue')
-        ).join(SaleItem).join(Sale).filter(
-            Sale.created_at >= start_date
-        ).group_by(Product.id, Product.name).order_by(
-            db.func.sum(SaleItem.total_price).desc()
-        ).limit(10).all()
+        top_products = sales_rollup.top_products(
+            db.session, Product, start_date.date(), end_date.date(), order_by='revenue'
+        )
         
         # Monthly revenue
-        monthly_revenue = db.session.query(
-            db.func.sum(Sale.total_amount)
-        ).filter(
-            Sale.created_at >= datetime.now().replace(day=1)
-        ).scalar() or 0
+        month_start = end_date.date().replace(day=1)
+        monthly_revenue = sales_rollup.totals(db.session, month_start).total
         
         # Calculate trends
-        previous_month = (datetime.now().replace(day=1) - timedelta(days=1)).replace(day=1)
-        previous_monthly_revenue = db.session.query(
-            db.func.sum(Sale.total_amount)
-        ).filter(
-            Sale.created_at >= previous_month,
-            Sale.created_at < datetime.now().replace(day=1)
-        ).scalar() or 0
+        previous_month = (month_start - timedelta(days=1)).replace(day=1)
+        previous_monthly_revenue = sales_rollup.totals(
+            db.session, previous_month, month_start - timedelta(days=1)
+        ).total
         
         revenue_trend = ((monthly_revenue - previous_monthly_revenue) / previous_monthly_revenue * 100) if previous_monthly_revenue > 0 else 0
         
@@ -1676,44 +1502,13 @@ def reports():
 
 @app.route('/reports/export')
 @login_required
+@replica.read_only
 def export_reports():
     try:
         report_type = request.args.get('type', 'sales')
         
         if report_type == 'sales':
-            # Export sales report
-            sales = Sale.query.order_by(Sale.created_at.desc()).all()
-            
-            import csv
-            import io
-            
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # Write header
-            writer.writerow(['วันที่', 'ลูกค้า', 'พนักงานขาย', 'จำนวนเงิน', 'วิธีชำระ', 'สถานะ'])
-            
-            # Write data
-            for sale in sales:
-                writer.writerow([
-                    sale.created_at.strftime('%Y-%m-%d %H:%M'),
-                    sale.customer.name if sale.customer else 'ลูกค้าทั่วไป',
-                    sale.salesperson.username if sale.salesperson else '',
-                    sale.total_amount,
-                    sale.payment_method or '',
-                    sale.payment_status
-                ])
-            
-            output.seek(0)
-            
-            from flask import Response
-            return Response(
-                output.getvalue(),
-                mimetype='text/csv',
-                headers={
-                    'Content-Disposition': f'attachment; filename=sales_report_{datetime.now().strftime("%Y%m%d")}.csv'
-                }
-            )
+            return SALES_EXPORT.response(db.session, **export_params(request.args))
         
         # Add other report types as needed
         return jsonify({'success': False, 'message': 'ประเภทรายงานไม่ถูกต้อง'}), 400
@@ -1789,12 +1584,37 @@ def inventory():
         return render_template_placeholder('คลังสินค้า', 'fas fa-warehouse')
 
 # API Routes
+@app.route('/api/customers')
+@login_required
+def api_customers_list():
+    try:
+        customers = Customer.query.order_by(Customer.name).all()
+        customer_list = []
+        for customer in customers:
+            customer_list.append({
+                'id': customer.id,
+                'name': customer.name,
+                'phone': customer.phone,
+                'email': customer.email or ''
+            })
+        return jsonify(customer_list)
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @app.route('/api/customers/<int:customer_id>/devices')
 @login_required
 def api_customer_devices(customer_id):
     try:
         customer = Customer.query.get_or_404(customer_id)
-        devices = [{'id': d.id, 'name': f'{d.brand} {d.model} ({d.device_type})'} for d in customer.devices]
+        devices = []
+        for device in customer.devices:
+            devices.append({
+                'id': device.id, 
+                'name': f'{device.brand} {device.model} ({device.device_type})',
+                'brand': device.brand,
+                'model': device.model,
+                'serial_number': device.serial_number or ''
+            })
         return jsonify({'success': True, 'devices': devices})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
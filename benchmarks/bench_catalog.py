@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: ค้นหาสินค้า / สแกนบาร์โค้ด - query ฐานข้อมูลเดิม กับ utils.catalog
+
+สร้างฐานข้อมูล SQLite ชั่วคราวจาก models.py ใส่สินค้าจำลอง แล้ววัดเวลา
+ต่อครั้ง (median / p99) ของการค้นหาแบบ contains() + LIMIT 50 และการสแกนบาร์โค้ด
+เทียบกับ product_catalog.search() / scan()
+
+Run: python benchmarks/bench_catalog.py [--products 20000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert, or_
+from models import db, Product, product_catalog
+
+BRANDS = ['Samsung', 'Apple', 'Oppo', 'Vivo', 'Xiaomi', 'Realme', 'Huawei']
+PARTS = ['จอ', 'แบตเตอรี่', 'สายชาร์จ', 'เคส', 'ฟิล์มกระจก', 'หูฟัง', 'Adapter', 'Cable']
+CATEGORIES = ['อะไหล่', 'อุปกรณ์เสริม', 'บริการ', 'มือถือ']
+
+def build_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    return app
+
+def seed(products):
+    rng = random.Random(42)
+    rows = [{
+        'name': f'{rng.choice(PARTS)} {rng.choice(BRANDS)} รุ่น {rng.randrange(1, 400)}',
+        'sku': f'SKU{i:06d}',
+        'barcode': f'885{i:010d}',
+        'category': rng.choice(CATEGORIES),
+        'price': rng.randrange(50, 5000),
+        'stock_quantity': rng.randrange(0, 30),
+    } for i in range(products)]
+    db.session.execute(insert(Product.__table__), rows)
+    db.session.commit()
+
+def measure(func, inputs):
+    samples = []
+    for value in inputs:
+        start = time.perf_counter()
+        func(value)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+def db_search(query):
+    return Product.query.filter(
+        or_(Product.name.contains(query), Product.barcode.contains(query), Product.sku.contains(query)),
+        Product.stock_quantity > 0
+    ).limit(50).all()
+
+def db_scan(code):
+    return Product.query.filter_by(barcode=code).first()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    queries = [rng.choice(['จอ', 'Sam', 'แบตเตอรี่', 'Apple รุ่น 12', 'SKU0012', 'เคส Oppo', 'xiao', 'Ca'])
+               for _ in range(args.repeat)]
+    codes = [f'885{rng.randrange(args.products):010d}' for _ in range(args.repeat)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            print(f'🔄 Seeding {args.products:,} products...')
+            seed(args.products)
+
+            start = time.perf_counter()
+            product_catalog.refresh(full=True)
+            print(f'📦 Catalog built in {(time.perf_counter() - start) * 1000:.1f} ms')
+
+            cases = [
+                ('search', db_search, lambda q: product_catalog.search(q, limit=50, in_stock=True), queries),
+                ('scan', db_scan, product_catalog.scan, codes),
+            ]
+            for label, before, after, inputs in cases:
+                before_median, before_p99 = measure(before, inputs)
+                after_median, after_p99 = measure(after, inputs)
+                print(f'\n📊 {label}')
+                print(f'   database: median {before_median:8.3f} ms  p99 {before_p99:8.3f} ms')
+                print(f'   catalog:  median {after_median:8.3f} ms  p99 {after_p99:8.3f} ms')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: func.date(created_at) กับช่วงเวลาแบบ half-open (utils.dateranges)
+
+สร้างฐานข้อมูล SQLite ชั่วคราวจาก models.py ใส่ข้อมูลจำลอง แล้วแสดง
+EXPLAIN QUERY PLAN และเวลาเฉลี่ยของแต่ละ query ทั้งแบบเดิมและแบบใหม่
+
+Run: python benchmarks/bench_date_ranges.py [--rows 200000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import func, insert, select
+from models import db, Sale, ServiceJob, Task, ServiceJobStatus, TaskStatus
+from utils.dateranges import date_bounds, day_bounds, in_range, in_dates, local_today
+
+def build_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    return app
+
+def seed(rows):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    stamp = lambda: now - timedelta(minutes=rng.randrange(365 * 24 * 60))
+    batch = 10000
+    for offset in range(0, rows, batch):
+        count = min(batch, rows - offset)
+        db.session.execute(insert(Sale.__table__), [{
+            'sale_number': f'S{offset + i:08d}', 'salesperson_id': 1,
+            'customer_id': rng.randrange(1, 2000), 'subtotal': 100.0, 'total_amount': 107.0,
+            'status': rng.choice(['completed', 'completed', 'completed', 'cancelled']),
+            'sale_date': now, 'created_at': stamp()
+        } for i in range(count)])
+        db.session.execute(insert(ServiceJob.__table__), [{
+            'job_number': f'J{offset + i:08d}', 'title': 'repair', 'created_by': 1,
+            'customer_id': rng.randrange(1, 2000),
+            'status': rng.choice(list(ServiceJobStatus)).name, 'created_at': stamp()
+        } for i in range(count)])
+        db.session.execute(insert(Task.__table__), [{
+            'title': 'task', 'created_by': 1, 'customer_id': rng.randrange(1, 2000),
+            'status': rng.choice(list(TaskStatus)).name, 'created_at': stamp()
+        } for i in range(count)])
+    db.session.commit()
+    db.session.execute(db.text('ANALYZE'))
+
+def explain(stmt):
+    compiled = stmt.compile(dialect=db.engine.dialect)
+    params = compiled.construct_params()
+    args = tuple(
+        compiled.binds[key].type.bind_processor(db.engine.dialect)(params[key])
+        if compiled.binds[key].type.bind_processor(db.engine.dialect) else params[key]
+        for key in compiled.positiontup
+    )
+    with db.engine.connect() as conn:
+        plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', args).all()
+    return ' | '.join(row[-1] for row in plan)
+
+def timed(stmt, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        db.session.execute(stmt).all()
+    return (time.perf_counter() - start) / repeat * 1000
+
+def cases():
+    today = local_today()
+    month_start = today.replace(day=1)
+    utc_today = datetime.utcnow().date()
+    return [
+        ('sale: ยอดขายวันนี้',
+         select(func.count(), func.sum(Sale.total_amount)).where(func.date(Sale.created_at) == utc_today),
+         select(func.count(), func.sum(Sale.total_amount)).where(in_range(Sale.created_at, day_bounds()))),
+        ('sale: รายงานเดือนนี้',
+         select(Sale.id).where(func.date(Sale.created_at) >= month_start, func.date(Sale.created_at) <= today),
+         select(Sale.id).where(in_dates(Sale.created_at, month_start, today))),
+        ('sale: ลูกค้า + ช่วงเวลา',
+         select(Sale.id).where(Sale.customer_id == 7, func.date(Sale.created_at) >= month_start),
+         select(Sale.id).where(Sale.customer_id == 7, in_dates(Sale.created_at, month_start, today))),
+        ('service_job: สถานะ + ช่วงเวลา',
+         select(func.count()).where(ServiceJob.status == ServiceJobStatus.COMPLETED,
+                                    func.date(ServiceJob.created_at) >= month_start),
+         select(func.count()).where(ServiceJob.status == ServiceJobStatus.COMPLETED,
+                                    in_dates(ServiceJob.created_at, month_start, today))),
+        ('task: 7 วันล่าสุด',
+         select(func.date(Task.created_at), func.count()).where(
+             func.date(Task.created_at) >= today - timedelta(days=6)).group_by(func.date(Task.created_at)),
+         select(func.date(Task.created_at), func.count()).where(
+             in_range(Task.created_at, date_bounds(today - timedelta(days=6), today))
+         ).group_by(func.date(Task.created_at))),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000, help='จำนวนแถวต่อตาราง')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(os.path.join(tmp, 'bench.db'))
+        with app.app_context():
+            db.create_all()
+            print(f'🔄 Seeding {args.rows:,} rows per table...')
+            seed(args.rows)
+            for label, before, after in cases():
+                print(f'\n📊 {label}')
+                print(f'   before ({timed(before, args.repeat):7.2f} ms): {explain(before)}')
+                print(f'   after  ({timed(after, args.repeat):7.2f} ms): {explain(after)}')
+
+if __name__ == '__main__':
+    main()
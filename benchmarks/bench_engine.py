@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: อ่าน/เขียนปนกันจากหลาย process บนไฟล์ SQLite เดียว - ค่าเริ่มต้นของ SQLite กับ engine profile (utils.engine)
+
+แต่ละ worker process (เหมือน worker ของ web server) เปิดแอปของตัวเองบนไฟล์เดียวกัน
+แล้วสุ่มทำงานเป็นเวลา --seconds วินาที: อ่าน (หน้ารายการขาย 20 แถว / ค้นสินค้าตาม SKU)
+หรือเขียน (ตัดสต็อกสินค้า + บันทึก ActivityLog แล้ว commit) ตามสัดส่วน --write-ratio
+    before: journal_mode=DELETE, synchronous=FULL, cache 2 MB, ไม่มี mmap (ค่าเริ่มต้นของ SQLite)
+    after:  profile ของ Config (WAL, synchronous=NORMAL, cache 64 MB, mmap 256 MB, temp_store=MEMORY)
+วัด operations ต่อวินาที, latency ของการอ่าน (median / p95) และจำนวน "database is locked"
+
+Run: python benchmarks/bench_engine.py [--processes 4] [--seconds 5] [--write-ratio 0.2]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import OperationalError
+from config import Config
+from models import db, ActivityLog, Customer, Product, Sale, User
+from utils.engine import init_engine
+
+PROFILES = {
+    'before': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_CACHE_SIZE_KB': 2000,
+        'SQLITE_MMAP_SIZE': 0,
+        'SQLITE_TEMP_STORE': 'DEFAULT',
+        'SQLITE_FOREIGN_KEYS': False,
+    },
+    'after': {},
+}
+
+def build_app(path, profile):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}',
+        CACHE_DISABLED=True,
+        AUDIT_ASYNC=False,
+        **PROFILES[profile]
+    )
+    init_engine(app, db, defaults=Config)
+    return app
+
+def seed(path, profile, products, sales):
+    app = build_app(path, profile)
+    rng = random.Random(42)
+    with app.app_context():
+        db.create_all()
+        user = User(username='bench', email='bench@test.local', first_name='B', last_name='M')
+        user.set_password('bench')
+        customer = Customer(name='Walk-in', phone='0800000000')
+        db.session.add_all([user, customer])
+        db.session.commit()
+        db.session.execute(insert(Product), [{
+            'name': f'สินค้า {i}', 'sku': f'SKU{i:06d}', 'category': 'อะไหล่',
+            'price': 100 + i % 900, 'cost': 50, 'stock_quantity': 1_000_000
+        } for i in range(products)])
+        db.session.execute(insert(Sale), [{
+            'sale_number': f'S{i:07d}', 'customer_id': customer.id, 'salesperson_id': user.id,
+            'subtotal': rng.randrange(100, 5000), 'total_amount': rng.randrange(100, 5000)
+        } for i in range(sales)])
+        db.session.commit()
+        user_id = user.id
+    with app.app_context():
+        db.engine.dispose()
+    return user_id
+
+def worker(path, profile, seconds, write_ratio, products, user_id, start, results):
+    app = build_app(path, profile)
+    rng = random.Random(os.getpid())
+    reads, writes, locked, latencies = 0, 0, 0, []
+    with app.app_context():
+        start.wait()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            sku = f'SKU{rng.randrange(products):06d}'
+            began = time.perf_counter()
+            try:
+                if rng.random() < write_ratio:
+                    db.session.execute(update(Product).where(Product.sku == sku).values(
+                        stock_quantity=Product.stock_quantity - 1
+                    ))
+                    db.session.execute(insert(ActivityLog).values(
+                        action='stock_adjust', entity_type='product', user_id=user_id, description=sku
+                    ))
+                    db.session.commit()
+                    writes += 1
+                else:
+                    if rng.random() < 0.5:
+                        db.session.scalars(select(Sale).order_by(Sale.created_at.desc(), Sale.id.desc()).limit(20)).all()
+                    else:
+                        db.session.scalar(select(Product).where(Product.sku == sku))
+                    db.session.rollback()
+                    latencies.append(time.perf_counter() - began)
+                    reads += 1
+            except OperationalError:
+                db.session.rollback()
+                locked += 1
+        db.engine.dispose()
+    results.put((reads, writes, locked, latencies))
+
+def run(profile, processes, seconds, write_ratio, products, sales):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        user_id = seed(path, profile, products, sales)
+        start = multiprocessing.Barrier(processes)
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=worker, args=(
+                path, profile, seconds, write_ratio, products, user_id, start, results
+            ))
+            for _ in range(processes)
+        ]
+        for process in workers:
+            process.start()
+        outcomes = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+
+    reads = sum(outcome[0] for outcome in outcomes)
+    writes = sum(outcome[1] for outcome in outcomes)
+    locked = sum(outcome[2] for outcome in outcomes)
+    latencies = sorted(latency for outcome in outcomes for latency in outcome[3])
+    return reads, writes, locked, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--sales', type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f'🔄 {args.processes} processes x {args.seconds:g}s, writes {args.write_ratio:.0%}')
+    throughput = {}
+    for profile in ('before', 'after'):
+        reads, writes, locked, latencies = run(
+            profile, args.processes, args.seconds, args.write_ratio, args.products, args.sales
+        )
+        throughput[profile] = (reads + writes) / args.seconds
+        p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+        median = statistics.median(latencies) if latencies else 0
+        print(f'\n📊 {profile}')
+        print(f'   reads:       {reads:,} ({reads / args.seconds:,.0f}/s)  median {median * 1000:.2f} ms  p95 {p95 * 1000:.2f} ms')
+        print(f'   writes:      {writes:,} ({writes / args.seconds:,.0f}/s)')
+        print(f'   locked:      {locked:,}')
+        print(f'   throughput:  {throughput[profile]:,.0f} ops/s')
+
+    if throughput['before']:
+        print(f"\n🚀 speedup: {throughput['after'] / throughput['before']:.1f}x")
+
+if __name__ == '__main__':
+    main()
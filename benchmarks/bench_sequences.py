@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: เลขที่เอกสารจากหลาย process พร้อมกัน (utils.sequences)
+
+แต่ละ worker process เปิดแอปของตัวเองบนไฟล์ SQLite เดียวกัน แล้วสร้าง Sale
+ทีละรายการ (commit ทุกรายการ) ซึ่งได้ sale_number จาก document_numbers
+วัดอัตราต่อวินาทีของ block size ต่าง ๆ และตรวจว่าไม่มีเลขซ้ำ / เลขในแต่ละ process เพิ่มขึ้นเสมอ
+เทียบกับจำนวนเลขที่ชนกันถ้ายังสุ่ม 6 หลักแบบเดิม
+
+Run: python benchmarks/bench_sequences.py [--processes 4] [--sales 500]
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from models import db, Sale, User
+
+def build_app(path, block_size):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}',
+        SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 60}},
+        SEQUENCE_BLOCK_SIZE=block_size,
+        CACHE_DISABLED=True
+    )
+    db.init_app(app)
+    return app
+
+def worker(path, block_size, sales, start, results):
+    app = build_app(path, block_size)
+    numbers = []
+    with app.app_context():
+        start.wait()
+        began = time.perf_counter()
+        for _ in range(sales):
+            sale = Sale(salesperson_id=1, subtotal=100, total_amount=100)
+            db.session.add(sale)
+            db.session.commit()
+            numbers.append(sale.sale_number)
+        elapsed = time.perf_counter() - began
+    results.put((os.getpid(), numbers, elapsed))
+
+def run(block_size, processes, sales):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        app = build_app(path, block_size)
+        with app.app_context():
+            db.create_all()
+            user = User(username='bench', email='bench@test.local', first_name='B', last_name='M')
+            user.set_password('bench')
+            db.session.add(user)
+            db.session.commit()
+
+        start = multiprocessing.Barrier(processes)
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=worker, args=(path, block_size, sales, start, results))
+            for _ in range(processes)
+        ]
+        for process in workers:
+            process.start()
+        outcomes = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+
+    numbers = [number for _, batch, _ in outcomes for number in batch]
+    duplicates = sum(count - 1 for count in Counter(numbers).values() if count > 1)
+    monotonic = all(batch == sorted(batch) for _, batch, _ in outcomes)
+    elapsed = max(seconds for _, _, seconds in outcomes)
+    return len(numbers), duplicates, monotonic, elapsed
+
+def legacy_collisions(total, rng):
+    """จำนวนเลขซ้ำถ้าสุ่ม 'SAL' + 6 หลักแบบเดิม"""
+    drawn = [''.join(rng.choices('0123456789', k=6)) for _ in range(total)]
+    return total - len(set(drawn))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--sales', type=int, default=500, help='จำนวน Sale ต่อ process')
+    parser.add_argument('--block-sizes', default='1,20,100')
+    args = parser.parse_args()
+
+    print(f'🔄 {args.processes} processes x {args.sales:,} sales')
+    for block_size in [int(size) for size in args.block_sizes.split(',')]:
+        total, duplicates, monotonic, elapsed = run(block_size, args.processes, args.sales)
+        print(f'\n📊 block size {block_size}')
+        print(f'   numbers:     {total:,}  duplicates: {duplicates}  monotonic per process: {monotonic}')
+        print(f'   throughput:  {total / elapsed:,.0f} sales/s')
+
+    rng = random.Random(42)
+    total = args.processes * args.sales
+    print(f'\n📊 random 6 digits (เดิม): {legacy_collisions(total, rng)} duplicates in {total:,} numbers')
+    print(f'   at 100,000 rows: {legacy_collisions(100_000, rng):,} duplicates')
+
+if __name__ == '__main__':
+    main()
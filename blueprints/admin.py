@@ -9,9 +9,15 @@ from flask_login import login_required, current_user
 from datetime import datetime, timezone, timedelta
 from models import (
     db, User, Customer, Task, ServiceJob, Product, Sale, SystemSettings,
-    ActivityLog, UserRole, log_activity, get_setting, set_setting
+    ActivityLog, UserRole, TaskStatus, ServiceJobStatus, sales_rollup,
+    log_activity, get_setting, set_setting, settings_cache, load_profile,
+    activity_partitions, replica
 )
 from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import selectinload
+from utils.pagination import paginate_keyset
+from utils.stats import get_dashboard_snapshot
+from utils.rollups import as_date
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -31,46 +37,39 @@ def admin_required(f):
 def dashboard():
     """Admin dashboard"""
     # System statistics
+    snapshot = get_dashboard_snapshot()
     stats = {
         'users': {
-            'total': User.query.count(),
-            'active': User.query.filter_by(is_active=True).count(),
-            'admins': User.query.filter_by(role=UserRole.ADMIN).count(),
-            'technicians': User.query.filter_by(role=UserRole.TECHNICIAN).count(),
-            'sales': User.query.filter_by(role=UserRole.SALES).count()
+            'total': snapshot.users.total,
+            'active': snapshot.users.active,
+            'admins': snapshot.users.by_role[UserRole.ADMIN.value],
+            'technicians': snapshot.users.by_role[UserRole.TECHNICIAN.value],
+            'sales': snapshot.users.by_role[UserRole.SALES.value]
         },
         'customers': {
-            'total': Customer.query.count(),
-            'active': Customer.query.filter_by(status='active').count(),
-            'new_this_month': Customer.query.filter(
-                Customer.created_at >= datetime.now().replace(day=1)
-            ).count()
+            'total': snapshot.customers.total,
+            'active': snapshot.customers.active,
+            'new_this_month': snapshot.customers.new_this_month
         },
         'tasks': {
-            'total': Task.query.count(),
-            'pending': Task.query.filter_by(status='pending').count(),
-            'completed': Task.query.filter_by(status='completed').count()
+            'total': snapshot.tasks.total,
+            'pending': snapshot.tasks.by_status[TaskStatus.PENDING.value],
+            'completed': snapshot.tasks.by_status[TaskStatus.COMPLETED.value]
         },
         'service_jobs': {
-            'total': ServiceJob.query.count(),
-            'active': ServiceJob.query.filter(
-                ServiceJob.status.in_(['received', 'in_repair'])
-            ).count(),
-            'completed': ServiceJob.query.filter_by(status='completed').count()
+            'total': snapshot.service_jobs.total,
+            'active': snapshot.service_jobs.active,
+            'completed': snapshot.service_jobs.by_status[ServiceJobStatus.COMPLETED.value]
         },
         'products': {
-            'total': Product.query.count(),
-            'active': Product.query.filter_by(is_active=True).count(),
-            'low_stock': Product.query.filter(
-                Product.stock_quantity <= Product.min_stock_level
-            ).count()
+            'total': snapshot.products.total,
+            'active': snapshot.products.active,
+            'low_stock': snapshot.products.low_stock
         },
         'sales': {
-            'total': Sale.query.count(),
-            'today': Sale.query.filter(
-                func.date(Sale.created_at) == datetime.now().date()
-            ).count(),
-            'total_revenue': db.session.query(func.sum(Sale.total_amount)).scalar() or 0
+            'total': snapshot.sales.total,
+            'today': snapshot.sales.today,
+            'total_revenue': snapshot.sales.total_revenue
         }
     }
     
@@ -95,7 +94,7 @@ def dashboard():
 @admin_required
 def users():
     """User management"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor', '')
     search = request.args.get('search', '')
     role_filter = request.args.get('role', '')
     status_filter = request.args.get('status', '')
@@ -125,9 +124,7 @@ def users():
     elif status_filter == 'inactive':
         query = query.filter(User.is_active == False)
     
-    users = query.order_by(User.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    users = paginate_keyset(query, [(User.created_at, True)], cursor=cursor, per_page=20)
     
     return render_template('admin/users.html',
                          users=users,
@@ -187,6 +184,7 @@ def update_settings():
                         )
         
         db.session.commit()
+        settings_cache.invalidate()
         flash(f'อัพเดตการตั้งค่า {updated_count} รายการเรียบร้อยแล้ว', 'success')
         
     except Exception as e:
@@ -200,38 +198,41 @@ def update_settings():
 @login_required
 @admin_required
 def activity_log():
-    """Activity log viewer"""
-    page = request.args.get('page', 1, type=int)
-    action_filter = request.args.get('action', '')
+    """Activity log viewer (keyset pagination ต่อกันข้ามตารางรายเดือน)"""
+    cursor = request.args.get('cursor', '')
+    action_filter = request.args.get('action', '').strip()
     user_filter = request.args.get('user', '')
     date_from = request.args.get('date_from', '')
     date_to = request.args.get('date_to', '')
     
-    # Build query
-    query = ActivityLog.query
-    
-    if action_filter:
-        query = query.filter(ActivityLog.action.contains(action_filter))
-    
-    if user_filter:
-        query = query.filter(ActivityLog.user_id == user_filter)
-    
+    since = until = None
     if date_from:
         try:
-            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d')
-            query = query.filter(ActivityLog.created_at >= date_from_obj)
+            since = datetime.strptime(date_from, '%Y-%m-%d')
         except ValueError:
             pass
     
     if date_to:
         try:
-            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
-            query = query.filter(ActivityLog.created_at < date_to_obj)
+            until = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
         except ValueError:
             pass
     
-    activities = query.order_by(ActivityLog.created_at.desc()).paginate(
-        page=page, per_page=50, error_out=False
+    def criteria(c):
+        clauses = []
+        if action_filter:
+            # ค้นส่วนใดของชื่อ action ก็ได้ (เช่น "login" เจอ "user_login") เหมือนเดิม
+            clauses.append(c.action.contains(action_filter))
+        if user_filter:
+            clauses.append(c.user_id == user_filter)
+        if until is not None:
+            clauses.append(c.created_at < until)
+        return clauses
+    
+    activities = activity_partitions.page(
+        db.session, cursor=cursor, per_page=current_app.config.get('ACTIVITY_LOG_PER_PAGE', 50),
+        criteria=criteria, since=since,
+        options=load_profile('activity_list'), partition_options=(selectinload(ActivityLog.user),)
     )
     
     # Get users for filter
@@ -239,6 +240,7 @@ def activity_log():
     
     return render_template('admin/activity_log.html',
                          activities=activities,
+                         next_cursor=activities.next_cursor,
                          users=users,
                          action_filter=action_filter,
                          user_filter=user_filter,
@@ -248,11 +250,20 @@ def activity_log():
 @admin_bp.route('/reports')
 @login_required
 @admin_required
+@replica.read_only
 def reports():
     """System reports"""
-    # Date range
-    date_from = request.args.get('date_from', (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d'))
-    date_to = request.args.get('date_to', datetime.now().strftime('%Y-%m-%d'))
+    # Date range (วันที่ผิดรูปแบบ -> ใช้ 30 วันล่าสุด)
+    default_from = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+    default_to = datetime.now().strftime('%Y-%m-%d')
+    date_from = request.args.get('date_from', default_from)
+    date_to = request.args.get('date_to', default_to)
+    try:
+        start_date, end_date = as_date(date_from), as_date(date_to)
+    except ValueError:
+        flash('รูปแบบวันที่ไม่ถูกต้อง แสดงข้อมูล 30 วันล่าสุดแทน', 'error')
+        date_from, date_to = default_from, default_to
+        start_date, end_date = as_date(date_from), as_date(date_to)
     
     # Users by role
     users_by_role = db.session.query(
@@ -266,33 +277,9 @@ def reports():
         func.count(Task.id).label('count')
     ).group_by(Task.status).all()
     
-    # Sales by day
-    sales_by_day = db.session.query(
-        func.date(Sale.created_at).label('date'),
-        func.count(Sale.id).label('count'),
-        func.sum(Sale.total_amount).label('total')
-    ).filter(
-        Sale.created_at >= date_from,
-        Sale.created_at <= date_to
-    ).group_by(func.date(Sale.created_at)).all()
-    
-    # Top products
-    top_products = db.session.query(
-        Product.name,
-        func.sum(SaleItem.quantity).label('total_quantity'),
-        func.sum(SaleItem.total_price).label('total_revenue')
-    ).join(
-        SaleItem, Product.id == SaleItem.product_id
-    ).join(
-        Sale, SaleItem.sale_id == Sale.id
-    ).filter(
-        Sale.created_at >= date_from,
-        Sale.created_at <= date_to
-    ).group_by(
-        Product.id, Product.name
-    ).order_by(
-        func.sum(SaleItem.quantity).desc()
-    ).limit(10).all()
+    # Sales by day / top products (จาก daily_sales_summary)
+    sales_by_day = sales_rollup.by_day(db.session, start_date, end_date)
+    top_products = sales_rollup.top_products(db.session, Product, start_date, end_date)
     
     return render_template('admin/reports.html',
                          users_by_role=users_by_role,
@@ -391,26 +378,21 @@ def create_backup():
 @admin_required
 def api_system_stats():
     """API for system statistics"""
+    snapshot = get_dashboard_snapshot()
     stats = {
-        'total_users': User.query.count(),
-        'active_users': User.query.filter_by(is_active=True).count(),
-        'total_customers': Customer.query.count(),
-        'active_customers': Customer.query.filter_by(status='active').count(),
-        'total_tasks': Task.query.count(),
-        'pending_tasks': Task.query.filter_by(status='pending').count(),
-        'total_service_jobs': ServiceJob.query.count(),
-        'active_service_jobs': ServiceJob.query.filter(
-            ServiceJob.status.in_(['received', 'in_repair'])
-        ).count(),
-        'total_products': Product.query.count(),
-        'low_stock_products': Product.query.filter(
-            Product.stock_quantity <= Product.min_stock_level
-        ).count(),
-        'total_sales': Sale.query.count(),
-        'today_sales': Sale.query.filter(
-            func.date(Sale.created_at) == datetime.now().date()
-        ).count(),
-        'total_revenue': db.session.query(func.sum(Sale.total_amount)).scalar() or 0
+        'total_users': snapshot.users.total,
+        'active_users': snapshot.users.active,
+        'total_customers': snapshot.customers.total,
+        'active_customers': snapshot.customers.active,
+        'total_tasks': snapshot.tasks.total,
+        'pending_tasks': snapshot.tasks.by_status[TaskStatus.PENDING.value],
+        'total_service_jobs': snapshot.service_jobs.total,
+        'active_service_jobs': snapshot.service_jobs.active,
+        'total_products': snapshot.products.total,
+        'low_stock_products': snapshot.products.low_stock,
+        'total_sales': snapshot.sales.total,
+        'today_sales': snapshot.sales.today,
+        'total_revenue': snapshot.sales.total_revenue
     }
     
     return jsonify(stats)
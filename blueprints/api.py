@@ -10,81 +10,73 @@ from datetime import datetime, timezone, timedelta
 from models import (
     db, User, Customer, Task, ServiceJob, Product, Sale, SaleItem,
     TaskStatus, TaskPriority, ServiceJobStatus, PaymentStatus, UserRole,
-    log_activity, get_setting
+    sales_rollup, log_activity, get_setting, product_catalog
 )
 from sqlalchemy import func, or_, and_
 from werkzeug.security import generate_password_hash
+from utils.stats import get_dashboard_snapshot, get_user_workload
+from utils.dateranges import date_bounds, in_range, local_today
+from utils.decorators import cache_response
+from utils.phones import phone_filter, same_phone
 
 api_bp = Blueprint('api', __name__)
 
 # ===== Dashboard API =====
+def _dashboard_scope():
+    """ช่างเห็นงานของตัวเองด้วย จึงแยกแคชรายคน ส่วน role อื่นแชร์กันตาม role"""
+    if current_user.role == UserRole.TECHNICIAN:
+        return f'user:{current_user.id}'
+    return f'role:{current_user.role.value}'
+
 @api_bp.route('/dashboard/stats')
 @login_required
+@cache_response(timeout=60, tags=('sales', 'stock', 'jobs', 'tasks', 'customers', 'users'), scope=_dashboard_scope)
 def api_dashboard_stats():
     """Get dashboard statistics"""
     try:
-        # Basic stats
+        snapshot = get_dashboard_snapshot()
         stats = {
             'users': {
-                'total': User.query.count(),
-                'active': User.query.filter_by(is_active=True).count(),
-                'technicians': User.query.filter_by(is_technician=True).count()
+                'total': snapshot.users.total,
+                'active': snapshot.users.active,
+                'technicians': snapshot.users.technicians
             },
             'customers': {
-                'total': Customer.query.count(),
-                'active': Customer.query.filter_by(status='active').count(),
-                'new_this_month': Customer.query.filter(
-                    Customer.created_at >= datetime.now().replace(day=1)
-                ).count()
+                'total': snapshot.customers.total,
+                'active': snapshot.customers.active,
+                'new_this_month': snapshot.customers.new_this_month
             },
             'tasks': {
-                'total': Task.query.count(),
-                'pending': Task.query.filter_by(status=TaskStatus.PENDING).count(),
-                'in_progress': Task.query.filter_by(status=TaskStatus.IN_PROGRESS).count(),
-                'completed': Task.query.filter_by(status=TaskStatus.COMPLETED).count(),
-                'overdue': Task.query.filter(
-                    Task.due_date < datetime.now(timezone.utc),
-                    Task.status.in_([TaskStatus.PENDING, TaskStatus.IN_PROGRESS])
-                ).count()
+                'total': snapshot.tasks.total,
+                'pending': snapshot.tasks.by_status[TaskStatus.PENDING.value],
+                'in_progress': snapshot.tasks.by_status[TaskStatus.IN_PROGRESS.value],
+                'completed': snapshot.tasks.by_status[TaskStatus.COMPLETED.value],
+                'overdue': snapshot.tasks.overdue
             },
             'service_jobs': {
-                'total': ServiceJob.query.count(),
-                'received': ServiceJob.query.filter_by(status=ServiceJobStatus.RECEIVED).count(),
-                'in_repair': ServiceJob.query.filter_by(status=ServiceJobStatus.IN_REPAIR).count(),
-                'completed': ServiceJob.query.filter_by(status=ServiceJobStatus.COMPLETED).count(),
-                'overdue': ServiceJob.query.filter(
-                    ServiceJob.promised_date < datetime.now(timezone.utc),
-                    ServiceJob.status.in_([ServiceJobStatus.RECEIVED, ServiceJobStatus.IN_REPAIR])
-                ).count()
+                'total': snapshot.service_jobs.total,
+                'received': snapshot.service_jobs.by_status[ServiceJobStatus.RECEIVED.value],
+                'in_repair': snapshot.service_jobs.by_status[ServiceJobStatus.IN_REPAIR.value],
+                'completed': snapshot.service_jobs.by_status[ServiceJobStatus.COMPLETED.value],
+                'overdue': snapshot.service_jobs.overdue
             },
             'sales': {
-                'total': Sale.query.count(),
-                'today': Sale.query.filter(
-                    func.date(Sale.created_at) == datetime.now().date()
-                ).count(),
-                'this_month': Sale.query.filter(
-                    Sale.created_at >= datetime.now().replace(day=1)
-                ).count(),
-                'total_revenue': db.session.query(func.sum(Sale.total_amount)).scalar() or 0
+                'total': snapshot.sales.total,
+                'today': snapshot.sales.today,
+                'this_month': snapshot.sales.this_month,
+                'total_revenue': snapshot.sales.total_revenue
             },
             'products': {
-                'total': Product.query.count(),
-                'active': Product.query.filter_by(is_active=True).count(),
-                'low_stock': Product.query.filter(
-                    Product.stock_quantity <= Product.min_stock_level
-                ).count(),
-                'out_of_stock': Product.query.filter_by(stock_quantity=0).count()
+                'total': snapshot.products.total,
+                'active': snapshot.products.active,
+                'low_stock': snapshot.products.low_stock,
+                'out_of_stock': snapshot.products.out_of_stock
             }
         }
         
         # Role-based filtering
         if current_user.role == UserRole.TECHNICIAN:
-            stats['my_tasks'] = Task.query.filter(
-                Task.assignees.any(User.id == current_user.id)
-            ).count()
-            stats['my_service_jobs'] = ServiceJob.query.filter_by(
-                assigned_technician=current_user.id
-            ).count()
+            stats.update(get_user_workload(current_user.id))
         
         return jsonify(stats)
     except Exception as e:
@@ -93,19 +85,21 @@ def api_dashboard_stats():
 
 @api_bp.route('/dashboard/charts')
 @login_required
+@cache_response(timeout=300, tags=('sales', 'jobs', 'tasks'), scope='role')
 def api_dashboard_charts():
     """Get chart data for dashboard"""
     try:
         # Last 7 days data
-        end_date = datetime.now().date()
+        end_date = local_today()
         start_date = end_date - timedelta(days=6)
+        since = date_bounds(start_date, end_date)
         
         # Tasks by day
         tasks_by_day = db.session.query(
             func.date(Task.created_at).label('date'),
             func.count(Task.id).label('count')
         ).filter(
-            Task.created_at >= start_date
+            in_range(Task.created_at, since)
         ).group_by(func.date(Task.created_at)).all()
         
         # Service jobs by day
@@ -113,16 +107,11 @@ def api_dashboard_charts():
             func.date(ServiceJob.created_at).label('date'),
             func.count(ServiceJob.id).label('count')
         ).filter(
-            ServiceJob.created_at >= start_date
+            in_range(ServiceJob.created_at, since)
         ).group_by(func.date(ServiceJob.created_at)).all()
         
-        # Sales by day
-        sales_by_day = db.session.query(
-            func.date(Sale.created_at).label('date'),
-            func.sum(Sale.total_amount).label('total')
-        ).filter(
-            Sale.created_at >= start_date
-        ).group_by(func.date(Sale.created_at)).all()
+        # Sales by day (จาก daily_sales_summary)
+        sales_by_day = sales_rollup.by_day(db.session, start_date, end_date)
         
         # Tasks by status
         tasks_by_status = db.session.query(
@@ -276,14 +265,18 @@ def api_search_customers():
     if not query:
         return jsonify([])
     
-    customers = Customer.query.filter(
-        Customer.status == 'active',
-        or_(
+    # เบอร์โทร (ทั้งเบอร์หรือเลขท้าย) ค้นผ่าน index ของ phone_digits / phone_reversed
+    search_filter = phone_filter(Customer, query)
+    if search_filter is None:
+        search_filter = or_(
             Customer.name.contains(query),
-            Customer.phone.contains(query),
             Customer.email.contains(query),
             Customer.customer_code.contains(query)
         )
+    
+    customers = Customer.query.filter(
+        Customer.status == 'active',
+        search_filter
     ).limit(limit).all()
     
     return jsonify([{
@@ -307,7 +300,7 @@ def api_quick_add_customer():
             return jsonify({'error': 'Name and phone are required'}), 400
         
         # Check if customer already exists
-        existing = Customer.query.filter_by(phone=data['phone']).first()
+        existing = Customer.query.filter(same_phone(Customer, data['phone'])).first()
         if existing:
             return jsonify({'error': 'Phone number already exists'}), 400
         
@@ -350,33 +343,19 @@ def api_search_products():
     category = request.args.get('category', '')
     limit = request.args.get('limit', 50, type=int)
     
-    products_query = Product.query.filter(Product.is_active == True)
-    
-    if query:
-        products_query = products_query.filter(
-            or_(
-                Product.name.contains(query),
-                Product.sku.contains(query),
-                Product.barcode.contains(query)
-            )
-        )
-    
-    if category:
-        products_query = products_query.filter(Product.category == category)
-    
-    products = products_query.limit(limit).all()
+    products = product_catalog.search(query, category=category or None, limit=limit, active_only=True)
     
     return jsonify([{
-        'id': product.id,
-        'name': product.name,
-        'sku': product.sku,
-        'barcode': product.barcode,
-        'price': float(product.price),
-        'cost': float(product.cost or 0),
-        'stock_quantity': product.stock_quantity,
-        'category': product.category,
-        'is_service': product.is_service,
-        'image_url': product.image_url
+        'id': product['id'],
+        'name': product['name'],
+        'sku': product['sku'],
+        'barcode': product['barcode'],
+        'price': float(product['price']),
+        'cost': float(product['cost'] or 0),
+        'stock_quantity': product['stock_quantity'],
+        'category': product['category'],
+        'is_service': product['is_service'],
+        'image_url': product['image_url']
     } for product in products])
 
 @api_bp.route('/products/<int:product_id>/adjust_stock', methods=['POST'])
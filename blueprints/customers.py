@@ -2,8 +2,11 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 from flask_login import login_required, current_user
 from models import db, Customer, Device, ServiceJob, Sale
 from datetime import datetime, timedelta
-from sqlalchemy import func, desc, or_
+from sqlalchemy import func, desc
 import re
+from utils import search as search_index
+from utils.phones import phone_filter, same_phone
+from utils.pagination import paginate_keyset, nulls_last
 
 customers_bp = Blueprint('customers', __name__, url_prefix='/customers')
 
@@ -34,7 +37,7 @@ def list_customers():
         search = request.args.get('search', '', type=str).strip()
         sort_by = request.args.get('sort', 'name', type=str)
         order = request.args.get('order', 'asc', type=str)
-        page = request.args.get('page', 1, type=int)
+        cursor = request.args.get('cursor', '')
         per_page = 20
         
         # สร้าง query หลัก
@@ -42,37 +45,23 @@ def list_customers():
         
         # ค้นหา
         if search:
-            search_filter = or_(
-                Customer.first_name.ilike(f'%{search}%'),
-                Customer.last_name.ilike(f'%{search}%'),
-                Customer.phone.ilike(f'%{search}%'),
-                Customer.email.ilike(f'%{search}%'),
-                Customer.address.ilike(f'%{search}%')
-            )
-            query = query.filter(search_filter)
+            query = query.filter(search_index.search_filter(db.session, Customer, search))
         
-        # เรียงลำดับ
-        if sort_by == 'name':
-            order_column = Customer.first_name if order == 'asc' else desc(Customer.first_name)
-        elif sort_by == 'created':
-            order_column = Customer.created_at if order == 'asc' else desc(Customer.created_at)
+        # เรียงลำดับ (key ของ cursor - id ต่อท้ายให้อัตโนมัติ)
+        descending = order != 'asc'
+        if sort_by == 'created':
+            sort_keys = [(Customer.created_at, descending)]
         elif sort_by == 'last_service':
-            # เรียงตามวันที่บริการล่าสุด
+            # เรียงตามวันที่บริการล่าสุด (ลูกค้าที่ยังไม่มีงานอยู่ท้าย)
             query = query.outerjoin(ServiceJob).group_by(Customer.id)
-            if order == 'asc':
-                order_column = func.max(ServiceJob.created_at).asc()
-            else:
-                order_column = func.max(ServiceJob.created_at).desc()
+            sort_keys = [nulls_last(func.max(ServiceJob.created_at), descending)]
         else:
-            order_column = Customer.first_name
-            
-        query = query.order_by(order_column)
+            sort_keys = [(Customer.name, sort_by == 'name' and descending)]
         
-        # แบ่งหน้า
-        customers = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
+        # แบ่งหน้าด้วย cursor - จำนวนทั้งหมดแคชไว้จนกว่าข้อมูลลูกค้าจะเปลี่ยน
+        customers = paginate_keyset(
+            query, sort_keys, cursor=cursor, per_page=per_page,
+            count='cached', count_tags=('customers',)
         )
         
         # สถิติลูกค้า
@@ -138,7 +127,7 @@ def add_customer():
                     return render_template('customers/add_customer.html')
                 
                 # ตรวจสอบเบอร์โทรซ้ำ
-                existing_phone = Customer.query.filter_by(phone=phone).first()
+                existing_phone = Customer.query.filter(same_phone(Customer, phone)).first()
                 if existing_phone:
                     flash('เบอร์โทรศัพท์นี้มีอยู่ในระบบแล้ว', 'error')
                     return render_template('customers/add_customer.html')
@@ -254,7 +243,7 @@ def edit_customer(id):
                 
                 # ตรวจสอบเบอร์โทรซ้ำ (ยกเว้นลูกค้าคนนี้)
                 existing_phone = Customer.query.filter(
-                    Customer.phone == phone,
+                    same_phone(Customer, phone),
                     Customer.id != id
                 ).first()
                 if existing_phone:
@@ -347,13 +336,16 @@ def search_customers_api():
         if not query or len(query) < 2:
             return jsonify([])
         
-        customers = Customer.query.filter(
-            or_(
-                Customer.first_name.ilike(f'%{query}%'),
-                Customer.last_name.ilike(f'%{query}%'),
-                Customer.phone.ilike(f'%{query}%')
-            )
-        ).limit(10).all()
+        by_phone = phone_filter(Customer, query)
+        if by_phone is not None:
+            customers = Customer.query.filter(by_phone).limit(10).all()
+        elif search_index.available(db.session):
+            hits = search_index.search(db.session, query, kinds=['customer'], limit=10)
+            customers = search_index.load_hits('customer', [hit.ref_id for hit in hits])
+        else:
+            customers = Customer.query.filter(
+                search_index.search_filter(db.session, Customer, query)
+            ).limit(10).all()
         
         results = []
         for customer in customers:
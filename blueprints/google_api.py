@@ -1,5 +1,6 @@
 # C:/.../comphone_integrated/blueprints/google_api.py
 
+import io
 import os
 from flask import (
     Blueprint, request, url_for, session, jsonify, redirect, current_app, flash
@@ -9,7 +10,7 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaIoBaseUpload
 import google.auth.transport.requests
 
 from models import db, Task, ServiceJob, Sale
@@ -151,30 +152,27 @@ def upload_receipt_to_drive(sale_id):
         return jsonify({'success': False, 'message': 'ไม่ได้ตั้งค่า Google Drive Folder ID'})
 
     try:
-        # --- สร้างไฟล์ใบเสร็จ (ตัวอย่างนี้จะสร้างไฟล์ text ง่ายๆ) ---
-        receipt_content = f"ใบเสร็จเลขที่: {sale.receipt_number}\n"
-        receipt_content += f"วันที่: {sale.created_at.strftime('%Y-%m-%d %H:%M')}\n"
-        receipt_content += f"ลูกค้า: {sale.customer.name}\n\n"
-        for item in sale.items:
-            receipt_content += f"- {item.product.name} x{item.quantity} = {item.total_price} บาท\n"
-        receipt_content += f"\nยอดรวม: {sale.total_amount} บาท"
-        
-        file_path = f"/tmp/receipt_{sale.receipt_number}.txt"
-        with open(file_path, "w") as f:
-            f.write(receipt_content)
+        # --- สร้างใบเสร็จในหน่วยความจำ (ไม่เขียนไฟล์ชั่วคราวลงดิสก์) ---
+        customer_name = sale.customer.name if sale.customer else 'ลูกค้าทั่วไป'
+        lines = [
+            f"ใบเสร็จเลขที่: {sale.sale_number}",
+            f"วันที่: {sale.created_at.strftime('%Y-%m-%d %H:%M')}",
+            f"ลูกค้า: {customer_name}",
+            "",
+        ]
+        lines += [f"- {item.product.name} x{item.quantity} = {item.total_price} บาท" for item in sale.items]
+        lines.append(f"\nยอดรวม: {sale.total_amount} บาท")
+        receipt_content = "\n".join(lines)
         # --------------------------------------------------------
 
         service = build('drive', 'v3', credentials=creds)
         file_metadata = {
-            'name': f'receipt_{sale.receipt_number}.txt',
+            'name': f'receipt_{sale.sale_number}.txt',
             'parents': [folder_id]
         }
-        media = MediaFileUpload(file_path, mimetype='text/plain')
+        media = MediaIoBaseUpload(io.BytesIO(receipt_content.encode('utf-8')), mimetype='text/plain')
         
         file = service.files().create(body=file_metadata, media_body=media, fields='id, webViewLink').execute()
-        
-        # ลบไฟล์ชั่วคราว
-        os.remove(file_path)
 
         # บันทึก Link ไปยัง Google Drive ไว้ใน Sale
         sale.gdrive_receipt_url = file.get('webViewLink')
@@ -1,68 +1,68 @@
 # C:/.../comphone_integrated/blueprints/line_bot.py
 
 from flask import Blueprint, request, abort, current_app
-from linebot.v3 import WebhookHandler
-from linebot.v3.exceptions import InvalidSignatureError
 from linebot.v3.messaging import (
     Configuration,
     ApiClient,
-    MessagingApi,
-    ReplyMessageRequest,
-    TextMessage
+    MessagingApi
 )
 from linebot.v3.webhooks import (
+    Event,
     MessageEvent,
     TextMessageContent,
     PostbackEvent,
     FollowEvent
 )
-import json
 
-from models import db, Customer, Task, User
+from models import db, Customer, Task, User, LineWebhookEvent, line_dispatcher
+from utils.line_webhook import CustomerLookup, LineEventQueue, verify_signature
 
 line_bp = Blueprint('line_bot', __name__, url_prefix='/line')
 
 # --- LINE Bot Setup ---
-handler = None
 configuration = None
 messaging_api = None
 
-# --- Event Handler Functions (ย้ายมาไว้ตรงนี้โดยไม่มี Decorator) ---
+# line_user_id -> (customer_id, name) แคชในหน่วยความจำ โหลดทีละ batch (utils.line_webhook)
+line_customers = CustomerLookup(Customer)
 
-def handle_text_message(event):
+# --- Event Handler Functions (เรียกจาก worker ของ line_events - ไม่ใช่ใน request ของ webhook) ---
+# customer: (id, name) จาก line_customers หรือ None ถ้ายังไม่ลงทะเบียน
+
+def latest_task(customer_id):
+    return Task.query.filter_by(customer_id=customer_id).order_by(Task.created_at.desc()).first()
+
+def handle_text_message(event, customer):
     """Handler for text messages from users."""
     text = event.message.text.lower().strip()
-    line_user_id = event.source.user_id
-    customer = Customer.query.filter_by(line_user_id=line_user_id).first()
     if not customer:
         reply_text = "สวัสดีครับ! ดูเหมือนคุณจะยังไม่ได้ลงทะเบียนกับเรา กรุณาลงทะเบียนผ่านเมนู 'สมัคร/เชื่อมต่อบัญชี' ก่อนนะครับ"
-        reply_message(event.reply_token, reply_text)
+        queue_reply(event, reply_text)
         return
 
+    customer_id, customer_name = customer
     if 'แจ้งปัญหา' in text or 'แจ้งซ่อม' in text:
-        reply_text = f"สวัสดีคุณ {customer.name} ครับ กรุณากดที่เมนู 'แจ้งปัญหา/งานซ่อม' เพื่อกรอกรายละเอียดได้เลยครับ"
+        reply_text = f"สวัสดีคุณ {customer_name} ครับ กรุณากดที่เมนู 'แจ้งปัญหา/งานซ่อม' เพื่อกรอกรายละเอียดได้เลยครับ"
     elif 'สถานะ' in text or 'ตามงาน' in text:
-        last_job = Task.query.filter_by(customer_id=customer.id).order_by(Task.created_at.desc()).first()
+        last_job = latest_task(customer_id)
         if last_job:
             reply_text = f"สถานะงานล่าสุดของคุณ '{last_job.title}' คือ: {last_job.status}"
         else:
             reply_text = "ไม่พบข้อมูลงานในระบบของท่านครับ"
     else:
         reply_text = "ขออภัยครับ ฉันไม่เข้าใจคำสั่ง กรุณาเลือกจากเมนูได้เลยครับ"
-    reply_message(event.reply_token, reply_text)
+    queue_reply(event, reply_text)
 
 
-def handle_postback(event):
+def handle_postback(event, customer):
     """Handler for postback events (button clicks)."""
     data = event.postback.data
-    line_user_id = event.source.user_id
     
     if data == 'action=create_task':
         reply_text = "กรุณาพิมพ์รายละเอียดปัญหาที่ต้องการแจ้งได้เลยครับ โดยขึ้นต้นว่า 'แจ้งปัญหา' ตามด้วยรายละเอียด"
     elif data == 'action=check_status':
-        customer = Customer.query.filter_by(line_user_id=line_user_id).first()
         if customer:
-            last_job = Task.query.filter_by(customer_id=customer.id).order_by(Task.created_at.desc()).first()
+            last_job = latest_task(customer[0])
             if last_job:
                 reply_text = f"สถานะงานล่าสุด: {last_job.title}\nสถานะ: {last_job.status}"
             else:
@@ -71,10 +71,10 @@ def handle_postback(event):
             reply_text = "กรุณาลงทะเบียนก่อนใช้งานครับ"
     else:
         reply_text = "ดำเนินการตามคำขอของท่านแล้ว"
-    reply_message(event.reply_token, reply_text)
+    queue_reply(event, reply_text)
 
 
-def handle_follow(event):
+def handle_follow(event, customer):
     """Handler for when a user adds the bot as a friend."""
     line_user_id = event.source.user_id
     try:
@@ -86,12 +86,40 @@ def handle_follow(event):
         f"สวัสดีคุณ {display_name} ยินดีต้อนรับสู่ Comphone Service ครับ!\n\n"
         "กรุณากดที่เมนู 'สมัคร/เชื่อมต่อบัญชี' ด้านล่างเพื่อเริ่มใช้งานระบบแจ้งซ่อมและติดตามสถานะได้เลยครับ"
     )
-    reply_message(event.reply_token, reply_text)
+    queue_reply(event, reply_text)
+
+
+def prepare_events(session, payloads):
+    """ค้นหาลูกค้าของทุก event ใน batch ด้วย query เดียว (หรือจากแคช)"""
+    return line_customers.lookup(session, [(payload.get('source') or {}).get('userId') for payload in payloads])
+
+def handle_event(session, payload, customers):
+    """แปลง event ดิบเป็น model ของ line-bot-sdk แล้วส่งให้ handler ตามชนิด"""
+    try:
+        event = Event.from_dict(payload)
+    except ValueError:
+        current_app.logger.debug(f"Skipping unknown LINE event type: {payload.get('type')}")
+        return
+    customer = customers.get((payload.get('source') or {}).get('userId'))
+    if isinstance(event, MessageEvent):
+        if isinstance(event.message, TextMessageContent):
+            handle_text_message(event, customer)
+    elif isinstance(event, PostbackEvent):
+        handle_postback(event, customer)
+    elif isinstance(event, FollowEvent):
+        handle_follow(event, customer)
+
+def queue_reply(event, text):
+    """ตอบกลับผ่าน outbox ใน transaction ของ worker (ส่งหลัง commit ของ batch)"""
+    line_dispatcher.reply(db.session, event.reply_token, text)
+
+# คิว webhook event (ตาราง line_webhook_event) - ประมวลผลโดย worker pool
+line_events = LineEventQueue(LineWebhookEvent, lambda: db.session, handle_event, prepare_events)
 
 
 def init_line_bot(app):
-    """Initialize LINE Bot handlers from app config and register handlers."""
-    global handler, configuration, messaging_api
+    """Initialize LINE Bot API client from app config and start the event / outbox workers."""
+    global configuration, messaging_api
     
     channel_secret = app.config.get('LINE_CHANNEL_SECRET')
     channel_access_token = app.config.get('LINE_CHANNEL_ACCESS_TOKEN')
@@ -100,62 +128,65 @@ def init_line_bot(app):
         app.logger.warning("LINE Bot credentials are not set. The LINE webhook will not work.")
         return
 
-    handler = WebhookHandler(channel_secret)
     configuration = Configuration(access_token=channel_access_token)
     api_client = ApiClient(configuration)
     messaging_api = MessagingApi(api_client)
     
-    # --- START: จุดที่แก้ไข ---
-    # Register event handlers manually after handler is created
-    handler.add(MessageEvent, message=TextMessageContent)(handle_text_message)
-    handler.add(PostbackEvent)(handle_postback)
-    handler.add(FollowEvent)(handle_follow)
-    # --- END: จุดที่แก้ไข ---
+    # webhook event และข้อความขาออกประมวลผลด้วย worker ใน process นี้
+    # หรือปิด LINE_DISPATCH_IN_PROCESS แล้วรัน `dispatch-line` / `process-line-events` แยกต่างหาก
+    if app.config.get('LINE_DISPATCH_IN_PROCESS', True):
+        line_events.start(app)
+        line_dispatcher.start(app)
     
-    app.logger.info("LINE Bot initialized and handlers registered successfully.")
+    app.logger.info("LINE Bot initialized and workers started successfully.")
 
 # --- Webhook Endpoint ---
 @line_bp.route("/callback", methods=['POST'])
 def callback():
-    """LINE Bot Webhook endpoint."""
-    if handler is None:
-        current_app.logger.error("LINE Bot handler is not initialized.")
+    """LINE Bot Webhook endpoint - ตรวจ signature, บันทึก event ลงคิว แล้วตอบ 200 ทันที"""
+    channel_secret = current_app.config.get('LINE_CHANNEL_SECRET')
+    if not channel_secret:
+        current_app.logger.error("LINE_CHANNEL_SECRET is not set.")
         abort(500)
 
     signature = request.headers.get('X-Line-Signature')
     if not signature:
         abort(400)
 
-    body = request.get_data(as_text=True)
-    current_app.logger.info(f"Request body: {body}")
+    body = request.get_data()
+    if not verify_signature(channel_secret, body, signature):
+        current_app.logger.error("Invalid signature. Please check your channel secret.")
+        abort(400)
 
     try:
-        handler.handle(body, signature)
-    except InvalidSignatureError:
-        current_app.logger.error("Invalid signature. Please check your channel secret.")
+        added, duplicates = line_events.enqueue(db.session, body)
+        db.session.commit()
+    except ValueError:
         abort(400)
     except Exception as e:
-        current_app.logger.error(f"Error handling webhook: {e}")
+        db.session.rollback()
+        current_app.logger.error(f"Error queueing webhook: {e}")
         abort(500)
 
+    current_app.logger.debug(f"LINE webhook: {added} queued, {duplicates} duplicates ({len(body)} bytes)")
     return 'OK'
 
 
 # --- Utility Functions ---
 def reply_message(reply_token, text):
-    """A simple helper to reply with a text message."""
-    if messaging_api:
-        messaging_api.reply_message(
-            ReplyMessageRequest(
-                reply_token=reply_token,
-                messages=[TextMessage(text=text)]
-            )
-        )
+    """A simple helper to reply with a text message (queued in the LINE outbox)."""
+    try:
+        line_dispatcher.reply(db.session, reply_token, text)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Could not queue LINE reply: {e}")
 
 def push_message(to, text):
-    """A simple helper to push a text message to a user."""
-    if messaging_api:
-        messaging_api.push_message(
-            to=to,
-            messages=[TextMessage(text=text)]
-        )
\ No newline at end of file
+    """A simple helper to push a text message to a user (queued in the LINE outbox)."""
+    try:
+        line_dispatcher.enqueue(db.session, to, text)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Could not queue LINE message: {e}")
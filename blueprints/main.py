@@ -1,7 +1,12 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
-from models import db, Task, Customer, ServiceJob, Product, Sale, Notification, User
+from models import db, Task, Customer, ServiceJob, ServiceJobStatus, Product, Sale, Notification, User, sales_rollup, load_profile
+from utils.stats import aggregate, count_where, product_stats
+from utils.dateranges import day_bounds, month_bounds, in_range, in_dates, local_today
+from utils.decorators import cache_response
+from utils import search as search_index
+from utils.pagination import paginate_keyset
 from sqlalchemy import func, desc
 import logging
 
@@ -33,21 +38,16 @@ def dashboard():
         
         # Customer statistics
         stats['total_customers'] = Customer.query.count()
-        today = datetime.utcnow().date()
-        first_day_of_month = today.replace(day=1)
         stats['new_customers'] = Customer.query.filter(
-            func.date(Customer.created_at) >= first_day_of_month
+            in_range(Customer.created_at, month_bounds())
         ).count()
         
         # Sales statistics
-        today_sales = db.session.query(func.sum(Sale.total_amount)).filter(
-            func.date(Sale.created_at) == today
-        ).scalar()
+        today_count, today_sales = db.session.query(
+            func.count(Sale.id), func.sum(Sale.total_amount)
+        ).filter(in_range(Sale.created_at, day_bounds())).one()
         stats['today_sales'] = today_sales or 0
-        
-        stats['today_transactions'] = Sale.query.filter(
-            func.date(Sale.created_at) == today
-        ).count()
+        stats['today_transactions'] = today_count
         
         # Low stock items
         stats['low_stock_items'] = Product.query.filter(
@@ -55,7 +55,7 @@ def dashboard():
         ).count()
         
         # Get recent activities (using service jobs as activities for now)
-        recent_activities = ServiceJob.query.order_by(desc(ServiceJob.created_at)).limit(5).all()
+        recent_activities = ServiceJob.query.options(*load_profile('job_list')).order_by(desc(ServiceJob.created_at)).limit(5).all()
         
         # Get user's assigned tasks
         my_tasks = Task.query.filter_by(assigned_to=current_user.id).filter(
@@ -63,7 +63,7 @@ def dashboard():
         ).order_by(desc(Task.created_at)).limit(5).all()
         
         # Get recent jobs
-        recent_jobs = ServiceJob.query.order_by(desc(ServiceJob.created_at)).limit(5).all()
+        recent_jobs = ServiceJob.query.options(*load_profile('job_list')).order_by(desc(ServiceJob.created_at)).limit(5).all()
         
         # Get notifications
         try:
@@ -100,63 +100,34 @@ def search():
     results = {'customers': [], 'jobs': [], 'tasks': [], 'products': []}
     
     if query and len(query) >= 2:
-        # Search customers
-        customers = Customer.query.filter(
-            db.or_(
-                Customer.first_name.ilike(f'%{query}%'),
-                Customer.last_name.ilike(f'%{query}%'),
-                Customer.email.ilike(f'%{query}%'),
-                Customer.phone.ilike(f'%{query}%')
-            )
-        ).limit(10).all()
-        results['customers'] = customers
-        
-        # Search service jobs
-        jobs = ServiceJob.query.filter(
-            db.or_(
-                ServiceJob.title.ilike(f'%{query}%'),
-                ServiceJob.description.ilike(f'%{query}%')
-            )
-        ).limit(10).all()
-        results['jobs'] = jobs
-        
-        # Search tasks
-        tasks = Task.query.filter(
-            db.or_(
-                Task.title.ilike(f'%{query}%'),
-                Task.description.ilike(f'%{query}%')
-            )
-        ).limit(10).all()
-        results['tasks'] = tasks
-        
-        # Search products
-        products = Product.query.filter(
-            db.or_(
-                Product.name.ilike(f'%{query}%'),
-                Product.description.ilike(f'%{query}%'),
-                Product.sku.ilike(f'%{query}%')
-            )
-        ).limit(10).all()
-        results['products'] = products
+        groups = {'customer': 'customers', 'job': 'jobs', 'task': 'tasks', 'product': 'products'}
+        if search_index.available(db.session):
+            # ผลค้นหาทุกประเภทจากดัชนี FTS5 ใน query เดียว เรียงตามความตรง
+            hits = search_index.search_grouped(db.session, query, list(groups), per_kind=10)
+            for kind, key in groups.items():
+                results[key] = search_index.load_hits(kind, hits[kind])
+        else:
+            for model, key in ((Customer, 'customers'), (ServiceJob, 'jobs'), (Task, 'tasks'), (Product, 'products')):
+                results[key] = model.query.filter(
+                    search_index.search_filter(db.session, model, query)
+                ).limit(10).all()
     
     return render_template('main/search_results.html', 
                          query=query, 
-                         results=results)
+                         results=results,
+                         total=sum(len(items) for items in results.values()))
 
 @main_bp.route('/notifications')
 @login_required
 def notifications():
     """Show all notifications for current user"""
     try:
-        page = request.args.get('page', 1, type=int)
+        cursor = request.args.get('cursor', '')
         per_page = 20
         
-        notifications = Notification.query.filter_by(user_id=current_user.id).order_by(
-            desc(Notification.created_at)
-        ).paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
+        notifications = paginate_keyset(
+            Notification.query.filter_by(user_id=current_user.id), [(Notification.created_at, True)],
+            cursor=cursor, per_page=per_page
         )
         
         # Mark notifications as read when viewed
@@ -199,7 +170,7 @@ def reports():
     
     # Default to current month if no dates provided
     if not start_date or not end_date:
-        today = datetime.utcnow().date()
+        today = local_today()
         start_date = today.replace(day=1)
         end_date = today
     else:
@@ -226,7 +197,7 @@ def activity_log():
     
     # For now, use service jobs as activity log
     # In a real system, you'd have a dedicated ActivityLog model
-    activities = ServiceJob.query.order_by(desc(ServiceJob.created_at)).paginate(
+    activities = ServiceJob.query.options(*load_profile('job_list')).order_by(desc(ServiceJob.created_at)).paginate(
         page=page, 
         per_page=per_page, 
         error_out=False
@@ -237,6 +208,7 @@ def activity_log():
 # API Routes
 @main_bp.route('/api/dashboard_stats')
 @login_required
+@cache_response(timeout=60, tags=('sales', 'stock', 'jobs', 'tasks', 'customers'), scope='role')
 def api_dashboard_stats():
     """API endpoint for dashboard statistics"""
     try:
@@ -256,15 +228,11 @@ def api_dashboard_stats():
         stats['total_customers'] = Customer.query.count()
         
         # Sales statistics
-        today = datetime.utcnow().date()
-        today_sales = db.session.query(func.sum(Sale.total_amount)).filter(
-            func.date(Sale.created_at) == today
-        ).scalar()
+        today_count, today_sales = db.session.query(
+            func.count(Sale.id), func.sum(Sale.total_amount)
+        ).filter(in_range(Sale.created_at, day_bounds())).one()
         stats['today_sales'] = float(today_sales or 0)
-        
-        stats['today_transactions'] = Sale.query.filter(
-            func.date(Sale.created_at) == today
-        ).count()
+        stats['today_transactions'] = today_count
         
         # Inventory statistics
         stats['total_products'] = Product.query.count()
@@ -366,13 +334,14 @@ def api_notifications():
 # Helper functions for reports
 def generate_sales_report(start_date, end_date):
     """Generate sales report for date range"""
-    sales = Sale.query.filter(
-        func.date(Sale.created_at) >= start_date,
-        func.date(Sale.created_at) <= end_date
-    ).all()
+    totals = sales_rollup.totals(db.session, start_date, end_date)
+    # Query object - โหลด Sale จริงเฉพาะเมื่อ template วนแสดงรายการ
+    sales = Sale.query.options(*load_profile('sale_list')).filter(
+        in_dates(Sale.created_at, start_date, end_date)
+    ).order_by(Sale.created_at.desc())
     
-    total_sales = sum(sale.total_amount for sale in sales)
-    total_transactions = len(sales)
+    total_sales = float(totals.total)
+    total_transactions = int(totals.count)
     
     return {
         'total_sales': total_sales,
@@ -383,50 +352,48 @@ def generate_sales_report(start_date, end_date):
 
 def generate_service_jobs_report(start_date, end_date):
     """Generate service jobs report for date range"""
-    jobs = ServiceJob.query.filter(
-        func.date(ServiceJob.created_at) >= start_date,
-        func.date(ServiceJob.created_at) <= end_date
-    ).all()
-    
-    completed_jobs = [job for job in jobs if job.status == 'completed']
-    pending_jobs = [job for job in jobs if job.status == 'pending']
-    in_progress_jobs = [job for job in jobs if job.status == 'in_progress']
+    in_period = in_dates(ServiceJob.created_at, start_date, end_date)
+    status = ServiceJob.status
+    counts = aggregate(
+        db.session, ServiceJob, in_period,
+        total_jobs=func.count(ServiceJob.id),
+        completed_jobs=count_where(status.in_([ServiceJobStatus.COMPLETED, ServiceJobStatus.DELIVERED])),
+        pending_jobs=count_where(status.in_([
+            ServiceJobStatus.RECEIVED, ServiceJobStatus.DIAGNOSED, ServiceJobStatus.WAITING_PARTS
+        ])),
+        in_progress_jobs=count_where(status.in_([ServiceJobStatus.IN_REPAIR, ServiceJobStatus.TESTING]))
+    )
     
     return {
-        'total_jobs': len(jobs),
-        'completed_jobs': len(completed_jobs),
-        'pending_jobs': len(pending_jobs),
-        'in_progress_jobs': len(in_progress_jobs),
-        'jobs': jobs
+        **{name: int(value) for name, value in counts.items()},
+        'jobs': ServiceJob.query.options(*load_profile('job_list')).filter(in_period).order_by(ServiceJob.created_at.desc())
     }
 
 def generate_customers_report(start_date, end_date):
     """Generate customers report for date range"""
-    new_customers = Customer.query.filter(
-        func.date(Customer.created_at) >= start_date,
-        func.date(Customer.created_at) <= end_date
-    ).all()
-    
-    total_customers = Customer.query.count()
+    in_period = in_dates(Customer.created_at, start_date, end_date)
+    counts = aggregate(
+        db.session, Customer,
+        new_customers=count_where(in_period),
+        total_customers=func.count(Customer.id)
+    )
     
     return {
-        'new_customers': len(new_customers),
-        'total_customers': total_customers,
-        'customers': new_customers
+        'new_customers': int(counts['new_customers']),
+        'total_customers': int(counts['total_customers']),
+        'customers': Customer.query.filter(in_period).order_by(Customer.created_at.desc())
     }
 
 def generate_inventory_report():
     """Generate inventory report"""
-    products = Product.query.all()
+    stats = product_stats()
     low_stock_products = Product.query.filter(
         Product.stock_quantity <= Product.min_stock_level
-    ).all()
-    
-    total_value = sum(product.stock_quantity * product.cost for product in products if product.cost)
+    ).order_by(Product.stock_quantity)
     
     return {
-        'total_products': len(products),
-        'low_stock_count': len(low_stock_products),
-        'total_inventory_value': total_value,
+        'total_products': stats.total,
+        'low_stock_count': stats.low_stock,
+        'total_inventory_value': stats.inventory_value,
         'low_stock_products': low_stock_products
     }
\ No newline at end of file
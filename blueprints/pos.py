@@ -1,18 +1,29 @@
 # blueprints/pos.py - Complete POS System Blueprint
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, session
 from flask_login import login_required, current_user
-from models import db, Product, Sale, SaleItem, Customer, ServiceJob, User
-from datetime import datetime, timedelta
+from models import db, Product, Sale, SaleItem, Customer, ServiceJob, User, sales_rollup, load_profile, product_catalog, checkout_service
+from datetime import datetime, timedelta, timezone
 import json
-import qrcode
-import io
-import base64
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func, and_, or_, select
+from sqlalchemy.exc import IntegrityError
 from utils.decorators import admin_required
-from utils.helpers import format_currency, generate_receipt_number
+from utils.helpers import format_currency
+from utils.stats import get_sale_stats, product_stats
+from utils.dateranges import local_today
+from utils.phones import phone_filter
+from utils.checkout import CheckoutError, StockShortage
+from utils.barcodes import barcodes, clamp_size
+from utils.pagination import paginate_keyset
 
 pos_bp = Blueprint('pos', __name__, url_prefix='/pos')
 
+@pos_bp.record_once
+def _warm_catalog(state):
+    """สร้างดัชนีสินค้า (utils.catalog) ตอนลงทะเบียน POS กับแอป - request แรกของ /pos/search ไม่ต้องรอโหลด"""
+    # ต้อง init_engine / db.init_app ก่อน register_blueprint
+    if 'sqlalchemy' in state.app.extensions:
+        product_catalog.init_app(state.app)
+
 # ===== POS Main Interface =====
 @pos_bp.route('/')
 @login_required
@@ -25,19 +36,15 @@ def index():
     
     categories = db.session.query(Product.category).distinct().all()
     
-    today = datetime.now().date()
-    today_sales = Sale.query.filter(
-        func.date(Sale.created_at) == today
-    ).all()
+    # SUM/COUNT ทำใน database - ไม่โหลด Sale ทั้งวันขึ้นมาใน Python
+    sales = get_sale_stats()
+    product_totals = product_stats()
     
     stats = {
-        'today_sales': len(today_sales),
-        'today_revenue': sum(sale.total_amount for sale in today_sales),
-        'products_count': Product.query.count(),
-        # --- START: จุดที่แก้ไข ---
-        # แก้ไข: เปลี่ยนจาก Product.stock เป็น Product.stock_quantity และ min_stock เป็น min_stock_level
-        'low_stock_count': Product.query.filter(Product.stock_quantity <= Product.min_stock_level).count()
-        # --- END: จุดที่แก้ไข ---
+        'today_sales': sales.today,
+        'today_revenue': sales.today_revenue,
+        'products_count': product_totals.total,
+        'low_stock_count': product_totals.low_stock
     }
     
     return render_template('pos/index.html', 
@@ -46,6 +53,42 @@ def index():
                          stats=stats)
 
 # ===== Sales Processing =====
+# จำนวนการขายสูงสุดต่อการ sync หนึ่งครั้งจากคิวออฟไลน์ของเครื่อง POS
+MAX_SYNC_BATCH = 100
+MAX_CLIENT_REF_LENGTH = 64
+
+def build_sale(data, sale_date=None):
+    """Sale (ยังไม่ add) และบรรทัดสินค้าจากข้อมูลของเครื่อง POS - สินค้าทั้งตะกร้าโหลดใน query เดียว"""
+    lines = checkout_service.prepare(db.session, data['items'])
+    subtotal = sum(line.total_price for line in lines)
+    discount = float(data.get('discount', 0) or 0)
+    tax = float(data.get('tax', 0) or 0)
+    
+    sale = Sale(
+        customer_id=data.get('customer_id'),
+        salesperson_id=current_user.id,
+        payment_method=data.get('payment_method', 'cash'),
+        discount_amount=discount,
+        tax_amount=tax,
+        notes=data.get('notes', ''),
+        subtotal=subtotal,
+        total_amount=subtotal - discount + tax,
+        client_ref=data.get('client_id')
+    )
+    if sale_date:
+        sale.sale_date = sale.created_at = sale_date
+    return sale, lines
+
+def client_sale_date(value):
+    """เวลาขายที่เครื่อง POS บันทึกไว้ (ISO 8601) - ไม่เกินเวลาปัจจุบัน, None ถ้าอ่านไม่ได้"""
+    try:
+        moment = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return min(moment.astimezone(timezone.utc), datetime.now(timezone.utc))
+
 @pos_bp.route('/api/create_sale', methods=['POST'])
 @login_required
 def create_sale():
@@ -56,67 +99,92 @@ def create_sale():
         if not data.get('items') or not data.get('customer_id'):
             return jsonify({'error': 'ข้อมูลไม่ครบถ้วน'}), 400
         
-        sale = Sale(
-            customer_id=data['customer_id'],
-            user_id=current_user.id,
-            payment_method=data.get('payment_method', 'cash'),
-            discount=data.get('discount', 0),
-            tax=data.get('tax', 0),
-            notes=data.get('notes', ''),
-            receipt_number=generate_receipt_number()
-        )
-        
-        total_amount = 0
-        sale_items = []
-        
-        for item_data in data['items']:
-            product = Product.query.get(item_data['product_id'])
-            if not product:
-                return jsonify({'error': f'ไม่พบสินค้า ID: {item_data["product_id"]}'}), 400
-            
-            quantity = int(item_data['quantity'])
-            
-            # --- START: จุดที่แก้ไข ---
-            if product.stock_quantity < quantity:
-                return jsonify({'error': f'สต็อกไม่เพียงพอ: {product.name}'}), 400
-            # --- END: จุดที่แก้ไข ---
-            
-            sale_item = SaleItem(
-                product_id=product.id,
-                quantity=quantity,
-                unit_price=product.price,
-                total_price=quantity * product.price
-            )
-            sale_items.append(sale_item)
-            total_amount += sale_item.total_price
-            
-            # --- START: จุดที่แก้ไข ---
-            product.stock_quantity -= quantity
-            # --- END: จุดที่แก้ไข ---
-        
-        sale.subtotal = total_amount
-        sale.total_amount = total_amount - sale.discount + sale.tax
-        
-        db.session.add(sale)
-        db.session.flush()
-        
-        for sale_item in sale_items:
-            sale_item.sale_id = sale.id
-            db.session.add(sale_item)
-        
+        sale, lines = build_sale(data)
+        checkout_service.complete(db.session, sale, lines)
         db.session.commit()
         
         return jsonify({
             'success': True,
             'sale_id': sale.id,
-            'receipt_number': sale.receipt_number,
+            'receipt_number': sale.sale_number,
             'total_amount': sale.total_amount,
             'message': 'บันทึกการขายสำเร็จ'
         })
         
+    except StockShortage as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), 'shortages': e.shortages}), 400
+    except CheckoutError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@pos_bp.route('/api/sync_sales', methods=['POST'])
+@login_required
+def sync_sales():
+    """รับการขายจากคิวออฟไลน์ของเครื่อง POS (IndexedDB) ทีละชุด แล้ว commit ใน transaction เดียว
+
+    แต่ละรายการมี client_id (idempotency key) - รายการที่เคยบันทึกแล้วตอบ duplicate
+    พร้อม sale_id เดิม จึงส่งซ้ำได้เมื่อเน็ตหลุดระหว่างรอคำตอบ
+    รายการที่สต็อกไม่พอจะถูกย้อนเฉพาะรายการนั้น (savepoint) รายการอื่นในชุดยังบันทึก
+    """
+    data = request.get_json(silent=True) or {}
+    entries = data.get('sales')
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': 'ไม่มีรายการขาย'}), 400
+    if len(entries) > MAX_SYNC_BATCH:
+        return jsonify({'error': f'ส่งได้ไม่เกิน {MAX_SYNC_BATCH} รายการต่อครั้ง'}), 413
+    
+    def recorded(refs):
+        return {
+            ref: (sale_id, number) for ref, sale_id, number in db.session.execute(
+                select(Sale.client_ref, Sale.id, Sale.sale_number).where(Sale.client_ref.in_(refs))
+            )
+        }
+    
+    def duplicate(ref):
+        sale_id, number = known[ref]
+        return {'client_id': ref, 'status': 'duplicate', 'sale_id': sale_id, 'receipt_number': number}
+    
+    refs = [entry.get('client_id') for entry in entries if isinstance(entry, dict)]
+    known = recorded([ref for ref in refs if isinstance(ref, str)])
+    results = []
+    
+    try:
+        for entry in entries:
+            ref = entry.get('client_id') if isinstance(entry, dict) else None
+            if not isinstance(ref, str) or not 0 < len(ref) <= MAX_CLIENT_REF_LENGTH or not entry.get('items'):
+                results.append({'client_id': ref, 'status': 'invalid', 'error': 'ข้อมูลไม่ครบถ้วน'})
+                continue
+            if ref in known:
+                results.append(duplicate(ref))
+                continue
+            try:
+                with db.session.begin_nested():
+                    sale, lines = build_sale(entry, client_sale_date(entry.get('created_at')))
+                    checkout_service.complete(db.session, sale, lines)
+            except CheckoutError as e:
+                results.append({'client_id': ref, 'status': 'rejected', 'error': str(e),
+                                'shortages': getattr(e, 'shortages', [])})
+                continue
+            except IntegrityError:
+                # request อื่นบันทึก client_id เดียวกันไปพร้อมกัน
+                known.update(recorded([ref]))
+                if ref not in known:
+                    raise
+                results.append(duplicate(ref))
+                continue
+            known[ref] = (sale.id, sale.sale_number)
+            results.append({'client_id': ref, 'status': 'created', 'sale_id': sale.id,
+                            'receipt_number': sale.sale_number, 'total_amount': sale.total_amount})
+        db.session.commit()
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+    
+    return jsonify({'success': True, 'results': results})
 
 @pos_bp.route('/api/search_products')
 @login_required
@@ -125,32 +193,17 @@ def search_products():
     query = request.args.get('q', '')
     category = request.args.get('category', '')
     
-    products_query = Product.query
-    
-    if query:
-        products_query = products_query.filter(
-            or_(
-                Product.name.contains(query),
-                Product.barcode.contains(query),
-                Product.sku.contains(query)
-            )
-        )
-    
-    if category:
-        products_query = products_query.filter(Product.category == category)
-    
-    # --- START: จุดที่แก้ไข ---
-    products = products_query.filter(Product.stock_quantity > 0).limit(50).all()
-    # --- END: จุดที่แก้ไข ---
+    # ค้นจากดัชนีสินค้าในหน่วยความจำ (utils.catalog) ไม่แตะฐานข้อมูล
+    products = product_catalog.search(query, category=category or None, limit=50, in_stock=True)
     
     return jsonify([{
-        'id': p.id,
-        'name': p.name,
-        'price': float(p.price),
-        'stock': p.stock_quantity, # แก้ไข: ส่ง stock_quantity
-        'barcode': p.barcode,
-        'category': p.category,
-        'image_url': p.image_url
+        'id': p['id'],
+        'name': p['name'],
+        'price': float(p['price']),
+        'stock': p['stock_quantity'],
+        'barcode': p['barcode'],
+        'category': p['category'],
+        'image_url': p['image_url']
     } for p in products])
 
 @pos_bp.route('/api/scan_barcode')
@@ -161,22 +214,20 @@ def scan_barcode():
     if not barcode:
         return jsonify({'error': 'ไม่พบบาร์โค้ด'}), 400
     
-    product = Product.query.filter_by(barcode=barcode).first()
+    product = product_catalog.scan(barcode)
     if not product:
         return jsonify({'error': 'ไม่พบสินค้า'}), 404
     
-    # --- START: จุดที่แก้ไข ---
-    if product.stock_quantity <= 0:
+    if (product['stock_quantity'] or 0) <= 0:
         return jsonify({'error': 'สินค้าหมด'}), 400
-    # --- END: จุดที่แก้ไข ---
     
     return jsonify({
-        'id': product.id,
-        'name': product.name,
-        'price': float(product.price),
-        'stock': product.stock_quantity, # แก้ไข: ส่ง stock_quantity
-        'barcode': product.barcode,
-        'category': product.category
+        'id': product['id'],
+        'name': product['name'],
+        'price': float(product['price']),
+        'stock': product['stock_quantity'],
+        'barcode': product['barcode'],
+        'category': product['category']
     })
 
 # ===== Product Management =====
@@ -184,7 +235,7 @@ def scan_barcode():
 @login_required
 def products():
     """หน้าจัดการสินค้า"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor', '')
     search = request.args.get('search', '')
     category = request.args.get('category', '')
     
@@ -202,9 +253,7 @@ def products():
     if category:
         products_query = products_query.filter(Product.category == category)
     
-    products = products_query.paginate(
-        page=page, per_page=20, error_out=False
-    )
+    products = paginate_keyset(products_query, [(Product.name, False)], cursor=cursor, per_page=20)
     
     categories = db.session.query(Product.category).distinct().all()
     
@@ -287,20 +336,18 @@ def edit_product(product_id):
 @login_required
 def sales_history():
     """ประวัติการขาย"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor', '')
     date_from = request.args.get('date_from')
     date_to = request.args.get('date_to')
     
-    sales_query = Sale.query
+    sales_query = Sale.query.options(*load_profile('sale_list'))
     
     if date_from:
         sales_query = sales_query.filter(Sale.created_at >= date_from)
     if date_to:
         sales_query = sales_query.filter(Sale.created_at <= date_to)
     
-    sales = sales_query.order_by(Sale.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    sales = paginate_keyset(sales_query, [(Sale.created_at, True)], cursor=cursor, per_page=20)
     
     return render_template('pos/sales.html', 
                          sales=sales,
@@ -325,32 +372,11 @@ def receipt(sale_id):
 @login_required
 def reports():
     """รายงานการขาย"""
-    today = datetime.now().date()
+    today = local_today()
     week_ago = today - timedelta(days=7)
     
-    daily_sales = db.session.query(
-        func.date(Sale.created_at).label('date'),
-        func.sum(Sale.total_amount).label('total'),
-        func.count(Sale.id).label('count')
-    ).filter(
-        Sale.created_at >= week_ago
-    ).group_by(func.date(Sale.created_at)).all()
-    
-    top_products = db.session.query(
-        Product.name,
-        func.sum(SaleItem.quantity).label('total_quantity'),
-        func.sum(SaleItem.total_price).label('total_revenue')
-    ).join(
-        SaleItem, Product.id == SaleItem.product_id
-    ).join(
-        Sale, SaleItem.sale_id == Sale.id
-    ).filter(
-        Sale.created_at >= week_ago
-    ).group_by(
-        Product.id, Product.name
-    ).order_by(
-        func.sum(SaleItem.quantity).desc()
-    ).limit(10).all()
+    daily_sales = sales_rollup.by_day(db.session, week_ago, today)
+    top_products = sales_rollup.top_products(db.session, Product, week_ago, today)
     
     # --- START: จุดที่แก้ไข ---
     low_stock = Product.query.filter(
@@ -373,13 +399,13 @@ def get_customers():
     customers_query = Customer.query
     
     if search:
-        customers_query = customers_query.filter(
-            or_(
+        search_filter = phone_filter(Customer, search)
+        if search_filter is None:
+            search_filter = or_(
                 Customer.name.contains(search),
-                Customer.phone.contains(search),
                 Customer.email.contains(search)
             )
-        )
+        customers_query = customers_query.filter(search_filter)
     
     customers = customers_query.limit(20).all()
     
@@ -514,59 +540,83 @@ def adjust_inventory():
         return jsonify({'error': str(e)}), 500
 
 # ===== Utility Functions =====
+# ป้ายสูงสุดต่อแผ่น / จำนวนคอลัมน์สูงสุด (/api/barcode_sheet)
+MAX_SHEET_LABELS = 300
+MAX_SHEET_COLUMNS = 12
+
 @pos_bp.route('/api/generate_barcode')
 @login_required
 def generate_barcode():
-    """สร้างบาร์โค้ด"""
+    """สร้างบาร์โค้ด (QR) - ส่งรูป PNG พร้อม ETag จากแคชของ utils.barcodes"""
     text = request.args.get('text', '')
     if not text:
         return jsonify({'error': 'ไม่พบข้อความ'}), 400
     
     try:
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(text)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        img_buffer = io.BytesIO()
-        img.save(img_buffer, format='PNG')
-        img_str = base64.b64encode(img_buffer.getvalue()).decode()
-        
-        return jsonify({'barcode': f'data:image/png;base64,{img_str}'})
+        png, etag = barcodes.png(text, clamp_size(request.args.get('size')))
+        return barcodes.response(png, etag)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@pos_bp.route('/api/barcode_sheet', methods=['GET', 'POST'])
+@login_required
+def barcode_sheet():
+    """แผ่นป้ายบาร์โค้ดสำหรับพิมพ์ (PNG แผ่นเดียว)
+
+    GET  ?category=<หมวด> หรือ ?ids=1,2,3 - ป้ายของสินค้า (barcode หรือ SKU, caption เป็น SKU + ราคา)
+    POST {"texts": [...]}                - ป้ายจากข้อความที่ส่งมา
+    ตัวเลือก: size (pixel ต่อ module), columns
+    """
+    data = request.get_json(silent=True) or {}
+    size = clamp_size(request.args.get('size', data.get('size')))
+    columns = clamp_size(request.args.get('columns', data.get('columns')), default=4, upper=MAX_SHEET_COLUMNS)
+
+    if request.method == 'POST':
+        labels = [(str(text), str(text)) for text in data.get('texts') or [] if text]
+    else:
+        query = select(Product.id, Product.sku, Product.barcode, Product.price).where(Product.is_active.is_(True))
+        category = request.args.get('category')
+        ids = [int(value) for value in request.args.get('ids', '').split(',') if value.strip().isdigit()]
+        if category:
+            query = query.where(Product.category == category)
+        elif ids:
+            query = query.where(Product.id.in_(ids))
+        else:
+            return jsonify({'error': 'ระบุ category, ids หรือ texts'}), 400
+        labels = [
+            (row.barcode or row.sku or str(row.id), f'{row.sku or row.id}  {row.price:,.2f}')
+            for row in db.session.execute(query.order_by(Product.name).limit(MAX_SHEET_LABELS + 1))
+        ]
+
+    if not labels:
+        return jsonify({'error': 'ไม่พบรายการสำหรับพิมพ์'}), 404
+    if len(labels) > MAX_SHEET_LABELS:
+        return jsonify({'error': f'พิมพ์ได้ครั้งละไม่เกิน {MAX_SHEET_LABELS} ป้าย'}), 400
+
+    try:
+        png = barcodes.sheet(labels, size, columns)
+        # ป้ายจากสินค้าเปลี่ยนตามราคา - ETag จากเนื้อรูป และให้ browser ถามใหม่ทุกครั้ง
+        return barcodes.response(png, max_age=0)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @pos_bp.route('/api/dashboard_stats')
 @login_required
 def dashboard_stats():
     """สถิติสำหรับแดชบอร์ด"""
-    today = datetime.now().date()
-    
-    today_sales = Sale.query.filter(
-        func.date(Sale.created_at) == today
-    ).all()
+    sales = get_sale_stats()
+    products = product_stats()
     
-    month_start = today.replace(day=1)
-    month_sales = Sale.query.filter(
-        Sale.created_at >= month_start
-    ).all()
-    
-    # --- START: จุดที่แก้ไข ---
     stats = {
-        'today_sales_count': len(today_sales),
-        'today_revenue': sum(s.total_amount for s in today_sales),
-        'month_sales_count': len(month_sales),
-        'month_revenue': sum(s.total_amount for s in month_sales),
-        'total_products': Product.query.count(),
-        'low_stock_products': Product.query.filter(
-            Product.stock_quantity <= Product.min_stock_level
-        ).count(),
-        'out_of_stock_products': Product.query.filter(
-            Product.stock_quantity == 0
-        ).count()
+        'today_sales_count': sales.today,
+        'today_revenue': sales.today_revenue,
+        'month_sales_count': sales.this_month,
+        'month_revenue': sales.month_revenue,
+        'total_products': products.total,
+        'low_stock_products': products.low_stock,
+        'out_of_stock_products': products.out_of_stock
     }
-    # --- END: จุดที่แก้ไข ---
     
     return jsonify(stats)
 
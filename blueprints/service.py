@@ -9,9 +9,11 @@ from flask_login import login_required, current_user
 from datetime import datetime, timezone, timedelta
 from models import (
     db, ServiceJob, Customer, CustomerDevice, User, Task, Product, 
-    ServiceJobStatus, TaskPriority, UserRole, log_activity
+    ServiceJobStatus, TaskPriority, UserRole, log_activity, load_profile
 )
 from sqlalchemy import func, or_, and_
+from utils import search as search_index
+from utils.pagination import paginate_keyset, per_page_arg
 
 service_bp = Blueprint('service_jobs', __name__)
 
@@ -19,14 +21,14 @@ service_bp = Blueprint('service_jobs', __name__)
 @login_required
 def list_jobs():
     """รายการงานซ่อม"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor', '')
     status = request.args.get('status', '')
     priority = request.args.get('priority', '')
     search = request.args.get('search', '')
     technician = request.args.get('technician', '')
     
     # Build query
-    query = ServiceJob.query
+    query = ServiceJob.query.options(*load_profile('job_list'))
     
     if status:
         try:
@@ -46,12 +48,10 @@ def list_jobs():
         query = query.filter(ServiceJob.assigned_technician == technician)
     
     if search:
-        query = query.join(Customer).filter(
+        query = query.filter(
             or_(
-                ServiceJob.title.contains(search),
-                ServiceJob.job_number.contains(search),
-                Customer.name.contains(search),
-                Customer.phone.contains(search)
+                search_index.search_filter(db.session, ServiceJob, search),
+                ServiceJob.customer.has(search_index.search_filter(db.session, Customer, search))
             )
         )
     
@@ -59,9 +59,7 @@ def list_jobs():
     if current_user.role == UserRole.TECHNICIAN:
         query = query.filter(ServiceJob.assigned_technician == current_user.id)
     
-    jobs = query.order_by(ServiceJob.created_at.desc()).paginate(
-        page=page, per_page=20, error_out=False
-    )
+    jobs = paginate_keyset(query, [(ServiceJob.created_at, True)], cursor=cursor, per_page=20)
     
     # Get filter options
     technicians = User.query.filter_by(is_technician=True).all()
@@ -501,12 +499,15 @@ def reports():
 @service_bp.route('/api/jobs')
 @login_required
 def api_jobs():
-    """API สำหรับดึงรายการงานซ่อม"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
-    
-    jobs = ServiceJob.query.order_by(ServiceJob.created_at.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
+    """API สำหรับดึงรายการงานซ่อม (?cursor=...&per_page=...&count=exact|estimate|cached)"""
+    cursor = request.args.get('cursor', '')
+    per_page = per_page_arg(request.args.get('per_page'), default=10)
+    count = request.args.get('count')
+    
+    jobs = paginate_keyset(
+        ServiceJob.query.options(*load_profile('job_list')), [(ServiceJob.created_at, True)],
+        cursor=cursor, per_page=per_page,
+        count=count if count in ('exact', 'estimate', 'cached') else None, count_tags=('jobs',)
     )
     
     return jsonify({
@@ -521,12 +522,7 @@ def api_jobs():
             'promised_date': job.promised_date.isoformat() if job.promised_date else None,
             'technician_name': job.technician.full_name if job.technician else None
         } for job in jobs.items],
-        'pagination': {
-            'page': jobs.page,
-            'pages': jobs.pages,
-            'per_page': jobs.per_page,
-            'total': jobs.total
-        }
+        'pagination': jobs.to_dict()
     })
 
 @service_bp.route('/api/jobs/<int:job_id>')
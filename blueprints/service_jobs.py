@@ -1,9 +1,11 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
-from models import db, ServiceJob, Customer, Device, User, Notification
+from models import db, ServiceJob, Customer, Device, User, Notification, load_profile
 from datetime import datetime, timedelta
 from sqlalchemy import func, desc, or_, and_
 import json
+from utils.decorators import cache_response
+from utils.dateranges import day_bounds, in_range
 
 service_jobs_bp = Blueprint('service_jobs', __name__, url_prefix='/service_jobs')
 
@@ -21,7 +23,7 @@ def index():
         per_page = 12
         
         # สร้าง query หลัก
-        query = ServiceJob.query
+        query = ServiceJob.query.options(*load_profile('job_list'))
         
         # Join กับ Customer สำหรับการค้นหา
         query = query.join(Customer, ServiceJob.customer_id == Customer.id)
@@ -39,18 +41,18 @@ def index():
         
         # กรองตามสถานะ
         if status:
-            from models import ServiceStatus
+            from models import ServiceJobStatus
             try:
-                status_enum = ServiceStatus(status)
+                status_enum = ServiceJobStatus(status)
                 query = query.filter(ServiceJob.status == status_enum)
             except ValueError:
                 pass
         
         # กรองตามความสำคัญ
         if priority:
-            from models import Priority
+            from models import TaskPriority
             try:
-                priority_enum = Priority(priority)
+                priority_enum = TaskPriority(priority)
                 query = query.filter(ServiceJob.priority == priority_enum)
             except ValueError:
                 pass
@@ -317,7 +319,7 @@ def update_status(id):
         if not new_status:
             return jsonify({'success': False, 'message': 'ไม่ได้ระบุสถานะใหม่'})
         
-        from models import ServiceStatus
+        from models import ServiceJobStatus
         try:
             status_enum = ServiceJobStatus(new_status)
         except ValueError:
@@ -370,21 +372,17 @@ def update_notes(id):
 
 @service_jobs_bp.route('/stats')
 @login_required
+@cache_response(timeout=60, tags=('jobs',), scope='role')
 def get_stats():
     """API สำหรับดึงสถิติงานบริการ"""
     try:
         from models import ServiceJobStatus
-        today = datetime.utcnow().date()
-        
         stats = {
             'total': ServiceJob.query.count(),
             'pending': ServiceJob.query.filter_by(status=ServiceJobStatus.RECEIVED).count(),
             'in_progress': ServiceJob.query.filter_by(status=ServiceJobStatus.IN_REPAIR).count(),
             'completed_today': ServiceJob.query.filter(
-                and_(
-                    ServiceJob.completed_date >= today,
-                    ServiceJob.completed_date < today + timedelta(days=1)
-                )
+                in_range(ServiceJob.completed_date, day_bounds())
             ).count()
         }
         
@@ -7,8 +7,10 @@ Fixed and Enhanced Version
 
 from flask import Blueprint, render_template, request, jsonify, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
-from models import db, Task, User, Customer, TaskStatus, TaskPriority, UserRole, log_activity
+from models import db, Task, User, Customer, TaskStatus, TaskPriority, UserRole, log_activity, load_profile
 from sqlalchemy import or_, and_
+from utils import search as search_index
+from utils.pagination import paginate_keyset, nulls_last
 from datetime import datetime, timezone
 import os
 from werkzeug.utils import secure_filename
@@ -20,14 +22,14 @@ tasks_bp = Blueprint('tasks', __name__)
 @login_required
 def list_tasks():
     """หน้าหลักสำหรับแสดงรายการ Task ทั้งหมด"""
-    page = request.args.get('page', 1, type=int)
+    cursor = request.args.get('cursor', '')
     status = request.args.get('status', '')
     priority = request.args.get('priority', '')
     search = request.args.get('search', '')
     assignee = request.args.get('assignee', '')
     
     # Build query
-    query = Task.query
+    query = Task.query.options(*load_profile('task_list'))
     
     # Filter by status
     if status:
@@ -51,23 +53,16 @@ def list_tasks():
     
     # Search functionality
     if search:
-        query = query.filter(
-            or_(
-                Task.title.contains(search),
-                Task.task_number.contains(search),
-                Task.description.contains(search)
-            )
-        )
+        query = query.filter(search_index.search_filter(db.session, Task, search))
     
     # Apply role-based filtering
     if current_user.role == UserRole.TECHNICIAN:
         query = query.filter(Task.assignees.any(User.id == current_user.id))
     
-    # Order by due date and creation date
-    query = query.order_by(Task.due_date.asc().nullslast(), Task.created_at.desc())
-    
-    # Paginate results
-    tasks = query.paginate(page=page, per_page=20, error_out=False)
+    # Order by due date (no due date last) and creation date - keyset pagination
+    tasks = paginate_keyset(
+        query, [nulls_last(Task.due_date), (Task.created_at, True)], cursor=cursor, per_page=20
+    )
     
     # Get filter options
     users = User.query.filter_by(is_active=True).all()
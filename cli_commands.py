@@ -7,15 +7,23 @@ CLI Commands - Command line interface for system management
 import click
 import os
 import sys
+import time
 from datetime import datetime, timezone
 from flask import current_app
 from flask.cli import with_appcontext
 from werkzeug.security import generate_password_hash
 from models import (
     db, User, Customer, Task, ServiceJob, Product, Sale, SystemSettings,
-    ActivityLog, UserRole, create_tables, init_default_settings, 
-    create_sample_data
+    ActivityLog, UserRole, StatCounter, sales_rollup, create_tables, init_default_settings, 
+    create_sample_data, settings_cache, line_dispatcher,
+    audit_writer, activity_partitions
 )
+from utils.rollups import as_date
+from utils.counters import rebuild_counters as rebuild_counter_table, verify_counters
+from utils.stats import get_dashboard_snapshot
+from utils.ndjson import open_ndjson, export_ndjson, import_ndjson
+from utils.search import rebuild_index as rebuild_search
+from utils.phones import backfill_phones as backfill_phone_columns
 
 @click.group()
 def cli():
@@ -205,20 +213,150 @@ def system_stats():
     click.echo('📊 System Statistics:')
     click.echo('-' * 40)
     
+    snapshot = get_dashboard_snapshot()
     stats = {
-        'Users': User.query.count(),
-        'Active Users': User.query.filter_by(is_active=True).count(),
-        'Customers': Customer.query.count(),
-        'Tasks': Task.query.count(),
-        'Service Jobs': ServiceJob.query.count(),
-        'Products': Product.query.count(),
-        'Sales': Sale.query.count(),
-        'Activity Logs': ActivityLog.query.count()
+        'Users': snapshot.users.total,
+        'Active Users': snapshot.users.active,
+        'Customers': snapshot.customers.total,
+        'Tasks': snapshot.tasks.total,
+        'Service Jobs': snapshot.service_jobs.total,
+        'Products': snapshot.products.total,
+        'Sales': snapshot.sales.total,
+        'Activity Logs': snapshot.activity_logs
     }
     
     for key, value in stats.items():
         click.echo(f'{key:<15}: {value:>10,}')
 
+@cli.command()
+@click.option('--verify-only', is_flag=True, help='Only compare counters with source tables')
+@with_appcontext
+def rebuild_counters(verify_only):
+    """Rebuild and verify dashboard counters (stat_counter)"""
+    if not verify_only:
+        click.echo('🔄 Rebuilding dashboard counters...')
+        count = rebuild_counter_table(db.session, StatCounter)
+        click.echo(f'✅ Rebuilt {count} counters')
+    
+    click.echo('🔍 Verifying counters against source tables...')
+    mismatches = verify_counters(db.session, StatCounter)
+    if not mismatches:
+        click.echo('✅ All counters match')
+        return
+    
+    for key, stored, expected in mismatches:
+        click.echo(f'❌ {key:<40} stored={stored:>12,.2f} expected={expected:>12,.2f}')
+    click.echo(f'⚠️  {len(mismatches)} counters out of sync - run without --verify-only to rebuild')
+    sys.exit(1)
+
+@cli.command()
+@click.option('--start', help='Start date (YYYY-MM-DD), default: all history')
+@click.option('--end', help='End date (YYYY-MM-DD), default: today')
+@with_appcontext
+def rebuild_sales_summary(start, end):
+    """Backfill daily_sales_summary / daily_product_sales from sales history"""
+    click.echo('🔄 Rebuilding daily sales summary...')
+    try:
+        days, product_rows = sales_rollup.rebuild(db.session, as_date(start), as_date(end))
+        click.echo(f'✅ Rebuilt {days:,} days, {product_rows:,} product rows')
+    except Exception as e:
+        db.session.rollback()
+        click.echo(f'❌ Error rebuilding sales summary: {e}')
+        sys.exit(1)
+
+@cli.command()
+@click.option('--batch-size', default=1000, show_default=True, type=int)
+@with_appcontext
+def rebuild_search_index(batch_size):
+    """Rebuild the full-text search index (SQLite FTS5)"""
+    click.echo('🔄 Rebuilding search index...')
+    try:
+        counts = rebuild_search(db.session, batch_size)
+    except Exception as e:
+        db.session.rollback()
+        click.echo(f'❌ Error rebuilding search index: {e}')
+        sys.exit(1)
+    
+    for kind, count in counts.items():
+        click.echo(f'  {kind:<25}: {count:>10,}')
+    click.echo(f'✅ Indexed {sum(counts.values()):,} documents')
+
+@cli.command()
+@click.option('--batch-size', default=1000, show_default=True, type=int)
+@with_appcontext
+def backfill_phones(batch_size):
+    """Fill normalized phone lookup columns for existing customers"""
+    click.echo('🔄 Normalizing customer phone numbers...')
+    try:
+        updated = backfill_phone_columns(db.session, Customer, batch_size)
+    except Exception as e:
+        db.session.rollback()
+        click.echo(f'❌ Error backfilling phones: {e}')
+        sys.exit(1)
+    click.echo(f'✅ Updated {updated:,} customers')
+
+@cli.command()
+@click.option('--once', is_flag=True, help='Send due messages once and exit')
+@click.option('--stats', is_flag=True, help='Show outbox queue and exit')
+@with_appcontext
+def dispatch_line(once, stats):
+    """Send queued LINE messages from the outbox (utils.line_outbox)"""
+    if stats:
+        metrics = line_dispatcher.metrics()
+        click.echo('📊 LINE outbox:')
+        for status, count in sorted(metrics['queue'].items()):
+            click.echo(f'  {status:<10}: {count:>10,}')
+        return
+    
+    if not current_app.config.get('LINE_CHANNEL_ACCESS_TOKEN'):
+        click.echo('❌ LINE_CHANNEL_ACCESS_TOKEN is not set')
+        sys.exit(1)
+    
+    if once:
+        claimed = line_dispatcher.dispatch_once()
+        counters = line_dispatcher.metrics()['counters']
+        click.echo(f"✅ Processed {claimed:,} messages (sent {counters.get('sent', 0):,}, "
+                   f"retry {counters.get('retried', 0):,}, failed {counters.get('failed', 0):,})")
+        return
+    
+    click.echo('🔄 Dispatching LINE messages (Ctrl+C to stop)...')
+    try:
+        line_dispatcher.run(current_app._get_current_object())
+    except KeyboardInterrupt:
+        click.echo('👋 Stopped')
+
+@cli.command()
+@click.option('--once', is_flag=True, help='Process one batch of due events and exit')
+@click.option('--stats', is_flag=True, help='Show webhook event queue and exit')
+@with_appcontext
+def process_line_events(once, stats):
+    """Process queued LINE webhook events (utils.line_webhook)"""
+    from blueprints.line_bot import line_events
+    
+    if stats:
+        metrics = line_events.metrics()
+        click.echo('📊 LINE webhook events:')
+        for status, count in sorted(metrics['queue'].items()):
+            click.echo(f'  {status:<10}: {count:>10,}')
+        return
+    
+    if once:
+        claimed = line_events.process_once()
+        counters = line_events.metrics()['counters']
+        click.echo(f"✅ Processed {claimed:,} events (ok {counters.get('processed', 0):,}, "
+                   f"retry {counters.get('retried', 0):,}, failed {counters.get('failed', 0):,})")
+        return
+    
+    workers = current_app.config.get('LINE_WEBHOOK_WORKERS', 2)
+    click.echo(f'🔄 Processing LINE webhook events with {workers} workers (Ctrl+C to stop)...')
+    line_events.start(current_app._get_current_object(), workers)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        line_events.stop()
+        click.echo('👋 Stopped')
+
 @cli.command()
 @with_appcontext
 def check_health():
@@ -272,8 +410,9 @@ def check_health():
 @cli.command()
 @with_appcontext
 def clean_logs():
-    """Clean old activity logs"""
-    days = click.prompt('Delete logs older than (days)', type=int, default=30)
+    """Clean old activity logs (monthly tables are dropped whole)"""
+    days = click.prompt('Delete logs older than (days)', type=int,
+                        default=current_app.config.get('ACTIVITY_LOG_RETENTION_DAYS', 30))
     
     if not click.confirm(f'Delete activity logs older than {days} days?'):
         return
@@ -281,35 +420,102 @@ def clean_logs():
     from datetime import timedelta
     cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
     
-    deleted_count = ActivityLog.query.filter(
-        ActivityLog.created_at < cutoff_date
-    ).delete()
-    
-    db.session.commit()
+    audit_writer.flush()
+    rotated = activity_partitions.rotate()
+    dropped, deleted_count = activity_partitions.expire(cutoff_date)
     
-    click.echo(f'✅ Deleted {deleted_count} old activity logs')
+    for name, _ in rotated:
+        click.echo(f'📦 Moved older logs to {name}')
+    click.echo(f'✅ Dropped {len(dropped)} monthly tables, deleted {deleted_count:,} old activity logs')
 
 @cli.command()
+@click.option('--stats', is_flag=True, help='List monthly activity log tables and exit')
 @with_appcontext
-def export_data():
-    """Export data to JSON"""
-    import json
-    
-    filename = click.prompt('Export filename', default='comphone_export.json')
-    
+def rotate_activity_log(stats):
+    """Move activity logs before this month to one table per month (utils.partitions)"""
+    if not stats:
+        audit_writer.flush()
+        rotated = activity_partitions.rotate()
+        for name, copied in rotated:
+            click.echo(f'✅ Moved older logs to {name}' + (f' ({copied:,} rows copied)' if copied else ''))
+        if not rotated:
+            click.echo('ℹ️  Nothing to rotate')
+    
+    from sqlalchemy import func, select, table
+    click.echo('📊 Activity log tables:')
+    for name in [ActivityLog.__tablename__] + [name for _, name in activity_partitions.partitions(refresh=True)]:
+        count = db.session.scalar(select(func.count()).select_from(table(name)))
+        click.echo(f'  {name:<22}: {count:>10,}')
+
+def _data_engine(database_url):
+    """engine ของ --database-url หรือของแอปปัจจุบัน"""
+    if database_url:
+        from sqlalchemy import create_engine
+        return create_engine(database_url)
+    return db.engine
+
+@cli.command()
+@click.option('--output', '-o', default='comphone_export.ndjson.gz', show_default=True,
+              help='Output file (.gz = gzip)')
+@click.option('--tables', help='Comma-separated tables, default: all')
+@click.option('--batch-size', default=1000, show_default=True, type=int)
+@click.option('--gzip/--no-gzip', 'compress', default=None, help='Override compression chosen by extension')
+@click.option('--database-url', help='Source database, default: app database')
+@with_appcontext
+def export_data(output, tables, batch_size, compress, database_url):
+    """Export all tables to NDJSON (streaming, keyset batches)"""
     click.echo('📤 Exporting data...')
-    
-    export_data = {
-        'users': [user.to_dict() for user in User.query.all()],
-        'customers': [customer.to_dict() for customer in Customer.query.all()],
-        'products': [product.to_dict() for product in Product.query.all()],
-        'export_date': datetime.now(timezone.utc).isoformat()
-    }
-    
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(export_data, f, indent=2, ensure_ascii=False)
-    
-    click.echo(f'✅ Data exported to {filename}')
+    engine = _data_engine(database_url)
+    table_names = [name.strip() for name in tables.split(',') if name.strip()] if tables else None
+    try:
+        with engine.connect() as connection, open_ndjson(output, 'w', compress) as out:
+            counts = export_ndjson(connection, out, table_names, batch_size)
+    except Exception as e:
+        click.echo(f'❌ Export error: {e}')
+        sys.exit(1)
+    finally:
+        if database_url:
+            engine.dispose()
+
+    for name, count in counts.items():
+        click.echo(f'  {name:<25}: {count:>10,}')
+    click.echo(f'✅ Exported {sum(counts.values()):,} rows to {output}')
+
+@cli.command()
+@click.option('--input', '-i', 'source', default='comphone_export.ndjson.gz', show_default=True,
+              help='File from export-data (.gz detected automatically)')
+@click.option('--rename', multiple=True, help='Map source table/column to target, e.g. setting:system_settings '
+                   'or service_job.description:problem_description')
+@click.option('--batch-size', default=1000, show_default=True, type=int)
+@click.option('--clear', is_flag=True, help='Delete existing rows of imported tables first')
+@click.option('--database-url', help='Target database, default: app database')
+@with_appcontext
+def import_data(source, rename, batch_size, clear, database_url):
+    """Import an NDJSON export (bulk inserts in foreign-key order)"""
+    if clear and not click.confirm('Delete existing rows in the imported tables?'):
+        return
+
+    click.echo('📥 Importing data...')
+    engine = _data_engine(database_url)
+    mapping = dict(item.split(':', 1) for item in rename)
+    try:
+        with engine.begin() as connection, open_ndjson(source) as f:
+            counts, skipped, dropped = import_ndjson(connection, f, mapping, batch_size, clear)
+    except Exception as e:
+        click.echo(f'❌ Import error: {e}')
+        sys.exit(1)
+    finally:
+        if database_url:
+            engine.dispose()
+
+    for name, count in counts.items():
+        click.echo(f'  {name:<25}: {count:>10,}')
+    for name, count in skipped.items():
+        click.echo(f'⚠️  Skipped {count:,} rows of {name} (no such table in target)')
+    for name, columns in dropped.items():
+        click.echo(f'⚠️  {name}: ignored columns {", ".join(columns)}')
+    click.echo(f'✅ Imported {sum(counts.values()):,} rows from {source}')
+    click.echo('💡 Run rebuild-counters and rebuild-sales-summary if the source schema differs')
 
 @cli.command()
 @with_appcontext
@@ -337,6 +543,7 @@ def update_settings():
             click.echo(f'✅ Updated {setting.key}')
     
     db.session.commit()
+    settings_cache.invalidate()
     click.echo('✅ Settings updated')
 
 @cli.command()
@@ -458,13 +665,14 @@ def run_maintenance():
     """Run routine maintenance tasks"""
     click.echo('🛠️  Running maintenance tasks...')
     
-    # Clean old logs
+    # Clean old logs - rotate เป็นตารางรายเดือนแล้ว DROP เดือนที่หมดอายุ (ไม่ DELETE ก้อนใหญ่)
     from datetime import timedelta
-    cutoff_date = datetime.now(timezone.utc) - timedelta(days=30)
+    retention_days = current_app.config.get('ACTIVITY_LOG_RETENTION_DAYS', 30)
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=retention_days)
     
-    deleted_logs = ActivityLog.query.filter(
-        ActivityLog.created_at < cutoff_date
-    ).delete()
+    audit_writer.flush()
+    activity_partitions.rotate()
+    dropped_months, deleted_logs = activity_partitions.expire(cutoff_date)
     
     # Fix data integrity
     customers_fixed = 0
@@ -479,7 +687,7 @@ def run_maintenance():
     db.session.commit()
     
     click.echo(f'✅ Maintenance completed:')
-    click.echo(f'   - Deleted {deleted_logs} old logs')
+    click.echo(f'   - Deleted {deleted_logs} old logs ({len(dropped_months)} monthly tables dropped)')
     click.echo(f'   - Fixed {customers_fixed} customer codes')
     click.echo(f'   - Optimized database')
 
@@ -5,6 +5,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from config import config
+from utils.engine import init_engine
 from sqlalchemy import MetaData
 import os
 
@@ -27,8 +28,8 @@ def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
 
-    # Initialize extensions
-    db.init_app(app)
+    # Initialize extensions (engine options / SQLite PRAGMA ตาม profile ของ config)
+    init_engine(app, db)
     migrate.init_app(app, db, render_as_batch=True)
     login.init_app(app)
     
@@ -48,6 +49,11 @@ def create_app(config_name='default'):
     # Register blueprints (import ภายใน function เพื่อหลีกเลี่ยง circular import)
     with app.app_context():
         register_blueprints(app)
+
+    # ส่งข้อความ LINE จาก outbox ด้วย worker เบื้องหลัง (utils.line_outbox)
+    if app.config.get('LINE_CHANNEL_ACCESS_TOKEN') and app.config.get('LINE_DISPATCH_IN_PROCESS', True):
+        from comphone.models import line_dispatcher
+        line_dispatcher.start(app)
     
     return app
 
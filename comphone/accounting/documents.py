@@ -0,0 +1,33 @@
+# comphone/accounting/documents.py
+"""
+ใบเสร็จ / ใบเสนอราคา PDF ผ่าน utils.documents (process pool + แคชบนดิสก์)
+ใช้ร่วมกันระหว่าง accounting routes และ POS (prewarm หลังบันทึกการขาย)
+"""
+from datetime import timedelta
+from flask import render_template, request
+import sqlalchemy as sa
+from sqlalchemy.orm import joinedload
+from comphone import db
+from comphone.models import Sale, SaleItem
+from utils.documents import documents
+
+def load_sale(sale_id):
+    """Sale พร้อมลูกค้าและรายการสินค้า (query เดียว) หรือ None"""
+    return db.session.scalar(
+        sa.select(Sale).options(
+            joinedload(Sale.customer),
+            joinedload(Sale.items).joinedload(SaleItem.product)
+        ).where(Sale.id == sale_id)
+    )
+
+def receipt_html(sale):
+    return render_template('accounting/receipt_pdf_template.html', sale=sale)
+
+def quote_html(sale):
+    return render_template('accounting/quote_pdf_template.html', sale=sale, timedelta=timedelta)
+
+def prewarm_receipt(sale_id):
+    """สั่งสร้าง PDF ใบเสร็จล่วงหน้า (ไม่รอ) - เรียกหลัง commit การขาย"""
+    sale = load_sale(sale_id)
+    if sale is not None:
+        documents.prewarm('receipt', sale.id, receipt_html(sale), request.url_root)
@@ -1,22 +1,23 @@
 # comphone/accounting/routes.py
-from flask import render_template, request, current_app, send_file, flash, redirect, url_for
+from flask import render_template, request, current_app, flash, redirect, url_for
 from flask_login import login_required, current_user
 import sqlalchemy as sa
 from sqlalchemy.orm import joinedload
 from comphone import db
 from comphone.accounting import bp
-from comphone.models import Sale, SaleItem, Product, Customer
+from comphone.models import Sale, SaleItem, Product, Customer, replica
 from comphone.decorators import admin_required # Import decorator
 from comphone.accounting.forms import ReportFilterForm
-from datetime import datetime, time, date, timedelta
+from datetime import datetime, time, date
 
-# สำหรับ PDF Export
-from weasyprint import HTML, CSS
-import io # เพิ่ม import io
+# สำหรับ PDF Export (WeasyPrint ทำงานใน process pool ของ utils.documents)
+from comphone.accounting.documents import load_sale, receipt_html, quote_html
+from utils.documents import documents
 
 @bp.route('/reports')
 @login_required
 @admin_required # กำหนดให้เฉพาะ Admin เข้าถึงหน้ารายงานได้ (ตามแผน)
+@replica.read_only
 def reports():
     """
     หน้ารายงานสรุปยอดขายและกำไร พร้อมตัวกรอง
@@ -80,36 +81,14 @@ def receipt_pdf(sale_id):
     """
     สร้างใบเสร็จรับเงินในรูปแบบ PDF
     Endpoint: accounting.receipt_pdf
+    PDF สร้างใน process pool และแคชบนดิสก์ (utils.documents) - ดาวน์โหลดซ้ำได้ 304 / อ่านจากไฟล์
     """
-    sale = db.session.scalar(
-        sa.select(Sale).options(
-            joinedload(Sale.customer),
-            joinedload(Sale.items).joinedload(SaleItem.product)
-        ).where(Sale.id == sale_id)
-    )
+    sale = load_sale(sale_id)
     if not sale:
         flash('ไม่พบรายการขายที่ต้องการสร้างใบเสร็จ', 'danger')
         return redirect(url_for('accounting.reports'))
 
-    # เรนเดอร์ HTML template สำหรับใบเสร็จ
-    rendered_html = render_template('accounting/receipt_pdf_template.html', sale=sale)
-
-    # สร้าง PDF จาก HTML
-    pdf_bytes = HTML(string=rendered_html, base_url=request.url_root).write_pdf(
-        stylesheets=[CSS(string='''
-            @page { size: A4; margin: 1cm; }
-            body { font-family: 'TH Sarabun New', sans-serif; font-size: 10pt; }
-            table { width: 100%; border-collapse: collapse; margin-bottom: 10px; }
-            th, td { border: 1px solid #000; padding: 8px; text-align: left; }
-            th { background-color: #f2f2f2; }
-            .text-right { text-align: right; }
-            .text-center { text-align: center; }
-            .header, .footer { text-align: center; margin-bottom: 20px; }
-            .total { font-size: 12pt; font-weight: bold; }
-        ''')]
-    )
-    # แก้ไข: ห่อ bytes object ด้วย io.BytesIO
-    return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf', download_name=f'receipt_{sale.id}.pdf')
+    return documents.response('receipt', sale.id, receipt_html(sale), f'receipt_{sale.id}.pdf')
 
 
 @bp.route('/quote_pdf/<int:sale_id>') # ใช้ sale_id เป็นตัวอย่าง, อาจเปลี่ยนเป็น quote_id ในอนาคต
@@ -119,32 +98,10 @@ def quote_pdf(sale_id):
     สร้างใบเสนอราคาในรูปแบบ PDF (ใช้ข้อมูล Sale เป็นตัวอย่าง)
     Endpoint: accounting.quote_pdf
     """
-    sale = db.session.scalar(
-        sa.select(Sale).options(
-            joinedload(Sale.customer),
-            joinedload(Sale.items).joinedload(SaleItem.product)
-        ).where(Sale.id == sale_id)
-    )
+    sale = load_sale(sale_id)
     if not sale:
         flash('ไม่พบข้อมูลที่ต้องการสร้างใบเสนอราคา', 'danger')
         return redirect(url_for('accounting.reports'))
 
-    # เรนเดอร์ HTML template สำหรับใบเสนอราคา
-    rendered_html = render_template('accounting/quote_pdf_template.html', sale=sale, timedelta=timedelta) # ส่ง timedelta ไปยัง template
-
-    # สร้าง PDF จาก HTML
-    pdf_bytes = HTML(string=rendered_html, base_url=request.url_root).write_pdf(
-        stylesheets=[CSS(string='''
-            @page { size: A4; margin: 1cm; }
-            body { font-family: 'TH Sarabun New', sans-serif; font-size: 10pt; }
-            table { width: 100%; border-collapse: collapse; margin-bottom: 10px; }
-            th, td { border: 1px solid #000; padding: 8px; text-align: left; }
-            th { background-color: #f2f2f2; }
-            .text-right { text-align: right; }
-            .text-center { text-align: center; }
-            .header, .footer { text-align: center; margin-bottom: 20px; }
-            .total { font-size: 12pt; font-weight: bold; }
-        ''')]
-    )
-    # แก้ไข: ห่อ bytes object ด้วย io.BytesIO
-    return send_file(io.BytesIO(pdf_bytes), mimetype='application/pdf', download_name=f'quote_{sale.id}.pdf')
+    # ใบเสนอราคามีวันหมดอายุจากวันที่สร้าง - แคชตาม HTML ที่ได้ จึงไม่ค้างเมื่อข้อมูลเปลี่ยน
+    return documents.response('quote', sale.id, quote_html(sale), f'quote_{sale.id}.pdf')
@@ -8,6 +8,11 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 import json
 from comphone import db, login
+from utils.counters import track_sales, track_status
+from utils.checkout import CheckoutService
+from utils.cache import SettingsCache
+from utils.line_outbox import LineDispatcher
+from utils.replica import ReadReplica
 
 # ===== USER MANAGEMENT =====
 class User(UserMixin, db.Model):
@@ -256,8 +261,7 @@ class Setting(db.Model):
 
     @classmethod
     def get_setting(cls, key, default=None):
-        setting = db.session.scalar(sa.select(cls).where(cls.key == key))
-        return setting.value if setting else default
+        return setting_cache.get(key, default)
     
     @classmethod
     def set_setting(cls, key, value):
@@ -268,8 +272,60 @@ class Setting(db.Model):
             setting = cls(key=key, value=value)
             db.session.add(setting)
         db.session.commit()
+        setting_cache.invalidate()
         return setting
 
+# Setting.get_setting อ่านจากแคช (ดู utils/cache.py:SettingsCache) - decode JSON ครั้งเดียวตอนโหลด
+setting_cache = SettingsCache(
+    'setting',
+    lambda: {s.key: s.value for s in db.session.scalars(sa.select(Setting))},
+    lambda: db.session.execute(sa.select(sa.func.count(Setting.id), sa.func.max(Setting.updated_at))).one()
+)
+
+# ===== DASHBOARD COUNTERS =====
+class StatCounter(db.Model):
+    """Materialized counters (ดู utils/counters.py)"""
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    key: so.Mapped[str] = so.mapped_column(sa.String(100), unique=True, index=True)
+    value: so.Mapped[float] = so.mapped_column(sa.Float, default=0.0)
+    updated_at: so.Mapped[datetime] = so.mapped_column(default=lambda: datetime.now(timezone.utc))
+
+track_sales(Sale, StatCounter, timestamp_attr='timestamp')
+track_status(ServiceJob, StatCounter, 'service_jobs')
+track_status(Task, StatCounter, 'tasks')
+
+# ตัดสต็อกด้วย UPDATE แบบมีเงื่อนไข และ bulk insert รายการขาย / stock movement (utils.checkout)
+checkout_service = CheckoutService(
+    Product, SaleItem,
+    item_row=lambda sale, line: {'price_per_item': line.unit_price},
+    stock_attr='quantity',
+    price_attr='selling_price',
+    movement_model=StockMovement,
+    movement_row=lambda sale, line: {'change': -line.quantity, 'reason': 'sale', 'related_id': sale.id}
+)
+
+# ===== LINE OUTBOX =====
+class LineOutbox(db.Model):
+    """ข้อความ LINE ที่รอส่ง (ดู utils/line_outbox.py)"""
+    __table_args__ = (sa.Index('ix_line_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),)
+    id: so.Mapped[int] = so.mapped_column(primary_key=True)
+    kind: so.Mapped[str] = so.mapped_column(sa.String(10), default='push')  # push, reply
+    recipient: so.Mapped[str] = so.mapped_column(sa.String(100))  # user / group id หรือ reply token
+    text: so.Mapped[str] = so.mapped_column(sa.Text)
+    status: so.Mapped[str] = so.mapped_column(sa.String(10), default='pending')  # pending, sending, sent, failed
+    attempts: so.Mapped[int] = so.mapped_column(default=0)
+    next_attempt_at: so.Mapped[datetime] = so.mapped_column(default=lambda: datetime.now(timezone.utc))
+    claim: so.Mapped[Optional[str]] = so.mapped_column(sa.String(32), index=True)
+    claimed_at: so.Mapped[Optional[datetime]] = so.mapped_column()
+    last_error: so.Mapped[Optional[str]] = so.mapped_column(sa.String(255))
+    created_at: so.Mapped[datetime] = so.mapped_column(default=lambda: datetime.now(timezone.utc))
+    sent_at: so.Mapped[Optional[datetime]] = so.mapped_column()
+
+line_dispatcher = LineDispatcher(LineOutbox, lambda: db.session)
+
+# หน้ารายงานอ่านจาก replica (utils.replica)
+replica = ReadReplica(db)
+
 # ===== FLASK-LOGIN USER LOADER =====
 @login.user_loader
 def load_user(id):
@@ -3,8 +3,9 @@ from flask_login import login_required
 import sqlalchemy as sa
 from comphone import db
 from comphone.pos import bp
-from comphone.models import Product, Sale, SaleItem, StockMovement, Customer
-from comphone.utils.line_api import send_line_message
+from comphone.models import Product, Sale, Customer, checkout_service, line_dispatcher
+from utils.checkout import CheckoutError
+from comphone.accounting.documents import prewarm_receipt
 from flask import current_app
 
 @bp.route('/')
@@ -52,49 +53,32 @@ def checkout():
         return jsonify({'status': 'error', 'message': 'ไม่มีสินค้าในตะกร้า'}), 400
 
     try:
-        total_amount = 0
+        # โหลดสินค้าทั้งตะกร้าใน query เดียว แล้วตัดสต็อกแบบมีเงื่อนไข (utils.checkout)
+        lines = checkout_service.prepare(db.session, cart_items, id_key='id', price_key='price')
+        total_amount = sum(line.total_price for line in lines)
         
-        new_sale = Sale(customer_id=customer_id, total_amount=0)
-        db.session.add(new_sale)
-        
-        for item in cart_items:
-            product = db.session.get(Product, item['id'])
-            if not product:
-                raise ValueError(f"ไม่พบสินค้า ID: {item['id']}")
-
-            quantity = int(item['quantity'])
-            
-            if product.quantity < quantity:
-                raise ValueError(f'สินค้า "{product.name}" มีไม่พอในสต็อก')
+        new_sale = Sale(customer_id=customer_id, total_amount=total_amount)
+        checkout_service.complete(db.session, new_sale, lines)
 
-            product.quantity -= quantity
-            
-            price = float(item['price'])
-            total_amount += price * quantity
-            
-            sale_item = SaleItem(sale=new_sale, product_id=product.id, quantity=quantity, price_per_item=price)
-            db.session.add(sale_item)
-            
-            movement = StockMovement(product_id=product.id, change=-quantity, reason='sale')
-            db.session.add(movement)
-            
-        new_sale.total_amount = total_amount
-        db.session.flush() 
-        
-        db.session.commit()
-        
-        # ส่ง LINE Message (ใช้ send_line_message แทน send_line_notification)
-        try:
+        # แจ้งเตือน LINE ผ่าน outbox ใน transaction เดียวกับการขาย - worker ส่งหลัง commit
+        # หน้าขายจึงไม่ต้องรอ LINE API (utils.line_outbox)
+        targets = current_app.config.get('LINE_NOTIFY_TARGETS')
+        if targets:
             customer_name = db.session.get(Customer, customer_id).name if customer_id else "ลูกค้าทั่วไป"
             message = f"📢 มีรายการขายใหม่!\nลูกค้า: {customer_name}\nยอดรวม: {total_amount:,.2f} บาท\nจำนวน: {len(cart_items)} รายการ"
-            send_line_message(message) 
+            line_dispatcher.enqueue(db.session, targets, message)
+        db.session.commit()
+
+        # สร้าง PDF ใบเสร็จล่วงหน้าใน process pool ให้ดาวน์โหลดครั้งแรกได้ทันที
+        try:
+            prewarm_receipt(new_sale.id)
         except Exception as e:
-            print(f"Could not send LINE message: {e}")
+            current_app.logger.warning(f"Could not prewarm receipt {new_sale.id}: {e}")
 
         flash('ทำรายการขายสำเร็จ!', 'success')
         return jsonify({'status': 'success', 'redirect_url': url_for('core.index')})
 
-    except ValueError as e:
+    except CheckoutError as e:
         db.session.rollback()
         return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
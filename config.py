@@ -19,11 +19,30 @@ class Config:
     # Database Configuration
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or f'sqlite:///{BASE_DIR}/comphone_integrated.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_pre_ping': True,
-        'pool_recycle': 300,
-        'connect_args': {'timeout': 20}
-    }
+    # ค่าที่ตั้งตรงนี้มีผลเหนือ profile ด้านล่าง (utils.engine.init_engine)
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    
+    # Engine profile (utils.engine) - PRAGMA ของ SQLite ทุก connection
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')  # ผู้อ่านไม่ถูกผู้เขียนบล็อก
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')  # WAL + NORMAL: fsync ตอน checkpoint
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))
+    SQLITE_TEMP_STORE = os.environ.get('SQLITE_TEMP_STORE', 'MEMORY')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 20000))
+    SQLITE_FOREIGN_KEYS = os.environ.get('SQLITE_FOREIGN_KEYS', 'True').lower() == 'true'
+    
+    # Engine profile - connection pool เมื่อ DATABASE_URL เป็น PostgreSQL / MySQL
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 300))
+    
+    # Read replica (utils.replica) - หน้ารายงาน / export อ่านจาก engine แยก
+    REPLICA_DATABASE_URL = os.environ.get('REPLICA_DATABASE_URL')  # ไม่ตั้ง = SQLite WAL แบบ mode=ro
+    REPLICA_SQLITE_SNAPSHOT = os.environ.get('REPLICA_SQLITE_SNAPSHOT', 'True').lower() == 'true'
+    REPLICA_POOL_SIZE = int(os.environ.get('REPLICA_POOL_SIZE', 5))
+    REPLICA_MAX_LAG_SECONDS = int(os.environ.get('REPLICA_MAX_LAG_SECONDS', 30))  # เกินนี้อ่านจาก engine หลัก
+    REPLICA_CHECK_SECONDS = int(os.environ.get('REPLICA_CHECK_SECONDS', 5))
     
     # Session Configuration
     PERMANENT_SESSION_LIFETIME = timedelta(hours=int(os.environ.get('SESSION_TIMEOUT_HOURS', 24)))
@@ -62,6 +81,23 @@ class Config:
     LINE_CHANNEL_SECRET = os.environ.get('LINE_CHANNEL_SECRET')
     LINE_BOT_ENABLED = bool(LINE_CHANNEL_ACCESS_TOKEN and LINE_CHANNEL_SECRET)
     
+    # LINE Outbox (utils.line_outbox) - ส่งข้อความผ่าน worker เบื้องหลัง
+    LINE_API_URL = os.environ.get('LINE_API_URL', 'https://api.line.me')
+    LINE_DISPATCH_IN_PROCESS = os.environ.get('LINE_DISPATCH_IN_PROCESS', 'True').lower() == 'true'
+    LINE_DISPATCH_INTERVAL = float(os.environ.get('LINE_DISPATCH_INTERVAL', 2))
+    LINE_DISPATCH_BATCH = int(os.environ.get('LINE_DISPATCH_BATCH', 200))
+    LINE_MAX_ATTEMPTS = int(os.environ.get('LINE_MAX_ATTEMPTS', 6))
+    LINE_RETRY_BASE_SECONDS = float(os.environ.get('LINE_RETRY_BASE_SECONDS', 5))
+    LINE_RETRY_MAX_SECONDS = float(os.environ.get('LINE_RETRY_MAX_SECONDS', 900))
+    LINE_HTTP_TIMEOUT = float(os.environ.get('LINE_HTTP_TIMEOUT', 10))
+    # LINE Webhook (utils.line_webhook) - event เข้าคิวแล้วประมวลผลด้วย worker pool
+    LINE_WEBHOOK_WORKERS = int(os.environ.get('LINE_WEBHOOK_WORKERS', 2))
+    LINE_WEBHOOK_BATCH = int(os.environ.get('LINE_WEBHOOK_BATCH', 50))
+    LINE_WEBHOOK_INTERVAL = float(os.environ.get('LINE_WEBHOOK_INTERVAL', 2))
+    LINE_CUSTOMER_CACHE_SECONDS = int(os.environ.get('LINE_CUSTOMER_CACHE_SECONDS', 300))
+    # ผู้รับแจ้งเตือนของร้าน (user / group id คั่นด้วย comma) เช่น แจ้งการขายจาก POS
+    LINE_NOTIFY_TARGETS = [target.strip() for target in os.environ.get('LINE_NOTIFY_TARGETS', '').split(',') if target.strip()]
+    
     # LINE Notify Configuration
     LINE_NOTIFY_TOKEN = os.environ.get('LINE_NOTIFY_TOKEN')
     LINE_NOTIFY_ENABLED = bool(LINE_NOTIFY_TOKEN)
@@ -126,8 +162,42 @@ class Config:
     API_RATE_LIMIT = os.environ.get('API_RATE_LIMIT', '100 per hour')
     API_KEY_REQUIRED = os.environ.get('API_KEY_REQUIRED', 'False').lower() == 'true'
     
+    # Cache Configuration
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')  # memory, sqlite (shared between workers)
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH', str(BASE_DIR / 'instance' / 'cache.sqlite'))
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 512))
+    CACHE_DISABLED = os.environ.get('CACHE_DISABLED', 'False').lower() == 'true'
+    SETTINGS_CACHE_CHECK_SECONDS = int(os.environ.get('SETTINGS_CACHE_CHECK_SECONDS', 5))
+    CATALOG_CHECK_SECONDS = int(os.environ.get('CATALOG_CHECK_SECONDS', 2))
+    
+    # Document Numbers (utils.sequences) - จำนวนเลขที่จองต่อครั้งต่อ process
+    SEQUENCE_BLOCK_SIZE = int(os.environ.get('SEQUENCE_BLOCK_SIZE', 20))
+    
+    # Document Rendering (utils.documents) - PDF แคชบนดิสก์ (ว่าง = <instance>/documents)
+    DOCUMENT_CACHE_DIR = os.environ.get('DOCUMENT_CACHE_DIR') or None
+    DOCUMENT_RENDER_WORKERS = int(os.environ.get('DOCUMENT_RENDER_WORKERS', 2))
+    
+    # Barcodes (utils.barcodes) - แคช QR code ในหน่วยความจำ (จำนวนรูป) และบนดิสก์ (ว่าง = <instance>/barcodes)
+    BARCODE_CACHE_DIR = os.environ.get('BARCODE_CACHE_DIR') or None
+    BARCODE_CACHE_SIZE = int(os.environ.get('BARCODE_CACHE_SIZE', 512))
+    BARCODE_RENDER_WORKERS = int(os.environ.get('BARCODE_RENDER_WORKERS', 2))
+    
+    # Activity Log (utils.audit) - buffer ในหน่วยความจำแล้ว insert เป็นชุด
+    AUDIT_ASYNC = os.environ.get('AUDIT_ASYNC', 'True').lower() == 'true'
+    AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 200))
+    AUDIT_FLUSH_MS = int(os.environ.get('AUDIT_FLUSH_MS', 500))
+    AUDIT_BUFFER_SIZE = int(os.environ.get('AUDIT_BUFFER_SIZE', 10000))
+    AUDIT_BLOCK_MS = int(os.environ.get('AUDIT_BLOCK_MS', 50))
+    AUDIT_SPILL_PATH = os.environ.get('AUDIT_SPILL_PATH') or None
+    
+    # Activity Log retention (utils.partitions) - log เก่ากว่าเดือนปัจจุบันแยกเป็นตารางรายเดือน
+    ACTIVITY_LOG_RETENTION_DAYS = int(os.environ.get('ACTIVITY_LOG_RETENTION_DAYS', 30))
+    ACTIVITY_LOG_DELETE_BATCH = int(os.environ.get('ACTIVITY_LOG_DELETE_BATCH', 5000))
+    ACTIVITY_LOG_PER_PAGE = int(os.environ.get('ACTIVITY_LOG_PER_PAGE', 50))
+    
     # Pagination Configuration
     ITEMS_PER_PAGE = int(os.environ.get('ITEMS_PER_PAGE', 20))
+    PAGINATION_COUNT_SECONDS = int(os.environ.get('PAGINATION_COUNT_SECONDS', 60))  # จำนวนทั้งหมดแบบ 'cached'
     MAX_ITEMS_PER_PAGE = int(os.environ.get('MAX_ITEMS_PER_PAGE', 100))
     
     @staticmethod
@@ -234,13 +304,10 @@ class ProductionConfig(Config):
     DEBUG = False
     TESTING = False
     
-    # Database with connection pooling
-    SQLALCHEMY_ENGINE_OPTIONS = {
-        'pool_size': 20,
-        'pool_recycle': 3600,
-        'pool_pre_ping': True,
-        'max_overflow': 30
-    }
+    # Database with connection pooling (utils.engine)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 20))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 3600))
     
     # Security
     SESSION_COOKIE_SECURE = True
@@ -271,6 +338,10 @@ class TestingConfig(Config):
     # In-memory database for testing
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     
+    # ไฟล์ฐานข้อมูลชั่วคราวของการทดสอบไม่ต้องทนไฟดับ
+    SQLITE_JOURNAL_MODE = 'MEMORY'
+    SQLITE_SYNCHRONOUS = 'OFF'
+    
     # Disable CSRF for testing
     WTF_CSRF_ENABLED = False
     
@@ -280,6 +351,12 @@ class TestingConfig(Config):
     # Disable rate limiting for tests
     RATELIMIT_ENABLED = False
     
+    # Tests dispatch LINE messages explicitly
+    LINE_DISPATCH_IN_PROCESS = False
+    
+    # Activity log is written immediately (own connection) so tests can read it back
+    AUDIT_ASYNC = False
+    
     @classmethod
     def init_app(cls, app):
         Config.init_app(app)
@@ -445,6 +522,7 @@ API_KEY_REQUIRED=False
 # Pagination
 ITEMS_PER_PAGE=20
 MAX_ITEMS_PER_PAGE=100
+PAGINATION_COUNT_SECONDS=60
 
 # Rate Limiting (Redis URL for production)
 REDIS_URL=redis://localhost:6379/0
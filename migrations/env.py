@@ -97,6 +97,9 @@ def run_migrations_online():
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            # batch migration สร้างตารางใหม่แล้ว DROP ตารางเดิม - foreign_keys=ON (utils.engine) จะลบแถวลูกตาม
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
@@ -0,0 +1,59 @@
+"""created_at range indexes for sale, service_job, task, activity_log
+
+Revision ID: 3f2b9c1d7a4e
+Revises: 
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2b9c1d7a4e'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# (index name, table, columns) - ใช้กับการกรองช่วงเวลาแบบ created_at >= :start AND created_at < :end
+INDEXES = [
+    ('ix_sale_created_at', 'sale', ['created_at']),
+    ('ix_sale_status_created_at', 'sale', ['status', 'created_at']),
+    ('ix_sale_customer_created_at', 'sale', ['customer_id', 'created_at']),
+    ('ix_service_job_created_at', 'service_job', ['created_at']),
+    ('ix_service_job_status_created_at', 'service_job', ['status', 'created_at']),
+    ('ix_service_job_customer_created_at', 'service_job', ['customer_id', 'created_at']),
+    ('ix_task_created_at', 'task', ['created_at']),
+    ('ix_task_status_created_at', 'task', ['status', 'created_at']),
+    ('ix_task_customer_created_at', 'task', ['customer_id', 'created_at']),
+    ('ix_activity_log_created_at', 'activity_log', ['created_at']),
+]
+
+# มีอยู่แล้วจาก index=True ใน models.py - สร้างถ้ายังไม่มี แต่ไม่ลบตอน downgrade
+PREEXISTING = {'ix_task_created_at', 'ix_activity_log_created_at'}
+
+
+def _applicable(inspector):
+    """เฉพาะ index ที่ตารางและคอลัมน์มีอยู่จริง (schema แต่ละชุดไม่เหมือนกัน)"""
+    tables = set(inspector.get_table_names())
+    for name, table, columns in INDEXES:
+        if table not in tables:
+            continue
+        existing_columns = {c['name'] for c in inspector.get_columns(table)}
+        existing_indexes = {i['name'] for i in inspector.get_indexes(table)}
+        if set(columns) <= existing_columns:
+            yield name, table, columns, name in existing_indexes
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns, exists in list(_applicable(inspector)):
+        if not exists:
+            op.create_index(name, table, columns)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    for name, table, columns, exists in list(_applicable(inspector)):
+        if exists and name not in PREEXISTING:
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,48 @@
+"""full-text search index (SQLite FTS5, trigram)
+
+Revision ID: 7c41e0b5d2a9
+Revises: 3f2b9c1d7a4e
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c41e0b5d2a9'
+down_revision = '3f2b9c1d7a4e'
+branch_labels = None
+depends_on = None
+
+# ต้องตรงกับ utils.search.CREATE_SQL / BUILT_ROWID
+CREATE_SQL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "kind UNINDEXED, ref_id UNINDEXED, title, body, tokenize='trigram')"
+)
+MARK_BUILT_SQL = (
+    "INSERT INTO search_index (rowid, kind, ref_id, title, body) "
+    "SELECT 0, '__built__', NULL, '', '' WHERE NOT EXISTS (SELECT 1 FROM search_index WHERE rowid = 0)"
+)
+# ตารางต้นทางของดัชนี (utils.search.index_model ใน models.py)
+SOURCE_TABLES = ('customer', 'service_job', 'task', 'product')
+
+
+def upgrade():
+    # FTS5 มีเฉพาะ SQLite - ฐานข้อมูลอื่นใช้ ilike ตามเดิม
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute(CREATE_SQL)
+    # ไม่มีข้อมูลเดิม -> ดัชนีว่างก็ครบแล้ว; มีข้อมูลเดิม -> ยังไม่ mark ค้นหาใช้ ilike
+    # จนกว่าจะรัน flask rebuild-search-index
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+    if not any(bind.execute(sa.text(f'SELECT 1 FROM {name} LIMIT 1')).first()
+               for name in SOURCE_TABLES if name in tables):
+        op.execute(MARK_BUILT_SQL)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TABLE IF EXISTS search_index')
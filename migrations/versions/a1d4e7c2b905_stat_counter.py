@@ -0,0 +1,37 @@
+"""stat_counter table for materialized counters
+
+Revision ID: a1d4e7c2b905
+Revises: f2c7a9d4b318
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a1d4e7c2b905'
+down_revision = 'f2c7a9d4b318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ฐานข้อมูลที่สร้างด้วย db.create_all() มีตารางนี้อยู่แล้ว
+    if 'stat_counter' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        'stat_counter',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('key', sa.String(length=100), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    # unique key ของ upsert ใน utils.counters.increment_row
+    op.create_index('ix_stat_counter_key', 'stat_counter', ['key'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_stat_counter_key', table_name='stat_counter')
+    op.drop_table('stat_counter')
@@ -0,0 +1,80 @@
+"""daily_sales_summary / daily_product_sales rollup tables
+
+Revision ID: b6e2f9a3c410
+Revises: a1d4e7c2b905
+Create Date: 2026-10-19 09:30:00.000000
+
+"""
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6e2f9a3c410'
+down_revision = 'a1d4e7c2b905'
+branch_labels = None
+depends_on = None
+
+# ต้องตรงกับ DailySalesRollup.built_key (utils.rollups) ของ daily_sales_summary
+BUILT_KEY = 'rollup.daily_sales_summary.built_at'
+
+
+def upgrade():
+    # ฐานข้อมูลที่สร้างด้วย db.create_all() มีตารางเหล่านี้อยู่แล้ว
+    tables = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'daily_sales_summary' not in tables:
+        op.create_table(
+            'daily_sales_summary',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('sales_date', sa.Date(), nullable=False),
+            sa.Column('sales_count', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.Column('subtotal', sa.Float(), nullable=False),
+            sa.Column('tax_amount', sa.Float(), nullable=False),
+            sa.Column('discount_amount', sa.Float(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_daily_sales_summary_sales_date', 'daily_sales_summary', ['sales_date'], unique=True)
+    if 'daily_product_sales' not in tables:
+        op.create_table(
+            'daily_product_sales',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('sales_date', sa.Date(), nullable=False),
+            sa.Column('product_id', sa.Integer(), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=False),
+            sa.Column('revenue', sa.Float(), nullable=False),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['product_id'], ['product.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('sales_date', 'product_id', name='uq_daily_product_sales_date_product')
+        )
+        op.create_index('ix_daily_product_sales_sales_date', 'daily_product_sales', ['sales_date'])
+        op.create_index('ix_daily_product_sales_product_id', 'daily_product_sales', ['product_id'])
+
+    # ยังไม่มีการขาย -> rollup ว่างก็ครบแล้ว; มีการขายเดิม -> ยังไม่ mark รายงานคำนวณจากตารางขาย
+    # จนกว่าจะรัน flask rebuild-sales-summary
+    bind = op.get_bind()
+    tables = set(sa.inspect(bind).get_table_names())
+    if 'stat_counter' not in tables:
+        return
+    counter = sa.table('stat_counter', sa.column('key', sa.String), sa.column('value', sa.Float),
+                       sa.column('updated_at', sa.DateTime))
+    has_sales = 'sale' in tables and bind.execute(sa.text('SELECT 1 FROM sale LIMIT 1')).first()
+    marked = bind.execute(sa.select(counter.c.key).where(counter.c.key == BUILT_KEY)).first()
+    if not has_sales and not marked:
+        now = datetime.now(timezone.utc)
+        op.bulk_insert(counter, [{'key': BUILT_KEY, 'value': now.timestamp(), 'updated_at': now}])
+
+
+def downgrade():
+    counter = sa.table('stat_counter', sa.column('key', sa.String))
+    if 'stat_counter' in sa.inspect(op.get_bind()).get_table_names():
+        op.execute(counter.delete().where(counter.c.key == BUILT_KEY))
+    op.drop_index('ix_daily_product_sales_product_id', table_name='daily_product_sales')
+    op.drop_index('ix_daily_product_sales_sales_date', table_name='daily_product_sales')
+    op.drop_table('daily_product_sales')
+    op.drop_index('ix_daily_sales_summary_sales_date', table_name='daily_sales_summary')
+    op.drop_table('daily_sales_summary')
@@ -0,0 +1,44 @@
+"""customer phone_digits / phone_reversed lookup columns
+
+Revision ID: b8d3f61e9c20
+Revises: 7c41e0b5d2a9
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from utils.phones import backfill_table
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8d3f61e9c20'
+down_revision = '7c41e0b5d2a9'
+branch_labels = None
+depends_on = None
+
+# ใช้ normalize_phone ตัวเดียวกับแอป ค่าที่เติมจึงตรงกับที่ track_phone เขียน
+customer = sa.table(
+    'customer',
+    sa.column('id', sa.Integer),
+    sa.column('phone', sa.String),
+    sa.column('phone_digits', sa.String),
+    sa.column('phone_reversed', sa.String),
+)
+
+
+def upgrade():
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('phone_digits', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('phone_reversed', sa.String(length=20), nullable=True))
+        batch_op.create_index('ix_customer_phone_digits', ['phone_digits'], unique=False)
+        batch_op.create_index('ix_customer_phone_reversed', ['phone_reversed'], unique=False)
+    # เติมค่าให้ลูกค้าเดิม - ไม่งั้นค้นด้วยเบอร์ไม่เจอจนกว่าจะรัน flask backfill-phones
+    backfill_table(op.get_bind(), customer)
+
+
+def downgrade():
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        batch_op.drop_index('ix_customer_phone_reversed')
+        batch_op.drop_index('ix_customer_phone_digits')
+        batch_op.drop_column('phone_reversed')
+        batch_op.drop_column('phone_digits')
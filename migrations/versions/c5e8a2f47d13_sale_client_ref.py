@@ -0,0 +1,28 @@
+"""sale client_ref idempotency key for offline POS sync
+
+Revision ID: c5e8a2f47d13
+Revises: b8d3f61e9c20
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e8a2f47d13'
+down_revision = 'b8d3f61e9c20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('client_ref', sa.String(length=64), nullable=True))
+        batch_op.create_index('ix_sale_client_ref', ['client_ref'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('sale', schema=None) as batch_op:
+        batch_op.drop_index('ix_sale_client_ref')
+        batch_op.drop_column('client_ref')
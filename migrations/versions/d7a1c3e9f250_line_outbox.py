@@ -0,0 +1,43 @@
+"""line_outbox table for asynchronous LINE messaging
+
+Revision ID: d7a1c3e9f250
+Revises: c5e8a2f47d13
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a1c3e9f250'
+down_revision = 'c5e8a2f47d13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'line_outbox',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=10), nullable=False),
+        sa.Column('recipient', sa.String(length=100), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('claim', sa.String(length=32), nullable=True),
+        sa.Column('claimed_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('sent_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_line_outbox_status_next_attempt_at', 'line_outbox', ['status', 'next_attempt_at'])
+    op.create_index('ix_line_outbox_claim', 'line_outbox', ['claim'])
+
+
+def downgrade():
+    op.drop_index('ix_line_outbox_claim', table_name='line_outbox')
+    op.drop_index('ix_line_outbox_status_next_attempt_at', table_name='line_outbox')
+    op.drop_table('line_outbox')
@@ -0,0 +1,53 @@
+"""line_webhook_event queue and customer.line_user_id
+
+Revision ID: e4b9d2a6c781
+Revises: d7a1c3e9f250
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b9d2a6c781'
+down_revision = 'd7a1c3e9f250'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('line_user_id', sa.String(length=100), nullable=True))
+        batch_op.create_index('ix_customer_line_user_id', ['line_user_id'], unique=True)
+
+    op.create_table(
+        'line_webhook_event',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('webhook_event_id', sa.String(length=64), nullable=False),
+        sa.Column('event_type', sa.String(length=30), nullable=True),
+        sa.Column('body', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=10), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('claim', sa.String(length=32), nullable=True),
+        sa.Column('claimed_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.String(length=255), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_line_webhook_event_webhook_event_id', 'line_webhook_event', ['webhook_event_id'], unique=True)
+    op.create_index('ix_line_webhook_event_status_next_attempt_at', 'line_webhook_event', ['status', 'next_attempt_at'])
+    op.create_index('ix_line_webhook_event_claim', 'line_webhook_event', ['claim'])
+
+
+def downgrade():
+    op.drop_index('ix_line_webhook_event_claim', table_name='line_webhook_event')
+    op.drop_index('ix_line_webhook_event_status_next_attempt_at', table_name='line_webhook_event')
+    op.drop_index('ix_line_webhook_event_webhook_event_id', table_name='line_webhook_event')
+    op.drop_table('line_webhook_event')
+
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        batch_op.drop_index('ix_customer_line_user_id')
+        batch_op.drop_column('line_user_id')
@@ -0,0 +1,25 @@
+"""activity_log (action, created_at) index
+
+Revision ID: f2c7a9d4b318
+Revises: e4b9d2a6c781
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c7a9d4b318'
+down_revision = 'e4b9d2a6c781'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # ตารางเดิมไม่ต้องสร้างใหม่เพื่อเปิด AUTOINCREMENT - ตารางหลักที่ rotate() สร้างใหม่จะมีเอง
+    op.create_index('ix_activity_log_action_created_at', 'activity_log', ['action', 'created_at'])
+
+
+def downgrade():
+    op.drop_index('ix_activity_log_action_created_at', table_name='activity_log')
@@ -5,10 +5,23 @@ Comphone Integrated System - Fixed Database Models
 
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.orm import joinedload, selectinload
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timezone, timedelta
 import json
 import enum
+from utils.counters import track_sales, track_status
+from utils.rollups import DailySalesRollup
+from utils.cache import invalidate_on_commit, SettingsCache
+from utils import search as search_index
+from utils.phones import track_phone
+from utils.catalog import ProductCatalog
+from utils.checkout import CheckoutService
+from utils.sequences import SequenceAllocator
+from utils.line_outbox import LineDispatcher
+from utils.audit import AuditWriter
+from utils.partitions import MonthlyPartitions
+from utils.replica import ReadReplica
 
 # Initialize SQLAlchemy
 db = SQLAlchemy()
@@ -204,8 +217,11 @@ class Customer(db.Model):
     
     # Contact Information
     phone = db.Column(db.String(20), index=True)
+    phone_digits = db.Column(db.String(20), index=True)  # ตัวเลขล้วน (utils.phones)
+    phone_reversed = db.Column(db.String(20), index=True)  # ตัวเลขกลับด้าน สำหรับค้นเลขท้าย
     email = db.Column(db.String(120), index=True)
     line_id = db.Column(db.String(100))
+    line_user_id = db.Column(db.String(100), unique=True, index=True)  # userId จาก LINE webhook / LIFF
     
     # Address Information
     address = db.Column(db.Text)
@@ -262,13 +278,12 @@ class Customer(db.Model):
         return json.loads(self.tags) if self.tags else []
     
     def generate_customer_code(self):
-        """Generate unique customer code"""
+        """Generate unique customer code (เลขลำดับจาก document_numbers)"""
         if not self.customer_code:
-            import random
-            import string
-            prefix = 'CUS'
-            suffix = ''.join(random.choices(string.digits, k=6))
-            self.customer_code = f"{prefix}{suffix}"
+            # 7 หลัก - ยาวกว่ารหัสสุ่มแบบเดิม (CUS + 6 หลัก) จึงไม่ชนกับข้อมูลเก่า
+            self.customer_code = document_numbers.next_number(
+                'CUS', period=None, width=7, column=Customer.customer_code
+            )
     
     def __repr__(self):
         return f'<Customer {self.name}>'
@@ -405,6 +420,10 @@ class Product(db.Model):
 class ServiceJob(db.Model):
     """Enhanced Service Job model for repair tracking"""
     __tablename__ = 'service_job'
+    __table_args__ = (
+        db.Index('ix_service_job_status_created_at', 'status', 'created_at'),
+        db.Index('ix_service_job_customer_created_at', 'customer_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -485,7 +504,7 @@ class ServiceJob(db.Model):
     notes = db.Column(db.Text)  # alias สำหรับ internal_notes
     
     # Timestamps
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     
     # Relationships
@@ -505,13 +524,9 @@ class ServiceJob(db.Model):
             self.reported_problem = self.problem_description
     
     def generate_job_number(self):
-        """Generate unique job number"""
+        """Generate unique job number เช่น SRV261000042 (ปีเดือน + ลำดับ)"""
         if not self.job_number:
-            import random
-            import string
-            prefix = 'SRV'
-            suffix = ''.join(random.choices(string.digits, k=6))
-            self.job_number = f"{prefix}{suffix}"
+            self.job_number = document_numbers.next_number('SRV', column=ServiceJob.job_number)
         return self.job_number
     
     def calculate_total_cost(self):
@@ -550,6 +565,10 @@ class ServiceJob(db.Model):
 class Task(db.Model):
     """Enhanced Task model with advanced tracking"""
     __tablename__ = 'task'
+    __table_args__ = (
+        db.Index('ix_task_status_created_at', 'status', 'created_at'),
+        db.Index('ix_task_customer_created_at', 'customer_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
@@ -618,15 +637,17 @@ class Task(db.Model):
                                secondaryjoin=User.id == task_assignees.c.user_id,
                                backref=db.backref('assigned_tasks', lazy='dynamic'),
                                lazy='dynamic')
+    # assignees เป็น dynamic จึง eager load ไม่ได้ - list view อ่านจาก assignee_list แทน
+    assignee_list = db.relationship('User',
+                                    secondary=task_assignees,
+                                    primaryjoin=id == task_assignees.c.task_id,
+                                    secondaryjoin=User.id == task_assignees.c.user_id,
+                                    viewonly=True)
     
     def generate_task_number(self):
-        """Generate unique task number"""
+        """Generate unique task number เช่น TSK261000042 (ปีเดือน + ลำดับ)"""
         if not self.task_number:
-            import random
-            import string
-            prefix = 'TSK'
-            suffix = ''.join(random.choices(string.digits, k=6))
-            self.task_number = f"{prefix}{suffix}"
+            self.task_number = document_numbers.next_number('TSK', column=Task.task_number)
     
     def set_checklist(self, checklist_items):
         """Set checklist as JSON"""
@@ -656,12 +677,18 @@ class Task(db.Model):
 class Sale(db.Model):
     """Enhanced Sales model with detailed tracking"""
     __tablename__ = 'sale'
+    __table_args__ = (
+        db.Index('ix_sale_status_created_at', 'status', 'created_at'),
+        db.Index('ix_sale_customer_created_at', 'customer_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     
     # Sale Information
     sale_number = db.Column(db.String(20), unique=True, nullable=False, index=True)
     sale_type = db.Column(db.String(20), default='cash')
+    # idempotency key ที่เครื่อง POS สร้าง (คิวออฟไลน์ - ดู pos.sync_sales) ส่งซ้ำได้โดยไม่เกิดการขายซ้ำ
+    client_ref = db.Column(db.String(64), unique=True, index=True)
     
     # Customer and Salesperson
     customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'))
@@ -689,7 +716,7 @@ class Sale(db.Model):
     
     # Timestamps
     sale_date = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
-    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
     
     # Relationships
@@ -703,13 +730,9 @@ class Sale(db.Model):
             self.sale_number = self.generate_sale_number()
 
     def generate_sale_number(self):
-        """Generate unique sale number"""
+        """Generate unique sale number เช่น SAL2610000042 (ปีเดือน + ลำดับ)"""
         if not self.sale_number:
-            import random
-            import string
-            prefix = 'SAL'
-            suffix = ''.join(random.choices(string.digits, k=6))
-            self.sale_number = f"{prefix}{suffix}"
+            self.sale_number = document_numbers.next_number('SAL', width=6, column=Sale.sale_number)
         return self.sale_number
     
     @property
@@ -809,6 +832,13 @@ class ActivityLog(db.Model):
     # Relationships
     user = db.relationship('User', backref='activity_logs')
     
+    __table_args__ = (
+        # ตัวกรอง action ของหน้าดู log (เรียงตามเวลา)
+        db.Index('ix_activity_log_action_created_at', 'action', 'created_at'),
+        # id ไม่ถูกใช้ซ้ำหลัง rotate ไปตารางรายเดือน (utils.partitions)
+        {'sqlite_autoincrement': True},
+    )
+    
     def __repr__(self):
         return f'<ActivityLog {self.action} on {self.entity_type}>'
 
@@ -871,6 +901,185 @@ class Notification(db.Model):
     def __repr__(self):
         return f'<Notification {self.title}>'
 
+class StatCounter(db.Model):
+    """Materialized counters สำหรับ dashboard (ดู utils/counters.py)"""
+    __tablename__ = 'stat_counter'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(100), unique=True, nullable=False, index=True)
+    value = db.Column(db.Float, default=0.0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        return f'<StatCounter {self.key}={self.value}>'
+
+class LineOutbox(db.Model):
+    """ข้อความ LINE ที่รอส่ง (ดู utils/line_outbox.py)"""
+    __tablename__ = 'line_outbox'
+    __table_args__ = (
+        db.Index('ix_line_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(10), default='push', nullable=False)  # push, reply
+    recipient = db.Column(db.String(100), nullable=False)  # user / group id หรือ reply token
+    text = db.Column(db.Text, nullable=False)
+    
+    # Delivery
+    status = db.Column(db.String(10), default='pending', nullable=False)  # pending, sending, sent, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    claim = db.Column(db.String(32), index=True)
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.String(255))
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    sent_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<LineOutbox {self.kind} to {self.recipient} ({self.status})>'
+
+class LineWebhookEvent(db.Model):
+    """Webhook event จาก LINE ที่รอประมวลผล (ดู utils/line_webhook.py)"""
+    __tablename__ = 'line_webhook_event'
+    __table_args__ = (
+        db.Index('ix_line_webhook_event_status_next_attempt_at', 'status', 'next_attempt_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    webhook_event_id = db.Column(db.String(64), unique=True, nullable=False, index=True)
+    event_type = db.Column(db.String(30))
+    body = db.Column(db.Text, nullable=False)  # JSON ของ event
+    
+    # Processing
+    status = db.Column(db.String(10), default='pending', nullable=False)  # pending, sending, processed, failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    claim = db.Column(db.String(32), index=True)
+    claimed_at = db.Column(db.DateTime)
+    last_error = db.Column(db.String(255))
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    processed_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<LineWebhookEvent {self.event_type} {self.webhook_event_id} ({self.status})>'
+
+class DailySalesSummary(db.Model):
+    """สรุปยอดขายรายวัน (rollup ของ sale - ดู utils/rollups.py)"""
+    __tablename__ = 'daily_sales_summary'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sales_date = db.Column(db.Date, unique=True, nullable=False, index=True)
+    sales_count = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+    subtotal = db.Column(db.Float, default=0.0, nullable=False)
+    tax_amount = db.Column(db.Float, default=0.0, nullable=False)
+    discount_amount = db.Column(db.Float, default=0.0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        return f'<DailySalesSummary {self.sales_date}>'
+
+class DailyProductSales(db.Model):
+    """ยอดขายรายวันแยกตามสินค้า (rollup ของ sale_item)"""
+    __tablename__ = 'daily_product_sales'
+    __table_args__ = (
+        db.UniqueConstraint('sales_date', 'product_id', name='uq_daily_product_sales_date_product'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sales_date = db.Column(db.Date, nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    quantity = db.Column(db.Integer, default=0, nullable=False)
+    revenue = db.Column(db.Float, default=0.0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        return f'<DailyProductSales {self.sales_date} product={self.product_id}>'
+
+# ตัวนับที่อัพเดตอัตโนมัติทุกครั้งที่ flush Sale / Task / ServiceJob
+track_sales(Sale, StatCounter)
+track_status(Task, StatCounter, 'tasks')
+track_status(ServiceJob, StatCounter, 'service_jobs')
+sales_rollup = DailySalesRollup(Sale, SaleItem, DailySalesSummary, DailyProductSales,
+                                counter_model=StatCounter)
+
+# ล้าง response cache (utils.cache) ของข้อมูลกลุ่มนั้นหลัง commit ที่แตะ model เหล่านี้
+invalidate_on_commit(Sale, 'sales')
+invalidate_on_commit(SaleItem, 'sales')
+invalidate_on_commit(Product, 'stock')
+invalidate_on_commit(ServiceJob, 'jobs')
+invalidate_on_commit(Task, 'tasks')
+invalidate_on_commit(Customer, 'customers')
+invalidate_on_commit(User, 'users')
+
+# ดัชนีสินค้าในหน่วยความจำสำหรับ POS (utils.catalog) - version stamp อยู่ใน stat_counter
+product_catalog = ProductCatalog(Product, StatCounter, lambda: db.session)
+
+# เลขที่เอกสาร (งานซ่อม, การขาย, งาน, รหัสลูกค้า) จองเป็นช่วงจาก stat_counter (utils.sequences)
+document_numbers = SequenceAllocator(StatCounter, lambda: db.session)
+
+# ตัดสต็อกด้วย UPDATE แบบมีเงื่อนไข และ bulk insert รายการขาย (utils.checkout)
+checkout_service = CheckoutService(
+    Product, SaleItem,
+    item_row=lambda sale, line: {
+        'price_per_unit': line.unit_price,
+        'cost_per_unit': line.product.cost,
+        'total_price': line.total_price,
+    },
+    on_stock_change=product_catalog.touch
+)
+
+# ข้อความ LINE ส่งผ่าน outbox โดย worker เบื้องหลัง (utils.line_outbox)
+line_dispatcher = LineDispatcher(LineOutbox, lambda: db.session)
+
+# เบอร์โทรแบบ normalize สำหรับค้นหาด้วย index (utils.phones)
+track_phone(Customer)
+
+# ดัชนีค้นหา FTS5 (utils.search) - code ห้ามเปลี่ยนหลังสร้างดัชนีแล้ว
+search_index.attach(db.metadata)
+search_index.index_model(Customer, 'customer', 1,
+                         title=('name', 'customer_code'),
+                         body=('phone', 'email', 'company_name', 'line_id', 'address'))
+search_index.index_model(ServiceJob, 'job', 2,
+                         title=('job_number', 'title'),
+                         body=('description', 'reported_problem', 'problem_description'))
+search_index.index_model(Task, 'task', 3,
+                         title=('task_number', 'title'),
+                         body=('description',))
+search_index.index_model(Product, 'product', 4,
+                         title=('name', 'sku'),
+                         body=('barcode', 'brand', 'model', 'category', 'description'))
+
+# Loader profiles - eager loading ของ list/export view (ป้องกัน N+1 query)
+# ใช้: ServiceJob.query.options(*load_profile('job_list'))
+LOADER_PROFILES = {
+    'job_list': (
+        joinedload(ServiceJob.customer),
+        joinedload(ServiceJob.technician),
+        joinedload(ServiceJob.device),
+    ),
+    'sale_list': (
+        joinedload(Sale.customer),
+        joinedload(Sale.salesperson),
+    ),
+    'task_list': (
+        joinedload(Task.customer),
+        joinedload(Task.creator),
+        selectinload(Task.assignee_list),
+    ),
+    'activity_list': (
+        joinedload(ActivityLog.user),
+    ),
+}
+
+def load_profile(name):
+    """Loader options ของ profile ที่ตั้งชื่อไว้ใน LOADER_PROFILES"""
+    return LOADER_PROFILES[name]
+
 # Database initialization functions
 def create_tables():
     """Create all database tables"""
@@ -921,6 +1130,7 @@ def init_default_settings():
                 db.session.add(setting)
             
             db.session.commit()
+            settings_cache.invalidate()
             print("✅ Default settings created successfully!")
             
     except Exception as e:
@@ -1146,13 +1356,21 @@ def create_sample_data():
         traceback.print_exc()
 
 # Helper functions
+def _load_settings():
+    return {setting.key: setting.get_value() for setting in SystemSettings.query.all()}
+
+def _settings_version():
+    return db.session.execute(
+        db.select(db.func.count(SystemSettings.id), db.func.max(SystemSettings.updated_at))
+    ).one()
+
+# ทุก get_setting อ่านจาก dict ในหน่วยความจำ - โหลดทั้งตารางใหม่เมื่อ version stamp เปลี่ยน
+settings_cache = SettingsCache('system_settings', _load_settings, _settings_version)
+
 def get_setting(key, default=None):
     """Get system setting value"""
     try:
-        setting = SystemSettings.query.filter_by(key=key).first()
-        if setting:
-            return setting.get_value()
-        return default
+        return settings_cache.get(key, default)
     except:
         return default
 
@@ -1169,18 +1387,28 @@ def set_setting(key, value, user_id=None):
             db.session.add(setting)
         
         db.session.commit()
+        settings_cache.invalidate()
         return True
     except Exception as e:
         db.session.rollback()
         print(f"Error setting {key}: {e}")
         return False
 
+# activity log เขียนแบบ async เป็นชุดผ่าน connection ของตัวเอง (utils.audit)
+audit_writer = AuditWriter(ActivityLog, lambda: db.engine)
+
+# activity log เก่าแยกเป็นตารางรายเดือน (utils.partitions)
+activity_partitions = MonthlyPartitions(ActivityLog, lambda: db.engine)
+
+# หน้ารายงาน / export อ่านจาก replica (utils.replica) - @replica.read_only
+replica = ReadReplica(db)
+
 def log_activity(action, entity_type=None, entity_id=None, user_id=None, 
                 description=None, old_values=None, new_values=None,
                 user_ip=None, user_agent=None):
-    """Log user activity"""
+    """Log user activity (buffered - ไม่ commit session ของผู้เรียก)"""
     try:
-        log = ActivityLog(
+        audit_writer.record(
             action=action,
             entity_type=entity_type,
             entity_id=entity_id,
@@ -1191,11 +1419,8 @@ def log_activity(action, entity_type=None, entity_id=None, user_id=None,
             user_ip=user_ip,
             user_agent=user_agent
         )
-        db.session.add(log)
-        db.session.commit()
     except Exception as e:
         print(f"Error logging activity: {e}")
-        db.session.rollback()
 
 # Helper function สำหรับ template
 def moment():
@@ -1206,8 +1431,10 @@ def moment():
 __all__ = [
     'db', 'User', 'Customer', 'CustomerDevice', 'Product', 'Task', 
     'ServiceJob', 'Sale', 'SaleItem', 
-    'SystemSettings', 'ActivityLog', 'Notification', 'TaskStatus', 
+    'SystemSettings', 'ActivityLog', 'Notification', 'StatCounter', 'LineOutbox', 'LineWebhookEvent',
+    'DailySalesSummary', 'DailyProductSales', 'sales_rollup', 'TaskStatus', 
     'TaskPriority', 'ServiceJobStatus', 'PaymentStatus', 'UserRole',
     'create_tables', 'init_default_settings', 'create_sample_data',
-    'get_setting', 'set_setting', 'log_activity', 'moment'
+    'get_setting', 'set_setting', 'settings_cache', 'product_catalog', 'checkout_service', 'document_numbers', 'line_dispatcher', 'audit_writer', 'activity_partitions', 'replica', 'log_activity', 'moment',
+    'LOADER_PROFILES', 'load_profile'
 ]
\ No newline at end of file
@@ -109,6 +109,97 @@ document.addEventListener('DOMContentLoaded', function() {
         renderCart();
     };
 
+    // --- Offline Sale Queue ---
+    // การขายถูกเก็บใน IndexedDB ก่อนเสมอ แล้วค่อยส่งเป็นชุดไปที่ /pos/api/sync_sales
+    // เน็ตหลุดเครื่องยังขายต่อได้ คิวจะถูกส่งใหม่เมื่อกลับมาออนไลน์ (client_id กันการบันทึกซ้ำ)
+    const SYNC_URL = '/pos/api/sync_sales';
+    const SYNC_BATCH_SIZE = 50;
+    const SYNC_RETRY_MS = 15000;
+    const syncStatus = document.getElementById('sync-status');
+    const saleQueue = openSaleQueue();
+    let syncing = false;
+
+    function openSaleQueue() {
+        return new Promise((resolve, reject) => {
+            const request = indexedDB.open('comphone-pos', 1);
+            request.onupgradeneeded = () => {
+                const db = request.result;
+                db.createObjectStore('pending', { keyPath: 'client_id' });
+                db.createObjectStore('rejected', { keyPath: 'client_id' });
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => reject(request.error);
+        });
+    }
+
+    async function queueStore(storeName, mode, action) {
+        const db = await saleQueue;
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction(storeName, mode);
+            const result = action(tx.objectStore(storeName));
+            tx.oncomplete = () => resolve(result && 'result' in result ? result.result : undefined);
+            tx.onerror = () => reject(tx.error);
+        });
+    }
+
+    function newClientId() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+    }
+
+    async function updateSyncStatus() {
+        const pending = await queueStore('pending', 'readonly', store => store.count());
+        syncStatus.textContent = pending
+            ? `รอส่งข้อมูล ${pending} รายการ${navigator.onLine ? '' : ' (ออฟไลน์)'}`
+            : '';
+    }
+
+    async function syncSales() {
+        if (syncing || !navigator.onLine) {
+            return [];
+        }
+        syncing = true;
+        const synced = [];
+        try {
+            while (true) {
+                const batch = await queueStore('pending', 'readonly', store => store.getAll(null, SYNC_BATCH_SIZE));
+                if (!batch.length) {
+                    break;
+                }
+                const response = await fetch(SYNC_URL, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ sales: batch })
+                });
+                if (!response.ok) {
+                    throw new Error(`sync failed: ${response.status}`);
+                }
+                const { results } = await response.json();
+                const sales = new Map(batch.map(sale => [sale.client_id, sale]));
+                await queueStore('pending', 'readwrite', store => {
+                    results.forEach(result => store.delete(result.client_id));
+                });
+                const rejected = results.filter(result => result.status === 'rejected' || result.status === 'invalid');
+                if (rejected.length) {
+                    await queueStore('rejected', 'readwrite', store => {
+                        rejected.forEach(result => store.put({ ...sales.get(result.client_id), error: result.error }));
+                    });
+                    alert('บันทึกการขายไม่สำเร็จ:\n' + rejected.map(result => result.error).join('\n'));
+                }
+                synced.push(...results);
+            }
+        } catch (error) {
+            // เน็ตหลุดหรือ server ไม่ตอบ - คิวยังอยู่ ลองใหม่รอบถัดไป
+            console.error('Error syncing sales:', error);
+        } finally {
+            syncing = false;
+            updateSyncStatus();
+        }
+        return synced;
+    }
+
     // --- Process Sale ---
     processSaleBtn.addEventListener('click', async function() {
         if (cart.length === 0) {
@@ -116,42 +207,45 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
 
-        const saleData = {
-            cart: cart,
-            total: parseFloat(cartTotalSpan.textContent.replace('฿', '')),
-            paymentMethod: paymentMethodSelect.value,
-            customerId: null // Can be enhanced to add customer selection
+        const sale = {
+            client_id: newClientId(),
+            created_at: new Date().toISOString(),
+            items: cart.map(item => ({ product_id: item.id, quantity: item.quantity })),
+            payment_method: paymentMethodSelect.value,
+            customer_id: null // Can be enhanced to add customer selection
         };
         
         this.disabled = true;
         this.innerHTML = '<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> กำลังบันทึก...';
 
         try {
-            const response = await fetch('/pos/api/process-sale', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(saleData)
-            });
-            const result = await response.json();
-            if (result.success) {
-                alert(result.message);
+            await queueStore('pending', 'readwrite', store => store.put(sale));
+            // Reset POS - การขายอยู่ในคิวแล้ว ขายรายการถัดไปได้ทันที
+            cart = [];
+            renderCart();
+
+            const results = await syncSales();
+            const result = results.find(item => item.client_id === sale.client_id);
+            if (result && (result.status === 'created' || result.status === 'duplicate')) {
                 // Open receipt in a new tab
-                window.open(`/pos/receipt/${result.sale_id}`, '_blank');
-                // Reset POS
-                cart = [];
-                renderCart();
-            } else {
-                alert(`เกิดข้อผิดพลาด: ${result.message}`);
+                window.open(`/pos/sales/${result.sale_id}/receipt`, '_blank');
+            } else if (!result) {
+                alert('บันทึกการขายไว้ในเครื่องแล้ว จะส่งข้อมูลอัตโนมัติเมื่อเชื่อมต่อได้');
             }
         } catch (error) {
-            console.error('Error processing sale:', error);
-            alert('การเชื่อมต่อกับเซิร์ฟเวอร์ล้มเหลว');
+            console.error('Error queueing sale:', error);
+            alert('ไม่สามารถบันทึกการขายในเครื่องได้');
         } finally {
             this.disabled = false;
             this.innerHTML = '<i class="fas fa-check-circle"></i> ยืนยันการขาย';
         }
     });
 
+    window.addEventListener('online', syncSales);
+    window.addEventListener('offline', updateSyncStatus);
+    setInterval(syncSales, SYNC_RETRY_MS);
+    syncSales();
+
     // Debounce utility
     function debounce(func, delay) {
         let timeout;
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Checkout tests - ตัดสต็อกแบบมีเงื่อนไข (utils.checkout)
+หลายเครื่องขายสินค้าชิ้นเดียวกันพร้อมกันต้องไม่ขายเกินสต็อก
+Run: python -m pytest -q tests/test_checkout.py
+"""
+
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from flask import Flask
+from sqlalchemy import event, func, select
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models import db, User, Product, Sale, SaleItem, DailyProductSales, checkout_service
+from utils.checkout import CheckoutError, StockShortage
+
+INITIAL_STOCK = 25
+TILLS = 8
+SALES_PER_TILL = 6
+
+def create_app(path):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{path}',
+        # หลาย thread เขียนไฟล์เดียวกัน - รอ lock แทนที่จะ error ทันที
+        SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 30, 'check_same_thread': False}},
+        TESTING=True,
+        CACHE_DISABLED=True
+    )
+    db.init_app(app)
+    return app
+
+@pytest.fixture()
+def app(tmp_path):
+    app = create_app(tmp_path / 'checkout.db')
+    with app.app_context():
+        db.create_all()
+        user = User(username='cashier', email='cashier@test.local', first_name='C', last_name='T')
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.add_all([
+            Product(name='จอ Samsung A10', sku='SKU-1', price=1500, cost=900, stock_quantity=INITIAL_STOCK),
+            Product(name='ฟิล์มกระจก', sku='SKU-2', price=100, cost=20, stock_quantity=INITIAL_STOCK),
+        ])
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+def sell(items, user_id=1):
+    lines = checkout_service.prepare(db.session, items)
+    subtotal = sum(line.total_price for line in lines)
+    sale = Sale(salesperson_id=user_id, subtotal=subtotal, total_amount=subtotal)
+    checkout_service.complete(db.session, sale, lines)
+    db.session.commit()
+    return sale.id
+
+def test_parallel_checkouts_never_oversell(app):
+    results = {'sold': 0, 'rejected': 0, 'errors': []}
+    lock = threading.Lock()
+    start = threading.Barrier(TILLS)
+
+    def till(number):
+        with app.app_context():
+            start.wait()
+            for i in range(SALES_PER_TILL):
+                quantity = 1 + (number + i) % 2
+                try:
+                    sell([{'product_id': 1, 'quantity': quantity}, {'product_id': 2, 'quantity': 1}])
+                    with lock:
+                        results['sold'] += quantity
+                except StockShortage:
+                    db.session.rollback()
+                    with lock:
+                        results['rejected'] += 1
+                except Exception as e:  # pragma: no cover - รายงานใน assert ด้านล่าง
+                    db.session.rollback()
+                    with lock:
+                        results['errors'].append(repr(e))
+            db.session.remove()
+
+    threads = [threading.Thread(target=till, args=(n,)) for n in range(TILLS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results['errors'] == []
+    # ความต้องการรวมเกินสต็อก จึงต้องมีการปฏิเสธ
+    assert results['rejected'] > 0
+    with app.app_context():
+        screen, film = db.session.get(Product, 1), db.session.get(Product, 2)
+        assert screen.stock_quantity >= 0 and film.stock_quantity >= 0
+        sold = db.session.scalar(select(func.sum(SaleItem.quantity)).where(SaleItem.product_id == 1))
+        assert sold == results['sold'] == INITIAL_STOCK - screen.stock_quantity
+        assert db.session.scalar(select(func.count(Sale.id))) == (
+            db.session.scalar(select(func.count(SaleItem.id)).where(SaleItem.product_id == 2))
+        )
+        rollup = db.session.scalar(select(func.sum(DailyProductSales.quantity))
+                                   .where(DailyProductSales.product_id == 1))
+        assert rollup == sold
+
+def test_shortage_rolls_back_whole_sale(app):
+    with app.app_context():
+        with pytest.raises(StockShortage) as error:
+            sell([{'product_id': 1, 'quantity': 2}, {'product_id': 2, 'quantity': INITIAL_STOCK + 1}])
+        db.session.rollback()
+        assert error.value.shortages == [{
+            'product_id': 2, 'name': 'ฟิล์มกระจก', 'requested': INITIAL_STOCK + 1, 'available': INITIAL_STOCK
+        }]
+        assert db.session.get(Product, 1).stock_quantity == INITIAL_STOCK
+        assert db.session.scalar(select(func.count(Sale.id))) == 0
+
+def test_cart_loaded_in_one_query(app):
+    with app.app_context():
+        statements = []
+        listener = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            lines = checkout_service.prepare(db.session, [
+                {'product_id': 1, 'quantity': 1}, {'product_id': 2, 'quantity': 3}, {'product_id': 1, 'quantity': 1}
+            ])
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert len(statements) == 1
+        assert [line.total_price for line in lines] == [1500, 300, 1500]
+
+        with pytest.raises(CheckoutError):
+            checkout_service.prepare(db.session, [{'product_id': 99, 'quantity': 1}])
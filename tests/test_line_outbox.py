@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+LINE outbox tests - ส่งข้อความผ่าน outbox ไปยัง LINE server จำลองบนเครื่อง (utils.line_outbox)
+Run: python -m pytest -q tests/test_line_outbox.py
+"""
+
+import json
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+from flask import Flask
+from sqlalchemy import select
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models import db, LineOutbox, line_dispatcher
+
+class FakeLineServer:
+    """LINE Messaging API จำลอง - บันทึก request และตอบตาม statuses ที่ตั้งไว้ (หมดแล้วตอบ 200)"""
+
+    def __init__(self):
+        self.requests = []
+        self.statuses = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                server.requests.append((self.path, body, self.headers.get('Authorization')))
+                status = server.statuses.pop(0) if server.statuses else 200
+                self.send_response(status)
+                if status == 429:
+                    self.send_header('Retry-After', '30')
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}'
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+@pytest.fixture()
+def line_server():
+    server = FakeLineServer()
+    yield server
+    server.close()
+
+@pytest.fixture()
+def app(tmp_path, line_server):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path / "line.db"}',
+        TESTING=True,
+        CACHE_DISABLED=True,
+        LINE_CHANNEL_ACCESS_TOKEN='test-token',
+        LINE_API_URL=line_server.url,
+        LINE_MAX_ATTEMPTS=3,
+        LINE_RETRY_BASE_SECONDS=10
+    )
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+def statuses():
+    return {row.recipient: (row.status, row.attempts) for row in db.session.scalars(select(LineOutbox))}
+
+def test_same_text_is_multicast_and_rollback_sends_nothing(app, line_server):
+    with app.app_context():
+        line_dispatcher.enqueue(db.session, ['U1', 'U2', 'U3'], 'โปรโมชั่นวันนี้')
+        line_dispatcher.enqueue(db.session, 'U1', 'งานซ่อมเสร็จแล้ว')
+        line_dispatcher.enqueue(db.session, 'C-staff', 'มีรายการขายใหม่')
+        db.session.commit()
+        line_dispatcher.enqueue(db.session, 'U9', 'ยกเลิก')
+        db.session.rollback()
+
+        assert line_dispatcher.dispatch_once() == 5
+        assert line_dispatcher.dispatch_once() == 0
+
+        sent = {path: body for path, body, _ in line_server.requests}
+        assert len(line_server.requests) == 3
+        assert sent['/v2/bot/message/multicast']['to'] == ['U1', 'U2', 'U3']
+        pushes = [body for path, body, _ in line_server.requests if path == '/v2/bot/message/push']
+        assert sorted(body['to'] for body in pushes) == ['C-staff', 'U1']
+        assert all(auth == 'Bearer test-token' for _, _, auth in line_server.requests)
+        assert db.session.scalar(select(LineOutbox).where(LineOutbox.recipient == 'U9')) is None
+        assert {status for status, _ in statuses().values()} == {'sent'}
+
+def test_messages_to_one_recipient_share_a_push(app, line_server):
+    with app.app_context():
+        for number in range(7):
+            line_dispatcher.enqueue(db.session, 'U1', f'ข้อความ {number}')
+        db.session.commit()
+        line_dispatcher.dispatch_once()
+        assert [len(body['messages']) for _, body, _ in line_server.requests] == [5, 2]
+
+def test_server_errors_retry_with_backoff_then_fail(app, line_server):
+    with app.app_context():
+        line_dispatcher.enqueue(db.session, 'U1', 'แจ้งเตือน')
+        db.session.commit()
+
+        now = datetime.now(timezone.utc)
+        line_server.statuses = [500]
+        line_dispatcher.dispatch_once(now=now)
+        row = db.session.scalar(select(LineOutbox))
+        assert (row.status, row.attempts) == ('pending', 1)
+        # ยังไม่ถึงเวลาลองใหม่
+        assert line_dispatcher.dispatch_once(now=now + timedelta(seconds=5)) == 0
+
+        line_server.statuses = [429]
+        line_dispatcher.dispatch_once(now=now + timedelta(seconds=15))
+        db.session.expire_all()
+        row = db.session.scalar(select(LineOutbox))
+        assert (row.status, row.attempts) == ('pending', 2)
+        # Retry-After 30 วินาทียาวกว่า backoff
+        assert row.next_attempt_at >= (now + timedelta(seconds=45)).replace(tzinfo=None)
+
+        line_server.statuses = [503]
+        line_dispatcher.dispatch_once(now=now + timedelta(hours=1))
+        db.session.expire_all()
+        assert statuses() == {'U1': ('failed', 3)}
+        assert len(line_server.requests) == 3
+
+def test_client_errors_fail_without_retry(app, line_server):
+    with app.app_context():
+        line_dispatcher.reply(db.session, 'expired-token', 'สวัสดีครับ')
+        db.session.commit()
+        line_server.statuses = [400]
+        line_dispatcher.dispatch_once()
+        assert statuses() == {'expired-token': ('failed', 1)}
+        assert line_server.requests[0][0] == '/v2/bot/message/reply'
+
+def test_enqueue_does_not_wait_for_line(app, line_server):
+    """checkout เพิ่มข้อความใน outbox เท่านั้น - LINE ล่มก็ commit ได้ทันที"""
+    line_server.close()
+    with app.app_context():
+        line_dispatcher.enqueue(db.session, ['U1', 'U2'], 'มีรายการขายใหม่')
+        db.session.commit()
+        assert line_dispatcher.dispatch_once() == 2
+        assert statuses() == {'U1': ('pending', 1), 'U2': ('pending', 1)}
+        assert 'ConnectionError' in line_dispatcher.metrics()['last_error']
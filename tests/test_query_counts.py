@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Query budget tests for list endpoints
+จำนวน query ต่อ request ต้องคงที่ไม่ว่าจะมีกี่แถวในหน้า (ดู models.LOADER_PROFILES)
+Run: python -m pytest -q tests/test_query_counts.py
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+from flask import Flask
+from flask_login import LoginManager
+from jinja2 import ChoiceLoader, DictLoader
+from sqlalchemy import event
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from models import (
+    db, User, Customer, CustomerDevice, ServiceJob, Sale, Task, ActivityLog, UserRole
+)
+from blueprints.service import service_bp
+from blueprints.tasks import tasks_bp
+from blueprints.pos import pos_bp
+from blueprints.admin import admin_bp
+
+# Template ย่อที่อ่าน relationship ทุกแถว - แทนที่ template จริงเพื่อวัดเฉพาะ query ของ view
+ROW_TEMPLATES = {
+    'service/list_jobs.html': (
+        '{% for job in jobs.items %}{{ job.customer.name }} {{ job.device.brand }} '
+        '{{ job.technician.full_name if job.technician }}{% endfor %}'
+    ),
+    'tasks/index.html': (
+        '{% for task in tasks.items %}{{ task.customer.name }} {{ task.creator.username }} '
+        '{% for user in task.assignee_list %}{{ user.username }}{% endfor %}{% endfor %}'
+    ),
+    'pos/sales.html': (
+        '{% for sale in sales.items %}{{ sale.customer.name }} {{ sale.salesperson.username }}{% endfor %}'
+    ),
+    'admin/activity_log.html': (
+        '{% for log in activities.items %}{{ log.user.username }}{% endfor %}'
+    ),
+}
+
+# endpoint -> จำนวน query สูงสุดต่อ request (รวมการโหลด current_user)
+BUDGETS = {
+    '/service/': 10,
+    '/service/api/jobs?per_page=50': 3,
+    '/tasks/': 11,
+    '/pos/sales': 3,
+    '/admin/activity_log': 4,
+}
+
+def create_app():
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI='sqlite://',
+        SECRET_KEY='test-key',
+        TESTING=True,
+        CACHE_DISABLED=True
+    )
+    db.init_app(app)
+    app.jinja_loader = ChoiceLoader([DictLoader(ROW_TEMPLATES), app.jinja_loader])
+
+    login_manager = LoginManager(app)
+
+    @login_manager.request_loader
+    def load_user_from_header(req):
+        user_id = req.headers.get('X-User-Id')
+        return db.session.get(User, int(user_id)) if user_id else None
+
+    app.register_blueprint(service_bp, url_prefix='/service')
+    app.register_blueprint(tasks_bp, url_prefix='/tasks')
+    app.register_blueprint(pos_bp)
+    app.register_blueprint(admin_bp, url_prefix='/admin')
+    return app
+
+def seed(rows):
+    """สร้างข้อมูล rows แถวต่อตาราง โดยแต่ละแถวอ้างถึง customer / user คนละคน"""
+    admin = User(username='admin', email='admin@test.local', first_name='Admin', last_name='User',
+                 role=UserRole.ADMIN)
+    admin.set_password('admin')
+    db.session.add(admin)
+    for i in range(rows):
+        user = User(username=f'tech{i}', email=f'tech{i}@test.local', first_name='Tech', last_name=str(i),
+                    role=UserRole.TECHNICIAN, is_technician=True, password_hash='-')
+        customer = Customer(name=f'Customer {i}', phone=f'08{i:08d}')
+        device = CustomerDevice(customer=customer, brand='Brand', model='Model')
+        db.session.add_all([user, customer, device])
+        db.session.flush()
+        db.session.add(ServiceJob(job_number=f'JOB{i:05d}', title='Repair', customer=customer, device=device,
+                                  technician=user, created_by=admin.id))
+        db.session.add(Sale(sale_number=f'S{i:05d}', customer=customer, salesperson=user,
+                            subtotal=100, total_amount=107))
+        task = Task(title=f'Task {i}', task_number=f'TSK{i:05d}', customer=customer, created_by=admin.id)
+        db.session.add(task)
+        db.session.flush()
+        task.assignees.append(user)
+        db.session.add(ActivityLog(action='test', user=user))
+    db.session.commit()
+    return admin.id
+
+def count_queries(app, url, user_id):
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            response = app.test_client().get(url, headers={'X-User-Id': str(user_id)})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+    assert response.status_code == 200, response.get_data(as_text=True)[:500]
+    return len(statements)
+
+@pytest.fixture(params=[2, 15], ids=['small', 'large'])
+def seeded_app(request):
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        user_id = seed(request.param)
+    yield app, user_id
+    with app.app_context():
+        db.drop_all()
+
+@pytest.mark.parametrize('url', list(BUDGETS))
+def test_list_endpoint_query_budget(seeded_app, url):
+    app, user_id = seeded_app
+    assert count_queries(app, url, user_id) <= BUDGETS[url]
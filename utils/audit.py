@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Audit Writer - บันทึก activity log แบบ async เป็นชุด (bulk insert)
+
+เดิม log_activity() add + commit ใน session ของผู้เรียก ซึ่ง commit งานค้างของผู้เรียกไปด้วย
+และเสีย fsync หนึ่งครั้งต่อ log หนึ่งแถว
+    - record() ใส่แถวลง buffer ในหน่วยความจำ (queue ขนาดจำกัด) แล้วกลับทันที ไม่แตะ session ของผู้เรียก
+    - flusher thread ต่อแอป insert ทีละชุดทุก AUDIT_BATCH_SIZE แถว หรือทุก AUDIT_FLUSH_MS
+      ผ่าน connection ของตัวเอง (engine.begin())
+    - backpressure: buffer เต็มรอได้ไม่เกิน AUDIT_BLOCK_MS แล้วเขียนแถวนั้นลง spill file แทน (ไม่ทิ้ง log)
+    - spill file (JSON lines, fsync) ใช้เมื่อ buffer เต็ม / insert ไม่สำเร็จ / ปิด process แล้ว flush ไม่ได้
+      ถูก replay เข้าฐานข้อมูลก่อนชุดถัดไป (rename ก่อน replay - process ตายกลางทางก็ replay ต่อได้)
+    - AUDIT_ASYNC=False (เช่น ตอนทดสอบ) insert ทันทีผ่าน connection ของตัวเองเช่นกัน
+
+Config: AUDIT_ASYNC, AUDIT_BATCH_SIZE, AUDIT_FLUSH_MS, AUDIT_BUFFER_SIZE, AUDIT_BLOCK_MS,
+        AUDIT_SPILL_PATH (ค่าเริ่มต้น <instance>/audit-spill.jsonl)
+"""
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import insert
+
+_STOP = object()
+
+class _AppState:
+    """buffer + flusher thread ของหนึ่งแอป"""
+
+    def __init__(self, app, size):
+        self.app = app
+        self.buffer = queue.Queue(maxsize=size)
+        self.thread = None
+
+class AuditWriter:
+    """ตัวเขียน activity log ของหนึ่ง schema
+
+    get_engine: callable ที่คืน engine ของแอป (เช่น lambda: db.engine) - เรียกใน app context
+    """
+
+    def __init__(self, model, get_engine, name='audit'):
+        self.model = model
+        self.get_engine = get_engine
+        self.name = name
+        self.counters = Counter()
+        self._lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        self._states = []
+        atexit.register(self.close)
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.counters[key] += amount
+
+    def _state(self, app):
+        key = f'{self.name}.writer'
+        state = app.extensions.get(key)
+        if state is None or state.thread is None or not state.thread.is_alive():
+            with self._lock:
+                state = app.extensions.get(key)
+                if state is None:
+                    state = app.extensions[key] = _AppState(app, app.config.get('AUDIT_BUFFER_SIZE', 10000))
+                    self._states.append(state)
+                if state.thread is None or not state.thread.is_alive():
+                    state.thread = threading.Thread(target=self._run, args=(state,), name=f'{self.name}-flusher', daemon=True)
+                    state.thread.start()
+        return state
+
+    # ----- ฝั่ง request -----
+    def record(self, **values):
+        """เพิ่ม log หนึ่งแถว (คอลัมน์ของ model) - ไม่ commit / ไม่รอฐานข้อมูล"""
+        values.setdefault('created_at', datetime.now(timezone.utc))
+        app = current_app._get_current_object()
+        self._count('recorded')
+        if not app.config.get('AUDIT_ASYNC', True):
+            self._flush(app, [values])
+            return
+
+        state = self._state(app)
+        try:
+            state.buffer.put(values, timeout=app.config.get('AUDIT_BLOCK_MS', 50) / 1000)
+        except queue.Full:
+            self._count('overflow')
+            self._spill(app, [values])
+
+    # ----- flusher -----
+    def _run(self, state):
+        app = state.app
+        batch_size = app.config.get('AUDIT_BATCH_SIZE', 200)
+        interval = app.config.get('AUDIT_FLUSH_MS', 500) / 1000
+        stopping = False
+        while not stopping:
+            first = state.buffer.get()
+            if first is _STOP:
+                break
+            batch = [first]
+            deadline = time.monotonic() + interval
+            while len(batch) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = state.buffer.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(app, batch)
+
+    def _flush(self, app, rows):
+        with app.app_context():
+            try:
+                self.replay(app)
+                self._insert(rows)
+                self._count('written', len(rows))
+                self._count('batches')
+            except Exception as e:
+                app.logger.error(f'Audit log flush failed ({len(rows)} rows spilled): {e}')
+                self._spill(app, rows)
+
+    def _insert(self, rows):
+        with self.get_engine().begin() as connection:
+            connection.execute(insert(self.model.__table__), rows)
+
+    def flush(self, app=None):
+        """เขียนทุกแถวที่ค้างใน buffer ทันที (CLI, ทดสอบ, ก่อนปิด process)"""
+        app = app or current_app._get_current_object()
+        state = app.extensions.get(f'{self.name}.writer')
+        rows = []
+        while state is not None:
+            try:
+                item = state.buffer.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # ให้ flusher ได้รับสัญญาณหยุดตามเดิม
+                state.buffer.put(item)
+                break
+            rows.append(item)
+        if rows:
+            self._flush(app, rows)
+        else:
+            with app.app_context():
+                self.replay(app)
+        return len(rows)
+
+    def close(self, timeout=5):
+        """หยุด flusher ทุกแอปแล้ว flush ที่เหลือ (atexit)"""
+        with self._lock:
+            states = list(self._states)
+        for state in states:
+            if state.thread is not None and state.thread.is_alive():
+                try:
+                    state.buffer.put(_STOP, timeout=timeout)
+                except queue.Full:
+                    pass
+                state.thread.join(timeout)
+            try:
+                self.flush(state.app)
+            except Exception:
+                pass
+
+    # ----- spill file -----
+    def _spill_path(self, app):
+        return app.config.get('AUDIT_SPILL_PATH') or os.path.join(app.instance_path, 'audit-spill.jsonl')
+
+    def _spill(self, app, rows):
+        path = self._spill_path(app)
+        lines = ''.join(json.dumps(row, default=_encode, ensure_ascii=False) + '\n' for row in rows)
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        self._count('spilled', len(rows))
+
+    def replay(self, app=None):
+        """insert แถวจาก spill file (ถ้ามี) -> จำนวนแถว"""
+        app = app or current_app._get_current_object()
+        path = self._spill_path(app)
+        replaying = path + '.replay'
+        with self._spill_lock:
+            if not os.path.exists(replaying):
+                if not os.path.exists(path):
+                    return 0
+                os.replace(path, replaying)
+            with open(replaying, encoding='utf-8') as f:
+                rows = [_decode(json.loads(line)) for line in f if line.strip()]
+            batch_size = app.config.get('AUDIT_BATCH_SIZE', 200)
+            # ทั้งไฟล์ใน transaction เดียว - ล้มกลางทางแล้ว replay ซ้ำจะไม่ได้แถวซ้ำ
+            with self.get_engine().begin() as connection:
+                for i in range(0, len(rows), batch_size):
+                    connection.execute(insert(self.model.__table__), rows[i:i + batch_size])
+            os.remove(replaying)
+        self._count('replayed', len(rows))
+        return len(rows)
+
+    def metrics(self, app=None):
+        app = app or current_app._get_current_object()
+        state = app.extensions.get(f'{self.name}.writer')
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            'buffered': state.buffer.qsize() if state else 0,
+            'spill_file': os.path.exists(self._spill_path(app)),
+            'counters': counters,
+        }
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def _decode(row):
+    return {
+        key: datetime.fromisoformat(value['__datetime__']) if isinstance(value, dict) and '__datetime__' in value else value
+        for key, value in row.items()
+    }
+
+__all__ = ['AuditWriter']
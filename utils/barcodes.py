@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Barcode Service - สร้างรูป QR code (PNG) พร้อมแคช และแผ่นป้ายราคาทีละหลายรายการ
+
+เดิมทุก request สร้าง QR ใหม่ แปลงเป็น base64 แล้วฝังใน JSON
+การพิมพ์ป้ายทั้งหมวดจึงเป็นการเรียกหลายร้อยครั้ง
+    - รูปถูกแคชตาม (payload, size) ในหน่วยความจำ (LRU) และบนดิสก์ (content-addressed)
+      key เดียวกันใช้เป็น ETag - browser ที่มีรูปแล้วได้ 304
+    - many() / sheet() render เฉพาะรายการที่ไม่อยู่ในแคช ถ้ามีมากพอจะกระจายไปยัง process pool
+      (spawn - fork จาก web server ที่มีหลาย thread ไม่ปลอดภัย)
+    - sheet() รวมป้ายทั้งหมดเป็น PNG แผ่นเดียวสำหรับพิมพ์
+
+Config: BARCODE_CACHE_DIR (ค่าเริ่มต้น <instance>/barcodes), BARCODE_CACHE_SIZE, BARCODE_RENDER_WORKERS
+"""
+
+import hashlib
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from flask import Response, current_app, has_app_context, request
+
+DEFAULT_SIZE = 10
+MAX_SIZE = 20
+BORDER = 5
+# จำนวนรูปที่ไม่อยู่ในแคชขั้นต่ำที่คุ้มค่าส่งไป process pool (น้อยกว่านี้ render ใน process เอง)
+POOL_THRESHOLD = 16
+CAPTION_HEIGHT = 16
+
+# ----- ทำงานได้ทั้งใน web process และ worker process -----
+def _render_png(payload, size):
+    """QR code ของ payload -> PNG bytes (size = จำนวน pixel ต่อ module)"""
+    import qrcode
+    qr = qrcode.QRCode(version=1, box_size=size, border=BORDER)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def _render_many(jobs):
+    return [_render_png(payload, size) for payload, size in jobs]
+
+def clamp_size(value, default=DEFAULT_SIZE, upper=MAX_SIZE):
+    """ตัวเลขจาก query string -> 1..upper (ค่าไม่ถูกต้องใช้ default)"""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return min(max(size, 1), upper)
+
+class BarcodeService:
+    """แคช QR code ต่อ process (pool สร้างเมื่อใช้ครั้งแรก)"""
+
+    def __init__(self, max_entries=512, workers=2):
+        self.max_entries = max_entries
+        self.workers = workers
+        self._memory = OrderedDict()
+        self._executor = None
+        self._lock = threading.RLock()
+
+    def key(self, payload, size=DEFAULT_SIZE):
+        """sha256 ของ (payload, size) - ใช้เป็นทั้งชื่อไฟล์และ ETag"""
+        return hashlib.sha256(f'{size}\0{payload}'.encode('utf-8')).hexdigest()
+
+    # ----- แคช -----
+    def _path(self, key):
+        if not has_app_context():
+            return None
+        root = current_app.config.get('BARCODE_CACHE_DIR') or os.path.join(current_app.instance_path, 'barcodes')
+        return os.path.join(str(root), key[:2], f'{key}.png')
+
+    def _limit(self):
+        if has_app_context():
+            return current_app.config.get('BARCODE_CACHE_SIZE', self.max_entries)
+        return self.max_entries
+
+    def _remember(self, key, png):
+        with self._lock:
+            self._memory[key] = png
+            self._memory.move_to_end(key)
+            while len(self._memory) > self._limit():
+                self._memory.popitem(last=False)
+
+    def _cached(self, key):
+        with self._lock:
+            png = self._memory.get(key)
+            if png is not None:
+                self._memory.move_to_end(key)
+                return png
+        path = self._path(key)
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                png = f.read()
+            self._remember(key, png)
+            return png
+        return None
+
+    def _store(self, key, png):
+        self._remember(key, png)
+        path = self._path(key)
+        if not path:
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(png)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # แคชบนดิสก์เป็นส่วนเสริม - เขียนไม่ได้ก็ยังมีในหน่วยความจำ
+            current_app.logger.warning(f'Could not cache barcode {key}: {e}')
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                workers = current_app.config.get('BARCODE_RENDER_WORKERS', self.workers)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    # ----- สร้างรูป -----
+    def png(self, payload, size=DEFAULT_SIZE):
+        """PNG ของ payload -> (bytes, etag)"""
+        key = self.key(payload, size)
+        png = self._cached(key)
+        if png is None:
+            png = _render_png(payload, size)
+            self._store(key, png)
+        return png, key
+
+    def many(self, payloads, size=DEFAULT_SIZE):
+        """PNG ของหลาย payload (ลำดับเดียวกับที่ส่งมา) - render เฉพาะที่ไม่อยู่ในแคช"""
+        keys = [self.key(payload, size) for payload in payloads]
+        images = {}
+        missing = {}
+        for payload, key in zip(payloads, keys):
+            if key in images or key in missing:
+                continue
+            png = self._cached(key)
+            if png is None:
+                missing[key] = payload
+            else:
+                images[key] = png
+
+        if missing:
+            jobs = [(payload, size) for payload in missing.values()]
+            if len(jobs) >= POOL_THRESHOLD and has_app_context():
+                pool = self._pool()
+                workers = current_app.config.get('BARCODE_RENDER_WORKERS', self.workers)
+                chunk = -(-len(jobs) // max(workers, 1))
+                futures = [pool.submit(_render_many, jobs[i:i + chunk]) for i in range(0, len(jobs), chunk)]
+                rendered = [png for future in futures for png in future.result()]
+            else:
+                rendered = _render_many(jobs)
+            for key, png in zip(missing, rendered):
+                self._store(key, png)
+                images[key] = png
+        return [images[key] for key in keys]
+
+    def sheet(self, labels, size=DEFAULT_SIZE, columns=4):
+        """แผ่นป้ายสำหรับพิมพ์ - labels: list ของ (payload, caption) -> PNG bytes
+
+        caption วาดด้วย font พื้นฐานของ Pillow (ASCII) เช่น SKU / ราคา
+        """
+        from PIL import Image, ImageDraw
+
+        images = [Image.open(io.BytesIO(png)) for png in self.many([payload for payload, _ in labels], size)]
+        columns = max(1, min(columns, len(images) or 1))
+        cell_width = max((img.width for img in images), default=1)
+        cell_height = max((img.height for img in images), default=1) + CAPTION_HEIGHT
+        rows = -(-len(images) // columns)
+
+        page = Image.new('RGB', (cell_width * columns, max(cell_height * rows, 1)), 'white')
+        draw = ImageDraw.Draw(page)
+        for index, (img, (_, caption)) in enumerate(zip(images, labels)):
+            left = (index % columns) * cell_width
+            top = (index // columns) * cell_height
+            page.paste(img, (left + (cell_width - img.width) // 2, top))
+            if caption:
+                text = str(caption).encode('ascii', 'replace').decode()
+                width = draw.textlength(text)
+                draw.text((left + (cell_width - width) / 2, top + img.height), text, fill='black')
+
+        buffer = io.BytesIO()
+        page.save(buffer, format='PNG', dpi=(300, 300))
+        return buffer.getvalue()
+
+    def response(self, png, etag=None, max_age=86400):
+        """ส่ง PNG พร้อม ETag / Cache-Control - If-None-Match ตรงตอบ 304 (ไม่ระบุ etag = hash ของรูป)"""
+        etag = etag or hashlib.sha256(png).hexdigest()
+        if etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            response = Response(png, mimetype='image/png')
+        response.set_etag(etag)
+        # รูปเดี่ยวขึ้นกับ payload + size เท่านั้น จึงแคชได้นาน
+        response.headers['Cache-Control'] = f'private, max-age={max_age}'
+        return response
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+barcodes = BarcodeService()
+
+__all__ = ['BarcodeService', 'barcodes', 'clamp_size']
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Response Cache - แคชผลลัพธ์ของ API/สถิติ แบบ TTL + LRU
+
+Backend:
+    memory  - แคชใน process (ค่าเริ่มต้น) จำกัดจำนวนด้วย LRU
+    sqlite  - ไฟล์ SQLite ที่หลาย worker process ใช้ร่วมกัน (CACHE_SQLITE_PATH)
+
+การล้างแคชใช้ "generation" ต่อ tag: แต่ละ entry ผูกกับ generation ปัจจุบัน
+ของ tag ที่มันขึ้นกับ (เช่น 'sales', 'stock', 'jobs') เมื่อ invalidate(tag)
+generation จะเพิ่มขึ้น entry เดิมจึงไม่ถูกอ่านอีกและหมดอายุไปเองตาม TTL / LRU
+model ที่ลงทะเบียนผ่าน invalidate_on_commit() จะล้าง tag ให้อัตโนมัติหลัง commit
+"""
+
+import copy
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+class MemoryCache:
+    """แคชใน process: TTL ต่อ entry และตัด entry ที่ใช้ล่าสุดนานที่สุดเมื่อเต็ม"""
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (time.time() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+    def generations(self, tags):
+        with self._lock:
+            return [self._generations.get(tag, 0) for tag in tags]
+
+    def bump(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+
+class SQLiteCache:
+    """แคชในไฟล์ SQLite ใช้ร่วมกันได้ระหว่างหลาย process บนเครื่องเดียวกัน"""
+
+    def __init__(self, path, max_entries=5000):
+        self.path = str(path)
+        self.max_entries = max_entries
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entry ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                'expires REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_entry_accessed ON cache_entry (accessed)')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache_generation ('
+                'tag TEXT PRIMARY KEY, generation INTEGER NOT NULL)'
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute(
+            'SELECT value, expires FROM cache_entry WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < now:
+            conn.execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+            return None
+        conn.execute('UPDATE cache_entry SET accessed = ? WHERE key = ?', (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key, value, timeout):
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache_entry (key, value, expires, accessed) VALUES (?, ?, ?, ?)',
+            (key, pickle.dumps(value), now + timeout, now)
+        )
+        # ตัด entry ที่หมดอายุ และที่ใช้ล่าสุดนานที่สุดเมื่อเกินจำนวน
+        conn.execute('DELETE FROM cache_entry WHERE expires < ?', (now,))
+        conn.execute(
+            'DELETE FROM cache_entry WHERE key IN ('
+            'SELECT key FROM cache_entry ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute('DELETE FROM cache_entry')
+        conn.execute('DELETE FROM cache_generation')
+
+    def generations(self, tags):
+        if not tags:
+            return []
+        rows = dict(self._connect().execute(
+            f'SELECT tag, generation FROM cache_generation WHERE tag IN ({",".join("?" * len(tags))})',
+            tuple(tags)
+        ).fetchall())
+        return [rows.get(tag, 0) for tag in tags]
+
+    def bump(self, *tags):
+        conn = self._connect()
+        for tag in tags:
+            conn.execute(
+                'INSERT INTO cache_generation (tag, generation) VALUES (?, 1) '
+                'ON CONFLICT(tag) DO UPDATE SET generation = generation + 1',
+                (tag,)
+            )
+
+def create_cache(config):
+    """สร้าง backend ตาม config (CACHE_BACKEND, CACHE_SQLITE_PATH, CACHE_MAX_ENTRIES)"""
+    backend = (config.get('CACHE_BACKEND') or 'memory').lower()
+    max_entries = int(config.get('CACHE_MAX_ENTRIES', 512))
+    if backend == 'sqlite':
+        path = config.get('CACHE_SQLITE_PATH') or os.path.join('instance', 'cache.sqlite')
+        return SQLiteCache(path, max_entries=max_entries)
+    if backend == 'memory':
+        return MemoryCache(max_entries=max_entries)
+    raise ValueError(f'Unknown CACHE_BACKEND: {backend}')
+
+def get_cache():
+    """backend ของแอปปัจจุบัน (สร้างครั้งแรกที่เรียก) หรือ None เมื่ออยู่นอก app context"""
+    if not has_app_context():
+        return None
+    cache = current_app.extensions.get('response_cache')
+    if cache is None:
+        cache = current_app.extensions['response_cache'] = create_cache(current_app.config)
+    return cache
+
+def tagged_key(cache, key, tags):
+    """ผูก key กับ generation ปัจจุบันของแต่ละ tag"""
+    if not tags:
+        return key
+    stamp = '.'.join(str(g) for g in cache.generations(list(tags)))
+    return f'{key}@{stamp}'
+
+def invalidate(*tags):
+    """ล้างแคชทุก entry ที่ขึ้นกับ tag เหล่านี้"""
+    cache = get_cache()
+    if cache is None or not tags:
+        return
+    try:
+        cache.bump(*tags)
+    except Exception as e:
+        current_app.logger.error(f"Cache invalidation error ({', '.join(tags)}): {e}")
+
+# ----- invalidation หลัง commit ตาม model ที่ถูกเขียน -----
+_MODEL_TAGS = {}
+
+def invalidate_on_commit(model, *tags):
+    """เมื่อ model ถูกเพิ่ม/แก้/ลบ แล้ว commit สำเร็จ ให้ invalidate(*tags)"""
+    _MODEL_TAGS.setdefault(model, set()).update(tags)
+
+def invalidate_models_on_commit(session, *models):
+    """เหมือน invalidate_on_commit สำหรับการแก้ด้วย Core UPDATE/INSERT ที่ไม่ผ่าน flush"""
+    pending = session.info.setdefault('cache_tags', set())
+    for model in models:
+        pending.update(_MODEL_TAGS.get(model, ()))
+
+@event.listens_for(Session, 'after_flush')
+def _collect_tags(session, flush_context):
+    if not _MODEL_TAGS:
+        return
+    pending = session.info.setdefault('cache_tags', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        pending.update(_MODEL_TAGS.get(type(obj), ()))
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    if session.in_nested_transaction():
+        # release savepoint - รอ commit จริง
+        return
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        invalidate(*sorted(tags))
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_tags(session):
+    if not session.in_nested_transaction():
+        session.info.pop('cache_tags', None)
+
+# ----- settings -----
+class SettingsCache:
+    """แคช settings ทั้งตารางต่อแอป: โหลดครั้งเดียว decode ครั้งเดียว
+
+    load_all() -> {key: value ที่ decode แล้ว}
+    load_version() -> ค่า stamp ที่เปลี่ยนเมื่อมีการแก้ settings (เช่น count + max(updated_at))
+    process อื่นที่แก้ settings จะเปลี่ยน stamp ซึ่งถูกตรวจทุก SETTINGS_CACHE_CHECK_SECONDS
+    """
+
+    def __init__(self, name, load_all, load_version, check_interval=5):
+        self.name = name
+        self.load_all = load_all
+        self.load_version = load_version
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+
+    def _state(self):
+        key = f'settings_cache.{self.name}'
+        state = current_app.extensions.get(key)
+        if state is None:
+            state = current_app.extensions[key] = {'values': None, 'version': None, 'checked': 0.0}
+        return state
+
+    def values(self):
+        state = self._state()
+        interval = current_app.config.get('SETTINGS_CACHE_CHECK_SECONDS', self.check_interval)
+        if state['values'] is not None and time.monotonic() - state['checked'] < interval:
+            return state['values']
+        with self._lock:
+            version = self.load_version()
+            if state['values'] is None or version != state['version']:
+                state['values'] = self.load_all()
+                state['version'] = version
+            state['checked'] = time.monotonic()
+        return state['values']
+
+    def get(self, key, default=None):
+        values = self.values()
+        if key not in values:
+            return default
+        value = values[key]
+        return copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+
+    def invalidate(self):
+        """ล้างค่าใน process นี้ (เรียกหลัง commit การแก้ settings)"""
+        if has_app_context():
+            self._state()['values'] = None
+
+__all__ = [
+    'MemoryCache', 'SQLiteCache', 'create_cache', 'get_cache', 'tagged_key',
+    'invalidate', 'invalidate_on_commit', 'invalidate_models_on_commit', 'SettingsCache'
+]
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Product Catalog Index - ดัชนีสินค้าในหน่วยความจำสำหรับค้นหา/สแกนบาร์โค้ดที่ POS
+
+โครงสร้างต่อ process:
+    barcode / sku    dict ค้นหาตรงตัว
+    trigram          n-gram (3 ตัวอักษร) ของชื่อ / sku / barcode -> id (ค้นส่วนใดของคำก็ได้ รวมภาษาไทย)
+    prefix           list ที่เรียงไว้ของ (คำ, id) ใช้ bisect กับคำค้นสั้นกว่า 3 ตัวอักษร
+    category         id ของสินค้าแยกตามหมวดหมู่
+
+โหลดครั้งแรกด้วย select เฉพาะคอลัมน์ แล้วคงความสดด้วย version stamp ใน stat_counter
+(utils.counters.bump_version) ซึ่งเพิ่มขึ้นใน transaction เดียวกับการแก้สินค้า / สต็อก
+แต่ละ process ตรวจ stamp อย่างมากทุก CATALOG_CHECK_SECONDS และโหลดเฉพาะแถวที่
+updated_at เปลี่ยน - การค้นหาและสแกนจึงไม่แตะฐานข้อมูล
+"""
+
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from utils.counters import bump_version, read_version
+
+VERSION_NAME = 'catalog'
+GRAM = 3
+# ช่วงเวลาที่โหลดซ้ำย้อนหลัง กัน transaction ที่ commit ช้ากว่าเวลาใน updated_at
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+FIELDS = (
+    'id', 'name', 'sku', 'barcode', 'price', 'cost', 'stock_quantity', 'category',
+    'is_service', 'is_active', 'image_url', 'updated_at'
+)
+
+def _grams(text):
+    return {text[i:i + GRAM] for i in range(len(text) - GRAM + 1)}
+
+def _keys(record):
+    """ข้อความที่ค้นได้ของสินค้า (ตัวพิมพ์เล็ก): ชื่อ, sku, barcode"""
+    return tuple((value or '').lower() for value in (record['name'], record['sku'], record['barcode']))
+
+class _Index:
+    """ดัชนีหนึ่งชุด - อ่าน/แก้ภายใต้ lock ของ ProductCatalog เท่านั้น"""
+
+    def __init__(self):
+        self.products = {}
+        self.keys = {}
+        self.barcode = {}
+        self.sku = {}
+        self.trigram = {}
+        self.prefix = []
+        self.names = []
+        self.category = {}
+        self.watermark = None
+        self._order = None
+        self._sorted = {}
+
+    @classmethod
+    def build(cls, records):
+        index = cls()
+        for record in records:
+            index.add(record, sort=False)
+        index.prefix.sort()
+        index.names.sort()
+        return index
+
+    def add(self, record, sort=True):
+        product_id = record['id']
+        self.discard(product_id)
+        keys = _keys(record)
+        self.products[product_id] = record
+        self.keys[product_id] = keys
+        if record['barcode']:
+            self.barcode[record['barcode']] = product_id
+        if record['sku']:
+            self.sku[keys[1]] = product_id
+        append = (lambda items, item: insort(items, item)) if sort else (lambda items, item: items.append(item))
+        append(self.names, (keys[0], product_id))
+        for key in set(filter(None, keys)):
+            append(self.prefix, (key, product_id))
+            for gram in _grams(key):
+                self.trigram.setdefault(gram, set()).add(product_id)
+        self.category.setdefault(record['category'], set()).add(product_id)
+        if record['updated_at'] and (self.watermark is None or record['updated_at'] > self.watermark):
+            self.watermark = record['updated_at']
+        self._order = None
+        self._sorted = {}
+
+    def discard(self, product_id):
+        record = self.products.pop(product_id, None)
+        if record is None:
+            return
+        keys = self.keys.pop(product_id)
+        if record['barcode'] and self.barcode.get(record['barcode']) == product_id:
+            del self.barcode[record['barcode']]
+        if record['sku'] and self.sku.get(keys[1]) == product_id:
+            del self.sku[keys[1]]
+        _remove(self.names, (keys[0], product_id))
+        for key in set(filter(None, keys)):
+            _remove(self.prefix, (key, product_id))
+            for gram in _grams(key):
+                ids = self.trigram.get(gram)
+                if ids is not None:
+                    ids.discard(product_id)
+                    if not ids:
+                        del self.trigram[gram]
+        bucket = self.category.get(record['category'])
+        if bucket is not None:
+            bucket.discard(product_id)
+        self._order = None
+        self._sorted = {}
+
+    def order(self):
+        """{id: ลำดับตามชื่อ} (คำนวณใหม่หลังมีการแก้)"""
+        if self._order is None:
+            self._order = {product_id: position for position, (_, product_id) in enumerate(self.names)}
+        return self._order
+
+    def candidates(self, text):
+        """id ที่อาจตรงกับ text เรียงตามชื่อ (ต้องตรวจ substring ซ้ำ) - คำค้นตั้งแต่ 3 ตัวอักษร
+
+        ใช้ trigram ที่มีสินค้าน้อยที่สุด แล้วเดินตามลำดับชื่อจนได้ครบ limit
+        """
+        smallest = None
+        for gram in _grams(text):
+            ids = self.trigram.get(gram)
+            if not ids:
+                return []
+            if smallest is None or len(ids) < len(self.trigram[smallest]):
+                smallest = gram
+        if smallest is None:
+            return []
+        return self.ordered(('gram', smallest), self.trigram[smallest])
+
+    def ordered(self, key, ids):
+        """ids เรียงตามชื่อ (แคชไว้จนกว่าดัชนีจะเปลี่ยน)"""
+        cached = self._sorted.get(key)
+        if cached is None:
+            cached = self._sorted[key] = sorted(ids, key=self.order().__getitem__)
+        return cached
+
+    def prefixed(self, text):
+        """id ที่ชื่อ / sku / barcode ขึ้นต้นด้วย text (คำค้นสั้น)"""
+        return [product_id for _, product_id in _prefixed(self.prefix, text)]
+
+    def name_prefixed(self, text):
+        """id ที่ชื่อขึ้นต้นด้วย text เรียงตามชื่อ"""
+        return [product_id for _, product_id in _prefixed(self.names, text)]
+
+def _remove(items, item):
+    position = bisect_left(items, item)
+    if position < len(items) and items[position] == item:
+        del items[position]
+
+def _prefixed(items, text):
+    """ช่วงของ list ที่เรียงไว้ซึ่ง key ขึ้นต้นด้วย text (bisect สองด้าน)"""
+    return items[bisect_left(items, (text,)):bisect_left(items, (text + '\U0010ffff',))]
+
+class ProductCatalog:
+    """ดัชนีสินค้าต่อแอป เก็บใน current_app.extensions['catalog.<name>']
+
+    get_session: callable ที่คืน session ของแอป (เช่น lambda: db.session)
+    """
+
+    def __init__(self, model, counter_model, get_session, name='products', check_interval=2):
+        self.model = model
+        self.counter_model = counter_model
+        self.get_session = get_session
+        self.name = name
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        event.listen(Session, 'after_flush', self._bump_on_flush)
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_rollback', self._after_rollback)
+
+    # ----- version stamp -----
+    def _bump_on_flush(self, session, flush_context):
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            if type(obj) is self.model:
+                bump_version(session.connection(), self.counter_model, VERSION_NAME)
+                session.info['catalog_changed'] = True
+                return
+
+    def _after_commit(self, session):
+        # process นี้เห็นการแก้ของตัวเองทันที ไม่ต้องรอรอบตรวจ (release savepoint ไม่นับ)
+        if session.in_nested_transaction():
+            return
+        if session.info.pop('catalog_changed', False) and has_app_context():
+            self.invalidate()
+
+    def _after_rollback(self, session):
+        if not session.in_nested_transaction():
+            session.info.pop('catalog_changed', None)
+
+    def touch(self, session):
+        """เรียกหลังแก้ตาราง product ด้วย Core UPDATE/DELETE (ไม่ผ่าน ORM flush)"""
+        bump_version(session.connection(), self.counter_model, VERSION_NAME)
+        session.info['catalog_changed'] = True
+
+    # ----- state -----
+    def _state(self):
+        key = f'catalog.{self.name}'
+        state = current_app.extensions.get(key)
+        if state is None:
+            state = current_app.extensions[key] = {'index': None, 'version': None, 'checked': 0.0}
+        return state
+
+    def _columns(self):
+        return [getattr(self.model, field) for field in FIELDS]
+
+    def _load(self, session, since=None):
+        stmt = select(*self._columns())
+        if since is not None:
+            stmt = stmt.where(self.model.updated_at >= since - REFRESH_OVERLAP)
+        return [dict(zip(FIELDS, row)) for row in session.execute(stmt.execution_options(yield_per=2000))]
+
+    def refresh(self, session=None, full=False):
+        """โหลดดัชนีใหม่ (full) หรือเฉพาะแถวที่เปลี่ยนตั้งแต่ครั้งก่อน"""
+        session = session or self.get_session()
+        state = self._state()
+        # อ่านจากฐานข้อมูลนอก lock - lock เฉพาะตอนแก้ดัชนี
+        version = read_version(session, self.counter_model, VERSION_NAME)
+        index = state['index']
+        if not full and index is not None:
+            changed = self._load(session, index.watermark)
+            total = session.scalar(select(func.count()).select_from(self.model))
+            with self._lock:
+                for record in changed:
+                    index.add(record)
+                # มีการลบสินค้า - จำนวนไม่ตรง ให้โหลดใหม่ทั้งหมด
+                full = total != len(index.products)
+        if full or index is None:
+            index = _Index.build(self._load(session))
+        with self._lock:
+            state.update(index=index, version=version, checked=time.monotonic())
+        return index
+
+    def index(self):
+        """ดัชนีปัจจุบัน - ตรวจ version stamp อย่างมากทุก CATALOG_CHECK_SECONDS"""
+        state = self._state()
+        interval = current_app.config.get('CATALOG_CHECK_SECONDS', self.check_interval)
+        if state['index'] is not None and time.monotonic() - state['checked'] < interval:
+            return state['index']
+        if state['index'] is None:
+            return self.refresh()
+        version = read_version(self.get_session(), self.counter_model, VERSION_NAME)
+        if version != state['version']:
+            return self.refresh()
+        state['checked'] = time.monotonic()
+        return state['index']
+
+    def invalidate(self):
+        """บังคับตรวจ version ในการเรียกครั้งถัดไป"""
+        self._state()['checked'] = 0.0
+
+    def init_app(self, app):
+        """สร้างดัชนีตอนเริ่มแอป (ถ้าตารางยังไม่มีจะสร้างเมื่อใช้งานครั้งแรก)"""
+        with app.app_context():
+            try:
+                self.refresh()
+            except Exception as e:
+                app.logger.warning(f'Product catalog warm-up skipped: {e}')
+
+    # ----- lookup -----
+    def scan(self, code):
+        """สินค้าจากบาร์โค้ดหรือ SKU (ตรงตัว) หรือ None"""
+        index = self.index()
+        code = (code or '').strip()
+        with self._lock:
+            product_id = index.barcode.get(code) or index.sku.get(code.lower())
+            return index.products.get(product_id)
+
+    def get(self, product_id):
+        index = self.index()
+        with self._lock:
+            return index.products.get(product_id)
+
+    def search(self, query='', category=None, limit=50, active_only=False, in_stock=False):
+        """ค้นหาสินค้า: รหัสตรงตัวมาก่อน แล้วชื่อที่ขึ้นต้นด้วยคำค้น แล้วที่เหลือ (เรียงตามชื่อ)"""
+        index = self.index()
+        text = (query or '').strip().lower()
+        with self._lock:
+            return self._match(index, text, category, limit, active_only, in_stock)
+
+    def _match(self, index, text, category, limit, active_only, in_stock):
+        bucket = index.category.get(category, set()) if category else None
+        short = 0 < len(text) < GRAM
+
+        def accept(product_id):
+            if bucket is not None and product_id not in bucket:
+                return False
+            record = index.products[product_id]
+            if active_only and not record['is_active']:
+                return False
+            if in_stock and (record['stock_quantity'] or 0) <= 0:
+                return False
+            if short:
+                return any(key.startswith(text) for key in index.keys[product_id])
+            return not text or any(text in key for key in index.keys[product_id])
+
+        picked, seen = [], set()
+
+        def take(product_ids):
+            for product_id in product_ids:
+                if len(picked) >= limit:
+                    return
+                if product_id not in seen and accept(product_id):
+                    seen.add(product_id)
+                    picked.append(product_id)
+
+        if text:
+            take([product_id for product_id in (index.barcode.get(text), index.sku.get(text)) if product_id])
+            take(index.name_prefixed(text))
+        if short:
+            # คำค้นสั้นกว่า trigram: เฉพาะที่ขึ้นต้นด้วยคำค้น
+            take(sorted(set(index.prefixed(text)), key=index.order().__getitem__))
+        elif text:
+            take(index.candidates(text))
+        elif bucket is not None:
+            take(index.ordered(('category', category), bucket))
+        else:
+            take(product_id for _, product_id in index.names)
+        return [index.products[product_id] for product_id in picked]
+
+    def categories(self):
+        index = self.index()
+        with self._lock:
+            return sorted(category for category, ids in index.category.items() if category and ids)
+
+__all__ = ['ProductCatalog', 'FIELDS', 'VERSION_NAME']
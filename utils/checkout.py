@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Checkout Service - ตัดสต็อกและบันทึกรายการขายโดยไม่ต้อง query ทีละบรรทัด
+
+ขั้นตอนต่อการขายหนึ่งครั้ง:
+    1. prepare()  โหลดสินค้าทุกบรรทัดของตะกร้าด้วย SELECT ... WHERE id IN (...) ครั้งเดียว
+    2. complete() ตัดสต็อกด้วย UPDATE แบบมีเงื่อนไขต่อสินค้า
+                      UPDATE product SET stock = stock - :q WHERE id = :id AND stock >= :q
+                  แถวที่ UPDATE ไม่ได้ (rowcount = 0) คือสต็อกไม่พอ -> StockShortage
+                  จากนั้น insert SaleItem / StockMovement แบบ executemany
+
+การเช็คสต็อกอยู่ใน UPDATE เดียวกับการตัด สองเครื่องขายสินค้าชิ้นเดียวกันพร้อมกัน
+จึงไม่เกิด lost update หรือขายเกินสต็อก ผู้เรียกต้อง rollback เมื่อเกิด CheckoutError
+
+การแก้ด้วย Core ไม่ผ่าน ORM flush จึงแจ้ง rollup (utils.rollups), cache tag
+(utils.cache) และ on_stock_change (เช่น product_catalog.touch) เอง
+"""
+
+from collections import namedtuple
+from sqlalchemy import insert, select, update
+from utils.cache import invalidate_models_on_commit
+from utils.rollups import record_bulk_items
+
+CartLine = namedtuple('CartLine', 'product quantity unit_price total_price')
+
+class CheckoutError(ValueError):
+    """ข้อมูลตะกร้าไม่ถูกต้อง (ข้อความแสดงต่อผู้ใช้ได้)"""
+
+class StockShortage(CheckoutError):
+    """สต็อกไม่พอ - shortages: list ของ {product_id, name, requested, available}"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        details = ', '.join(
+            f"{item['name']} (เหลือ {item['available']}, ต้องการ {item['requested']})" for item in shortages
+        )
+        super().__init__(f'สต็อกไม่เพียงพอ: {details}')
+
+class CheckoutService:
+    """ตัดสต็อก / บันทึกการขายของหนึ่ง schema
+
+    item_row(sale, line) -> dict ของคอลัมน์ SaleItem (ไม่ต้องใส่ sale_id / product_id / quantity)
+    movement_row(sale, line) -> dict ของ StockMovement (ถ้ามี movement_model)
+    on_stock_change(session) เรียกหลังตัดสต็อก เช่น product_catalog.touch
+    """
+
+    def __init__(self, product_model, item_model, item_row, stock_attr='stock_quantity',
+                 price_attr='price', movement_model=None, movement_row=None, on_stock_change=None):
+        self.product_model = product_model
+        self.item_model = item_model
+        self.item_row = item_row
+        self.stock_attr = stock_attr
+        self.price_attr = price_attr
+        self.movement_model = movement_model
+        self.movement_row = movement_row
+        self.on_stock_change = on_stock_change
+
+    def prepare(self, session, items, id_key='product_id', quantity_key='quantity', price_key=None):
+        """ตรวจตะกร้าและโหลดสินค้าทั้งหมดใน query เดียว -> list ของ CartLine
+
+        price_key: ชื่อ field ราคาต่อหน่วยใน items (ไม่มี = ใช้ราคาสินค้า)
+        """
+        parsed = []
+        for item in items:
+            try:
+                product_id, quantity = int(item[id_key]), int(item[quantity_key])
+            except (KeyError, TypeError, ValueError):
+                raise CheckoutError('ข้อมูลสินค้าในตะกร้าไม่ถูกต้อง')
+            if quantity <= 0:
+                raise CheckoutError(f'จำนวนสินค้าไม่ถูกต้อง ID: {product_id}')
+            parsed.append((product_id, quantity, item.get(price_key) if price_key else None))
+
+        model = self.product_model
+        ids = {product_id for product_id, _, _ in parsed}
+        products = {product.id: product for product in session.scalars(select(model).where(model.id.in_(ids)))}
+        missing = sorted(ids - set(products))
+        if missing:
+            raise CheckoutError(f'ไม่พบสินค้า ID: {", ".join(map(str, missing))}')
+
+        lines = []
+        for product_id, quantity, price in parsed:
+            product = products[product_id]
+            unit_price = float(price if price not in (None, '') else getattr(product, self.price_attr) or 0)
+            lines.append(CartLine(product, quantity, unit_price, unit_price * quantity))
+        return lines
+
+    def decrement_stock(self, session, lines):
+        """ตัดสต็อกแบบมีเงื่อนไข - สต็อกไม่พอแม้บรรทัดเดียวจะ raise StockShortage (ผู้เรียก rollback)"""
+        requested = {}
+        for line in lines:
+            requested[line.product.id] = requested.get(line.product.id, 0) + line.quantity
+
+        table = self.product_model.__table__
+        stock = table.c[self.stock_attr]
+        failed = []
+        # updated_at (onupdate ของคอลัมน์) ถูกตั้งโดย Core ให้ utils.catalog เห็นแถวที่เปลี่ยน
+        # เรียงตาม id ให้ทุก transaction ล็อกแถวตามลำดับเดียวกัน (กัน deadlock บน PostgreSQL)
+        for product_id in sorted(requested):
+            quantity = requested[product_id]
+            result = session.execute(
+                update(table).where(table.c.id == product_id, stock >= quantity)
+                .values({self.stock_attr: stock - quantity})
+            )
+            if result.rowcount == 0:
+                failed.append(product_id)
+
+        if failed:
+            available = dict(session.execute(select(table.c.id, stock).where(table.c.id.in_(failed))).all())
+            names = {line.product.id: line.product.name for line in lines}
+            raise StockShortage([{
+                'product_id': product_id,
+                'name': names[product_id],
+                'requested': requested[product_id],
+                'available': available.get(product_id) or 0,
+            } for product_id in failed])
+
+        # object ที่โหลดไว้ยังถือค่าสต็อกเดิม
+        for line in lines:
+            session.expire(line.product, [self.stock_attr])
+        invalidate_models_on_commit(session, self.product_model)
+        if self.on_stock_change:
+            self.on_stock_change(session)
+
+    def complete(self, session, sale, lines):
+        """ตัดสต็อก, บันทึก sale แล้ว insert รายการขาย / stock movement แบบ bulk"""
+        self.decrement_stock(session, lines)
+        session.add(sale)
+        session.flush()
+
+        items = [{
+            **self.item_row(sale, line),
+            'sale_id': sale.id,
+            'product_id': line.product.id,
+            'quantity': line.quantity,
+        } for line in lines]
+        session.execute(insert(self.item_model), items)
+        record_bulk_items(session, self.item_model, sale, items)
+        invalidate_models_on_commit(session, self.item_model)
+
+        if self.movement_model is not None:
+            session.execute(insert(self.movement_model), [{
+                'product_id': line.product.id,
+                **self.movement_row(sale, line),
+            } for line in lines])
+        return sale
+
+__all__ = ['CartLine', 'CheckoutError', 'StockShortage', 'CheckoutService']
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Materialized Counters - ตัวนับสถิติที่อัพเดตใน transaction เดียวกับการเขียนข้อมูล
+
+แต่ละ schema (models.py, app.py, comphone) มีตาราง counter ของตัวเอง
+แล้วลงทะเบียน model ที่ต้องการนับผ่าน track_sales() / track_status()
+ตัว listener after_flush จะคำนวณ delta จาก session.new / dirty / deleted
+แล้วเขียนลงตาราง counter ผ่าน connection เดียวกันกับ flush นั้น
+"""
+
+import enum
+from collections import defaultdict
+from datetime import datetime, timezone
+from sqlalchemy import event, inspect, select, update, insert, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from utils.dateranges import to_local_date
+
+# Marker key - มีค่าเมื่อ rebuild แล้วอย่างน้อยหนึ่งครั้ง (ก่อนหน้านั้น counter ยังเชื่อไม่ได้)
+BUILT_AT_KEY = 'counters.built_at'
+# Version stamp (ดู bump_version) - ไม่ได้คำนวณจาก source tables จึงไม่ถูก verify / rebuild
+VERSION_PREFIX = 'version.'
+# ลำดับเลขที่เอกสาร (utils.sequences) - ไม่ใช่ค่าที่คำนวณจาก source tables
+SEQUENCE_PREFIX = 'sequence.'
+# marker ของตาราง rollup (utils.rollups) - ไม่ใช่ค่าที่คำนวณจาก source tables
+ROLLUP_PREFIX = 'rollup.'
+
+_SPECS = {}
+
+_DIALECT_INSERTS = {'sqlite': sqlite_insert, 'postgresql': postgresql_insert}
+
+class _SalesSpec:
+    def __init__(self, counter_model, prefix, amount_attr, timestamp_attr):
+        self.counter_model = counter_model
+        self.prefix = prefix
+        self.amount_attr = amount_attr
+        self.timestamp_attr = timestamp_attr
+
+    def keys_for(self, timestamp):
+        day, month = period_keys(timestamp)
+        return (
+            f'{self.prefix}.count', f'{self.prefix}.revenue',
+            f'{self.prefix}.count:day:{day}', f'{self.prefix}.revenue:day:{day}',
+            f'{self.prefix}.count:month:{month}', f'{self.prefix}.revenue:month:{month}',
+        )
+
+    def deltas(self, obj, sign, deltas):
+        amount = float(getattr(obj, self.amount_attr) or 0)
+        count_all, rev_all, count_day, rev_day, count_month, rev_month = self.keys_for(
+            getattr(obj, self.timestamp_attr)
+        )
+        for key in (count_all, count_day, count_month):
+            deltas[key] += sign
+        for key in (rev_all, rev_day, rev_month):
+            deltas[key] += sign * amount
+
+    def changed(self, obj, deltas):
+        history = inspect(obj).attrs[self.amount_attr].history
+        if not history.has_changes():
+            return
+        old = float(history.deleted[0] or 0) if history.deleted else 0.0
+        new = float(history.added[0] or 0) if history.added else 0.0
+        _, rev_all, _, rev_day, _, rev_month = self.keys_for(getattr(obj, self.timestamp_attr))
+        for key in (rev_all, rev_day, rev_month):
+            deltas[key] += new - old
+
+class _StatusSpec:
+    def __init__(self, counter_model, prefix, status_attr):
+        self.counter_model = counter_model
+        self.prefix = prefix
+        self.status_attr = status_attr
+
+    def status_key(self, status):
+        if isinstance(status, enum.Enum):
+            status = status.value
+        return f'{self.prefix}.status:{status}'
+
+    def deltas(self, obj, sign, deltas):
+        deltas[f'{self.prefix}.count'] += sign
+        deltas[self.status_key(getattr(obj, self.status_attr))] += sign
+
+    def changed(self, obj, deltas):
+        history = inspect(obj).attrs[self.status_attr].history
+        if not history.has_changes() or not history.deleted:
+            return
+        old, new = history.deleted[0], history.added[0] if history.added else None
+        if old == new:
+            return
+        deltas[self.status_key(old)] -= 1
+        deltas[self.status_key(new)] += 1
+
+def bucket_date(timestamp):
+    """วันที่ท้องถิ่น (เขตเวลาของร้าน) ที่ใช้แบ่ง bucket รายวันของ counter และ rollup"""
+    return to_local_date(timestamp)
+
+def period_keys(timestamp):
+    """คืนค่า (day, month) สำหรับแบ่ง bucket ของ counter"""
+    day = bucket_date(timestamp)
+    return day.strftime('%Y-%m-%d'), day.strftime('%Y-%m')
+
+def track_sales(model, counter_model, prefix='sales', amount_attr='total_amount',
+                timestamp_attr='created_at'):
+    """นับจำนวนและยอดขาย (รวม / รายวัน / รายเดือน) ของ model"""
+    _SPECS[model] = _SalesSpec(counter_model, prefix, amount_attr, timestamp_attr)
+
+def track_status(model, counter_model, prefix, status_attr='status'):
+    """นับจำนวนทั้งหมดและจำนวนแยกตามสถานะของ model"""
+    _SPECS[model] = _StatusSpec(counter_model, prefix, status_attr)
+
+def increment_row(connection, table, keys, increments):
+    """col = col + delta ของแถว keys (สร้างแถวถ้ายังไม่มี) - keys ต้องเป็น unique key ของ table
+
+    SQLite / PostgreSQL / MySQL ใช้ upsert ของ dialect ใน statement เดียว
+    จึงไม่ชนกันเมื่อสอง transaction สร้างแถวแรกของ key เดียวกันพร้อมกัน
+    """
+    now = datetime.now(timezone.utc)
+    row = {'updated_at': now, **keys, **increments}
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        upsert = _DIALECT_INSERTS[dialect](table).values(**row)
+        connection.execute(upsert.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={'updated_at': upsert.excluded.updated_at,
+                  **{name: table.c[name] + upsert.excluded[name] for name in increments}}
+        ))
+        return
+    if dialect in ('mysql', 'mariadb'):
+        upsert = mysql_insert(table).values(**row)
+        connection.execute(upsert.on_duplicate_key_update(
+            updated_at=upsert.inserted.updated_at,
+            **{name: table.c[name] + upsert.inserted[name] for name in increments}
+        ))
+        return
+
+    where = [table.c[name] == value for name, value in keys.items()]
+    values = {name: table.c[name] + delta for name, delta in increments.items()}
+    if connection.execute(update(table).where(*where).values(updated_at=now, **values)).rowcount:
+        return
+    try:
+        # อีก transaction อาจ INSERT แถวเดียวกันไปก่อน - ชนแล้ว UPDATE ซ้ำ (แบบเดียวกับ utils.sequences)
+        with connection.begin_nested():
+            connection.execute(insert(table).values(**row))
+    except IntegrityError:
+        connection.execute(update(table).where(*where).values(updated_at=now, **values))
+
+def apply_deltas(connection, counter_model, deltas):
+    """Upsert counter rows: value = value + delta"""
+    table = counter_model.__table__
+    for key, delta in deltas.items():
+        if delta:
+            increment_row(connection, table, {'key': key}, {'value': delta})
+
+@event.listens_for(Session, 'after_flush')
+def _update_counters(session, flush_context):
+    if not _SPECS:
+        return
+    pending = defaultdict(lambda: defaultdict(float))
+    for objects, sign in ((session.new, 1), (session.deleted, -1)):
+        for obj in objects:
+            spec = _SPECS.get(type(obj))
+            if spec:
+                spec.deltas(obj, sign, pending[spec.counter_model])
+    for obj in session.dirty:
+        spec = _SPECS.get(type(obj))
+        if spec and obj not in session.deleted:
+            spec.changed(obj, pending[spec.counter_model])
+    for counter_model, deltas in pending.items():
+        apply_deltas(session.connection(), counter_model, deltas)
+
+def bump_version(connection, counter_model, name):
+    """เพิ่ม version stamp ของ name (เช่น 'catalog') ใน transaction ปัจจุบัน"""
+    apply_deltas(connection, counter_model, {VERSION_PREFIX + name: 1})
+
+def read_version(session, counter_model, name):
+    """ค่า version stamp ปัจจุบันของ name (0 ถ้ายังไม่เคย bump)"""
+    return session.scalar(
+        select(counter_model.value).where(counter_model.key == VERSION_PREFIX + name)
+    ) or 0
+
+def read_counters(session, counter_model, keys):
+    """อ่าน counter หลาย key ใน query เดียว -> {key: value} (key ที่ไม่มีได้ 0)"""
+    keys = list(keys)
+    rows = session.execute(
+        select(counter_model.key, counter_model.value).where(counter_model.key.in_(keys))
+    ).all()
+    values = dict.fromkeys(keys, 0)
+    values.update({key: value for key, value in rows})
+    return values
+
+def counters_ready(session, counter_model):
+    """True เมื่อเคย rebuild แล้ว (counter เชื่อถือได้)"""
+    return session.scalar(
+        select(counter_model.id).where(counter_model.key == BUILT_AT_KEY)
+    ) is not None
+
+def compute_counters(session, counter_model):
+    """คำนวณค่า counter ที่ถูกต้องจาก source tables (ใช้ตอน rebuild / verify)"""
+    target = defaultdict(float)
+    for model, spec in _SPECS.items():
+        if spec.counter_model is not counter_model:
+            continue
+        if isinstance(spec, _SalesSpec):
+            rows = session.execute(
+                select(getattr(model, spec.timestamp_attr), getattr(model, spec.amount_attr))
+                .execution_options(yield_per=1000)
+            )
+            for timestamp, amount in rows:
+                count_all, rev_all, count_day, rev_day, count_month, rev_month = spec.keys_for(timestamp)
+                for key in (count_all, count_day, count_month):
+                    target[key] += 1
+                for key in (rev_all, rev_day, rev_month):
+                    target[key] += float(amount or 0)
+        else:
+            status_col = getattr(model, spec.status_attr)
+            target[f'{spec.prefix}.count'] += 0
+            for status, count in session.execute(
+                select(status_col, func.count()).group_by(status_col)
+            ):
+                target[f'{spec.prefix}.count'] += count
+                target[spec.status_key(status)] += count
+    return target
+
+def verify_counters(session, counter_model):
+    """เทียบ counter กับ source tables -> list ของ (key, stored, expected) ที่ไม่ตรงกัน"""
+    expected = compute_counters(session, counter_model)
+    stored = dict(session.execute(
+        select(counter_model.key, counter_model.value).where(
+            counter_model.key != BUILT_AT_KEY, ~counter_model.key.startswith(VERSION_PREFIX),
+            ~counter_model.key.startswith(SEQUENCE_PREFIX), ~counter_model.key.startswith(ROLLUP_PREFIX)
+        )
+    ).all())
+    mismatches = []
+    for key in sorted(set(stored) | set(expected)):
+        have, want = stored.get(key, 0.0), expected.get(key, 0.0)
+        if abs((have or 0) - want) > 0.005:
+            mismatches.append((key, have, want))
+    return mismatches
+
+def rebuild_counters(session, counter_model):
+    """ลบแล้วสร้าง counter ใหม่ทั้งหมดจาก source tables (commit ใน transaction เดียว)"""
+    expected = compute_counters(session, counter_model)
+    now = datetime.now(timezone.utc)
+    table = counter_model.__table__
+    session.execute(table.delete().where(
+        ~table.c.key.startswith(VERSION_PREFIX), ~table.c.key.startswith(SEQUENCE_PREFIX),
+        ~table.c.key.startswith(ROLLUP_PREFIX)
+    ))
+    rows = [{'key': key, 'value': value, 'updated_at': now} for key, value in expected.items()]
+    rows.append({'key': BUILT_AT_KEY, 'value': now.timestamp(), 'updated_at': now})
+    session.execute(insert(table), rows)
+    session.commit()
+    return len(expected)
+
+__all__ = [
+    'BUILT_AT_KEY', 'VERSION_PREFIX', 'SEQUENCE_PREFIX', 'ROLLUP_PREFIX', 'bucket_date', 'period_keys',
+    'track_sales', 'track_status', 'increment_row', 'apply_deltas', 'bump_version', 'read_version',
+    'read_counters', 'counters_ready', 'compute_counters', 'verify_counters',
+    'rebuild_counters'
+]
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Date Ranges - ช่วงเวลาแบบ half-open [start, end) ตามเวลาท้องถิ่นของร้าน
+
+created_at ทุกตารางเก็บเป็นเวลา UTC (naive) ส่วน "วันนี้" / "เดือนนี้" ของร้าน
+เป็นวันตามเขตเวลา Asia/Bangkok (ค่า default_timezone ใน SystemSettings)
+ฟังก์ชันในโมดูลนี้แปลงวันที่ท้องถิ่นเป็นขอบเขต UTC เพื่อใช้กรอง
+
+    Sale.created_at >= start AND Sale.created_at < end
+
+ซึ่งใช้ index บน created_at ได้ ต่างจาก func.date(Sale.created_at) == today
+ที่ต้อง scan ทั้งตาราง (และตัดวันตาม UTC ไม่ใช่เวลาไทย)
+"""
+
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+from flask import current_app, has_app_context
+from sqlalchemy import and_
+
+DEFAULT_TIMEZONE = 'Asia/Bangkok'
+
+@lru_cache(maxsize=8)
+def _zone(name):
+    return ZoneInfo(name)
+
+def business_timezone():
+    """เขตเวลาของร้าน (config DEFAULT_TIMEZONE, ค่าเริ่มต้น Asia/Bangkok)"""
+    name = DEFAULT_TIMEZONE
+    if has_app_context():
+        name = current_app.config.get('DEFAULT_TIMEZONE') or DEFAULT_TIMEZONE
+    return _zone(name)
+
+def local_now():
+    """เวลาปัจจุบันตามเขตเวลาของร้าน (aware)"""
+    return datetime.now(business_timezone())
+
+def local_today():
+    """วันที่ปัจจุบันตามเขตเวลาของร้าน"""
+    return local_now().date()
+
+def to_local_date(timestamp):
+    """แปลง timestamp ที่เก็บใน DB (naive = UTC) เป็นวันที่ท้องถิ่น"""
+    if timestamp is None:
+        return local_today()
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(business_timezone()).date()
+
+def _utc_start_of(day):
+    """เที่ยงคืนท้องถิ่นของ day -> datetime UTC แบบ naive (รูปแบบเดียวกับที่เก็บใน DB)"""
+    local = datetime.combine(day, time.min, tzinfo=business_timezone())
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def date_bounds(start_date, end_date=None):
+    """วันที่ท้องถิ่น start_date..end_date (inclusive) -> (start, end) UTC แบบ half-open"""
+    start_date = _as_date(start_date)
+    end_date = _as_date(end_date) if end_date is not None else start_date
+    return _utc_start_of(start_date), _utc_start_of(end_date + timedelta(days=1))
+
+def day_bounds(day=None):
+    """ขอบเขตของวัน (ค่าเริ่มต้นวันนี้)"""
+    return date_bounds(day or local_today())
+
+def month_bounds(day=None):
+    """ขอบเขตของเดือนที่ day อยู่ (ค่าเริ่มต้นเดือนนี้)"""
+    day = _as_date(day or local_today())
+    first = day.replace(day=1)
+    next_month = (first + timedelta(days=32)).replace(day=1)
+    return _utc_start_of(first), _utc_start_of(next_month)
+
+def in_range(column, bounds):
+    """column >= start AND column < end (sargable)"""
+    start, end = bounds
+    return and_(column >= start, column < end)
+
+def in_dates(column, start_date, end_date=None):
+    """กรอง column ตามวันที่ท้องถิ่น start_date..end_date (inclusive)"""
+    return in_range(column, date_bounds(start_date, end_date))
+
+__all__ = [
+    'DEFAULT_TIMEZONE', 'business_timezone', 'local_now', 'local_today', 'to_local_date',
+    'date_bounds', 'day_bounds', 'month_bounds', 'in_range', 'in_dates'
+]
@@ -5,7 +5,7 @@ Custom Decorators - Role-based access control and utility decorators
 """
 
 from functools import wraps
-from flask import jsonify, redirect, url_for, flash, request, current_app, abort
+from flask import jsonify, redirect, url_for, flash, request, current_app, abort, make_response
 from flask_login import current_user
 from models import UserRole
 
@@ -196,26 +196,62 @@ def validate_form(form_class):
         return decorated_function
     return decorator
 
-def cache_response(timeout=300):
-    """Decorator to cache response for specified time"""
+def _cache_scope(scope):
+    """ส่วนของ cache key ที่แยกตามผู้ใช้ / role"""
+    if callable(scope):
+        return scope()
+    if scope == 'global':
+        return 'global'
+    if not current_user.is_authenticated:
+        return 'anonymous'
+    if scope == 'role':
+        return f"role:{getattr(current_user.role, 'value', current_user.role)}"
+    return f"user:{current_user.id}"
+
+def _is_error_payload(response):
+    payload = response.get_json(silent=True) if response.is_json else None
+    return isinstance(payload, dict) and (payload.get('success') is False or payload.get('status') == 'error')
+
+def cache_response(timeout=300, tags=(), scope='user'):
+    """Decorator to cache response for specified time
+
+    tags: ข้อมูลที่ response ขึ้นกับ ('sales', 'stock', 'jobs', ...) - ล้างด้วย utils.cache.invalidate()
+    scope: 'user', 'role', 'global' หรือ callable ที่คืนค่าส่วนของ key
+    """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            # Simple caching implementation
-            # In production, you would use Redis or similar
-            cache_key = f"{request.endpoint}:{request.args}"
+            from utils.cache import get_cache, tagged_key
             
-            # Check cache (pseudo-code)
-            # cached_response = cache.get(cache_key)
-            # if cached_response:
-            #     return cached_response
+            cache = get_cache()
+            if cache is None or request.method != 'GET' or current_app.config.get('CACHE_DISABLED'):
+                return f(*args, **kwargs)
             
-            result = f(*args, **kwargs)
+            try:
+                base_key = ':'.join([
+                    'view', request.endpoint, _cache_scope(scope),
+                    repr(sorted(kwargs.items())), repr(sorted(request.args.items(multi=True)))
+                ])
+                cache_key = tagged_key(cache, base_key, tags)
+                cached = cache.get(cache_key)
+            except Exception as e:
+                current_app.logger.error(f"Cache read error for {request.endpoint}: {e}")
+                return f(*args, **kwargs)
             
-            # Store in cache (pseudo-code)
-            # cache.set(cache_key, result, timeout=timeout)
+            if cached is not None:
+                body, status, mimetype = cached
+                return current_app.response_class(body, status=status, mimetype=mimetype)
             
-            return result
+            response = make_response(f(*args, **kwargs))
+            
+            # เก็บเฉพาะ response ที่สำเร็จ (บาง API ตอบ error ด้วย 200 + success: false)
+            if response.status_code == 200 and not response.direct_passthrough and not _is_error_payload(response):
+                try:
+                    cache.set(cache_key, (response.get_data(), response.status_code, response.mimetype), timeout)
+                except Exception as e:
+                    current_app.logger.error(f"Cache write error for {request.endpoint}: {e}")
+            
+            return response
         return decorated_function
     return decorator
 
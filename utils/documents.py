@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Document Rendering - สร้าง PDF (ใบเสร็จ / ใบเสนอราคา) ใน process pool พร้อมแคชบนดิสก์
+
+WeasyPrint ใช้ CPU หลายร้อย ms ต่อเอกสาร จึงย้ายออกจาก request thread:
+    - HTML ยัง render ด้วย Jinja ใน request (เร็ว) ส่วน HTML -> PDF ทำใน process pool
+      (spawn - fork จาก web server ที่มีหลาย thread ไม่ปลอดภัย)
+    - CSS ที่ใช้ร่วมกันถูก parse ครั้งเดียวต่อ worker process
+    - ไฟล์ PDF เก็บแบบ content-addressed: ชื่อไฟล์คือ sha256 ของ (ชนิด, id, HTML, CSS)
+      เอกสารที่ข้อมูลไม่เปลี่ยนจึงอ่านจากดิสก์ และใช้ hash เดียวกันเป็น ETag
+      (ตอบ 304 เมื่อ If-None-Match ตรง โดยไม่แตะดิสก์)
+    - prewarm() สั่ง render ล่วงหน้าโดยไม่รอ เช่นหลัง commit การขาย
+
+Config: DOCUMENT_CACHE_DIR (ค่าเริ่มต้น <instance>/documents), DOCUMENT_RENDER_WORKERS
+"""
+
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from flask import Response, current_app, request, send_file
+
+DOCUMENT_CSS = '''
+    @page { size: A4; margin: 1cm; }
+    body { font-family: 'TH Sarabun New', sans-serif; font-size: 10pt; }
+    table { width: 100%; border-collapse: collapse; margin-bottom: 10px; }
+    th, td { border: 1px solid #000; padding: 8px; text-align: left; }
+    th { background-color: #f2f2f2; }
+    .text-right { text-align: right; }
+    .text-center { text-align: center; }
+    .header, .footer { text-align: center; margin-bottom: 20px; }
+    .total { font-size: 12pt; font-weight: bold; }
+'''
+
+# ----- ทำงานใน worker process -----
+@lru_cache(maxsize=8)
+def _stylesheet(css):
+    from weasyprint import CSS
+    return CSS(string=css)
+
+def _render_to_file(html, base_url, css, path):
+    """HTML -> PDF แล้วเขียนลง path แบบ atomic (เขียนไฟล์ชั่วคราวแล้ว rename)"""
+    from weasyprint import HTML
+    pdf_bytes = HTML(string=html, base_url=base_url).write_pdf(stylesheets=[_stylesheet(css)])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+# ----- ฝั่ง web process -----
+class DocumentRenderer:
+    """Pool สร้าง PDF + แคชไฟล์ - หนึ่ง instance ต่อ process (pool สร้างเมื่อใช้ครั้งแรก)"""
+
+    def __init__(self, css=DOCUMENT_CSS, workers=2):
+        self.css = css
+        self.workers = workers
+        self._executor = None
+        self._inflight = {}
+        self._lock = threading.RLock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                workers = current_app.config.get('DOCUMENT_RENDER_WORKERS', self.workers)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def key(self, kind, ref_id, html):
+        """sha256 ของเนื้อหาเอกสาร - ใช้เป็นทั้งชื่อไฟล์และ ETag"""
+        digest = hashlib.sha256()
+        for part in (kind, str(ref_id), self.css, html):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def path(self, kind, key):
+        root = current_app.config.get('DOCUMENT_CACHE_DIR') or os.path.join(current_app.instance_path, 'documents')
+        return os.path.join(str(root), kind, key[:2], f'{key}.pdf')
+
+    def submit(self, kind, ref_id, html, base_url=None):
+        """เริ่ม render (ถ้ายังไม่มีไฟล์และยังไม่มีงานเดียวกันค้างอยู่) -> (key, future หรือ None)"""
+        key = self.key(kind, ref_id, html)
+        path = self.path(kind, key)
+        if os.path.exists(path):
+            return key, None
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = self._pool().submit(
+                    _render_to_file, html, base_url, self.css, path
+                )
+                future.add_done_callback(lambda done: self._inflight.pop(key, None))
+        return key, future
+
+    def render(self, kind, ref_id, html, base_url=None):
+        """path ของ PDF (รอ render ถ้ายังไม่มีในแคช) -> (path, etag)"""
+        key, future = self.submit(kind, ref_id, html, base_url)
+        if future is not None:
+            future.result()
+        return self.path(kind, key), key
+
+    def prewarm(self, kind, ref_id, html, base_url=None):
+        """สั่ง render ล่วงหน้าโดยไม่รอผล - error ถูก log ไว้ ไม่กระทบผู้เรียก"""
+        try:
+            _, future = self.submit(kind, ref_id, html, base_url)
+        except Exception as e:
+            current_app.logger.warning(f'Document prewarm failed for {kind} {ref_id}: {e}')
+            return
+        if future is None:
+            return
+        logger = current_app.logger
+
+        def report(done):
+            if done.exception() is not None:
+                logger.warning(f'Document prewarm failed for {kind} {ref_id}: {done.exception()}')
+        future.add_done_callback(report)
+
+    def response(self, kind, ref_id, html, download_name, base_url=None):
+        """ส่ง PDF พร้อม ETag - If-None-Match ตรงตอบ 304 โดยไม่ render / อ่านไฟล์"""
+        key = self.key(kind, ref_id, html)
+        if key in request.if_none_match:
+            response = Response(status=304)
+            response.set_etag(key)
+            return response
+        path, key = self.render(kind, ref_id, html, base_url or request.url_root)
+        response = send_file(path, mimetype='application/pdf', download_name=download_name,
+                             etag=key, conditional=True, max_age=0)
+        # ข้อมูลลูกค้า - ให้ browser ถามใหม่ทุกครั้งแต่ใช้ 304 ได้
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+documents = DocumentRenderer()
+
+__all__ = ['DOCUMENT_CSS', 'DocumentRenderer', 'documents']
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Engine Profile - ตั้งค่า engine ของฐานข้อมูลตาม config (Development / Production / Testing)
+
+เดิม SQLite ใช้ค่าเริ่มต้นทั้งหมด: rollback journal (ผู้เขียนบล็อกผู้อ่าน) และ fsync เต็มทุก commit
+ส่วน connect_args {'timeout': 20} ของ SQLite ก็ถูกส่งให้ PostgreSQL ด้วยเมื่อ DATABASE_URL ชี้ไปที่นั่น
+    - SQLite: ตั้ง PRAGMA ทุกครั้งที่เปิด connection - journal_mode (WAL), synchronous (NORMAL),
+      cache_size, mmap_size, temp_store, busy_timeout, foreign_keys
+    - PostgreSQL / MySQL: pool_size, max_overflow, pool_timeout, pool_recycle, pool_pre_ping
+    - SQLALCHEMY_ENGINE_OPTIONS ที่ตั้งเองใน config ยังมีผลเหนือค่าจาก profile
+
+ใช้ init_engine(app, db) แทน db.init_app(app)
+
+Config: SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE, SQLITE_TEMP_STORE,
+        SQLITE_BUSY_TIMEOUT_MS, SQLITE_FOREIGN_KEYS, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+        DB_POOL_RECYCLE
+"""
+
+import re
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# ค่าเริ่มต้นเมื่อ config ไม่ได้กำหนด (ตรงกับ Config ใน config.py)
+DEFAULTS = {
+    'SQLITE_JOURNAL_MODE': 'WAL',
+    'SQLITE_SYNCHRONOUS': 'NORMAL',
+    'SQLITE_CACHE_SIZE_KB': 65536,
+    'SQLITE_MMAP_SIZE': 268435456,
+    'SQLITE_TEMP_STORE': 'MEMORY',
+    'SQLITE_BUSY_TIMEOUT_MS': 20000,
+    'SQLITE_FOREIGN_KEYS': True,
+    'DB_POOL_SIZE': 5,
+    'DB_MAX_OVERFLOW': 10,
+    'DB_POOL_TIMEOUT': 30,
+    'DB_POOL_RECYCLE': 300,
+}
+
+_WORD = re.compile(r'^[A-Za-z]+$')
+
+def _setting(config, key, defaults=None):
+    if key in config:
+        return config[key]
+    if defaults is not None and hasattr(defaults, key):
+        return getattr(defaults, key)
+    return DEFAULTS[key]
+
+def _is_memory(url):
+    return url.database in (None, '', ':memory:') or 'mode=memory' in str(url)
+
+def sqlite_pragmas(config, defaults=None):
+    """[(ชื่อ, ค่า)] ตามลำดับที่ต้องตั้ง (busy_timeout ก่อน - journal_mode=WAL ต้องรอ lock ได้)"""
+    def word(key):
+        value = str(_setting(config, key, defaults)).upper()
+        if not _WORD.match(value):
+            raise ValueError(f'{key} must be a PRAGMA keyword, got {value!r}')
+        return value
+
+    return [
+        ('busy_timeout', int(_setting(config, 'SQLITE_BUSY_TIMEOUT_MS', defaults))),
+        ('journal_mode', word('SQLITE_JOURNAL_MODE')),
+        ('synchronous', word('SQLITE_SYNCHRONOUS')),
+        # ค่าติดลบ = KiB
+        ('cache_size', -abs(int(_setting(config, 'SQLITE_CACHE_SIZE_KB', defaults)))),
+        ('mmap_size', int(_setting(config, 'SQLITE_MMAP_SIZE', defaults))),
+        ('temp_store', word('SQLITE_TEMP_STORE')),
+        ('foreign_keys', 'ON' if _setting(config, 'SQLITE_FOREIGN_KEYS', defaults) else 'OFF'),
+    ]
+
+def engine_options(config, defaults=None):
+    """SQLALCHEMY_ENGINE_OPTIONS ตามชนิดฐานข้อมูลของ SQLALCHEMY_DATABASE_URI"""
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite':
+        options = {}
+        if not _is_memory(url):
+            options['connect_args'] = {'timeout': int(_setting(config, 'SQLITE_BUSY_TIMEOUT_MS', defaults)) / 1000}
+    else:
+        options = {
+            'pool_size': int(_setting(config, 'DB_POOL_SIZE', defaults)),
+            'max_overflow': int(_setting(config, 'DB_MAX_OVERFLOW', defaults)),
+            'pool_timeout': int(_setting(config, 'DB_POOL_TIMEOUT', defaults)),
+            'pool_recycle': int(_setting(config, 'DB_POOL_RECYCLE', defaults)),
+            'pool_pre_ping': True,
+        }
+
+    explicit = dict(config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if 'connect_args' in explicit and 'connect_args' in options:
+        explicit['connect_args'] = {**options['connect_args'], **explicit['connect_args']}
+    options.update(explicit)
+    return options
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """ตั้ง PRAGMA ทุก connection ใหม่ของ engine (ไม่ทำอะไรถ้าไม่ใช่ SQLite)"""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+def init_engine(app, db, defaults=None):
+    """db.init_app(app) พร้อม engine options / PRAGMA ตาม profile
+
+    defaults: class ของ config (เช่น config['production']) สำหรับค่าที่ app.config ไม่มี
+    """
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config, defaults)
+    pragmas = sqlite_pragmas(app.config, defaults)
+    db.init_app(app)
+    with app.app_context():
+        engines = getattr(db, 'engines', None) or {None: db.engine}
+        for engine in engines.values():
+            apply_sqlite_pragmas(engine, pragmas)
+    app.extensions['engine_profile'] = {'pragmas': dict(pragmas)}
+    return db
+
+__all__ = ['init_engine', 'engine_options', 'sqlite_pragmas', 'apply_sqlite_pragmas']
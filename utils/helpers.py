@@ -13,6 +13,7 @@ from flask import current_app, request, jsonify
 from flask_login import current_user
 from decimal import Decimal
 import re
+from utils.pagination import paginate_keyset
 
 def generate_receipt_number():
     """Generate unique receipt number"""
@@ -201,13 +202,9 @@ def get_time_ago(date):
     else:
         return 'เมื่อสักครู่'
 
-def paginate_query(query, page=1, per_page=20, error_out=False):
-    """Paginate SQLAlchemy query"""
-    return query.paginate(
-        page=page,
-        per_page=per_page,
-        error_out=error_out
-    )
+def paginate_query(query, cursor=None, per_page=20, order=None, count=None):
+    """Paginate SQLAlchemy query ด้วย cursor (utils.pagination) - order ว่าง = ใหม่ไปเก่าตาม primary key"""
+    return paginate_keyset(query, order or [], cursor=cursor, per_page=per_page, count=count)
 
 def get_or_404(model, id_value, error_message=None):
     """Get model instance or return 404"""
@@ -261,23 +258,13 @@ def next_business_day(date):
     return next_day
 
 def generate_barcode_data(text):
-    """Generate barcode data for display"""
+    """Generate barcode data for display (cached by utils.barcodes)"""
     import base64
-    import io
     
     try:
-        import qrcode
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(text)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        img_buffer = io.BytesIO()
-        img.save(img_buffer, format='PNG')
-        img_str = base64.b64encode(img_buffer.getvalue()).decode()
-        
-        return f'data:image/png;base64,{img_str}'
+        from utils.barcodes import barcodes
+        png, _ = barcodes.png(text)
+        return f'data:image/png;base64,{base64.b64encode(png).decode()}'
     except ImportError:
         return None
 
@@ -294,7 +281,7 @@ def clean_phone_number(phone):
         phone = '0' + phone[2:]
     elif phone.startswith('+66'):
         phone = '0' + phone[3:]
-    elif len(phone) == 9:
+    elif len(phone) == 9 and not phone.startswith('0'):
         phone = '0' + phone
     
     # Format as 0X-XXXX-XXXX
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LINE Outbox - ส่งข้อความ LINE แบบ async ผ่านตาราง outbox และ worker เบื้องหลัง
+
+เดิม push / reply เรียก LINE Messaging API ใน request (checkout, webhook) โดยตรง
+LINE ช้าหรือล่มเมื่อไร หน้าขายก็ช้าตามไปด้วย
+    - enqueue() / reply() เพิ่มแถวใน outbox ใน transaction เดียวกับข้อมูลธุรกิจ
+      (rollback = ไม่ส่ง, commit = ส่งแน่นอน) แล้วปลุก worker หลัง commit
+    - worker (thread ใน process หรือ `flask cli dispatch-line`) จองแถวที่ถึงเวลาด้วย claim token
+      หลาย process ทำงานพร้อมกันได้ แถวที่จองค้างเกิน LEASE_SECONDS ถูกจองใหม่ (process ตาย)
+    - ข้อความเดียวกันถึงผู้ใช้หลายคนรวมเป็น multicast (สูงสุด 500 คน)
+      ข้อความถึงผู้รับเดียวกันรวมเป็น push / reply ละไม่เกิน 5 ข้อความ
+      (ข้อความ multicast กับ push ของผู้รับคนเดียวกันในรอบเดียวกันอาจสลับลำดับได้)
+    - HTTP client ใช้ requests.Session (connection pool) ต่อแอป
+    - 429 / 5xx / เชื่อมต่อไม่ได้ -> ลองใหม่แบบ exponential backoff (เคารพ Retry-After)
+      4xx อื่น หรือครบ LINE_MAX_ATTEMPTS -> failed
+    - metrics() ตัวนับของ process + จำนวนแถวในคิวแยกตามสถานะ
+
+Config: LINE_CHANNEL_ACCESS_TOKEN, LINE_API_URL, LINE_DISPATCH_INTERVAL, LINE_DISPATCH_BATCH,
+        LINE_MAX_ATTEMPTS, LINE_RETRY_BASE_SECONDS, LINE_RETRY_MAX_SECONDS, LINE_HTTP_TIMEOUT
+"""
+
+import random
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime, timedelta, timezone
+import requests
+from flask import current_app
+from sqlalchemy import and_, event, func, or_, select, update
+from sqlalchemy.orm import Session
+
+LINE_API_URL = 'https://api.line.me'
+MULTICAST_LIMIT = 500
+MESSAGES_PER_REQUEST = 5
+LEASE_SECONDS = 120
+
+PENDING, SENDING, SENT, FAILED = 'pending', 'sending', 'sent', 'failed'
+
+_WAKE = 'line_outbox_wake'
+
+class LineSendError(Exception):
+    """ส่งไม่สำเร็จ - retryable: ลองใหม่ได้ (429 / 5xx / network), retry_after: วินาทีจาก Retry-After"""
+
+    def __init__(self, message, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+class LineClient:
+    """HTTP client ของ LINE Messaging API - requests.Session ถือ connection pool ไว้ใช้ซ้ำ"""
+
+    def __init__(self, access_token, base_url=LINE_API_URL, timeout=10, pool_size=4):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.http = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.http.mount('http://', adapter)
+        self.http.mount('https://', adapter)
+        self.http.headers.update({'Authorization': f'Bearer {access_token}'})
+
+    def post(self, path, payload):
+        """POST JSON - raise LineSendError เมื่อไม่ได้ 2xx"""
+        try:
+            response = self.http.post(self.base_url + path, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise LineSendError(f'{type(e).__name__}: {e}', retryable=True)
+        if response.status_code < 300:
+            return response
+        status = response.status_code
+        retry_after = response.headers.get('Retry-After')
+        raise LineSendError(
+            f'HTTP {status}: {response.text[:200]}',
+            retryable=status == 429 or status >= 500,
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+        )
+
+    def close(self):
+        self.http.close()
+
+def _chunks(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def _text_messages(rows):
+    return [{'type': 'text', 'text': row.text} for row in rows]
+
+def plan_requests(rows):
+    """จัดแถวที่จองได้เป็น request -> list ของ (path, payload, rows)"""
+    planned = []
+    replies = OrderedDict()
+    by_text = OrderedDict()
+    for row in rows:
+        if row.kind == 'reply':
+            replies.setdefault(row.recipient, []).append(row)
+        else:
+            by_text.setdefault(row.text, []).append(row)
+
+    for token, group in replies.items():
+        for chunk in _chunks(group, MESSAGES_PER_REQUEST):
+            planned.append(('/v2/bot/message/reply', {'replyToken': token, 'messages': _text_messages(chunk)}, chunk))
+
+    pushes = OrderedDict()
+    for text, group in by_text.items():
+        # multicast รับเฉพาะ user id (U...) - group / room ส่งแบบ push
+        users = OrderedDict()
+        for row in group:
+            if row.recipient.startswith('U'):
+                users.setdefault(row.recipient, []).append(row)
+            else:
+                pushes.setdefault(row.recipient, []).append(row)
+        if len(users) > 1:
+            for chunk in _chunks(list(users), MULTICAST_LIMIT):
+                planned.append((
+                    '/v2/bot/message/multicast',
+                    {'to': chunk, 'messages': [{'type': 'text', 'text': text}]},
+                    [row for user in chunk for row in users[user]]
+                ))
+        else:
+            for user, user_rows in users.items():
+                pushes.setdefault(user, []).extend(user_rows)
+
+    for recipient, group in pushes.items():
+        for chunk in _chunks(group, MESSAGES_PER_REQUEST):
+            planned.append(('/v2/bot/message/push', {'to': recipient, 'messages': _text_messages(chunk)}, chunk))
+    return planned
+
+def claim_due(session, table, now, limit):
+    """จองแถวที่ถึงเวลา (และแถวที่จองค้างเกิน lease) ของตารางคิว แล้ว commit -> list ของแถว
+
+    ตารางต้องมีคอลัมน์ status, next_attempt_at, claim, claimed_at
+    """
+    due = or_(
+        and_(table.c.status == PENDING, table.c.next_attempt_at <= now),
+        and_(table.c.status == SENDING, table.c.claimed_at < now - timedelta(seconds=LEASE_SECONDS))
+    )
+    ids = session.scalars(select(table.c.id).where(due).order_by(table.c.id).limit(limit)).all()
+    if not ids:
+        return []
+    claim = uuid.uuid4().hex
+    session.execute(update(table).where(table.c.id.in_(ids), due)
+                    .values(status=SENDING, claim=claim, claimed_at=now))
+    session.commit()
+    return session.execute(select(table).where(table.c.claim == claim).order_by(table.c.id)).all()
+
+def retry_values(attempts, now, retryable=True, retry_after=None):
+    """คอลัมน์ของแถวที่ทำไม่สำเร็จครั้งที่ attempts: ลองใหม่แบบ exponential backoff หรือ failed"""
+    if not retryable or attempts >= current_app.config.get('LINE_MAX_ATTEMPTS', 6):
+        return {'status': FAILED, 'attempts': attempts, 'claim': None}
+    base = current_app.config.get('LINE_RETRY_BASE_SECONDS', 5)
+    ceiling = current_app.config.get('LINE_RETRY_MAX_SECONDS', 900)
+    delay = min(base * 2 ** (attempts - 1), ceiling) * random.uniform(0.8, 1.2)
+    delay = max(delay, retry_after or 0)
+    return {'status': PENDING, 'attempts': attempts, 'claim': None, 'next_attempt_at': now + timedelta(seconds=delay)}
+
+class QueueWorker:
+    """ฐานของคิวในตาราง + worker thread ที่ถูกปลุกหลัง commit ซึ่งเพิ่มงาน (wake_on_commit)
+
+    subclass กำหนด work_once(limit) -> จำนวนแถวที่จองได้ และชื่อ config ของ batch / interval / workers
+    """
+
+    batch_config = None
+    interval_config = None
+    workers_config = None
+
+    def __init__(self, get_session, name):
+        self.get_session = get_session
+        self.name = name
+        self.counters = Counter()
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_rollback', self._after_rollback)
+
+    def wake_on_commit(self, session):
+        session.info.setdefault(_WAKE, set()).add(self)
+
+    def _after_commit(self, session):
+        if session.in_nested_transaction():
+            return
+        if self in session.info.get(_WAKE, ()):
+            session.info[_WAKE].discard(self)
+            self._wake.set()
+
+    def _after_rollback(self, session):
+        if not session.in_nested_transaction():
+            session.info.get(_WAKE, set()).discard(self)
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self.counters[key] += amount
+
+    def work_once(self, limit=None):
+        raise NotImplementedError
+
+    def queue_counts(self, table, session=None):
+        session = session or self.get_session()
+        return dict(session.execute(select(table.c.status, func.count()).group_by(table.c.status)).all())
+
+    def run(self, app, interval=None):
+        """วนทำงานจนกว่าจะ stop() - คิวว่างรอ interval วินาที หรือจนมี commit ที่เพิ่มงาน"""
+        interval = interval or app.config.get(self.interval_config, 2)
+        limit = app.config.get(self.batch_config, 100)
+        while not self._stop.is_set():
+            claimed = 0
+            with app.app_context():
+                try:
+                    claimed = self.work_once(limit=limit)
+                except Exception as e:
+                    self.get_session().rollback()
+                    self.last_error = str(e)[:255]
+                    app.logger.error(f'{self.name} worker failed: {e}')
+            if claimed < limit:
+                self._wake.wait(interval)
+                self._wake.clear()
+
+    def start(self, app, workers=None):
+        """เริ่ม worker thread (daemon) ใน process นี้ - เรียกซ้ำได้"""
+        if workers is None:
+            workers = app.config.get(self.workers_config, 1) if self.workers_config else 1
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            if self._threads:
+                return
+            self._stop.clear()
+            for number in range(max(workers, 1)):
+                thread = threading.Thread(target=self.run, args=(app,), name=f'{self.name}-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+class LineDispatcher(QueueWorker):
+    """Outbox + worker ของหนึ่ง schema
+
+    get_session: callable ที่คืน session ของแอป (เช่น lambda: db.session)
+    """
+
+    batch_config = 'LINE_DISPATCH_BATCH'
+    interval_config = 'LINE_DISPATCH_INTERVAL'
+
+    def __init__(self, outbox_model, get_session, name='line_outbox'):
+        super().__init__(get_session, name)
+        self.outbox_model = outbox_model
+
+    # ----- ฝั่งผู้ส่ง (ใน transaction ของ request) -----
+    def enqueue(self, session, to, text, kind='push'):
+        """เพิ่มข้อความถึงผู้รับ (id เดียวหรือ list) ใน outbox - ส่งจริงหลัง commit"""
+        recipients = [to] if isinstance(to, str) else list(dict.fromkeys(to))
+        rows = [self.outbox_model(kind=kind, recipient=recipient, text=text) for recipient in recipients if recipient]
+        session.add_all(rows)
+        self.wake_on_commit(session)
+        self._count('enqueued', len(rows))
+        return rows
+
+    def reply(self, session, reply_token, text):
+        """ตอบกลับด้วย reply token (ไม่เสียโควต้า push แต่ token หมดอายุในไม่กี่สิบวินาที)"""
+        return self.enqueue(session, reply_token, text, kind='reply')
+
+    # ----- worker -----
+    def _client(self):
+        token = current_app.config.get('LINE_CHANNEL_ACCESS_TOKEN')
+        if not token:
+            return None
+        key = f'{self.name}.client'
+        client = current_app.extensions.get(key)
+        if client is None:
+            client = current_app.extensions[key] = LineClient(
+                token,
+                current_app.config.get('LINE_API_URL') or LINE_API_URL,
+                timeout=current_app.config.get('LINE_HTTP_TIMEOUT', 10)
+            )
+        return client
+
+    def claim(self, session, now, limit):
+        return claim_due(session, self.outbox_model.__table__, now, limit)
+
+    def _finish(self, session, rows, error, now):
+        table = self.outbox_model.__table__
+        if error is None:
+            session.execute(update(table).where(table.c.id.in_([row.id for row in rows]))
+                            .values(status=SENT, sent_at=now, attempts=table.c.attempts + 1, last_error=None))
+            self._count('sent', len(rows))
+            return
+
+        message = str(error)[:255]
+        self.last_error = message
+        for row in rows:
+            values = retry_values((row.attempts or 0) + 1, now, error.retryable, error.retry_after)
+            self._count('retried' if values['status'] == PENDING else 'failed')
+            session.execute(update(table).where(table.c.id == row.id).values(last_error=message, **values))
+
+    def dispatch_once(self, now=None, limit=None):
+        """ส่งข้อความที่ถึงเวลาหนึ่งรอบ -> จำนวนแถวที่จองได้ (0 = คิวว่าง หรือยังไม่ตั้ง token)"""
+        client = self._client()
+        if client is None:
+            return 0
+        session = self.get_session()
+        now = now or datetime.now(timezone.utc)
+        rows = self.claim(session, now, limit or current_app.config.get('LINE_DISPATCH_BATCH', 200))
+        for path, payload, batch in plan_requests(rows):
+            started = time.perf_counter()
+            error = None
+            try:
+                client.post(path, payload)
+            except LineSendError as e:
+                error = e
+            self._count('requests')
+            self._count(path.rsplit('/', 1)[-1])
+            self._count('request_ms', round((time.perf_counter() - started) * 1000))
+            self._finish(session, batch, error, now)
+            session.commit()
+        return len(rows)
+
+    work_once = dispatch_once
+
+    def metrics(self, session=None):
+        """ตัวนับของ process นี้ + จำนวนแถวในคิวแยกตามสถานะ"""
+        with self._lock:
+            counters = dict(self.counters)
+        requests_sent = counters.get('requests', 0)
+        return {
+            'queue': self.queue_counts(self.outbox_model.__table__, session),
+            'counters': counters,
+            'avg_request_ms': round(counters.get('request_ms', 0) / requests_sent, 1) if requests_sent else None,
+            'last_error': self.last_error,
+        }
+
+__all__ = ['LineClient', 'LineDispatcher', 'LineSendError', 'QueueWorker', 'plan_requests', 'claim_due', 'retry_values',
+           'PENDING', 'SENDING', 'SENT', 'FAILED']
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LINE Webhook Queue - รับ webhook แล้วตอบ 200 ทันที ประมวลผล event ด้วย worker pool
+
+เดิม callback ประมวลผลทุก event (ค้นหาลูกค้า, ตอบกลับ) ก่อนตอบ LINE
+ช่วง broadcast มี event พร้อมกันจำนวนมาก webhook จึง timeout แล้ว LINE ส่งซ้ำ ทำให้งานเพิ่มขึ้นอีก
+    - callback ตรวจ X-Line-Signature แล้ว enqueue() event ดิบลงตาราง (durable) แล้วตอบ 200
+    - ตัด event ซ้ำด้วย webhookEventId (unique) - LINE ส่งซ้ำ (redelivery) ได้ 200 โดยไม่ทำซ้ำ
+    - worker pool จองทีละ batch (claim token เดียวกับ utils.line_outbox) แล้วเรียก prepare() ครั้งเดียวต่อ batch
+      เช่น ค้นหาลูกค้าของทุก event ด้วย query เดียว (CustomerLookup) จากนั้น handle() ทีละ event ใน savepoint
+      event ที่ error ถูก rollback เฉพาะตัวเองและลองใหม่แบบ backoff
+
+Config: LINE_CHANNEL_SECRET, LINE_WEBHOOK_WORKERS, LINE_WEBHOOK_BATCH, LINE_WEBHOOK_INTERVAL,
+        LINE_CUSTOMER_CACHE_SECONDS
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+from datetime import datetime, timezone
+from flask import current_app, has_app_context
+from sqlalchemy import event, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from utils.cache import MemoryCache
+from utils.line_outbox import PENDING, QueueWorker, claim_due, retry_values
+
+PROCESSED = 'processed'
+
+def verify_signature(channel_secret, body, signature):
+    """ตรวจ X-Line-Signature (base64 ของ HMAC-SHA256 ของ body ด้วย channel secret)"""
+    if not channel_secret or not signature:
+        return False
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hmac.new(channel_secret.encode('utf-8'), body, hashlib.sha256).digest()
+    return hmac.compare_digest(base64.b64encode(digest), signature.encode('utf-8'))
+
+def event_id(payload):
+    """webhookEventId ของ event (event แบบเก่าที่ไม่มี id ใช้ hash ของเนื้อหา)"""
+    return payload.get('webhookEventId') or hashlib.sha256(
+        json.dumps(payload, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+
+class CustomerLookup:
+    """line_user_id -> (customer_id, name) แคชในหน่วยความจำต่อแอป
+
+    lookup() โหลดเฉพาะ id ที่ไม่อยู่ในแคชด้วย query เดียว (ผู้ใช้ที่ยังไม่ลงทะเบียนแคชเป็น None ด้วย)
+    ลูกค้าที่ถูกแก้ / ลบ ใน process นี้ถูกลบออกจากแคชตอน flush ส่วน process อื่นหมดอายุตาม TTL
+    """
+
+    def __init__(self, customer_model, attr='line_user_id', timeout=300, max_entries=5000, name='line_customers'):
+        self.customer_model = customer_model
+        self.attr = attr
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.name = name
+        event.listen(Session, 'after_flush', self._forget_changed)
+
+    def _cache(self):
+        cache = current_app.extensions.get(self.name)
+        if cache is None:
+            cache = current_app.extensions[self.name] = MemoryCache(self.max_entries)
+        return cache
+
+    def lookup(self, session, user_ids):
+        """{line_user_id: (customer_id, name) หรือ None}"""
+        cache = self._cache()
+        found, missing = {}, []
+        for user_id in dict.fromkeys(user_id for user_id in user_ids if user_id):
+            entry = cache.get(user_id)
+            if entry is None:
+                missing.append(user_id)
+            else:
+                found[user_id] = entry or None
+
+        if missing:
+            model = self.customer_model
+            column = getattr(model, self.attr)
+            rows = {user_id: (customer_id, name) for customer_id, name, user_id in session.execute(
+                select(model.id, model.name, column).where(column.in_(missing))
+            )}
+            timeout = current_app.config.get('LINE_CUSTOMER_CACHE_SECONDS', self.timeout)
+            for user_id in missing:
+                entry = rows.get(user_id)
+                # () = ยังไม่ลงทะเบียน (MemoryCache ใช้ None แทน miss)
+                cache.set(user_id, entry or (), timeout)
+                found[user_id] = entry
+        return found
+
+    def forget(self, *user_ids):
+        cache = self._cache()
+        for user_id in user_ids:
+            if user_id:
+                cache.delete(user_id)
+
+    def _forget_changed(self, session, flush_context):
+        changed = [obj for obj in (*session.new, *session.dirty, *session.deleted)
+                   if isinstance(obj, self.customer_model)]
+        if not changed or not has_app_context() or self.name not in current_app.extensions:
+            return
+        for obj in changed:
+            history = inspect(obj).attrs[self.attr].history
+            self.forget(*history.added, *history.deleted, *history.unchanged)
+
+class LineEventQueue(QueueWorker):
+    """คิว webhook event ของหนึ่ง schema
+
+    handle(session, payload, context) ประมวลผล event เดียว (payload = dict ของ event จาก LINE)
+    prepare(session, payloads) -> context ที่ใช้ร่วมกันทั้ง batch (ไม่บังคับ)
+    """
+
+    batch_config = 'LINE_WEBHOOK_BATCH'
+    interval_config = 'LINE_WEBHOOK_INTERVAL'
+    workers_config = 'LINE_WEBHOOK_WORKERS'
+
+    def __init__(self, event_model, get_session, handle, prepare=None, name='line_events'):
+        super().__init__(get_session, name)
+        self.event_model = event_model
+        self.handle = handle
+        self.prepare = prepare
+
+    # ----- ฝั่ง webhook -----
+    def enqueue(self, session, body):
+        """บันทึก event ดิบจาก body ของ webhook -> (จำนวนที่เพิ่ม, จำนวนที่ซ้ำ) - ผู้เรียก commit"""
+        payloads = {}
+        for payload in json.loads(body).get('events') or []:
+            payloads.setdefault(event_id(payload), payload)
+        if not payloads:
+            return 0, 0
+
+        table = self.event_model.__table__
+        existing = set(session.scalars(
+            select(table.c.webhook_event_id).where(table.c.webhook_event_id.in_(list(payloads)))
+        ))
+        rows = [{
+            'webhook_event_id': key,
+            'event_type': str(payload.get('type', ''))[:30],
+            'body': json.dumps(payload, ensure_ascii=False),
+        } for key, payload in payloads.items() if key not in existing]
+
+        added = len(rows)
+        if rows:
+            try:
+                with session.begin_nested():
+                    session.execute(insert(table), rows)
+            except IntegrityError:
+                # request ส่งซ้ำที่มาพร้อมกันเพิ่มบางแถวไปก่อน - เพิ่มทีละแถวข้ามแถวที่มีแล้ว
+                added = 0
+                for row in rows:
+                    try:
+                        with session.begin_nested():
+                            session.execute(insert(table), [row])
+                        added += 1
+                    except IntegrityError:
+                        pass
+            self.wake_on_commit(session)
+
+        duplicates = len(payloads) - added
+        self._count('received', added)
+        self._count('duplicates', duplicates)
+        return added, duplicates
+
+    # ----- worker -----
+    def process_once(self, now=None, limit=None):
+        """ประมวลผล event ที่ถึงเวลาหนึ่ง batch -> จำนวน event ที่จองได้"""
+        session = self.get_session()
+        now = now or datetime.now(timezone.utc)
+        table = self.event_model.__table__
+        rows = claim_due(session, table, now, limit or current_app.config.get('LINE_WEBHOOK_BATCH', 50))
+        if not rows:
+            return 0
+
+        payloads = [json.loads(row.body) for row in rows]
+        context = self.prepare(session, payloads) if self.prepare else None
+        for row, payload in zip(rows, payloads):
+            try:
+                with session.begin_nested():
+                    self.handle(session, payload, context)
+            except Exception as e:
+                message = f'{type(e).__name__}: {e}'[:255]
+                self.last_error = message
+                values = retry_values((row.attempts or 0) + 1, now)
+                self._count('retried' if values['status'] == PENDING else 'failed')
+                current_app.logger.error(f'LINE event {row.webhook_event_id} failed: {message}')
+                session.execute(update(table).where(table.c.id == row.id).values(last_error=message, **values))
+            else:
+                self._count('processed')
+                session.execute(update(table).where(table.c.id == row.id).values(
+                    status=PROCESSED, processed_at=now, attempts=table.c.attempts + 1, claim=None, last_error=None
+                ))
+        session.commit()
+        return len(rows)
+
+    work_once = process_once
+
+    def metrics(self, session=None):
+        """ตัวนับของ process นี้ + จำนวน event ในคิวแยกตามสถานะ"""
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            'queue': self.queue_counts(self.event_model.__table__, session),
+            'counters': counters,
+            'last_error': self.last_error,
+        }
+
+__all__ = ['CustomerLookup', 'LineEventQueue', 'verify_signature', 'event_id', 'PROCESSED']
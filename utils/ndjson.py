@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NDJSON Export/Import - ย้ายข้อมูลทั้งฐานข้อมูลแบบ streaming
+
+ใช้ schema ที่ reflect จากฐานข้อมูลจริง จึงใช้ได้กับทั้ง models.py, app.py
+และ comphone/models.py โดยไม่ต้องโหลด ORM object
+
+รูปแบบไฟล์ (หนึ่ง JSON ต่อบรรทัด, .gz = gzip):
+    {"format": "comphone-ndjson", "version": 1, "tables": [...], ...}   <- header
+    {"table": "customer", "row": {"id": 1, "name": "...", ...}}
+    {"table": "customer", "end": 1234}                                   <- ท้ายตาราง
+
+Export: อ่านทีละ batch ด้วย keyset pagination (WHERE pk > last ORDER BY pk)
+เรียงตาราง parent ก่อน child ตาม foreign key
+Import: insert แบบ executemany ทีละ batch ตามลำดับ foreign key ของฐานปลายทาง
+ตารางที่มาถึงก่อน parent ของมันจะถูกพักไว้ในไฟล์ชั่วคราวแล้วโหลดทีหลัง
+คอลัมน์ที่ไม่มีในตารางปลายทางจะถูกข้าม (ใช้ย้ายข้าม schema ได้)
+"""
+
+import base64
+import gzip
+import json
+import tempfile
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from sqlalchemy import MetaData, select, tuple_, text
+from sqlalchemy.types import Date, DateTime, Integer, LargeBinary, Time
+
+FORMAT = 'comphone-ndjson'
+VERSION = 1
+# ตารางของระบบ migration - ไม่ย้ายข้าม schema
+SKIP_TABLES = {'alembic_version'}
+
+def open_ndjson(path, mode='r', compress=None):
+    """เปิดไฟล์ NDJSON แบบ text - compress=None คือดูจากนามสกุล (.gz) หรือ magic bytes"""
+    if mode == 'r':
+        with open(path, 'rb') as f:
+            compressed = f.read(2) == b'\x1f\x8b'
+    else:
+        compressed = str(path).endswith('.gz') if compress is None else compress
+    if compressed:
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def reflect(connection, tables=None):
+    """MetaData ของฐานข้อมูลจริง (เฉพาะ tables ถ้าระบุ)"""
+    metadata = MetaData()
+    metadata.reflect(bind=connection, only=tables, views=False)
+    return metadata
+
+def _encode(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'$b64': base64.b64encode(bytes(value)).decode('ascii')}
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+def _keyset_batches(connection, table, batch_size):
+    """แถวของ table ทีละ batch เรียงตาม primary key"""
+    pk = list(table.primary_key.columns)
+    if not pk:
+        result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(select(table))
+        for rows in result.partitions():
+            yield rows
+        return
+
+    key = pk[0] if len(pk) == 1 else tuple_(*pk)
+    last = None
+    while True:
+        stmt = select(table).order_by(*pk).limit(batch_size)
+        if last is not None:
+            stmt = stmt.where(key > (last if len(pk) == 1 else tuple_(*last)))
+        rows = connection.execute(stmt).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        tail = rows[-1]._mapping
+        last = tail[pk[0].name] if len(pk) == 1 else [tail[column.name] for column in pk]
+
+def export_ndjson(connection, out, tables=None, batch_size=1000):
+    """เขียนทุกตาราง (หรือ tables) ลง out - คืน {table: จำนวนแถว}"""
+    metadata = reflect(connection, tables)
+    ordered = [table for table in metadata.sorted_tables if table.name not in SKIP_TABLES]
+    header = {
+        'format': FORMAT,
+        'version': VERSION,
+        'exported_at': datetime.now(timezone.utc).isoformat(),
+        'dialect': connection.dialect.name,
+        'tables': [table.name for table in ordered],
+    }
+    out.write(json.dumps(header, ensure_ascii=False) + '\n')
+
+    counts = {}
+    for table in ordered:
+        counts[table.name] = 0
+        for rows in _keyset_batches(connection, table, batch_size):
+            out.write(''.join(
+                json.dumps({'table': table.name, 'row': dict(row._mapping)},
+                           ensure_ascii=False, default=_encode) + '\n'
+                for row in rows
+            ))
+            counts[table.name] += len(rows)
+        # marker ท้ายตาราง ให้ฝั่ง import รู้ว่าตารางนี้ครบแล้ว (รวมตารางว่าง)
+        out.write(json.dumps({'table': table.name, 'end': counts[table.name]}) + '\n')
+    return counts
+
+def _decoder(column):
+    """แปลงค่าจาก JSON กลับเป็นชนิดของคอลัมน์ปลายทาง"""
+    column_type = column.type
+    if isinstance(column_type, DateTime):
+        return datetime.fromisoformat
+    if isinstance(column_type, Date):
+        return lambda value: datetime.fromisoformat(value).date() if 'T' in value else date.fromisoformat(value)
+    if isinstance(column_type, Time):
+        return time.fromisoformat
+    if isinstance(column_type, LargeBinary):
+        return lambda value: base64.b64decode(value['$b64']) if isinstance(value, dict) else value
+    return None
+
+class _TableLoader:
+    """สะสมแถวของตารางหนึ่งแล้ว insert แบบ executemany ทีละ batch_size"""
+
+    def __init__(self, connection, table, batch_size, columns=None):
+        self.connection = connection
+        self.table = table
+        self.batch_size = batch_size
+        self.renames = columns or {}
+        # คอลัมน์ต้นทางชื่อเดียวกับปลายทางของการ rename ถูกแทนที่ ไม่ใช้ค่าเดิม
+        self.shadowed = set(self.renames.values()) - set(self.renames)
+        self.columns = {column.name for column in table.columns}
+        self.decoders = {
+            column.name: decoder for column in table.columns
+            if (decoder := _decoder(column)) is not None
+        }
+        self.dropped = set()
+        self.pending = []
+        self.count = 0
+
+    def add(self, row):
+        values = {}
+        for name, value in row.items():
+            if name in self.shadowed:
+                self.dropped.add(name)
+                continue
+            name = self.renames.get(name, name)
+            if name not in self.columns:
+                self.dropped.add(name)
+                continue
+            if value is not None and name in self.decoders:
+                value = self.decoders[name](value)
+            values[name] = value
+        self.pending.append(values)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        # executemany ต้องการ key ชุดเดียวกันทุกแถว
+        keys = set().union(*self.pending)
+        rows = [{key: row.get(key) for key in keys} if len(row) != len(keys) else row for row in self.pending]
+        self.connection.execute(self.table.insert(), rows)
+        self.count += len(rows)
+        self.pending = []
+
+def _reset_sequences(connection, tables):
+    """PostgreSQL: ขยับ sequence ของ id ให้เกินค่าที่นำเข้า"""
+    if connection.dialect.name != 'postgresql':
+        return
+    for table in tables:
+        pk = list(table.primary_key.columns)
+        if len(pk) != 1 or not isinstance(pk[0].type, Integer):
+            continue
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', '{pk[0].name}'), "
+            f"COALESCE((SELECT MAX({pk[0].name}) FROM {table.name}), 1))"
+        ))
+
+def import_ndjson(connection, source, rename=None, batch_size=1000, clear=False):
+    """โหลดไฟล์จาก export_ndjson เข้าฐานข้อมูลของ connection
+
+    rename: {ชื่อตารางต้นทาง: ชื่อตารางปลายทาง, 'ตาราง.คอลัมน์ต้นทาง': ชื่อคอลัมน์ปลายทาง}
+    clear: ลบข้อมูลเดิมของตารางที่นำเข้าก่อน (child ก่อน parent)
+    คืน (counts, skipped, dropped) = ({table: แถวที่นำเข้า}, {table ที่ไม่มีปลายทาง: แถว}, {table: คอลัมน์ที่ข้าม})
+    """
+    rename = rename or {}
+    column_renames = {}
+    for key, target in rename.items():
+        if '.' in key:
+            table_name, column_name = key.split('.', 1)
+            column_renames.setdefault(table_name, {})[column_name] = target
+    rename = {key: target for key, target in rename.items() if '.' not in key}
+    header = json.loads(source.readline() or '{}')
+    if header.get('format') != FORMAT:
+        raise ValueError('Not a comphone NDJSON export')
+
+    metadata = reflect(connection)
+    wanted = {rename.get(name, name) for name in header.get('tables', [])}
+    order = [table for table in metadata.sorted_tables if table.name in wanted - SKIP_TABLES]
+    if clear:
+        for table in reversed(order):
+            connection.execute(table.delete())
+
+    sources = {rename.get(name, name): name for name in header.get('tables', [])}
+    loaders = {
+        table.name: _TableLoader(connection, table, batch_size, column_renames.get(sources.get(table.name)))
+        for table in order
+    }
+    spooled = {}
+    skipped = {}
+    done = set()
+    position = 0
+
+    def load_spool(name):
+        spool = spooled.pop(name)
+        spool.seek(0)
+        for line in spool:
+            loaders[name].add(json.loads(line))
+        spool.close()
+        loaders[name].flush()
+
+    def finish(name):
+        """ตาราง name ครบแล้ว - เลื่อนคิวและโหลดตารางที่พักไว้ซึ่งถึงคิว"""
+        nonlocal position
+        loaders[name].flush()
+        done.add(name)
+        while position < len(order) and order[position].name in done:
+            if order[position].name in spooled:
+                load_spool(order[position].name)
+            position += 1
+
+    for line in source:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        name = rename.get(record['table'], record['table'])
+        if name not in loaders:
+            if 'row' in record:
+                skipped[name] = skipped.get(name, 0) + 1
+            continue
+        if 'end' in record:
+            finish(name)
+        elif position < len(order) and order[position].name == name:
+            loaders[name].add(record['row'])
+        else:
+            spool = spooled.get(name)
+            if spool is None:
+                spool = spooled[name] = tempfile.TemporaryFile('w+', encoding='utf-8')
+            spool.write(json.dumps(record['row'], ensure_ascii=False) + '\n')
+
+    # ตารางที่ค้างอยู่ (ไฟล์ไม่ครบ) โหลดตามลำดับที่เหลือ
+    for table in order:
+        if table.name in spooled:
+            load_spool(table.name)
+        loaders[table.name].flush()
+
+    _reset_sequences(connection, order)
+    counts = {name: loader.count for name, loader in loaders.items()}
+    dropped = {name: sorted(loader.dropped) for name, loader in loaders.items() if loader.dropped}
+    return counts, skipped, dropped
+
+__all__ = ['FORMAT', 'VERSION', 'open_ndjson', 'reflect', 'export_ndjson', 'import_ndjson']
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Keyset Pagination - แบ่งหน้าด้วย cursor แทน OFFSET
+
+OFFSET ต้องอ่านแล้วทิ้งทุกแถวก่อนหน้าที่ขอ หน้าลึก ๆ ของตารางใหญ่จึงช้าลงเรื่อย ๆ
+และ paginate() นับ COUNT(*) ทั้งตารางทุกหน้า
+keyset จำค่าคอลัมน์เรียงลำดับของแถวสุดท้าย (เช่น (created_at, id)) ไว้ใน cursor
+หน้าถัดไปเริ่มอ่านต่อจากตำแหน่งนั้นผ่าน index โดยตรง - ทุกหน้าเร็วเท่ากัน
+    - cursor เป็น string ทึบ (base64 ของ JSON: ทิศทาง + ลายนิ้วมือของการเรียง + ค่าของ key)
+      ส่งกลับมาทาง query string ?cursor=... - cursor ที่อ่านไม่ได้ / มาจากการเรียงแบบอื่น ถือเป็นหน้าแรก
+    - paginate_keyset() ใช้กับ Model.query (Flask-SQLAlchemy) ได้ทั้งที่มี group_by (เงื่อนไขไปอยู่ใน HAVING)
+    - จำนวนทั้งหมดเป็นตัวเลือก: None (ไม่นับ), 'exact', 'cached' (แคชตาม tag ของ utils.cache),
+      'estimate' (ไม่มีตัวกรอง = ประมาณจาก primary key / สถิติของตาราง ไม่อย่างนั้นใช้ 'cached')
+
+Config: MAX_ITEMS_PER_PAGE, PAGINATION_COUNT_SECONDS
+"""
+
+import base64
+import binascii
+import hashlib
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from flask import current_app, has_app_context
+from sqlalchemy import and_, case, func, or_, select, text
+from utils.cache import get_cache, tagged_key
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    if isinstance(value, Decimal):
+        return {'n': str(value)}
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def _decode(value):
+    if isinstance(value, dict):
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        if 'n' in value:
+            return Decimal(value['n'])
+    return value
+
+def encode_cursor(values):
+    """list ของค่า -> cursor (string ที่ใส่ใน URL ได้)"""
+    raw = json.dumps(list(values), default=_encode, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """cursor -> list ของค่า (None ถ้าว่างหรืออ่านไม่ได้)"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        return None
+    if not isinstance(values, list):
+        return None
+    try:
+        return [_decode(value) for value in values]
+    except (TypeError, ValueError):
+        return None
+
+def keyset_after(columns, values, descending=True):
+    """เงื่อนไข "อยู่ถัดจาก values" ตามลำดับของ columns
+
+    (a, b) เรียงมากไปน้อย -> a < va OR (a = va AND b < vb)
+    descending เป็น bool (ทุกคอลัมน์) หรือ list ต่อคอลัมน์
+    ค่า None เท่ากับ NULL เท่านั้น (ลำดับของ NULL กำหนดด้วย key ก่อนหน้า - ดู nulls_last())
+    """
+    if isinstance(descending, bool):
+        descending = [descending] * len(columns)
+    clauses = []
+    for index, (column, value) in enumerate(zip(columns, values)):
+        if value is None:
+            continue
+        step = column < value if descending[index] else column > value
+        equal = [c.is_(None) if v is None else c == v for c, v in zip(columns[:index], values[:index])]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+def nulls_last(expression, descending=False):
+    """key เรียงของคอลัมน์ที่เป็น NULL ได้ - แถวที่เป็น NULL อยู่ท้ายเสมอ (ทั้งสองทิศทาง)"""
+    return [(case((expression.is_(None), 1), else_=0), False), (expression, descending)]
+
+class KeysetPage:
+    """หนึ่งหน้าของผลลัพธ์ - items + cursor ของหน้าถัดไป / ก่อนหน้า (None = ไม่มี)
+
+    total: จำนวนทั้งหมด (None = ไม่ได้นับ), total_is_estimate: total เป็นค่าประมาณ
+    """
+
+    def __init__(self, items, per_page, next_cursor=None, cursor=None, prev_cursor=None,
+                 total=None, total_is_estimate=False):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.cursor = cursor
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def to_dict(self):
+        """ส่วน pagination ของ JSON API"""
+        return {
+            'per_page': self.per_page,
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+            'has_next': self.has_next,
+            'has_prev': self.has_prev,
+            'total': self.total,
+            'total_is_estimate': self.total_is_estimate,
+        }
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+# ----- Model.query -----
+def per_page_arg(value, default=20):
+    """per_page จาก query string -> 1..MAX_ITEMS_PER_PAGE"""
+    upper = current_app.config.get('MAX_ITEMS_PER_PAGE', 100) if has_app_context() else 100
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        return default
+    return min(max(per_page, 1), upper)
+
+def _sort_keys(query, order):
+    """[(expression, descending)] + primary key ต่อท้าย (ถ้ายังไม่มี) ให้ทุกแถวมีตำแหน่งไม่ซ้ำ"""
+    keys = []
+    for item in order:
+        keys.extend(item if isinstance(item, list) else [item])
+    entity = query.column_descriptions[0]['entity']
+    primary_key = entity.__mapper__.primary_key[0]
+    if not any(expression is primary_key or getattr(expression, 'expression', None) is primary_key
+               for expression, _ in keys):
+        keys.append((getattr(entity, primary_key.key), keys[-1][1] if keys else True))
+    return keys, entity
+
+def _fingerprint(keys):
+    signature = '|'.join(f'{expression}:{int(descending)}' for expression, descending in keys)
+    return hashlib.sha1(signature.encode('utf-8')).hexdigest()[:8]
+
+def paginate_keyset(query, order, cursor=None, per_page=20, count=None, count_tags=()):
+    """แบ่งหน้า Model.query ด้วย keyset -> KeysetPage
+
+    order: list ของ (expression, descending) หรือ nulls_last(...) - ไม่ต้องเรียก order_by() เอง
+    count: None | 'exact' | 'cached' | 'estimate' (count_tags = tag ของ utils.cache ที่ล้างแคชจำนวน)
+    """
+    keys, entity = _sort_keys(query, order)
+    fingerprint = _fingerprint(keys)
+    expressions = [expression for expression, _ in keys]
+    directions = [descending for _, descending in keys]
+
+    position = decode_cursor(cursor)
+    backward = False
+    if position is not None and (len(position) != len(keys) + 2 or position[1] != fingerprint
+                                 or position[0] not in ('a', 'b')):
+        position = None
+    if position is not None:
+        backward = position[0] == 'b'
+
+    counted = query
+    page_query = query.add_columns(*expressions)
+    if position is not None:
+        # ย้อนกลับ = อ่านต่อในทิศตรงข้ามแล้วกลับลำดับ
+        after = keyset_after(expressions, position[2:], [d != backward for d in directions])
+        grouped = bool(query.statement._group_by_clauses)
+        page_query = page_query.having(after) if grouped else page_query.filter(after)
+    page_query = page_query.order_by(None).order_by(*[
+        expression.desc() if descending != backward else expression.asc()
+        for expression, descending in keys
+    ]).limit(per_page + 1)
+
+    rows = page_query.all()
+    more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backward:
+        rows.reverse()
+    items = [row[0] for row in rows]
+
+    def cursor_for(direction, row):
+        return encode_cursor([direction, fingerprint, *row[1:]])
+
+    next_cursor = prev_cursor = None
+    if rows:
+        if more or backward:
+            next_cursor = cursor_for('a', rows[-1])
+        if (more and backward) or (position is not None and not backward):
+            prev_cursor = cursor_for('b', rows[0])
+
+    total, estimated = None, False
+    if count:
+        total, estimated = count_rows(counted, entity, count, count_tags)
+    return KeysetPage(items, per_page, next_cursor, cursor, prev_cursor, total, estimated)
+
+def count_rows(query, entity, mode='exact', tags=()):
+    """จำนวนแถวของ query -> (จำนวน, เป็นค่าประมาณหรือไม่)"""
+    query = query.order_by(None)
+    if mode == 'estimate':
+        statement = query.statement
+        if statement.whereclause is None and not statement._group_by_clauses:
+            estimate = _estimate_table(query.session, entity)
+            if estimate is not None:
+                return estimate, True
+        mode = 'cached'
+
+    if mode == 'cached':
+        cache = get_cache()
+        if cache is not None and not current_app.config.get('CACHE_DISABLED'):
+            compiled = query.statement.compile()
+            digest = hashlib.sha1(f'{compiled}|{sorted(compiled.params.items(), key=str)}'.encode('utf-8')).hexdigest()
+            key = tagged_key(cache, f'count:{digest}', tags)
+            total = cache.get(key)
+            if total is None:
+                total = query.count()
+                cache.set(key, total, current_app.config.get('PAGINATION_COUNT_SECONDS', 60))
+            return total, False
+    return query.count(), False
+
+def _estimate_table(session, entity):
+    """จำนวนแถวโดยประมาณของทั้งตาราง โดยไม่สแกนตาราง"""
+    table = entity.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        estimate = session.scalar(text('SELECT reltuples::bigint FROM pg_class WHERE relname = :name'),
+                                  {'name': table.name})
+        return max(int(estimate), 0) if estimate is not None and estimate >= 0 else None
+    primary_key = table.primary_key.columns.values()
+    if len(primary_key) == 1 and primary_key[0].type.python_type is int:
+        # id เรียงต่อกัน - ห่างจากจำนวนจริงเท่าจำนวนแถวที่ถูกลบ (อ่านจาก index ของ primary key 2 ครั้ง)
+        low, high = session.execute(select(func.min(primary_key[0]), func.max(primary_key[0]))).one()
+        return 0 if high is None else high - low + 1
+    return None
+
+__all__ = [
+    'KeysetPage', 'encode_cursor', 'decode_cursor', 'keyset_after', 'nulls_last',
+    'paginate_keyset', 'count_rows', 'per_page_arg'
+]
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Monthly Partitions - แยก activity log ตามเดือน และอ่านต่อกันด้วย keyset pagination
+
+เดิม activity log อยู่ตารางเดียวตลอดไป การลบ log เก่าเป็น DELETE ก้อนเดียว (ล็อก SQLite นาน)
+และหน้าดู log ใช้ OFFSET ซึ่งช้าลงตามจำนวนแถว
+    - ตารางหลัก (hot) เก็บเฉพาะเดือนปัจจุบัน ทุกการเขียนยังไปที่ตารางหลักตามเดิม
+    - rotate() ย้าย log ก่อนเดือนปัจจุบันไปเป็นตาราง <table>_YYYYMM ตารางละเดือน (ตาม created_at)
+      SQLite + log เก่าอยู่เดือนเดียว: ALTER TABLE RENAME แล้วสร้างตารางหลักใหม่ (O(1) ไม่ขึ้นกับจำนวนแถว)
+      นอกนั้น (ฐานข้อมูลอื่น / rotate ครั้งแรก / ข้ามเดือน): คัดลอก + ลบทีละชุดแยกตามเดือน
+      (commit ทุกชุด ไม่ล็อกนาน)
+      id ต่อเนื่องจากตารางเดิม (sqlite_autoincrement) - id ไม่ซ้ำข้ามเดือน
+    - expire() DROP ตารางของเดือนที่หมดอายุทั้งเดือน (O(1) ต่อเดือน)
+      ส่วนที่เหลือก่อน cutoff ลบทีละชุด
+    - page() อ่านตารางหลักแล้วต่อด้วยตารางเดือนจากใหม่ไปเก่า เรียงตาม (created_at, id)
+      cursor จำชื่อตาราง + ค่าของแถวสุดท้าย
+
+Config: ACTIVITY_LOG_RETENTION_DAYS, ACTIVITY_LOG_DELETE_BATCH
+"""
+
+import re
+from datetime import datetime, timezone
+from flask import current_app, has_app_context
+from sqlalchemy import Column, Index, MetaData, Table, delete, func, insert, inspect, select
+from utils.pagination import KeysetPage, decode_cursor, encode_cursor, keyset_after
+
+def month_start(value):
+    """วันแรกของเดือนของ value (naive UTC เหมือนค่าที่เก็บในฐานข้อมูล)"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return datetime(value.year, value.month, 1)
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class MonthlyPartitions:
+    """ตารางหลัก + ตารางรายเดือนของ model หนึ่ง (ต้องมีคอลัมน์ id และ created_at)
+
+    get_engine: callable ที่คืน engine ของแอป (เช่น lambda: db.engine) - เรียกใน app context
+    """
+
+    def __init__(self, model, get_engine, cache_seconds=60):
+        self.model = model
+        self.table = model.__table__
+        self.get_engine = get_engine
+        self.cache_seconds = cache_seconds
+        self._pattern = re.compile(rf'^{re.escape(self.table.name)}_(\d{{4}})(\d{{2}})$')
+        self._tables = {}
+
+    def partition_name(self, month):
+        return f'{self.table.name}_{month:%Y%m}'
+
+    def _partition_table(self, name):
+        """Table ของตารางเดือน (คอลัมน์เดียวกับตารางหลัก ไม่มี foreign key)"""
+        table = self._tables.get(name)
+        if table is None:
+            table = Table(name, MetaData(), *[
+                Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable)
+                for column in self.table.c
+            ])
+            self._tables[name] = table
+        return table
+
+    # ----- รายชื่อตารางเดือน -----
+    def partitions(self, refresh=False):
+        """[(เดือน, ชื่อตาราง)] จากใหม่ไปเก่า - แคชต่อแอป cache_seconds วินาที"""
+        key = f'{self.table.name}.partitions'
+        now = _utcnow()
+        cached = current_app.extensions.get(key) if has_app_context() else None
+        if cached is not None and not refresh and cached[0] > now.timestamp():
+            return cached[1]
+
+        found = []
+        for name in inspect(self.get_engine()).get_table_names():
+            match = self._pattern.match(name)
+            if match:
+                found.append((datetime(int(match.group(1)), int(match.group(2)), 1), name))
+        found.sort(reverse=True)
+        if has_app_context():
+            current_app.extensions[key] = (now.timestamp() + self.cache_seconds, found)
+        return found
+
+    def _forget(self):
+        if has_app_context():
+            current_app.extensions.pop(f'{self.table.name}.partitions', None)
+
+    # ----- ย้าย / ลบ -----
+    def rotate(self, now=None):
+        """ย้าย log ก่อนเดือนปัจจุบันไปตารางของเดือนนั้น ๆ (ตารางละเดือน) -> [(ชื่อตาราง, จำนวนแถวที่ย้ายแบบคัดลอก)]"""
+        boundary = month_start(now or _utcnow())
+        engine = self.get_engine()
+        months = self._months_before(engine, boundary)
+        if not months:
+            return []
+
+        existing = {partition for _, partition in self.partitions(refresh=True)}
+        rotated = []
+        if engine.dialect.name == 'sqlite' and len(months) == 1 and self.partition_name(months[0]) not in existing:
+            # กรณีปกติ (rotate ทุกเดือน) - log เก่าทั้งหมดอยู่เดือนเดียว: rename ทั้งตาราง
+            name = self.partition_name(months[0])
+            rotated.append((name, self._rename(engine, name, boundary)))
+            self._create_indexes(engine, name)
+        else:
+            # rotate ครั้งแรก / ข้ามเดือน - คัดลอกแยกตามเดือน expire() จึง DROP ได้ทีละเดือนตามชื่อตาราง
+            for month in months:
+                name = self.partition_name(month)
+                copied = self._copy(engine, name, month, add_months(month, 1), create=name not in existing)
+                self._create_indexes(engine, name)
+                rotated.append((name, copied))
+        self._forget()
+        return rotated
+
+    def _months_before(self, engine, boundary):
+        """เดือนที่มี log ก่อน boundary (เก่าไปใหม่) - อ่าน min(created_at) ผ่าน index ทีละเดือน"""
+        created_at = self.table.c.created_at
+        months = []
+        start = None
+        with engine.connect() as connection:
+            while True:
+                query = select(func.min(created_at)).where(created_at < boundary)
+                if start is not None:
+                    query = query.where(created_at >= start)
+                oldest = connection.scalar(query)
+                if oldest is None:
+                    return months
+                month = month_start(oldest)
+                months.append(month)
+                start = add_months(month, 1)
+
+    def _rename(self, engine, name, boundary):
+        table = self.table
+        partition = self._partition_table(name)
+        with engine.connect() as connection:
+            # pysqlite ไม่เปิด transaction ให้ DDL เอง - เปิดเองให้ rename + สร้างตารางใหม่เป็นก้อนเดียว
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+            last_id = connection.scalar(select(func.max(table.c.id))) or 0
+            connection.exec_driver_sql(f'ALTER TABLE "{table.name}" RENAME TO "{name}"')
+            # ชื่อ index ติดไปกับตารางที่ถูก rename - ลบออกเพื่อสร้างตารางหลักใหม่ด้วยชื่อเดิม
+            for index in inspect(connection).get_indexes(name):
+                connection.exec_driver_sql(f'DROP INDEX "{index["name"]}"')
+            table.create(connection)
+            if table.dialect_options['sqlite'].get('autoincrement'):
+                connection.exec_driver_sql(
+                    'INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)', (table.name, last_id)
+                )
+            # log ของเดือนปัจจุบัน (rotate ช้ากว่าต้นเดือน) กลับไปตารางหลัก
+            moved_back = select(partition).where(partition.c.created_at >= boundary)
+            connection.execute(insert(table).from_select([c.name for c in partition.c], moved_back))
+            connection.execute(delete(partition).where(partition.c.created_at >= boundary))
+            connection.commit()
+        return 0
+
+    def _copy(self, engine, name, start, end, create):
+        """ย้ายแถว start <= created_at < end ไปตาราง name ทีละชุด"""
+        table = self.table
+        partition = self._partition_table(name)
+        batch_size = self._batch_size()
+        if create:
+            with engine.begin() as connection:
+                partition.create(connection)
+        copied = 0
+        while True:
+            with engine.begin() as connection:
+                ids = list(connection.scalars(
+                    select(table.c.id).where(table.c.created_at >= start, table.c.created_at < end)
+                    .order_by(table.c.id).limit(batch_size)
+                ))
+                if not ids:
+                    break
+                connection.execute(insert(partition).from_select(
+                    [c.name for c in table.c], select(table).where(table.c.id.in_(ids))
+                ))
+                connection.execute(delete(table).where(table.c.id.in_(ids)))
+            copied += len(ids)
+        return copied
+
+    def _create_indexes(self, engine, name):
+        """index เดียวกับตารางหลัก (ชื่อขึ้นต้นด้วยชื่อตารางเดือน) - สร้างครั้งเดียวหลังย้าย"""
+        partition = self._partition_table(name)
+        with engine.begin() as connection:
+            existing = {index['name'] for index in inspect(connection).get_indexes(name)}
+            for index in self.table.indexes:
+                columns = [column.name for column in index.columns]
+                index_name = f'ix_{name}_{"_".join(columns)}'
+                if index_name not in existing:
+                    Index(index_name, *[partition.c[column] for column in columns]).create(connection)
+
+    def _batch_size(self):
+        if has_app_context():
+            return current_app.config.get('ACTIVITY_LOG_DELETE_BATCH', 5000)
+        return 5000
+
+    def expire(self, cutoff):
+        """ลบ log ก่อน cutoff -> (ตารางเดือนที่ DROP, จำนวนแถวที่ลบทีละชุด)"""
+        cutoff = cutoff.astimezone(timezone.utc).replace(tzinfo=None) if cutoff.tzinfo else cutoff
+        engine = self.get_engine()
+        dropped, deleted = [], 0
+        remaining = [self.table]
+        for month, name in self.partitions(refresh=True):
+            if add_months(month, 1) <= cutoff:
+                # ทั้งเดือนหมดอายุ - DROP ทั้งตาราง ไม่ต้องลบทีละแถว
+                with engine.begin() as connection:
+                    self._partition_table(name).drop(connection)
+                self._tables.pop(name, None)
+                dropped.append(name)
+            elif month < cutoff:
+                remaining.append(self._partition_table(name))
+
+        batch_size = self._batch_size()
+        for table in remaining:
+            while True:
+                with engine.begin() as connection:
+                    ids = list(connection.scalars(
+                        select(table.c.id).where(table.c.created_at < cutoff).limit(batch_size)
+                    ))
+                    if ids:
+                        connection.execute(delete(table).where(table.c.id.in_(ids)))
+                deleted += len(ids)
+                if len(ids) < batch_size:
+                    break
+        self._forget()
+        return dropped, deleted
+
+    # ----- อ่าน -----
+    def page(self, session, cursor=None, per_page=50, criteria=None, since=None, options=(), partition_options=()):
+        """หนึ่งหน้าเรียงจากใหม่ไปเก่า -> KeysetPage ของ object ของ model
+
+        criteria(columns) -> list ของเงื่อนไข (columns = .c ของตารางที่กำลังอ่าน)
+        since: created_at ต่ำสุด - ตารางเดือนที่เก่ากว่านี้ทั้งเดือนจะไม่ถูกอ่าน
+        options: loader options ของตารางหลัก / partition_options: ของตารางเดือน (ใช้ joinedload ไม่ได้)
+        """
+        model = self.model
+        position = decode_cursor(cursor)
+        if position is not None and (len(position) != 3 or not isinstance(position[1], datetime)):
+            position = None
+
+        def where(table):
+            clauses = list(criteria(table.c)) if criteria else []
+            if since is not None:
+                clauses.append(table.c.created_at >= since)
+            return clauses
+
+        items = []
+        for source in self._sources(position[0] if position else None, since):
+            table = self.table if source == self.table.name else self._partition_table(source)
+            clauses = where(table)
+            if position and position[0] == source:
+                clauses.append(keyset_after([table.c.created_at, table.c.id], position[1:]))
+            limit = per_page + 1 - len(items)
+            order = (table.c.created_at.desc(), table.c.id.desc())
+            if table is self.table:
+                query = select(model).where(*clauses).order_by(*order).limit(limit).options(*options)
+            else:
+                # ตารางเดือนไม่ได้ map กับ model - อ่านแถวแล้วให้ ORM สร้าง object ตามชื่อคอลัมน์
+                query = select(model).from_statement(
+                    select(table).where(*clauses).order_by(*order).limit(limit)
+                ).options(*partition_options)
+            rows = session.scalars(query).unique().all()
+            items.extend((source, row) for row in rows)
+            if len(items) > per_page:
+                break
+
+        next_cursor = None
+        if len(items) > per_page:
+            items = items[:per_page]
+            source, row = items[-1]
+            next_cursor = encode_cursor([source, row.created_at, row.id])
+        return KeysetPage([row for _, row in items], per_page, next_cursor, cursor)
+
+    def _sources(self, start, since):
+        """ชื่อตารางตามลำดับการอ่าน เริ่มจากตารางของ cursor"""
+        partitions = self.partitions()
+        names = [self.table.name] + [name for month, name in partitions
+                                     if since is None or add_months(month, 1) > since]
+        if start is None or start == self.table.name:
+            return names
+        if start in names:
+            return names[names.index(start):]
+        # ตารางของ cursor ถูกลบไปแล้ว - อ่านต่อจากเดือนที่เก่ากว่า
+        match = self._pattern.match(start)
+        if not match:
+            return names
+        month = datetime(int(match.group(1)), int(match.group(2)), 1)
+        return [name for partition_month, name in partitions if partition_month < month and name in names]
+
+__all__ = ['MonthlyPartitions', 'month_start', 'add_months']
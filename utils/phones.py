@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Phone Lookup - ค้นหาลูกค้าด้วยเบอร์โทรแบบใช้ index
+
+เบอร์โทรถูกกรอกหลายรูปแบบ (08-1234-5678, +66 81 234 5678, 0812345678)
+จึงเก็บเพิ่มอีกสองคอลัมน์ที่มี index:
+    phone_digits    เฉพาะตัวเลขหลัง clean_phone_number  เช่น 0812345678
+    phone_reversed  ตัวเลขกลับด้าน                     เช่น 8765432180
+
+"ค้นด้วยเลขท้าย 4 ตัว" (5678) จึงกลายเป็นการค้นคำนำหน้า '8765' บน phone_reversed
+ซึ่งเขียนเป็นช่วง phone_reversed >= '8765' AND phone_reversed < '8765:'
+(':' อยู่ถัดจาก '9' ใน ASCII) ใช้ index ได้ทุกฐานข้อมูลโดยไม่ขึ้นกับ collation ของ LIKE
+"""
+
+import re
+from sqlalchemy import and_, bindparam, event, or_, select, update
+from utils.helpers import clean_phone_number
+
+MIN_LOOKUP_DIGITS = 3
+FULL_NUMBER_DIGITS = 9
+_PHONE_LIKE = re.compile(r'^[\d\s\-+().]+$')
+
+def normalize_phone(phone):
+    """เบอร์โทรเป็นตัวเลขล้วนตามรูปแบบของ clean_phone_number (None ถ้าว่าง)"""
+    digits = re.sub(r'\D', '', clean_phone_number(phone or ''))
+    return digits or None
+
+def reverse_digits(digits):
+    return digits[::-1] if digits else None
+
+def phone_query_digits(query):
+    """ตัวเลขจากคำค้นที่ดูเหมือนเบอร์โทร (อย่างน้อย 3 หลัก) หรือ None"""
+    query = (query or '').strip()
+    if not query or not _PHONE_LIKE.match(query):
+        return None
+    digits = re.sub(r'\D', '', query)
+    return digits if len(digits) >= MIN_LOOKUP_DIGITS else None
+
+def _prefix(column, prefix):
+    return and_(column >= prefix, column < prefix + ':')
+
+def track_phone(model, source='phone', digits='phone_digits', reversed_digits='phone_reversed'):
+    """ตั้งค่า phone_digits / phone_reversed ทุกครั้งที่ insert / update model"""
+    def sync(mapper, connection, target):
+        value = normalize_phone(getattr(target, source))
+        setattr(target, digits, value)
+        setattr(target, reversed_digits, reverse_digits(value))
+    event.listen(model, 'before_insert', sync)
+    event.listen(model, 'before_update', sync)
+
+def phone_filter(model, query):
+    """เงื่อนไขค้นหาด้วยเบอร์โทร (index seek) หรือ None ถ้าคำค้นไม่ใช่เบอร์โทร
+
+    เบอร์เต็ม -> เท่ากับ phone_digits
+    เบอร์บางส่วน -> ขึ้นต้นด้วย (phone_digits) หรือ ลงท้ายด้วย (phone_reversed)
+    """
+    digits = phone_query_digits(query)
+    if digits is None:
+        return None
+    if len(digits) >= FULL_NUMBER_DIGITS:
+        return model.phone_digits == normalize_phone(digits)
+    return or_(
+        _prefix(model.phone_reversed, reverse_digits(digits)),
+        _prefix(model.phone_digits, digits),
+    )
+
+def same_phone(model, phone):
+    """เงื่อนไขหาเบอร์ซ้ำ ไม่ว่าจะกรอกรูปแบบไหน"""
+    return model.phone_digits == normalize_phone(phone)
+
+def backfill_table(connection, table, batch_size=1000):
+    """เติม phone_digits / phone_reversed ของ table (keyset ทีละ batch, ไม่ commit) -> จำนวนแถวที่แก้
+
+    connection เป็น Session หรือ Connection ก็ได้ (migration ส่ง op.get_bind() มา)
+    """
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam('row_id'))
+        .values(phone_digits=bindparam('digits'), phone_reversed=bindparam('reversed'))
+    )
+    last_id, updated = 0, 0
+    while True:
+        rows = connection.execute(
+            select(table.c.id, table.c.phone, table.c.phone_digits)
+            .where(table.c.id > last_id)
+            .order_by(table.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            break
+        changes = []
+        for row_id, phone, current in rows:
+            digits = normalize_phone(phone)
+            if digits != current:
+                changes.append({'row_id': row_id, 'digits': digits, 'reversed': reverse_digits(digits)})
+        if changes:
+            connection.execute(stmt, changes)
+            updated += len(changes)
+        last_id = rows[-1][0]
+    return updated
+
+def backfill_phones(session, model, batch_size=1000):
+    """เติม phone_digits / phone_reversed ให้แถวเดิมของ model แล้ว commit -> จำนวนแถวที่แก้"""
+    updated = backfill_table(session, model.__table__, batch_size)
+    session.commit()
+    return updated
+
+__all__ = [
+    'normalize_phone', 'reverse_digits', 'phone_query_digits', 'track_phone',
+    'phone_filter', 'same_phone', 'backfill_table', 'backfill_phones'
+]
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Read Replica - ส่ง query ของหน้ารายงาน / export ไปที่ engine อ่านอย่างเดียวแยกจาก engine หลัก
+
+เดิมรายงานหนัก ๆ และ CSV export ใช้ connection pool เดียวกับการเขียนของ POS
+query ที่ใช้เวลานานจึงยึด connection ไว้จน checkout ต้องรอ
+    - use_replica(): context ที่สลับ db.session (ของ app context ปัจจุบัน) เป็น session ของ replica
+      ทุกอย่างที่ใช้ db.session / Model.query ภายใน context ไปที่ replica - ออกจาก context แล้วกลับเป็นเดิม
+    - read_only: decorator ของ view (ครอบทั้ง view) - Response แบบ streaming ใช้ session ของ replica
+      ต่อจนส่งครบแล้วจึงปิด
+    - engine ของ replica:
+        REPLICA_DATABASE_URL (เช่น PostgreSQL / MySQL replica) - pool แยกขนาด REPLICA_POOL_SIZE
+        ไม่ตั้ง + ฐานข้อมูลหลักเป็นไฟล์ SQLite โหมด WAL -> เปิดไฟล์เดียวกันแบบ mode=ro
+        (แต่ละ transaction อ่าน snapshot ของ WAL ไม่บล็อกและไม่ถูกผู้เขียนบล็อก)
+        นอกนั้น (เช่น SQLite ในหน่วยความจำ) ไม่มี replica - use_replica() ใช้ session หลักตามเดิม
+    - ห้ามเขียน: flush / INSERT / UPDATE / DELETE ผ่าน session ของ replica -> ReadOnlyError
+      และ connection ของ replica เองก็อ่านอย่างเดียว (PRAGMA query_only / read-only transaction)
+    - replica ตามไม่ทัน (lag เกิน REPLICA_MAX_LAG_SECONDS) หรือเชื่อมต่อไม่ได้ -> ใช้ engine หลักแทน
+      ตรวจ lag ไม่เกินทุก REPLICA_CHECK_SECONDS (snapshot ของ SQLite ไม่มี lag)
+
+Config: REPLICA_DATABASE_URL, REPLICA_SQLITE_SNAPSHOT, REPLICA_POOL_SIZE, REPLICA_MAX_LAG_SECONDS,
+        REPLICA_CHECK_SECONDS
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from flask import Response, current_app
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+from utils.engine import apply_sqlite_pragmas, engine_options
+
+# PRAGMA ของ engine หลักที่ใช้กับ connection อ่านอย่างเดียวได้ (journal_mode / synchronous ตั้งไม่ได้)
+_SQLITE_READ_PRAGMAS = ('busy_timeout', 'cache_size', 'mmap_size', 'temp_store')
+_READ_KEYWORDS = ('SELECT', 'WITH', 'PRAGMA', 'EXPLAIN', 'SHOW', 'VALUES')
+
+class ReadOnlyError(RuntimeError):
+    """เขียนผ่าน session ของ replica"""
+
+def _is_write(statement):
+    if isinstance(statement, TextClause):
+        words = statement.text.lstrip().split(None, 1)
+        return bool(words) and words[0].upper() not in _READ_KEYWORDS
+    return bool(getattr(statement, 'is_dml', False) or getattr(statement, 'is_ddl', False))
+
+class ReplicaSession(Session):
+    """session ของ replica - อ่านอย่างเดียว"""
+
+@event.listens_for(ReplicaSession, 'before_flush')
+def _reject_flush(session, flush_context, instances):
+    raise ReadOnlyError('Replica session is read-only (flush)')
+
+@event.listens_for(ReplicaSession, 'do_orm_execute')
+def _reject_write(orm_execute_state):
+    if _is_write(orm_execute_state.statement):
+        raise ReadOnlyError(f'Replica session is read-only: {orm_execute_state.statement}')
+
+class _AppState:
+    """engine ของ replica + ผลตรวจ lag ล่าสุดของหนึ่งแอป"""
+
+    def __init__(self, engine=None, mode=None):
+        self.engine = engine
+        self.mode = mode
+        self.lag = 0.0 if mode == 'snapshot' else None
+        self.fresh = engine is not None
+        self.checked_at = 0.0
+
+class ReadReplica:
+    """การส่ง query ไป replica ของ db (Flask-SQLAlchemy) หนึ่งตัว"""
+
+    def __init__(self, db, name='replica'):
+        self.db = db
+        self.name = name
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    # ----- engine -----
+    def _state(self, app):
+        state = app.extensions.get(self.name)
+        if state is None:
+            with self._lock:
+                state = app.extensions.get(self.name)
+                if state is None:
+                    state = app.extensions[self.name] = self._build(app)
+        return state
+
+    def _build(self, app):
+        config = app.config
+        if config.get('REPLICA_DATABASE_URL'):
+            replica_config = {
+                **config,
+                'SQLALCHEMY_DATABASE_URI': config['REPLICA_DATABASE_URL'],
+                'SQLALCHEMY_ENGINE_OPTIONS': {},
+                'DB_POOL_SIZE': config.get('REPLICA_POOL_SIZE', 5),
+            }
+            engine = create_engine(config['REPLICA_DATABASE_URL'], **engine_options(replica_config))
+            mode = 'url'
+        else:
+            primary = self.db.engine
+            pragmas = app.extensions.get('engine_profile', {}).get('pragmas', {})
+            if (primary.dialect.name != 'sqlite' or not config.get('REPLICA_SQLITE_SNAPSHOT', True)
+                    or str(pragmas.get('journal_mode', '')).upper() != 'WAL'
+                    or primary.url.database in (None, '', ':memory:') or 'mode=memory' in str(primary.url)):
+                return _AppState()
+            path = os.path.abspath(primary.url.database)
+            engine = create_engine(
+                f'sqlite:///file:{path}?mode=ro&uri=true',
+                **engine_options({**config, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+                                  'SQLALCHEMY_ENGINE_OPTIONS': {}})
+            )
+            apply_sqlite_pragmas(engine, [
+                (name, pragmas[name]) for name in _SQLITE_READ_PRAGMAS if name in pragmas
+            ])
+            mode = 'snapshot'
+        _read_only_connections(engine)
+        return _AppState(engine, mode)
+
+    def engine(self, app=None):
+        """engine ของ replica (None = ไม่มี replica)"""
+        return self._state(app or current_app._get_current_object()).engine
+
+    # ----- lag -----
+    def lag(self, app=None):
+        """lag ของ replica เป็นวินาที (อ่านจาก replica ทุกครั้ง)"""
+        state = self._state(app or current_app._get_current_object())
+        if state.engine is None or state.mode == 'snapshot':
+            return 0.0
+        with state.engine.connect() as connection:
+            return _replication_lag(connection)
+
+    def _fresh(self, app, state):
+        now = time.monotonic()
+        if state.mode == 'snapshot' or now - state.checked_at < app.config.get('REPLICA_CHECK_SECONDS', 5):
+            return state.fresh
+        state.checked_at = now
+        try:
+            state.lag = self.lag(app)
+            state.fresh = state.lag is not None and state.lag <= app.config.get('REPLICA_MAX_LAG_SECONDS', 30)
+            if not state.fresh:
+                app.logger.warning(f'Replica lag {state.lag}s - reading from primary')
+        except Exception as e:
+            state.lag, state.fresh = None, False
+            app.logger.warning(f'Replica unavailable - reading from primary: {e}')
+        return state.fresh
+
+    # ----- routing -----
+    @contextmanager
+    def use_replica(self):
+        """สลับ db.session เป็น session ของ replica ภายใน context -> session ที่ใช้อยู่"""
+        app = current_app._get_current_object()
+        registry = self.db.session.registry
+        current = registry() if registry.has() else None
+        if isinstance(current, ReplicaSession):
+            # ซ้อนกัน - ใช้ session ของ context นอก
+            yield current
+            return
+
+        state = self._state(app)
+        if state.engine is None or not self._fresh(app, state):
+            self._count('primary' if state.engine is None else 'fallback')
+            yield self.db.session()
+            return
+
+        session = ReplicaSession(bind=state.engine, query_cls=self.db.Query)
+        registry.set(session)
+        self._count('replica')
+        try:
+            yield session
+        finally:
+            if not session.info.pop('streaming', False):
+                session.close()
+            if current is not None:
+                registry.set(current)
+            else:
+                registry.clear()
+
+    def read_only(self, view):
+        """decorator ของ view ที่อ่านอย่างเดียว (รายงาน / export) - ทั้ง view ใช้ replica"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with self.use_replica() as session:
+                response = view(*args, **kwargs)
+                if isinstance(session, ReplicaSession) and isinstance(response, Response) and response.is_streamed:
+                    # generator ของ stream_with_context ยังใช้ session นี้หลัง view คืนค่า
+                    session.info['streaming'] = True
+                    response.call_on_close(session.close)
+            return response
+        return wrapper
+
+    def metrics(self, app=None):
+        app = app or current_app._get_current_object()
+        state = self._state(app)
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            'mode': state.mode,
+            'fresh': state.fresh,
+            'lag': state.lag,
+            'counters': counters,
+        }
+
+def _read_only_connections(engine):
+    """ให้ทุก connection ของ engine เขียนไม่ได้ที่ระดับฐานข้อมูลด้วย"""
+    statement = {
+        'sqlite': 'PRAGMA query_only=ON',
+        'postgresql': 'SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY',
+        'mysql': 'SET SESSION TRANSACTION READ ONLY',
+        'mariadb': 'SET SESSION TRANSACTION READ ONLY',
+    }.get(engine.dialect.name)
+    if statement is None:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_read_only(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(statement)
+        finally:
+            cursor.close()
+
+def _replication_lag(connection):
+    """lag (วินาที) จาก replica เอง - None = replication หยุดอยู่, 0 = ไม่ใช่ replica / ตามทัน"""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        return float(connection.scalar(text(
+            'SELECT CASE WHEN NOT pg_is_in_recovery() '
+            'OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+            'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+        )))
+    if dialect in ('mysql', 'mariadb'):
+        try:
+            row = connection.execute(text('SHOW REPLICA STATUS')).mappings().first()
+        except DBAPIError:
+            # MySQL < 8.0.22 / MariaDB
+            row = connection.execute(text('SHOW SLAVE STATUS')).mappings().first()
+        if row is None:
+            return 0.0
+        seconds = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+        return None if seconds is None else float(seconds)
+    # ไฟล์สำเนาอื่น ๆ วัด lag ไม่ได้ - ถือว่าตามทัน
+    return 0.0
+
+__all__ = ['ReadReplica', 'ReplicaSession', 'ReadOnlyError']
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Daily Sales Rollup - สรุปยอดขายรายวัน (รวม และแยกตามสินค้า)
+
+รายงานและกราฟอ่านจากตาราง rollup แทนการ GROUP BY func.date(Sale.created_at)
+บนตารางขายทั้งหมด ตาราง rollup อัพเดตใน flush เดียวกับการบันทึกการขาย
+และสร้างย้อนหลังได้ด้วย DailySalesRollup.rebuild()
+
+ตาราง rollup ใช้ได้เมื่อมี marker ใน counter_model (rollup.<ตาราง>.built_at) ซึ่งเขียนหลัง
+rebuild() ทั้งหมด หรือตอนสร้างตารางบนฐานข้อมูลที่ยังไม่มีการขาย ก่อนหน้านั้น
+(เช่น migration สร้างตารางว่างบนข้อมูลเดิม) ผู้อ่านคำนวณจากตารางขายโดยตรง
+สร้าง rollup ย้อนหลังด้วย: flask rebuild-sales-summary
+"""
+
+import weakref
+from collections import defaultdict, namedtuple
+from datetime import date, datetime, timezone
+from sqlalchemy import event, inspect, select, insert, func
+from sqlalchemy.orm import Session
+from utils.counters import ROLLUP_PREFIX, bucket_date, increment_row
+from utils.dateranges import date_bounds
+
+_ROLLUPS = {}
+
+DaySales = namedtuple('DaySales', 'date count total subtotal tax discount')
+
+class DailySalesRollup:
+    """Rollup รายวันของ Sale / SaleItem หนึ่ง schema
+
+    summary_model: sales_date, sales_count, revenue, subtotal, tax_amount, discount_amount
+    product_model: sales_date, product_id, quantity, revenue
+    counter_model: ตาราง key / value (StatCounter) สำหรับ marker - None = ถือว่า rollup พร้อมเสมอ
+    """
+
+    def __init__(self, sale_model, item_model, summary_model, product_model,
+                 total_attr='total_amount', subtotal_attr='subtotal',
+                 tax_attr='tax_amount', discount_attr='discount_amount',
+                 timestamp_attr='created_at', item_total_attr='total_price', counter_model=None):
+        self.sale_model = sale_model
+        self.item_model = item_model
+        self.summary_model = summary_model
+        self.product_model = product_model
+        self.counter_model = counter_model
+        self.built_key = f'{ROLLUP_PREFIX}{summary_model.__tablename__}.built_at'
+        self._ready = weakref.WeakKeyDictionary()
+        self.timestamp_attr = timestamp_attr
+        self.item_total_attr = item_total_attr
+        # summary column -> Sale attribute
+        self.amount_fields = {
+            'revenue': total_attr,
+            'subtotal': subtotal_attr,
+            'tax_amount': tax_attr,
+            'discount_amount': discount_attr,
+        }
+        _ROLLUPS[sale_model] = self
+        _ROLLUPS[item_model] = self
+        if counter_model is not None:
+            event.listen(summary_model.metadata, 'after_create', self._create_with_metadata)
+
+    # ----- marker -----
+    def _built(self, connection):
+        counter = self.counter_model.__table__
+        return connection.execute(
+            select(counter.c.id).where(counter.c.key == self.built_key)
+        ).first() is not None
+
+    def mark_built(self, connection):
+        """เขียน marker - ตาราง rollup มีข้อมูลครบแล้ว"""
+        counter = self.counter_model.__table__
+        now = datetime.now(timezone.utc)
+        connection.execute(counter.delete().where(counter.c.key == self.built_key))
+        connection.execute(insert(counter), [{'key': self.built_key, 'value': now.timestamp(), 'updated_at': now}])
+
+    def _create_with_metadata(self, target, connection, **kw):
+        # ฐานข้อมูลที่ยังไม่มีการขาย: rollup ว่างก็ครบแล้ว
+        tables = inspect(connection)
+        if not all(tables.has_table(model.__tablename__)
+                   for model in (self.counter_model, self.sale_model, self.summary_model)):
+            return
+        if not self._built(connection) and connection.execute(
+                select(self.sale_model.__table__.c.id).limit(1)).first() is None:
+            self.mark_built(connection)
+
+    def ready(self, session):
+        """True เมื่อตาราง rollup เชื่อถือได้ (มี marker) - ไม่เช่นนั้นผู้อ่านคำนวณจากตารางขาย"""
+        if self.counter_model is None:
+            return True
+        engine = session.get_bind()
+        if self._ready.get(engine):
+            return True
+        # จำเฉพาะผลบวก - marker อาจถูกเขียนภายหลังด้วย rebuild()
+        found = self._built(session)
+        if found:
+            self._ready[engine] = True
+        return found
+
+    # ----- incremental maintenance -----
+    def _sale_date(self, sale):
+        return bucket_date(getattr(sale, self.timestamp_attr))
+
+    def _item_sale(self, session, item):
+        sale = item.sale
+        if sale is None and item.sale_id is not None:
+            sale = session.get(self.sale_model, item.sale_id)
+        return sale
+
+    def _sale_delta(self, sale, sign, summary):
+        row = summary[self._sale_date(sale)]
+        row['sales_count'] += sign
+        for column, attr in self.amount_fields.items():
+            row[column] += sign * float(getattr(sale, attr) or 0)
+
+    def _sale_changed(self, sale, summary):
+        state = inspect(sale)
+        row = summary[self._sale_date(sale)]
+        for column, attr in self.amount_fields.items():
+            history = state.attrs[attr].history
+            if history.has_changes():
+                old = float(history.deleted[0] or 0) if history.deleted else 0.0
+                new = float(history.added[0] or 0) if history.added else 0.0
+                row[column] += new - old
+
+    def _item_delta(self, session, item, sign, products, quantity=None, revenue=None):
+        sale = self._item_sale(session, item)
+        key = (self._sale_date(sale) if sale else bucket_date(None), item.product_id)
+        products[key]['quantity'] += sign * (quantity if quantity is not None else item.quantity or 0)
+        products[key]['revenue'] += sign * float(
+            revenue if revenue is not None else getattr(item, self.item_total_attr) or 0
+        )
+
+    def _item_changed(self, session, item, products):
+        state = inspect(item)
+        qty, total = state.attrs.quantity.history, state.attrs[self.item_total_attr].history
+        if not (qty.has_changes() or total.has_changes()):
+            return
+        old_qty = qty.deleted[0] if qty.deleted else item.quantity
+        old_total = total.deleted[0] if total.deleted else getattr(item, self.item_total_attr)
+        self._item_delta(session, item, -1, products, old_qty or 0, old_total or 0)
+        self._item_delta(session, item, 1, products)
+
+    def collect(self, session, summary, products):
+        for objects, sign in ((session.new, 1), (session.deleted, -1)):
+            for obj in objects:
+                if type(obj) is self.sale_model:
+                    self._sale_delta(obj, sign, summary)
+                elif type(obj) is self.item_model:
+                    self._item_delta(session, obj, sign, products)
+        for obj in session.dirty:
+            if obj in session.deleted:
+                continue
+            if type(obj) is self.sale_model:
+                self._sale_changed(obj, summary)
+            elif type(obj) is self.item_model:
+                self._item_changed(session, obj, products)
+
+    def apply(self, connection, summary, products):
+        summary_table = self.summary_model.__table__
+        product_table = self.product_model.__table__
+        for sales_date, increments in summary.items():
+            if any(increments.values()):
+                increment_row(connection, summary_table, {'sales_date': sales_date},
+                              _typed(increments, 'sales_count'))
+        for (sales_date, product_id), increments in products.items():
+            if any(increments.values()):
+                increment_row(connection, product_table,
+                              {'sales_date': sales_date, 'product_id': product_id},
+                              _typed(increments, 'quantity'))
+
+    def record_items(self, connection, sale, rows):
+        """บันทึก rollup ของ SaleItem ที่ insert ด้วย Core/bulk insert (ไม่ผ่าน flush)"""
+        products = defaultdict(lambda: defaultdict(float))
+        sales_date = self._sale_date(sale)
+        for row in rows:
+            products[(sales_date, row['product_id'])]['quantity'] += row['quantity'] or 0
+            products[(sales_date, row['product_id'])]['revenue'] += float(row[self.item_total_attr] or 0)
+        self.apply(connection, {}, products)
+
+    # ----- backfill -----
+    def rebuild(self, session, start_date=None, end_date=None):
+        """สร้าง rollup ใหม่จากประวัติการขาย (ช่วงวันที่แบบ inclusive หรือทั้งหมด)"""
+        summary = defaultdict(lambda: defaultdict(float))
+        products = defaultdict(lambda: defaultdict(float))
+        ts_col = getattr(self.sale_model, self.timestamp_attr)
+        amount_cols = [getattr(self.sale_model, attr) for attr in self.amount_fields.values()]
+        window = self._window(start_date, end_date)
+
+        rows = session.execute(
+            select(ts_col, *amount_cols).where(*window).execution_options(yield_per=1000)
+        )
+        for timestamp, *amounts in rows:
+            row = summary[bucket_date(timestamp)]
+            row['sales_count'] += 1
+            for column, amount in zip(self.amount_fields, amounts):
+                row[column] += float(amount or 0)
+
+        item = self.item_model
+        rows = session.execute(
+            select(ts_col, item.product_id, item.quantity, getattr(item, self.item_total_attr))
+            .join(self.sale_model, item.sale_id == self.sale_model.id)
+            .where(*window)
+            .execution_options(yield_per=1000)
+        )
+        for timestamp, product_id, quantity, total in rows:
+            sales_date = bucket_date(timestamp)
+            products[(sales_date, product_id)]['quantity'] += quantity or 0
+            products[(sales_date, product_id)]['revenue'] += float(total or 0)
+
+        summary_table = self.summary_model.__table__
+        product_table = self.product_model.__table__
+        for table in (summary_table, product_table):
+            stmt = table.delete()
+            if start_date:
+                stmt = stmt.where(table.c.sales_date >= start_date)
+            if end_date:
+                stmt = stmt.where(table.c.sales_date <= end_date)
+            session.execute(stmt)
+
+        now = datetime.now(timezone.utc)
+        if summary:
+            session.execute(insert(summary_table), [
+                {'sales_date': d, 'updated_at': now, **_typed(values, 'sales_count')}
+                for d, values in summary.items()
+            ])
+        if products:
+            session.execute(insert(product_table), [
+                {'sales_date': d, 'product_id': pid, 'updated_at': now, **_typed(values, 'quantity')}
+                for (d, pid), values in products.items()
+            ])
+        if self.counter_model is not None and not (start_date or end_date):
+            self.mark_built(session)
+        session.commit()
+        return len(summary), len(products)
+
+    def _window(self, start_date=None, end_date=None):
+        """ช่วงวันที่ท้องถิ่น -> เงื่อนไข created_at แบบ half-open (ใช้ index ไม่ต้องอ่านประวัติทั้งหมด)"""
+        ts_col = getattr(self.sale_model, self.timestamp_attr)
+        window = []
+        if start_date:
+            window.append(ts_col >= date_bounds(start_date)[0])
+        if end_date:
+            window.append(ts_col < date_bounds(end_date)[1])
+        return window
+
+    # ----- readers -----
+    def by_day(self, session, start_date, end_date=None):
+        """ยอดขายรายวัน -> rows (date, count, total, subtotal, tax, discount)"""
+        if not self.ready(session):
+            return self._by_day_from_sales(session, start_date, end_date)
+        s = self.summary_model
+        query = select(
+            s.sales_date.label('date'),
+            s.sales_count.label('count'),
+            s.revenue.label('total'),
+            s.subtotal.label('subtotal'),
+            s.tax_amount.label('tax'),
+            s.discount_amount.label('discount')
+        ).where(s.sales_date >= start_date)
+        if end_date:
+            query = query.where(s.sales_date <= end_date)
+        return session.execute(query.order_by(s.sales_date)).all()
+
+    def totals(self, session, start_date=None, end_date=None):
+        """ผลรวมของช่วงวันที่ -> row (count, total, subtotal, tax, discount)"""
+        if not self.ready(session):
+            return self._totals_from_sales(session, start_date, end_date)
+        s = self.summary_model
+        query = select(
+            func.coalesce(func.sum(s.sales_count), 0).label('count'),
+            func.coalesce(func.sum(s.revenue), 0).label('total'),
+            func.coalesce(func.sum(s.subtotal), 0).label('subtotal'),
+            func.coalesce(func.sum(s.tax_amount), 0).label('tax'),
+            func.coalesce(func.sum(s.discount_amount), 0).label('discount')
+        )
+        if start_date:
+            query = query.where(s.sales_date >= start_date)
+        if end_date:
+            query = query.where(s.sales_date <= end_date)
+        return session.execute(query).one()
+
+    def top_products(self, session, product_model, start_date, end_date=None,
+                     limit=10, order_by='quantity'):
+        """สินค้าขายดี -> rows (name, total_quantity, total_revenue)"""
+        if not self.ready(session):
+            return self._top_products_from_sales(session, product_model, start_date, end_date, limit, order_by)
+        p = self.product_model
+        total_quantity = func.sum(p.quantity).label('total_quantity')
+        total_revenue = func.sum(p.revenue).label('total_revenue')
+        query = select(
+            product_model.name, total_quantity, total_revenue
+        ).join(product_model, product_model.id == p.product_id).where(p.sales_date >= start_date)
+        if end_date:
+            query = query.where(p.sales_date <= end_date)
+        order = total_revenue if order_by == 'revenue' else total_quantity
+        return session.execute(
+            query.group_by(product_model.id, product_model.name).order_by(order.desc()).limit(limit)
+        ).all()
+
+    # ----- readers จากตารางขาย (ก่อน rollup พร้อม) -----
+    def _by_day_from_sales(self, session, start_date, end_date=None):
+        ts_col = getattr(self.sale_model, self.timestamp_attr)
+        amount_cols = [getattr(self.sale_model, attr) for attr in self.amount_fields.values()]
+        days = defaultdict(lambda: [0, 0.0, 0.0, 0.0, 0.0])
+        rows = session.execute(
+            select(ts_col, *amount_cols).where(*self._window(start_date, end_date))
+            .execution_options(yield_per=1000)
+        )
+        # จัดกลุ่มตามวันที่ท้องถิ่นด้วย bucket_date ให้ตรงกับตาราง rollup
+        for timestamp, *amounts in rows:
+            day = days[bucket_date(timestamp)]
+            day[0] += 1
+            for i, amount in enumerate(amounts, 1):
+                day[i] += float(amount or 0)
+        return [DaySales(sales_date, *values) for sales_date, values in sorted(days.items())]
+
+    def _totals_from_sales(self, session, start_date=None, end_date=None):
+        sale = self.sale_model
+        query = select(
+            func.count(sale.id).label('count'),
+            *[func.coalesce(func.sum(getattr(sale, attr)), 0).label(label)
+              for label, attr in zip(('total', 'subtotal', 'tax', 'discount'), self.amount_fields.values())]
+        ).where(*self._window(start_date, end_date))
+        return session.execute(query).one()
+
+    def _top_products_from_sales(self, session, product_model, start_date, end_date=None,
+                                 limit=10, order_by='quantity'):
+        item = self.item_model
+        total_quantity = func.sum(item.quantity).label('total_quantity')
+        total_revenue = func.sum(getattr(item, self.item_total_attr)).label('total_revenue')
+        query = (
+            select(product_model.name, total_quantity, total_revenue)
+            .join(product_model, product_model.id == item.product_id)
+            .join(self.sale_model, self.sale_model.id == item.sale_id)
+            .where(*self._window(start_date, end_date))
+        )
+        order = total_revenue if order_by == 'revenue' else total_quantity
+        return session.execute(
+            query.group_by(product_model.id, product_model.name).order_by(order.desc()).limit(limit)
+        ).all()
+
+def _typed(increments, int_column):
+    return {k: int(v) if k == int_column else v for k, v in increments.items()}
+
+def as_date(value):
+    """แปลง str 'YYYY-MM-DD' / datetime / date เป็น date"""
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+@event.listens_for(Session, 'after_flush')
+def _update_rollups(session, flush_context):
+    if not _ROLLUPS:
+        return
+    touched = {}
+    for obj in (*session.new, *session.deleted, *session.dirty):
+        rollup = _ROLLUPS.get(type(obj))
+        if rollup and rollup not in touched:
+            touched[rollup] = (
+                defaultdict(lambda: defaultdict(float)), defaultdict(lambda: defaultdict(float))
+            )
+    for rollup, (summary, products) in touched.items():
+        rollup.collect(session, summary, products)
+        rollup.apply(session.connection(), summary, products)
+
+def record_bulk_items(session, item_model, sale, rows):
+    """ให้ rollup ของ item_model (ถ้ามี) นับแถวที่ bulk insert เอง"""
+    rollup = _ROLLUPS.get(item_model)
+    if rollup is not None:
+        rollup.record_items(session.connection(), sale, rows)
+
+__all__ = ['DailySalesRollup', 'DaySales', 'as_date', 'record_bulk_items']
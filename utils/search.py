@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Full-Text Search - ดัชนีค้นหา SQLite FTS5 สำหรับลูกค้า งานซ่อม งาน และสินค้า
+
+ใช้ tokenizer แบบ trigram: ข้อความภาษาไทยไม่มีช่องว่างระหว่างคำ trigram จึงค้นหา
+ส่วนใดของคำก็ได้ (เหมือน LIKE '%q%') แต่ใช้ index แทนการ scan ตาราง
+ตัวอักษรละตินไม่สนตัวพิมพ์เล็ก/ใหญ่
+
+แต่ละ model ลงทะเบียนผ่าน index_model() แล้ว listener after_flush จะเขียน
+ดัชนีใน transaction เดียวกับข้อมูล (เหมือน utils/counters) rowid ของแถวในดัชนี
+คือ ref_id * 16 + code จึงแก้/ลบแถวได้โดยไม่ต้อง scan
+
+ดัชนีใช้ได้เมื่อมีแถว marker (rowid 0 - code จริงคือ 1-15) ซึ่งเขียนหลังเติมข้อมูลครบแล้ว
+ฐานข้อมูลที่ไม่ใช่ SQLite หรือดัชนียังไม่ถูกสร้าง (เช่น migration สร้างตารางว่างบนข้อมูลเดิม)
+จะใช้ ilike บนคอลัมน์เดิมจนกว่าจะรัน: flask rebuild-search-index
+ตารางต้นทางว่าง (ฐานข้อมูลใหม่) ถือว่าสร้างดัชนีแล้วทันที
+"""
+
+import weakref
+from collections import namedtuple
+from sqlalchemy import (
+    Column, Integer, MetaData, String, Table, Text, and_, bindparam, event, func, inspect,
+    literal_column, or_, select, text
+)
+from sqlalchemy.orm import Session
+
+SEARCH_TABLE = 'search_index'
+MIN_TERM_LENGTH = 3  # trigram ต้องมีอย่างน้อย 3 ตัวอักษร - สั้นกว่านั้นใช้ LIKE บนดัชนี
+_CODE_BITS = 16
+BUILT_ROWID = 0
+BUILT_KIND = '__built__'
+
+# ตารางนี้อยู่นอก db.metadata เพื่อไม่ให้ create_all สร้างเป็นตารางธรรมดา
+search_index = Table(
+    SEARCH_TABLE, MetaData(),
+    Column('rowid', Integer, primary_key=True),
+    Column('kind', String),
+    Column('ref_id', Integer),
+    Column('title', Text),
+    Column('body', Text),
+)
+
+CREATE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "kind UNINDEXED, ref_id UNINDEXED, title, body, tokenize='trigram')"
+)
+
+SearchHit = namedtuple('SearchHit', 'kind ref_id score')
+
+class _DocSpec:
+    def __init__(self, model, kind, code, title, body):
+        self.model = model
+        self.kind = kind
+        self.code = code
+        self.title = tuple(title)
+        self.body = tuple(body)
+
+    @property
+    def fields(self):
+        return self.title + self.body
+
+    def rowid(self, ref_id):
+        return ref_id * _CODE_BITS + self.code
+
+    def document(self, values):
+        """values: mapping ของ field -> ค่า"""
+        join = lambda names: ' '.join(str(values[name]) for name in names if values[name] not in (None, ''))
+        return join(self.title), join(self.body)
+
+    def row(self, ref_id, values):
+        title, body = self.document(values)
+        return {'rowid': self.rowid(ref_id), 'kind': self.kind, 'ref_id': ref_id, 'title': title, 'body': body}
+
+_SPECS = {}
+_KINDS = {}
+_available = weakref.WeakKeyDictionary()
+
+def index_model(model, kind, code, title=(), body=()):
+    """ลงทะเบียน model ในดัชนี - code (1-15) ต้องไม่ซ้ำและห้ามเปลี่ยนหลังสร้างดัชนีแล้ว"""
+    if not 0 < code < _CODE_BITS:
+        raise ValueError(f'code must be between 1 and {_CODE_BITS - 1}')
+    if any(spec.code == code and spec.kind != kind for spec in _KINDS.values()):
+        raise ValueError(f'search code {code} already used')
+    spec = _DocSpec(model, kind, code, title, body)
+    _SPECS[model] = spec
+    _KINDS[kind] = spec
+
+def create_index(connection):
+    """สร้าง virtual table (เฉพาะ SQLite) - ยังไม่ถือว่าใช้ได้จนกว่าจะ mark_built()"""
+    if connection.dialect.name != 'sqlite':
+        return False
+    connection.execute(text(CREATE_SQL))
+    return True
+
+def _built(connection):
+    return connection.execute(
+        select(search_index.c.rowid).where(search_index.c.rowid == BUILT_ROWID)
+    ).first() is not None
+
+def mark_built(connection):
+    """เขียนแถว marker - ดัชนีมีข้อมูลครบแล้ว"""
+    connection.execute(search_index.delete().where(search_index.c.rowid == BUILT_ROWID))
+    connection.execute(search_index.insert(), [
+        {'rowid': BUILT_ROWID, 'kind': BUILT_KIND, 'ref_id': None, 'title': '', 'body': ''}
+    ])
+
+def _sources_empty(connection):
+    """ตารางต้นทางทุกตารางว่าง (หรือยังไม่มี)"""
+    inspector = inspect(connection)
+    for spec in _SPECS.values():
+        table = spec.model.__table__
+        if inspector.has_table(table.name) and connection.execute(select(table.c.id).limit(1)).first():
+            return False
+    return True
+
+def _create_with_metadata(target, connection, **kw):
+    if create_index(connection) and not _built(connection) and _sources_empty(connection):
+        mark_built(connection)
+
+def attach(metadata):
+    """ให้ metadata.create_all() สร้างตารางดัชนีด้วย (ฐานข้อมูลใหม่ถือว่าสร้างดัชนีแล้ว)"""
+    event.listen(metadata, 'after_create', _create_with_metadata)
+
+def available(session_or_connection):
+    """True เมื่อฐานข้อมูลเป็น SQLite และดัชนี search_index ถูกสร้างครบแล้ว (มีแถว marker)"""
+    get_bind = getattr(session_or_connection, 'get_bind', None)
+    bind = get_bind() if get_bind else session_or_connection
+    engine = getattr(bind, 'engine', bind)
+    if engine.dialect.name != 'sqlite':
+        return False
+    if _available.get(engine):
+        return True
+    # จำเฉพาะผลบวก - ตาราง / marker อาจถูกสร้างภายหลังด้วย migration หรือ rebuild_index
+    # ตรวจผ่าน connection ของ transaction ปัจจุบัน - ยืม connection ใหม่จาก pool แล้วคืน
+    # จะ rollback งานที่ยังไม่ commit เมื่อเป็น SQLite ในหน่วยความจำ (connection เดียวกัน)
+    connection = session_or_connection.connection() if get_bind else session_or_connection
+    found = inspect(connection).has_table(SEARCH_TABLE) and _built(connection)
+    if found:
+        _available[engine] = True
+    return found
+
+# ----- การค้นหา -----
+def _terms(query):
+    """แยกคำค้นด้วยช่องว่าง -> (คำยาวสำหรับ MATCH, คำสั้นสำหรับ LIKE)"""
+    terms = [term for term in (query or '').split() if term]
+    long_terms = [term for term in terms if len(term) >= MIN_TERM_LENGTH]
+    short_terms = [term for term in terms if len(term) < MIN_TERM_LENGTH]
+    return long_terms, short_terms
+
+def _like(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+def _conditions(query, kinds=None):
+    """เงื่อนไข WHERE บน search_index -> (conditions, ใช้ MATCH หรือไม่) หรือ None ถ้าไม่มีคำค้น"""
+    long_terms, short_terms = _terms(query)
+    if not long_terms and not short_terms:
+        return None
+    conditions = []
+    if long_terms:
+        # ครอบแต่ละคำด้วย "..." ให้เป็น phrase (ไม่ตีความ operator ของ FTS5) และ AND ทุกคำ
+        expression = ' '.join('"' + term.replace('"', '""') + '"' for term in long_terms)
+        conditions.append(text(f'{SEARCH_TABLE} MATCH :search_query').bindparams(search_query=expression))
+    for term in short_terms:
+        pattern = _like(term)
+        conditions.append(or_(
+            search_index.c.title.like(pattern, escape='\\'),
+            search_index.c.body.like(pattern, escape='\\'),
+        ))
+    if kinds:
+        conditions.append(search_index.c.kind.in_(list(kinds)))
+    return conditions, bool(long_terms)
+
+def _score(ranked):
+    # title มีน้ำหนักมากกว่า body; bm25 ยิ่งน้อยยิ่งตรง
+    if ranked:
+        return literal_column(f'bm25({SEARCH_TABLE}, 0.0, 0.0, 10.0, 1.0)')
+    return literal_column('0.0')
+
+def search(session, query, kinds=None, limit=20, offset=0):
+    """ผลการค้นหาเรียงตามความตรง (list ของ SearchHit)"""
+    built = _conditions(query, kinds)
+    if built is None:
+        return []
+    conditions, ranked = built
+    score = _score(ranked).label('score')
+    stmt = (
+        select(search_index.c.kind, search_index.c.ref_id, score)
+        .where(*conditions)
+        .order_by(literal_column('score'), search_index.c.rowid.desc())
+        .limit(limit).offset(offset)
+    )
+    return [SearchHit(*row) for row in session.execute(stmt)]
+
+def search_grouped(session, query, kinds, per_kind=10):
+    """ผลค้นหาสูงสุด per_kind รายการต่อประเภท ใน query เดียว -> {kind: [ref_id, ...]}"""
+    results = {kind: [] for kind in kinds}
+    built = _conditions(query, kinds)
+    if built is None:
+        return results
+    conditions, ranked = built
+    hits = (
+        select(search_index.c.kind, search_index.c.ref_id, _score(ranked).label('score'),
+               search_index.c.rowid.label('position'))
+        .where(*conditions)
+        .subquery()
+    )
+    number = func.row_number().over(
+        partition_by=hits.c.kind, order_by=(hits.c.score, hits.c.position.desc())
+    ).label('number')
+    numbered = select(hits.c.kind, hits.c.ref_id, number).subquery()
+    stmt = (
+        select(numbered.c.kind, numbered.c.ref_id)
+        .where(numbered.c.number <= per_kind)
+        .order_by(numbered.c.kind, numbered.c.number)
+    )
+    for kind, ref_id in session.execute(stmt):
+        results[kind].append(ref_id)
+    return results
+
+def matching_ids(kind, query):
+    """subquery ของ id ที่ตรงกับคำค้น ใช้กับ Model.id.in_(...) (None ถ้าไม่มีคำค้น)"""
+    built = _conditions(query, [kind])
+    if built is None:
+        return None
+    conditions, _ = built
+    return select(search_index.c.ref_id).where(*conditions)
+
+def search_filter(session, model, query):
+    """เงื่อนไขกรอง model ตามคำค้น - ใช้ดัชนีถ้ามี ไม่เช่นนั้น ilike ทุกคำบนคอลัมน์ที่ลงทะเบียนไว้"""
+    spec = _SPECS[model]
+    if available(session):
+        ids = matching_ids(spec.kind, query)
+        return model.id.in_(ids) if ids is not None else None
+    terms = (query or '').split()
+    if not terms:
+        return None
+    columns = [getattr(model, name) for name in spec.fields]
+    return and_(*[or_(*[column.ilike(_like(term), escape='\\') for column in columns]) for term in terms])
+
+def load_hits(kind, ids):
+    """โหลด object ตามลำดับของ ids"""
+    if not ids:
+        return []
+    model = _KINDS[kind].model
+    objects = {obj.id: obj for obj in model.query.filter(model.id.in_(ids)).all()}
+    return [objects[ref_id] for ref_id in ids if ref_id in objects]
+
+# ----- sync กับ ORM -----
+def _changed(obj, spec):
+    state = inspect(obj)
+    return any(state.attrs[name].history.has_changes() for name in spec.fields)
+
+def _values(obj, spec):
+    return {name: getattr(obj, name) for name in spec.fields}
+
+@event.listens_for(Session, 'after_flush')
+def _sync_index(session, flush_context):
+    if not _SPECS:
+        return
+    upserts, deletes = [], []
+    for obj in session.new:
+        spec = _SPECS.get(type(obj))
+        if spec:
+            upserts.append(spec.row(obj.id, _values(obj, spec)))
+    for obj in session.dirty:
+        spec = _SPECS.get(type(obj))
+        if spec and obj not in session.deleted and _changed(obj, spec):
+            deletes.append(spec.rowid(obj.id))
+            upserts.append(spec.row(obj.id, _values(obj, spec)))
+    for obj in session.deleted:
+        spec = _SPECS.get(type(obj))
+        if spec:
+            deletes.append(spec.rowid(obj.id))
+    if not (upserts or deletes):
+        return
+    connection = session.connection()
+    if not available(connection):
+        return
+    if deletes:
+        connection.execute(search_index.delete().where(search_index.c.rowid == bindparam('old_rowid')),
+                           [{'old_rowid': rowid} for rowid in deletes])
+    if upserts:
+        connection.execute(search_index.insert(), upserts)
+
+def rebuild_index(session, batch_size=1000):
+    """สร้างดัชนีใหม่ทั้งหมดจากตารางต้นทางแล้ว mark_built() (commit ใน transaction เดียว) -> {kind: จำนวน}"""
+    connection = session.connection()
+    if not create_index(connection):
+        raise RuntimeError('Full-text search index requires SQLite with FTS5')
+    connection.execute(search_index.delete())
+    counts = {}
+    for spec in _SPECS.values():
+        columns = [getattr(spec.model, name) for name in spec.fields]
+        result = session.execute(
+            select(spec.model.id, *columns).execution_options(yield_per=batch_size)
+        )
+        counts[spec.kind] = 0
+        for rows in result.partitions():
+            connection.execute(search_index.insert(), [
+                spec.row(row[0], dict(zip(spec.fields, row[1:]))) for row in rows
+            ])
+            counts[spec.kind] += len(rows)
+    mark_built(connection)
+    session.commit()
+    return counts
+
+__all__ = [
+    'SEARCH_TABLE', 'SearchHit', 'search_index', 'index_model', 'create_index', 'mark_built', 'attach',
+    'available', 'search', 'search_grouped', 'matching_ids', 'search_filter', 'load_hits',
+    'rebuild_index'
+]
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Document Numbers - เลขที่เอกสารเรียงลำดับ ไม่ซ้ำ (เลขงานซ่อม, การขาย, งาน, ลูกค้า, ใบเสร็จ)
+
+แทนการสุ่มเลข 6 หลัก (ชนกันได้เมื่อข้อมูลเยอะ) และการอ่าน id ล่าสุด (แข่งกันได้)
+ลำดับเก็บใน stat_counter key 'sequence.<prefix><period>' เช่น 'sequence.SRV2610'
+เลขที่ได้จึงเป็น prefix + งวด + เลขลำดับเติมศูนย์ เช่น SRV261000042
+
+จองเป็นช่วง (block) ละ SEQUENCE_BLOCK_SIZE เลขด้วย UPDATE ... SET value = value + n
+ใน transaction ของ session ที่ขอ แล้วแจกจากหน่วยความจำโดยไม่ต้องถามฐานข้อมูล
+    - ช่วงที่จองยังไม่ commit ใช้ได้เฉพาะใน session นั้น ถ้า rollback ช่วงนั้นถูกทิ้งด้วย
+      (การจองถูก rollback เช่นกัน จึงไม่มีเลขที่อาจถูกจองซ้ำหลุดออกไป)
+    - commit แล้วเลขที่เหลือในช่วงจะถูกแบ่งให้ request อื่นใน process เดียวกัน
+เลขใน process เดียวกันเพิ่มขึ้นเสมอ ต่าง process ได้คนละช่วง (ไม่ซ้ำ แต่อาจสลับลำดับ/มีช่องว่าง)
+เอกสารที่ต้องเรียงไม่มีช่องว่าง (เช่น ใบกำกับภาษี) ใช้ block_size=1
+"""
+
+import threading
+from datetime import datetime, timezone
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from utils.counters import SEQUENCE_PREFIX
+from utils.dateranges import local_now
+
+_PENDING = 'sequence_blocks'
+
+class SequenceAllocator:
+    """แจกเลขลำดับจาก counter_model (stat_counter) ของหนึ่ง schema
+
+    get_session: callable ที่คืน session ของแอป (เช่น lambda: db.session)
+    """
+
+    def __init__(self, counter_model, get_session, block_size=20, name='sequences'):
+        self.counter_model = counter_model
+        self.get_session = get_session
+        self.block_size = block_size
+        self.name = name
+        self._lock = threading.Lock()
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_rollback', self._after_rollback)
+
+    # ----- ช่วงเลขที่ใช้ร่วมกันใน process -----
+    def _shared(self):
+        key = f'{self.name}.blocks'
+        blocks = current_app.extensions.get(key)
+        if blocks is None:
+            blocks = current_app.extensions[key] = {}
+        return blocks
+
+    def _after_commit(self, session):
+        if session.in_nested_transaction():
+            # release savepoint ไม่ใช่การ commit จริง
+            return
+        pending = session.info.get(_PENDING, {}).pop(self, None)
+        if not pending or not has_app_context():
+            return
+        with self._lock:
+            shared = self._shared()
+            for sequence, ranges in pending.items():
+                shared.setdefault(sequence, []).extend(block for block in ranges if block[0] <= block[1])
+                shared[sequence].sort()
+
+    def _after_rollback(self, session):
+        # การจองอาจถูก rollback ไปด้วย (รวม rollback ของ savepoint) - ทิ้งช่วงที่ยังไม่ commit
+        session.info.get(_PENDING, {}).pop(self, None)
+
+    # ----- การจอง -----
+    def reserve(self, session, sequence, count, seed=None):
+        """จอง count เลขถัดไปของ sequence ใน transaction ของ session -> (first, last)
+
+        seed(session) -> ค่าเริ่มต้นเมื่อ sequence ยังไม่มีแถว (เช่น เลขสูงสุดที่มีอยู่แล้ว)
+        """
+        table = self.counter_model.__table__
+        key = SEQUENCE_PREFIX + sequence
+        now = datetime.now(timezone.utc)
+        stmt = update(table).where(table.c.key == key).values(value=table.c.value + count, updated_at=now)
+        if session.execute(stmt).rowcount == 0:
+            start = seed(session) if seed else 0
+            try:
+                with session.begin_nested():
+                    session.execute(insert(table).values(key=key, value=start + count, updated_at=now))
+            except IntegrityError:
+                # process อื่นสร้างแถวไปก่อน
+                session.execute(stmt)
+        last = int(session.scalar(select(table.c.value).where(table.c.key == key)))
+        return last - count + 1, last
+
+    def next_value(self, sequence, block_size=None, seed=None):
+        """เลขถัดไปของ sequence (จองช่วงใหม่เมื่อช่วงที่มีหมด)"""
+        with self._lock:
+            value = _take(self._shared().get(sequence))
+        if value is not None:
+            return value
+
+        session = self.get_session()
+        pending = session.info.setdefault(_PENDING, {}).setdefault(self, {})
+        value = _take(pending.get(sequence))
+        if value is not None:
+            return value
+
+        if block_size is None:
+            block_size = current_app.config.get('SEQUENCE_BLOCK_SIZE', self.block_size)
+        first, last = self.reserve(session, sequence, max(int(block_size), 1), seed)
+        # savepoint ใน reserve() อาจล้าง pending เดิมไปแล้ว
+        pending = session.info.setdefault(_PENDING, {}).setdefault(self, {})
+        pending.setdefault(sequence, []).append([first + 1, last])
+        return first
+
+    def next_number(self, prefix, period='%y%m', width=5, block_size=None, column=None):
+        """เลขที่เอกสาร prefix + งวด (strftime ตามเวลาร้าน) + ลำดับ width หลัก
+
+        column: คอลัมน์ที่เก็บเลขนี้ - ใช้หาเลขสูงสุดที่มีอยู่แล้วตอนเริ่มงวดใหม่
+        """
+        head = prefix + (local_now().strftime(period) if period else '')
+        seed = (lambda session: _existing_max(session, column, head, width)) if column is not None else None
+        return f'{head}{self.next_value(head, block_size, seed):0{width}d}'
+
+def _take(ranges):
+    """ดึงเลขถัดไปจาก list ของช่วง [next, last] ที่เรียงแล้ว"""
+    while ranges:
+        block = ranges[0]
+        if block[0] <= block[1]:
+            block[0] += 1
+            return block[0] - 1
+        ranges.pop(0)
+    return None
+
+def _existing_max(session, column, head, width):
+    """ลำดับสูงสุดของเลขรูปแบบ head + width หลักที่มีอยู่ในตาราง (0 ถ้าไม่มี)"""
+    highest = session.scalar(
+        select(func.max(column)).where(column.startswith(head, autoescape=True),
+                                       func.length(column) == len(head) + width)
+    )
+    tail = highest[len(head):] if highest else ''
+    return int(tail) if tail.isdigit() else 0
+
+__all__ = ['SequenceAllocator']
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Dashboard Statistics - สถิติรวมของระบบ คำนวณแบบ 1 query ต่อ entity
+"""
+
+import enum
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+from sqlalchemy import func, case, select
+from models import (
+    db, User, Customer, Task, ServiceJob, Product, Sale, ActivityLog, StatCounter,
+    TaskStatus, ServiceJobStatus, UserRole, task_assignees
+)
+from utils.counters import BUILT_AT_KEY, period_keys, read_counters
+from utils.dateranges import day_bounds, month_bounds, in_range, local_today, to_local_date
+
+def count_where(condition):
+    """SUM(CASE WHEN condition THEN 1 ELSE 0 END) สำหรับนับแบบมีเงื่อนไข"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+def aggregate(session, model, *conditions, **expressions):
+    """Run named aggregate expressions over one table in a single SELECT
+
+    Positional conditions become the WHERE clause.
+    """
+    columns = [expr.label(name) for name, expr in expressions.items()]
+    query = select(*columns).select_from(model)
+    if conditions:
+        query = query.where(*conditions)
+    row = session.execute(query).one()
+    return dict(row._mapping)
+
+def grouped_counts(session, column):
+    """COUNT(*) GROUP BY column -> {value: count}"""
+    rows = session.execute(select(column, func.count()).group_by(column)).all()
+    return {
+        (key.value if isinstance(key, enum.Enum) else key): count
+        for key, count in rows
+    }
+
+def _status_counts(column, enum_class):
+    """One conditional count per enum member, keyed by enum value"""
+    return {member.value: count_where(column == member) for member in enum_class}
+
+def _local_day(now):
+    """วันที่ท้องถิ่นของ now (None = วันนี้)"""
+    return to_local_date(now) if now else local_today()
+
+@dataclass
+class UserStats:
+    total: int = 0
+    active: int = 0
+    technicians: int = 0
+    by_role: dict = field(default_factory=dict)
+
+@dataclass
+class CustomerStats:
+    total: int = 0
+    active: int = 0
+    new_this_month: int = 0
+
+@dataclass
+class TaskStats:
+    total: int = 0
+    overdue: int = 0
+    by_status: dict = field(default_factory=dict)
+
+@dataclass
+class ServiceJobStats:
+    total: int = 0
+    active: int = 0
+    overdue: int = 0
+    by_status: dict = field(default_factory=dict)
+
+@dataclass
+class SaleStats:
+    total: int = 0
+    today: int = 0
+    this_month: int = 0
+    total_revenue: float = 0.0
+    today_revenue: float = 0.0
+    month_revenue: float = 0.0
+
+@dataclass
+class ProductStats:
+    total: int = 0
+    active: int = 0
+    low_stock: int = 0
+    out_of_stock: int = 0
+    inventory_value: float = 0.0
+
+@dataclass
+class DashboardSnapshot:
+    """สถิติทั้งหมดของ dashboard ณ เวลาหนึ่ง"""
+    users: UserStats
+    customers: CustomerStats
+    tasks: TaskStats
+    service_jobs: ServiceJobStats
+    sales: SaleStats
+    products: ProductStats
+    activity_logs: int = 0
+    generated_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+
+    def to_dict(self):
+        data = asdict(self)
+        data['generated_at'] = self.generated_at.isoformat()
+        return data
+
+# Active / overdue ของงานซ่อม = รับเข้า + กำลังซ่อม (ความหมายเดียวกับตัวเลขเดิมของ dashboard / api)
+ACTIVE_JOB_STATUSES = [ServiceJobStatus.RECEIVED, ServiceJobStatus.IN_REPAIR]
+OPEN_TASK_STATUSES = [TaskStatus.PENDING, TaskStatus.IN_PROGRESS]
+
+def user_stats(session=None):
+    session = session or db.session
+    row = aggregate(
+        session, User,
+        total=func.count(User.id),
+        active=count_where(User.is_active == True),
+        technicians=count_where(User.is_technician == True),
+        **{f'role_{k}': v for k, v in _status_counts(User.role, UserRole).items()}
+    )
+    by_role = {role.value: int(row.pop(f'role_{role.value}')) for role in UserRole}
+    return UserStats(by_role=by_role, **{k: int(v) for k, v in row.items()})
+
+def customer_stats(session=None, now=None):
+    session = session or db.session
+    row = aggregate(
+        session, Customer,
+        total=func.count(Customer.id),
+        active=count_where(Customer.status == 'active'),
+        new_this_month=count_where(in_range(Customer.created_at, month_bounds(_local_day(now))))
+    )
+    return CustomerStats(**{k: int(v) for k, v in row.items()})
+
+def task_stats(session=None, now=None):
+    session = session or db.session
+    now = now or datetime.now(timezone.utc)
+    row = aggregate(
+        session, Task,
+        total=func.count(Task.id),
+        overdue=count_where((Task.due_date < now) & Task.status.in_(OPEN_TASK_STATUSES)),
+        **{f'status_{k}': v for k, v in _status_counts(Task.status, TaskStatus).items()}
+    )
+    by_status = {s.value: int(row.pop(f'status_{s.value}')) for s in TaskStatus}
+    return TaskStats(by_status=by_status, **{k: int(v) for k, v in row.items()})
+
+def service_job_stats(session=None, now=None):
+    session = session or db.session
+    now = now or datetime.now(timezone.utc)
+    row = aggregate(
+        session, ServiceJob,
+        total=func.count(ServiceJob.id),
+        active=count_where(ServiceJob.status.in_(ACTIVE_JOB_STATUSES)),
+        overdue=count_where(
+            (ServiceJob.promised_date < now) & ServiceJob.status.in_(ACTIVE_JOB_STATUSES)
+        ),
+        **{f'status_{k}': v for k, v in _status_counts(ServiceJob.status, ServiceJobStatus).items()}
+    )
+    by_status = {s.value: int(row.pop(f'status_{s.value}')) for s in ServiceJobStatus}
+    return ServiceJobStats(by_status=by_status, **{k: int(v) for k, v in row.items()})
+
+def sale_stats(session=None, now=None):
+    session = session or db.session
+    day = _local_day(now)
+    in_today = in_range(Sale.created_at, day_bounds(day))
+    in_month = in_range(Sale.created_at, month_bounds(day))
+    row = aggregate(
+        session, Sale,
+        total=func.count(Sale.id),
+        today=count_where(in_today),
+        this_month=count_where(in_month),
+        total_revenue=func.coalesce(func.sum(Sale.total_amount), 0),
+        today_revenue=func.coalesce(
+            func.sum(case((in_today, Sale.total_amount), else_=0)), 0
+        ),
+        month_revenue=func.coalesce(
+            func.sum(case((in_month, Sale.total_amount), else_=0)), 0
+        )
+    )
+    return SaleStats(
+        total=int(row['total']),
+        today=int(row['today']),
+        this_month=int(row['this_month']),
+        total_revenue=float(row['total_revenue']),
+        today_revenue=float(row['today_revenue']),
+        month_revenue=float(row['month_revenue'])
+    )
+
+def product_stats(session=None):
+    session = session or db.session
+    row = aggregate(
+        session, Product,
+        total=func.count(Product.id),
+        active=count_where(Product.is_active == True),
+        low_stock=count_where(Product.stock_quantity <= Product.min_stock_level),
+        out_of_stock=count_where(Product.stock_quantity == 0),
+        inventory_value=func.coalesce(func.sum(Product.stock_quantity * Product.cost), 0)
+    )
+    inventory_value = float(row.pop('inventory_value'))
+    return ProductStats(inventory_value=inventory_value, **{k: int(v) for k, v in row.items()})
+
+def overdue_counts(session=None, now=None):
+    """จำนวน task / งานซ่อมที่เลยกำหนด (ขึ้นกับเวลา จึงเก็บเป็น counter ไม่ได้)"""
+    session = session or db.session
+    now = now or datetime.now(timezone.utc)
+    row = session.execute(select(
+        select(func.count(Task.id)).where(
+            Task.due_date < now, Task.status.in_(OPEN_TASK_STATUSES)
+        ).scalar_subquery().label('tasks'),
+        select(func.count(ServiceJob.id)).where(
+            ServiceJob.promised_date < now, ServiceJob.status.in_(ACTIVE_JOB_STATUSES)
+        ).scalar_subquery().label('service_jobs')
+    )).one()
+    return int(row.tasks or 0), int(row.service_jobs or 0)
+
+def counter_stats(session=None, now=None):
+    """อ่าน TaskStats / ServiceJobStats / SaleStats จากตาราง stat_counter (O(1) rows)
+
+    คืนค่า None ถ้ายังไม่เคย rebuild counters
+    """
+    session = session or db.session
+    now = now or datetime.now(timezone.utc)
+    day, month = period_keys(now)
+    task_keys = {s.value: f'tasks.status:{s.value}' for s in TaskStatus}
+    job_keys = {s.value: f'service_jobs.status:{s.value}' for s in ServiceJobStatus}
+    sale_keys = {
+        'total': 'sales.count', 'total_revenue': 'sales.revenue',
+        'today': f'sales.count:day:{day}', 'this_month': f'sales.count:month:{month}',
+        'today_revenue': f'sales.revenue:day:{day}', 'month_revenue': f'sales.revenue:month:{month}'
+    }
+    values = read_counters(session, StatCounter, [
+        BUILT_AT_KEY, 'tasks.count', 'service_jobs.count',
+        *task_keys.values(), *job_keys.values(), *sale_keys.values()
+    ])
+    if not values[BUILT_AT_KEY]:
+        return None
+
+    overdue_tasks, overdue_jobs = overdue_counts(session, now)
+    jobs_by_status = {status: int(values[key]) for status, key in job_keys.items()}
+    tasks = TaskStats(
+        total=int(values['tasks.count']),
+        overdue=overdue_tasks,
+        by_status={status: int(values[key]) for status, key in task_keys.items()}
+    )
+    service_jobs = ServiceJobStats(
+        total=int(values['service_jobs.count']),
+        active=sum(jobs_by_status[s.value] for s in ACTIVE_JOB_STATUSES),
+        overdue=overdue_jobs,
+        by_status=jobs_by_status
+    )
+    sales = SaleStats(
+        total=int(values[sale_keys['total']]),
+        today=int(values[sale_keys['today']]),
+        this_month=int(values[sale_keys['this_month']]),
+        total_revenue=float(values[sale_keys['total_revenue']]),
+        today_revenue=float(values[sale_keys['today_revenue']]),
+        month_revenue=float(values[sale_keys['month_revenue']])
+    )
+    return tasks, service_jobs, sales
+
+def get_sale_stats(session=None):
+    """SaleStats จาก stat_counter ถ้าพร้อม ไม่เช่นนั้น aggregate จากตาราง sale"""
+    session = session or db.session
+    counted = counter_stats(session)
+    return counted[2] if counted else sale_stats(session)
+
+def get_dashboard_snapshot(session=None, use_counters=True):
+    """สร้าง DashboardSnapshot
+
+    Task / ServiceJob / Sale อ่านจาก stat_counter ถ้า rebuild แล้ว
+    ไม่เช่นนั้นคำนวณแบบ 1 query ต่อ entity
+    """
+    session = session or db.session
+    counted = counter_stats(session) if use_counters else None
+    if counted:
+        tasks, service_jobs, sales = counted
+    else:
+        tasks, service_jobs, sales = task_stats(session), service_job_stats(session), sale_stats(session)
+    return DashboardSnapshot(
+        users=user_stats(session),
+        customers=customer_stats(session),
+        tasks=tasks,
+        service_jobs=service_jobs,
+        sales=sales,
+        products=product_stats(session),
+        activity_logs=session.scalar(select(func.count(ActivityLog.id))) or 0
+    )
+
+def get_user_workload(user_id, session=None):
+    """งานของผู้ใช้ (สำหรับช่าง) - รวม 2 COUNT ไว้ใน SELECT เดียว"""
+    session = session or db.session
+    row = session.execute(select(
+        select(func.count()).select_from(task_assignees)
+            .where(task_assignees.c.user_id == user_id).scalar_subquery().label('my_tasks'),
+        select(func.count(ServiceJob.id))
+            .where(ServiceJob.assigned_technician == user_id).scalar_subquery().label('my_service_jobs')
+    )).one()
+    return {'my_tasks': int(row.my_tasks or 0), 'my_service_jobs': int(row.my_service_jobs or 0)}
+
+__all__ = [
+    'count_where', 'aggregate', 'grouped_counts',
+    'UserStats', 'CustomerStats', 'TaskStats', 'ServiceJobStats', 'SaleStats',
+    'ProductStats', 'DashboardSnapshot', 'ACTIVE_JOB_STATUSES', 'OPEN_TASK_STATUSES',
+    'user_stats', 'customer_stats', 'task_stats', 'service_job_stats', 'sale_stats',
+    'product_stats', 'overdue_counts', 'counter_stats', 'get_sale_stats', 'get_dashboard_snapshot',
+    'get_user_workload'
+]